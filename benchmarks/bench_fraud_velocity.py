@@ -0,0 +1,63 @@
+"""
+Measure how fast the velocity engine scores and records events, and how much
+memory its counters hold.
+
+    python -m benchmarks.bench_fraud_velocity --events 5000000 --phones 500000
+    python -m benchmarks.bench_fraud_velocity --trace-memory   # slower, but reports counter memory
+"""
+import argparse
+import random
+import time
+import tracemalloc
+
+from src.fraud.services import VELOCITY_RULES
+from src.fraud.velocity import VelocityEngine
+
+
+def main(events: int, phones: int, max_keys: int, trace_memory: bool) -> None:
+    rng = random.Random(7)
+    pool = [
+        {"phone": f"+234803{index:07d}", "device": f"device-{index % (phones // 2 or 1)}",
+         "ip": f"10.{index % 250}.{index // 250 % 250}.1"}
+        for index in range(phones)
+    ]
+    event_types = ["login", "login", "login_failure"]
+    stream = [(rng.choice(event_types), pool[rng.randrange(phones)], 0.0)
+              for _ in range(min(events, 1_000_000))]
+
+    if trace_memory:
+        tracemalloc.start()
+    engine = VelocityEngine(VELOCITY_RULES, max_keys=max_keys)
+
+    started = time.perf_counter()
+    now = time.time()
+    blocked = 0
+    for index in range(events):
+        event_type, attributes, amount = stream[index % len(stream)]
+        # Spread the events over one simulated day
+        moment = now + index * 86400 / events
+        decision = engine.check(event_type, attributes, amount, moment)
+        if decision.allowed:
+            engine.record(event_type, attributes, amount, moment)
+        else:
+            blocked += 1
+    elapsed = time.perf_counter() - started
+
+    keys = sum(len(counter) for counter in engine.counters.values())
+    evictions = sum(counter.evictions for counter in engine.counters.values())
+    print(f"{events:,} events in {elapsed:.2f}s: {events / elapsed:,.0f} events/s, "
+          f"{elapsed / events * 1e6:.2f} us/event, {blocked:,} blocked")
+    print(f"{keys:,} tracked keys, {evictions:,} evictions")
+    if trace_memory:
+        current, _ = tracemalloc.get_traced_memory()
+        print(f"{current / 1e6:,.1f} MB held by the engine, {current / max(keys, 1):,.0f} bytes per key")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--events", type=int, default=2_000_000)
+    parser.add_argument("--phones", type=int, default=200_000)
+    parser.add_argument("--max-keys", type=int, default=200_000)
+    parser.add_argument("--trace-memory", action="store_true")
+    args = parser.parse_args()
+    main(args.events, args.phones, args.max_keys, args.trace_memory)
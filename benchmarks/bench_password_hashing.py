@@ -0,0 +1,59 @@
+"""
+PIN hashing throughput per core for bcrypt and argon2 costs, and the cost
+startup calibration picks for a latency budget on this machine.
+
+    python -m benchmarks.bench_password_hashing --hashes 10 --budget-ms 250
+
+argon2 rows need argon2-cffi and are skipped without it.
+"""
+import argparse
+import time
+
+from passlib.context import CryptContext
+from passlib.exc import MissingBackendError
+
+from src.authentications.hashing import ARGON2_MEMORY_KIB, PasswordPolicy
+
+BCRYPT_COSTS = (10, 11, 12, 13)
+ARGON2_COSTS = ((1, 19456), (2, 19456), (2, 65536), (3, 65536))  # (time cost, memory KiB)
+
+
+def cpu_per_hash(context: CryptContext, hashes: int) -> tuple:
+    started_wall, started_cpu = time.perf_counter(), time.process_time()
+    for _ in range(hashes):
+        context.hash("1234")
+    return (time.perf_counter() - started_wall) / hashes, (time.process_time() - started_cpu) / hashes
+
+
+def report(label: str, wall: float, cpu: float) -> None:
+    print(f"{label:<28} {wall * 1000:8.1f} ms/hash  {1 / cpu:8.1f} hashes/s/core")
+
+
+def main(hashes: int, budget_ms: float) -> None:
+    for rounds in BCRYPT_COSTS:
+        report(f"bcrypt rounds={rounds}", *cpu_per_hash(CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds), hashes))
+
+    for time_cost, memory_kib in ARGON2_COSTS:
+        context = CryptContext(schemes=["argon2"], argon2__rounds=time_cost, argon2__memory_cost=memory_kib,
+                               argon2__parallelism=1)
+        try:
+            report(f"argon2id t={time_cost} m={memory_kib // 1024}MiB", *cpu_per_hash(context, hashes))
+        except MissingBackendError:
+            print("argon2: argon2-cffi is not installed, skipping")
+            break
+
+    print()
+    for scheme in ("bcrypt", "argon2"):
+        try:
+            settings = PasswordPolicy(scheme, argon2_memory_kib=ARGON2_MEMORY_KIB).calibrate(budget_ms)
+        except MissingBackendError:
+            continue
+        print(f"Calibrated for {budget_ms:.0f} ms: {settings}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--hashes", type=int, default=10, help="Hashes timed per cost")
+    parser.add_argument("--budget-ms", type=float, default=250)
+    args = parser.parse_args()
+    main(args.hashes, args.budget_ms)
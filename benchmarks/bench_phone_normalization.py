@@ -0,0 +1,39 @@
+"""
+Report phone-number normalizations per second, cold (unique numbers) and warm (memoised).
+
+    python -m benchmarks.bench_phone_normalization --numbers 1000000
+"""
+import argparse
+import random
+import time
+
+from src.authentications.phone import normalize_phone_number
+
+SPELLINGS = ["0{}", "{}", "234{}", "+234{}", "+234 {}", "0{} "]
+
+
+def run(label: str, numbers: list) -> None:
+    started = time.perf_counter()
+    for number in numbers:
+        normalize_phone_number(number)
+    elapsed = time.perf_counter() - started
+    print(f"{label:>6}: {len(numbers) / elapsed:,.0f} normalizations/s")
+
+
+def main(count: int) -> None:
+    random.seed(7)
+    numbers = [
+        random.choice(SPELLINGS).format(f"{random.choice('789')}{random.choice('01')}{random.randrange(10 ** 8):08d}")
+        for _ in range(count)
+    ]
+    normalize_phone_number.cache_clear()
+    run("cold", numbers)
+    run("warm", numbers[-50_000:] * (count // 50_000 or 1))
+    print(normalize_phone_number.cache_info())
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--numbers", type=int, default=1_000_000)
+    args = parser.parse_args()
+    main(args.numbers)
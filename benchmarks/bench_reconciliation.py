@@ -0,0 +1,87 @@
+"""
+Reconcile a synthetic multi-million-row settlement file against a matching
+ledger export with a known number of injected exceptions.
+
+    python -m benchmarks.bench_reconciliation --rows 5000000 --partitions 64
+
+Files are written to a temporary directory and removed afterwards.
+"""
+import argparse
+import os
+import resource
+import tempfile
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+
+from src.reconciliation.pipeline import reconcile
+
+WRITE_CHUNK = 1_000_000
+
+
+def _write(path: str, references, amounts_kobo, reference_column: str, amount_column: str) -> None:
+    with pa_csv.CSVWriter(path, pa.schema([(reference_column, pa.string()), (amount_column, pa.string())])) as writer:
+        for start in range(0, len(references), WRITE_CHUNK):
+            chunk = amounts_kobo[start:start + WRITE_CHUNK]
+            amounts = [f"{value // 100}.{value % 100:02d}" for value in chunk.tolist()]
+            writer.write_batch(pa.record_batch([
+                pa.array(references[start:start + WRITE_CHUNK].tolist(), pa.string()),
+                pa.array(amounts, pa.string()),
+            ], names=[reference_column, amount_column]))
+
+
+def generate(directory: str, rows: int, error_rate: float, seed: int = 11) -> tuple:
+    rng = np.random.default_rng(seed)
+    references = np.array([f"bill:{index:012d}" for index in range(rows)], dtype=object)
+    amounts = rng.integers(10_000, 5_000_000, rows)
+
+    errors = int(rows * error_rate)
+    picked = rng.choice(rows, size=errors * 3, replace=False)
+    mismatched, missing_from_ledger, missing_from_provider = np.split(picked, 3)
+
+    provider_keep = np.ones(rows, bool)
+    provider_keep[missing_from_provider] = False
+    ledger_keep = np.ones(rows, bool)
+    ledger_keep[missing_from_ledger] = False
+    ledger_amounts = amounts.copy()
+    ledger_amounts[mismatched] += 1
+
+    # The ledger export comes out in a different order from the provider file
+    ledger_order = rng.permutation(np.flatnonzero(ledger_keep))
+
+    provider_path = os.path.join(directory, "provider.csv")
+    ledger_path = os.path.join(directory, "ledger.csv")
+    _write(provider_path, references[provider_keep], amounts[provider_keep], "transaction_reference", "amount")
+    _write(ledger_path, references[ledger_order], ledger_amounts[ledger_order], "reference", "amount")
+    return provider_path, ledger_path, errors
+
+
+def main(rows: int, partitions: int, error_rate: float) -> None:
+    with tempfile.TemporaryDirectory(prefix="bench-reconcile-") as directory:
+        started = time.perf_counter()
+        provider_path, ledger_path, errors = generate(directory, rows, error_rate)
+        print(f"Generated {rows:,} rows per side with {errors:,} exceptions of each kind "
+              f"in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        totals = reconcile(provider_path, ledger_path, os.path.join(directory, "exceptions.csv"),
+                           provider_columns=("transaction_reference", "amount"), partitions=partitions)
+        elapsed = time.perf_counter() - started
+
+    peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    print(f"Reconciled in {elapsed:.2f}s: {(totals['provider_rows'] + totals['ledger_rows']) / elapsed:,.0f} rows/s, "
+          f"peak RSS {peak_mb:,.0f} MB (includes the generator)")
+    for key in ("matched", "amount_mismatch", "missing_from_ledger", "missing_from_provider", "duplicate_reference"):
+        print(f"  {key}: {totals.get(key, 0):,}")
+    assert totals["amount_mismatch"] == totals["missing_from_ledger"] == totals["missing_from_provider"] == errors
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5_000_000)
+    parser.add_argument("--partitions", type=int, default=64)
+    parser.add_argument("--error-rate", type=float, default=0.001)
+    args = parser.parse_args()
+    main(args.rows, args.partitions, args.error_rate)
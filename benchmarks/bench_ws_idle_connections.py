@@ -0,0 +1,66 @@
+"""
+Load test for /v1/ws: open many idle WebSocket connections for one user, then
+publish an event through Postgres NOTIFY and time how long it takes to reach all of them.
+
+Start the app first (raise the open-file limit on both sides, e.g. `ulimit -n 100000`):
+    uvicorn src.main:app --workers 4
+then:
+    DB_URL=postgresql+asyncpg://... python -m benchmarks.bench_ws_idle_connections \
+        --url ws://localhost:8000/v1/ws --phone-number +2348031234567 --connections 20000
+The phone number must belong to an existing user.
+"""
+import argparse
+import asyncio
+import json
+import time
+
+import asyncpg
+import websockets
+
+from src.authentications.utilities import create_access_token
+from src.database import DB_URL
+from src.notifications.push import PUSH_CHANNEL
+
+
+async def open_connections(url: str, count: int, concurrency: int) -> list:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def open_one():
+        async with semaphore:
+            return await websockets.connect(url, ping_interval=None, max_queue=4)
+
+    return await asyncio.gather(*(open_one() for _ in range(count)))
+
+
+async def main(url: str, phone_number: str, user_id: str, count: int, concurrency: int) -> None:
+    token = create_access_token({"sub": phone_number})
+    url = f"{url}?token={token}"
+
+    started = time.perf_counter()
+    connections = await open_connections(url, count, concurrency)
+    elapsed = time.perf_counter() - started
+    print(f"Opened {len(connections)} connections in {elapsed:.2f}s ({len(connections) / elapsed:.0f}/s)")
+
+    # Let the connections sit idle, then push one event to all of them
+    await asyncio.sleep(5)
+    payload = json.dumps({"user": user_id, "event": {"type": "benchmark", "data": {}}})
+    notifier = await asyncpg.connect(DB_URL.replace("+asyncpg", ""))
+    started = time.perf_counter()
+    await notifier.execute("SELECT pg_notify($1, $2)", PUSH_CHANNEL, payload)
+    await asyncio.gather(*(connection.recv() for connection in connections))
+    elapsed = time.perf_counter() - started
+    print(f"Fan-out to {len(connections)} connections took {elapsed * 1000:.1f}ms")
+
+    await notifier.close()
+    await asyncio.gather(*(connection.close() for connection in connections))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="ws://localhost:8000/v1/ws")
+    parser.add_argument("--phone-number", required=True)
+    parser.add_argument("--user-id", required=True, help="users.id of the same user")
+    parser.add_argument("--connections", type=int, default=10_000)
+    parser.add_argument("--concurrency", type=int, default=500, help="Handshakes in flight at once")
+    args = parser.parse_args()
+    asyncio.run(main(args.url, args.phone_number, args.user_id, args.connections, args.concurrency))
@@ -0,0 +1,216 @@
+"""
+Synthetic users, abandoned signups, OTPs, wallets and ledger entries shaped like
+production traffic, bulk-loaded with COPY. Used by bench_capacity.
+
+Person number n always gets the same phone number and user and wallet ids for a
+given seed, so rows can reference each other without keeping millions of ids in
+memory, and a load can be repeated exactly.
+"""
+import hashlib
+import math
+import random
+import time
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+from uuid import UUID
+
+# Mobile prefixes weighted by rough subscriber share of MTN, Airtel, Glo and 9mobile; the weights sum to 100
+PHONE_PREFIXES = {
+    "0803": 8, "0806": 6, "0703": 4, "0706": 3, "0813": 4, "0816": 3, "0810": 3, "0814": 2, "0903": 3,
+    "0906": 2, "0913": 1, "0916": 1,
+    "0802": 7, "0808": 6, "0708": 4, "0812": 3, "0701": 3, "0902": 3, "0901": 2, "0904": 2, "0907": 1,
+    "0912": 1,
+    "0805": 6, "0807": 5, "0705": 3, "0815": 3, "0811": 2, "0905": 2, "0915": 1,
+    "0809": 2, "0818": 1, "0817": 1, "0909": 1, "0908": 1,
+}
+FIRST_NAMES = ["Ada", "Chinedu", "Emeka", "Funmi", "Ngozi", "Tunde", "Bola", "Kemi", "Yusuf", "Amaka", "Ifeanyi",
+               "Seun", "Halima", "Obinna", "Zainab", "Kunle", "Nkechi", "Musa", "Tobi", "Uche", "Aisha", "Segun",
+               "Chiamaka", "Ibrahim", "Folake", "Femi", "Hauwa", "Damilola", "Nneka", "Sani"]
+LAST_NAMES = ["Okafor", "Adeyemi", "Bello", "Eze", "Okonkwo", "Balogun", "Ibrahim", "Nwosu", "Adebayo", "Obi",
+              "Afolabi", "Umar", "Chukwu", "Olawale", "Danjuma", "Onyeka", "Lawal", "Nnamdi", "Abubakar",
+              "Ogunleye", "Mohammed", "Okeke", "Yakubu", "Oyelaran", "Anozie"]
+# Ledger reference prefixes (see src.reconciliation.job) and their share of entries
+LEDGER_REFERENCES = {"transfer:": 40, "bill:": 25, "card:": 20, "airtime:": 10, "estate-levy:": 3, "loan:": 2}
+# Requests for an OTP per day by one number: most get one code, a few retry up to the ban
+OTP_REQUEST_COUNTS = {1: 70, 2: 17, 3: 7, 4: 3, 5: 2, 8: 0.7, 11: 0.3}
+
+USER_COLUMNS = ["id", "first_name", "last_name", "phone_number", "phone_e164", "login_pin", "device_id", "version",
+                "created_date"]
+INIT_USER_COLUMNS = ["id", "first_name", "last_name", "phone_number", "phone_e164", "login_pin"]
+WALLET_COLUMNS = ["id", "user_id", "balance", "currency", "created_date"]
+LEDGER_COLUMNS = ["id", "wallet_id", "entry_type", "amount", "reference", "description", "created_date"]
+OTP_COLUMNS = ["id", "phone_number", "phone_e164", "otp_code", "created_date", "is_valid", "request_count",
+               "expire_date"]
+
+# Users written per COPY round; their wallets and ledger entries go in the same round
+CHUNK_USERS = 10_000
+
+_SLOTS = [prefix for prefix, weight in PHONE_PREFIXES.items() for _ in range(weight)]
+_SLOT_RANKS = [_SLOTS[:slot].count(prefix) for slot, prefix in enumerate(_SLOTS)]
+# Coprime with 10 ** 7, so multiplying by it permutes the subscriber numbers of a prefix
+_SUBSCRIBER_SCRAMBLE = 3_779_213
+
+
+def phone_for(person: int) -> tuple:
+    """
+    Phone number of person number person, as typed and in E.164 form. Distinct
+    people never share a number (up to about 10 ** 9 people).
+
+    Returns:
+        tuple: (phone_number, phone_e164).
+    """
+    slot = person % len(_SLOTS)
+    prefix = _SLOTS[slot]
+    serial = person // len(_SLOTS) * PHONE_PREFIXES[prefix] + _SLOT_RANKS[slot]
+    subscriber = f"{serial * _SUBSCRIBER_SCRAMBLE % 10 ** 7:07d}"
+    phone_e164 = "+234" + prefix[1:] + subscriber
+    # Accounts from before phone normalisation kept the number as typed
+    return (prefix + subscriber if person % 10 < 3 else phone_e164), phone_e164
+
+
+def stable_uuid(kind: str, person: int, seed: int) -> UUID:
+    digest = hashlib.blake2b(f"{seed}:{kind}:{person}".encode(), digest_size=16).digest()
+    return UUID(bytes=digest, version=4)
+
+
+def random_uuid(rng: random.Random) -> UUID:
+    return UUID(int=rng.getrandbits(128), version=4)
+
+
+def signup_time(rng: random.Random, now: datetime, days: int) -> datetime:
+    # Signups grow linearly over the history: yesterday saw about twice the average day
+    return now - timedelta(days=days * (1 - math.sqrt(rng.random())))
+
+
+def abandoned_signups(users: int, abandon_rate: float) -> int:
+    """Signups left in initusers when abandon_rate of everyone who starts one never verifies the OTP."""
+    return round(users * abandon_rate / (1 - abandon_rate))
+
+
+def _weighted(rng: random.Random, weights: dict):
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def _amount(rng: random.Random) -> Decimal:
+    # Median around NGN 3,000 with a long tail of large transfers
+    return Decimal(f"{min(rng.lognormvariate(8, 1.3), 5_000_000):.2f}")
+
+
+def user_rows(rng: random.Random, start: int, stop: int, now: datetime, days: int, ledger_per_user: float,
+              login_pin: str, seed: int) -> tuple:
+    """
+    Users start..stop-1 with one wallet each and their ledger history.
+
+    Entries per wallet are log-normal around ledger_per_user: most wallets see
+    a handful, a few merchants-in-all-but-name see thousands.
+
+    Returns:
+        tuple: (user records, wallet records, ledger records).
+    """
+    sigma = 1.2
+    mu = math.log(ledger_per_user) - sigma ** 2 / 2 if ledger_per_user > 0 else None
+    users, wallets, entries = [], [], []
+    for person in range(start, stop):
+        phone_number, phone_e164 = phone_for(person)
+        user_id = stable_uuid("user", person, seed)
+        wallet_id = stable_uuid("wallet", person, seed)
+        created = signup_time(rng, now, days)
+        device_id = f"android-{rng.getrandbits(64):016x}" if rng.random() < 0.8 else None
+        users.append((user_id, rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES), phone_number, phone_e164,
+                      login_pin, device_id, 1, created))
+        wallets.append((wallet_id, user_id, _amount(rng), "NGN", created))
+
+        if mu is None:
+            continue
+        active_seconds = max((now - created).total_seconds(), 1.0)
+        for _ in range(int(rng.lognormvariate(mu, sigma))):
+            prefix = _weighted(rng, LEDGER_REFERENCES)
+            entries.append((random_uuid(rng), wallet_id, "credit" if rng.random() < 0.35 else "debit",
+                            _amount(rng), f"{prefix}{rng.getrandbits(80):020x}", None,
+                            created + timedelta(seconds=rng.uniform(0, active_seconds))))
+    return users, wallets, entries
+
+
+def init_user_rows(rng: random.Random, start: int, stop: int, login_pin: str, seed: int) -> list:
+    """Abandoned signups: people start..stop-1, who never became users."""
+    rows = []
+    for person in range(start, stop):
+        phone_number, phone_e164 = phone_for(person)
+        rows.append((stable_uuid("init_user", person, seed), rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES),
+                     phone_number, phone_e164, login_pin))
+    return rows
+
+
+def otp_rows(rng: random.Random, now: datetime, users: int, abandoned: int, per_day: int, days: int):
+    """
+    Yield what is left in the otp table after days of churn, one day at a time.
+
+    Verified codes are deleted by the app, so what remains is mostly codes that
+    were never entered: a fifth of them from people who abandoned signup. A
+    number has at most one row a day, since repeat requests update it.
+    """
+    for day in range(days):
+        from_signups = min(per_day // 5, abandoned)
+        people = rng.sample(range(users), min(per_day - from_signups, users))
+        people += [users + person for person in rng.sample(range(abandoned), from_signups)]
+        rows = []
+        for person in people:
+            phone_number, phone_e164 = phone_for(person)
+            created = now - timedelta(days=day, seconds=rng.uniform(0, 86_400))
+            request_count = _weighted(rng, OTP_REQUEST_COUNTS)
+            # expire_date holds the time of the latest resend
+            last_sent = created + timedelta(minutes=sum(rng.uniform(1, 10) for _ in range(request_count - 1)))
+            rows.append((random_uuid(rng), phone_number, phone_e164, f"{rng.randrange(10 ** 6):06d}", created,
+                         rng.random() < 0.9, request_count, min(last_sent, now)))
+        yield rows
+
+
+async def load(raw_connection, schema: str, users: int, abandon_rate: float, otp_per_day: int, otp_days: int,
+               ledger_per_user: float, days: int, login_pin: str, seed: int = 42, now: datetime = None) -> dict:
+    """
+    COPY a full synthetic population into schema, whose tables and partitions must exist.
+
+    Args:
+        raw_connection: An asyncpg connection.
+        schema (str): Schema holding users, initusers, otp, wallets and ledger_entries.
+        users (int): Registered users; each gets a wallet.
+        abandon_rate (float): Share of started signups never completed.
+        otp_per_day (int): Numbers left with an unverified OTP per day.
+        otp_days (int): Days of OTP history (the otp partition retention).
+        ledger_per_user (float): Mean ledger entries per wallet.
+        days (int): How far back signups go.
+        login_pin (str): PIN hash given to everyone; hashing millions of PINs would dominate the load.
+        seed (int): Seed for every random choice.
+
+    Returns:
+        dict: Table -> (rows, seconds spent in COPY).
+    """
+    rng = random.Random(seed)
+    now = now or datetime.now(timezone.utc)
+    totals = {table: [0, 0.0] for table in ("users", "wallets", "ledger_entries", "initusers", "otp")}
+
+    async def copy(table: str, columns: list, records: list) -> None:
+        if not records:
+            return
+        started = time.perf_counter()
+        await raw_connection.copy_records_to_table(table, schema_name=schema, records=records, columns=columns)
+        totals[table][0] += len(records)
+        totals[table][1] += time.perf_counter() - started
+
+    for start in range(0, users, CHUNK_USERS):
+        user_records, wallet_records, ledger_records = user_rows(
+            rng, start, min(start + CHUNK_USERS, users), now, days, ledger_per_user, login_pin, seed
+        )
+        await copy("users", USER_COLUMNS, user_records)
+        await copy("wallets", WALLET_COLUMNS, wallet_records)
+        await copy("ledger_entries", LEDGER_COLUMNS, ledger_records)
+
+    abandoned = abandoned_signups(users, abandon_rate)
+    for start in range(users, users + abandoned, CHUNK_USERS):
+        await copy("initusers", INIT_USER_COLUMNS,
+                   init_user_rows(rng, start, min(start + CHUNK_USERS, users + abandoned), login_pin, seed))
+
+    for records in otp_rows(rng, now, users, abandoned, otp_per_day, otp_days):
+        await copy("otp", OTP_COLUMNS, records)
+
+    return {table: tuple(total) for table, total in totals.items()}
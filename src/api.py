@@ -1,8 +1,23 @@
 from fastapi import APIRouter
 
 from .authentications.views import router as auth_router
+from .debug.views import router as debug_router
+from .estates.views import router as estates_router
+from .media.views import router as media_router
+from .notifications.views import router as notifications_router, ws_router
+from .settings.views import router as settings_router
+from .utilities.views import router as utilities_router
+from .user.views import router as user_router
 
 
 router = APIRouter(prefix="/v1")
 
 router.include_router(auth_router)
+router.include_router(notifications_router)
+router.include_router(ws_router)
+router.include_router(utilities_router)
+router.include_router(user_router)
+router.include_router(media_router)
+router.include_router(estates_router)
+router.include_router(settings_router)
+router.include_router(debug_router)
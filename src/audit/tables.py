@@ -0,0 +1,39 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import text
+
+from src.partitions import PARTITION_POLICIES, create_partition, period_start
+
+# Declared in SQL rather than as a SQLModel table because create_all cannot
+# emit PARTITION BY; rows are routed to monthly partitions on created_date.
+CREATE_AUDIT_LOG = """
+CREATE TABLE IF NOT EXISTS audit_log (
+    id UUID NOT NULL,
+    created_date TIMESTAMP WITH TIME ZONE NOT NULL,
+    event_type VARCHAR NOT NULL,
+    actor VARCHAR,
+    user_id UUID,
+    success BOOLEAN NOT NULL,
+    ip_address VARCHAR,
+    user_agent VARCHAR,
+    details JSONB,
+    PRIMARY KEY (id, created_date)
+) PARTITION BY RANGE (created_date)
+"""
+
+CREATE_AUDIT_LOG_INDEX = """
+CREATE INDEX IF NOT EXISTS ix_audit_log_actor_created_date ON audit_log (actor, created_date)
+"""
+
+
+async def ensure_audit_tables(conn) -> None:
+    """
+    Create the partitioned audit_log table and its partitions for the current
+    month and the months src.partitions keeps ready ahead of time.
+    """
+    await conn.execute(text(CREATE_AUDIT_LOG))
+    await conn.execute(text(CREATE_AUDIT_LOG_INDEX))
+    policy = PARTITION_POLICIES["audit_log"]
+    time_now = datetime.now(timezone.utc)
+    for offset in range(policy.premake + 1):
+        await create_partition(conn, "audit_log", period_start(time_now, "month", offset), "month")
@@ -0,0 +1,188 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import dotenv
+
+from src.database import async_engine
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+AUDIT_BUFFER_SIZE = int(os.getenv("AUDIT_BUFFER_SIZE", "50000"))
+AUDIT_BATCH_SIZE = int(os.getenv("AUDIT_BATCH_SIZE", "5000"))
+AUDIT_FLUSH_SECONDS = float(os.getenv("AUDIT_FLUSH_SECONDS", "1.0"))
+# A failed COPY is retried after 0.5s, 1s, 2s ... up to this delay, for as long as the database is down
+AUDIT_RETRY_SECONDS = 0.5
+AUDIT_RETRY_MAX_SECONDS = 30
+# Rows the database still refuses at shutdown are appended here as JSON lines, to be loaded by hand
+AUDIT_SPILL_PATH = os.getenv("AUDIT_SPILL_PATH", "audit-spill.jsonl")
+
+AUDIT_COLUMNS = (
+    "id", "created_date", "event_type", "actor", "user_id", "success", "ip_address", "user_agent", "details",
+)
+
+
+class AuditLogWriter:
+    """
+    Buffers audit rows in memory and writes them with COPY in batches to the
+    audit_log table, which exists on the home database only (see src.partitions).
+
+    A batch is flushed when it reaches batch_size rows or flush_seconds after its
+    first row, whichever comes first. A batch the database refuses is retried
+    until it is written, and record() waits while the buffer is full, so a
+    stalled database slows callers down instead of losing rows or growing memory
+    without bound. Whatever cannot be written by shutdown goes to spill_path.
+    """
+
+    def __init__(self, engine=async_engine, buffer_size: int = AUDIT_BUFFER_SIZE,
+                 batch_size: int = AUDIT_BATCH_SIZE, flush_seconds: float = AUDIT_FLUSH_SECONDS,
+                 spill_path: str = AUDIT_SPILL_PATH):
+        self.engine = engine
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.spill_path = spill_path
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        self.rows_written = 0
+        self.rows_spilled = 0
+        self._task = None
+        self._stopping = asyncio.Event()
+
+    async def record(self, event_type: str, actor: str = None, success: bool = True, user_id=None,
+                     ip_address: str = None, user_agent: str = None, details: dict = None) -> None:
+        """
+        Queue one audit row. Returns as soon as the row is buffered.
+
+        Args:
+            event_type (str): What happened, e.g. 'login', 'otp_verified', 'pin_reset', 'transfer'.
+            actor (str): Canonical phone number of whoever triggered the event.
+            success (bool): Whether the attempt succeeded.
+            user_id: The affected user's id, if known.
+            ip_address (str): Client address.
+            user_agent (str): Client user agent.
+            details (dict): Extra JSON-serialisable context.
+
+        Raises:
+            RuntimeError: If the buffer is full and no flusher is running to drain it.
+        """
+        if self.queue.full() and (self._task is None or self._task.done()):
+            # Waiting would never end
+            raise RuntimeError("Audit log buffer is full and the writer is not running; call start() first")
+        await self.queue.put((
+            uuid4(),
+            datetime.now(timezone.utc),
+            event_type,
+            actor,
+            user_id,
+            success,
+            ip_address,
+            user_agent,
+            json.dumps(details, default=str) if details is not None else None,
+        ))
+
+    async def record_request(self, http_request, event_type: str, actor: str = None, success: bool = True,
+                             user_id=None, details: dict = None) -> None:
+        """
+        record() with the client address and user agent taken from a FastAPI Request.
+        """
+        await self.record(
+            event_type,
+            actor=actor,
+            success=success,
+            user_id=user_id,
+            ip_address=http_request.client.host if http_request.client else None,
+            user_agent=http_request.headers.get("user-agent"),
+            details=details,
+        )
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """
+        Write everything still buffered, then stop the flusher. Called from lifespan on shutdown.
+        """
+        if self._task is None:
+            return
+        self._stopping.set()
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+        self._stopping.clear()
+
+    async def _run(self) -> None:
+        while True:
+            # Block for the first row, then gather more until the batch is full or the timer expires
+            row = await self.queue.get()
+            if row is None:
+                return
+            rows = [row]
+            deadline = time.monotonic() + self.flush_seconds
+            stopping = False
+            while len(rows) < self.batch_size:
+                if self.queue.empty():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        row = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    row = self.queue.get_nowait()
+                if row is None:
+                    stopping = True
+                    break
+                rows.append(row)
+            await self._flush(rows)
+            if stopping:
+                return
+
+    async def _flush(self, rows: list) -> None:
+        if not rows:
+            return
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                await self._copy(rows)
+                self.rows_written += len(rows)
+                return
+            except Exception:
+                if self._stopping.is_set():
+                    logger.exception("Spilling %d audit rows to %s; the database refused them at shutdown",
+                                     len(rows), self.spill_path)
+                    await asyncio.to_thread(self._spill, rows)
+                    self.rows_spilled += len(rows)
+                    return
+                delay = min(AUDIT_RETRY_SECONDS * 2 ** (attempt - 1), AUDIT_RETRY_MAX_SECONDS)
+                logger.exception("Audit COPY of %d rows failed (attempt %d); retrying in %.1fs",
+                                 len(rows), attempt, delay)
+                # Shutdown cuts the wait short and spills instead
+                try:
+                    await asyncio.wait_for(self._stopping.wait(), delay)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def _copy(self, rows: list) -> None:
+        async with self.engine.connect() as conn:
+            raw_connection = await conn.get_raw_connection()
+            await raw_connection.driver_connection.copy_records_to_table(
+                "audit_log", records=rows, columns=AUDIT_COLUMNS
+            )
+
+    def _spill(self, rows: list) -> None:
+        lines = "".join(json.dumps(dict(zip(AUDIT_COLUMNS, row)), default=str) + "\n" for row in rows)
+        with open(self.spill_path, "a", encoding="utf-8") as handle:
+            handle.write(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+
+audit_log = AuditLogWriter()
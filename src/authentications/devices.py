@@ -0,0 +1,116 @@
+import base64
+import hashlib
+import hmac
+import os
+from datetime import datetime, timedelta, timezone
+from uuid import UUID
+
+import dotenv
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.settings.services import get_settings
+from .models import TrustedDevice, User
+
+dotenv.load_dotenv()
+
+# A device has to re-enter the PIN this long after it was last trusted
+DEVICE_TRUST_DAYS = int(os.getenv("DEVICE_TRUST_DAYS", "30"))
+# Velocity score (see src.fraud) from which a trusted device still has to enter the PIN
+DEVICE_RISK_SCORE = float(os.getenv("DEVICE_RISK_SCORE", "0.5"))
+
+
+def _signature(device_pk: UUID, user_id: UUID, device_id: str) -> str:
+    message = f"{device_pk}:{user_id}:{device_id}".encode()
+    # Startup-only and required, so the same key signs and checks for the life of the process
+    secret = get_settings().device_credential_secret.encode()
+    digest = hmac.new(secret, message, hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+
+def sign_device(device: TrustedDevice) -> str:
+    """
+    Returns:
+        str: "<trusted device id>.<HMAC>", handed to the app to present on later logins.
+    """
+    return f"{device.id.hex}.{_signature(device.id, device.user_id, device.device_id)}"
+
+
+def requires_pin(decision) -> bool:
+    """
+    Whether a velocity decision is risky enough that a trusted device must still enter the PIN.
+    """
+    return not decision.allowed or decision.score >= DEVICE_RISK_SCORE
+
+
+async def issue_device_credential(db: AsyncSession, user: User, device_id: str, google_id: str = None) -> str:
+    """
+    Trust a device after a successful PIN login. Any earlier credential for
+    the same device is revoked, so only the newest one works. The caller commits.
+
+    Returns:
+        str: The new device credential.
+    """
+    await revoke_devices(db, user.id, device_id)
+    device = TrustedDevice(user_id=user.id, device_id=device_id, google_id=google_id)
+    db.add(device)
+    return sign_device(device)
+
+
+async def verify_device_credential(db: AsyncSession, user: User, credential: str, device_id: str,
+                                   google_id: str = None) -> TrustedDevice:
+    """
+    Check a device credential presented at login: an HMAC comparison and one
+    primary-key lookup instead of a bcrypt verification.
+
+    The credential is a bearer secret bound to the device id the app reports;
+    it is as strong as the app's storage of it (keystore/keychain).
+
+    Returns:
+        TrustedDevice: The trusted device, or None if the credential is forged,
+        revoked, expired or presented by another user, device or Google account.
+    """
+    device_pk, _, signature = credential.partition(".")
+    try:
+        device_pk = UUID(hex=device_pk)
+    except ValueError:
+        return None
+    if not hmac.compare_digest(signature, _signature(device_pk, user.id, device_id)):
+        return None
+
+    device = await db.get(TrustedDevice, device_pk)
+    if device is None or device.revoked_date is not None or device.google_id != google_id:
+        return None
+    created_date = device.created_date
+    if created_date.tzinfo is None:
+        created_date = created_date.replace(tzinfo=timezone.utc)
+    if datetime.now(timezone.utc) - created_date > timedelta(days=DEVICE_TRUST_DAYS):
+        return None
+    return device
+
+
+async def revoke_devices(db: AsyncSession, user_id: UUID, device_id: str = None) -> int:
+    """
+    Revoke a user's trusted devices: one device, or all of them when device_id is None.
+
+    Returns:
+        int: Credentials revoked.
+    """
+    statement = (
+        update(TrustedDevice)
+        .where(TrustedDevice.user_id == user_id, TrustedDevice.revoked_date.is_(None))
+        .values(revoked_date=datetime.now(timezone.utc))
+    )
+    if device_id is not None:
+        statement = statement.where(TrustedDevice.device_id == device_id)
+    result = await db.execute(statement)
+    return result.rowcount
+
+
+async def list_devices(db: AsyncSession, user_id: UUID) -> list:
+    statement = (
+        select(TrustedDevice)
+        .where(TrustedDevice.user_id == user_id, TrustedDevice.revoked_date.is_(None))
+        .order_by(TrustedDevice.created_date.desc())
+    )
+    return (await db.execute(statement)).scalars().all()
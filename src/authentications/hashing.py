@@ -0,0 +1,135 @@
+import logging
+import os
+import re
+import time
+
+import dotenv
+from passlib.context import CryptContext
+from passlib.hash import bcrypt
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+# "bcrypt" or "argon2" (needs argon2-cffi); hashes in the other scheme still verify and are upgraded on login
+PASSWORD_HASH_SCHEME = os.getenv("PASSWORD_HASH_SCHEME", "bcrypt")
+# Wall-clock time one hash should take on this hardware; costs are calibrated to it at startup
+PASSWORD_HASH_BUDGET_MS = float(os.getenv("PASSWORD_HASH_BUDGET_MS", "250"))
+# Pin the costs instead of calibrating, so every node in a mixed fleet agrees on them
+PASSWORD_HASH_CALIBRATE = os.getenv("PASSWORD_HASH_CALIBRATE", "true").lower() == "true"
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+ARGON2_TIME_COST = int(os.getenv("ARGON2_TIME_COST", "3"))
+ARGON2_MEMORY_KIB = int(os.getenv("ARGON2_MEMORY_KIB", "65536"))
+ARGON2_PARALLELISM = int(os.getenv("ARGON2_PARALLELISM", "1"))
+
+# Calibration never goes below these floors, however slow the machine
+MIN_BCRYPT_ROUNDS, MAX_BCRYPT_ROUNDS = 10, 16
+MIN_ARGON2_TIME_COST, MAX_ARGON2_TIME_COST = 2, 10
+
+_ARGON2_PARAMS = re.compile(r"\$m=(\d+),t=(\d+),p=(\d+)\$")
+
+
+def bcrypt_rounds_for(budget_ms: float, seconds_at_min: float, min_rounds: int = MIN_BCRYPT_ROUNDS,
+                      max_rounds: int = MAX_BCRYPT_ROUNDS) -> int:
+    """
+    Highest bcrypt cost whose hash fits in budget_ms, given the time of one hash
+    at min_rounds. Each extra round doubles the work.
+    """
+    rounds = min_rounds
+    while rounds < max_rounds and seconds_at_min * 2 ** (rounds + 1 - min_rounds) * 1000 <= budget_ms:
+        rounds += 1
+    return rounds
+
+
+def argon2_time_cost_for(budget_ms: float, seconds_per_pass: float, min_time_cost: int = MIN_ARGON2_TIME_COST,
+                         max_time_cost: int = MAX_ARGON2_TIME_COST) -> int:
+    """
+    Highest argon2 time cost whose hash fits in budget_ms, given the time of one
+    pass over the configured memory. Time grows linearly with the cost.
+    """
+    fits = int(budget_ms / 1000 / seconds_per_pass) if seconds_per_pass > 0 else max_time_cost
+    return max(min_time_cost, min(max_time_cost, fits))
+
+
+class PasswordPolicy:
+    """
+    Which scheme and cost new PIN hashes use, and whether an existing hash is
+    weaker than that and should be replaced.
+
+    Upgrades only ever go up: a hash made with a higher cost than this node's
+    policy (say by a faster node) is left alone, so nodes that calibrated
+    differently do not rehash each other's work back and forth.
+    """
+
+    def __init__(self, scheme: str = PASSWORD_HASH_SCHEME, bcrypt_rounds: int = BCRYPT_ROUNDS,
+                 argon2_time_cost: int = ARGON2_TIME_COST, argon2_memory_kib: int = ARGON2_MEMORY_KIB,
+                 argon2_parallelism: int = ARGON2_PARALLELISM):
+        if scheme not in ("bcrypt", "argon2"):
+            raise ValueError(f"Unknown PASSWORD_HASH_SCHEME: {scheme!r}")
+        self.scheme = scheme
+        self.bcrypt_rounds = bcrypt_rounds
+        self.argon2_time_cost = argon2_time_cost
+        self.argon2_memory_kib = argon2_memory_kib
+        self.argon2_parallelism = argon2_parallelism
+        self.context = self._build_context()
+
+    def _build_context(self) -> CryptContext:
+        return CryptContext(
+            schemes=[self.scheme, "argon2" if self.scheme == "bcrypt" else "bcrypt"],
+            default=self.scheme,
+            bcrypt__rounds=self.bcrypt_rounds,
+            argon2__rounds=self.argon2_time_cost,
+            argon2__memory_cost=self.argon2_memory_kib,
+            argon2__parallelism=self.argon2_parallelism,
+        )
+
+    def hash(self, secret: str) -> str:
+        return self.context.hash(secret)
+
+    def verify(self, secret: str, hashed: str) -> bool:
+        return self.context.verify(secret, hashed)
+
+    def needs_rehash(self, hashed: str) -> bool:
+        """
+        True if hashed uses another scheme or a lower cost than the policy.
+        """
+        scheme = self.context.identify(hashed)
+        if scheme != self.scheme:
+            return True
+        if scheme == "bcrypt":
+            return bcrypt.from_string(hashed).rounds < self.bcrypt_rounds
+        params = _ARGON2_PARAMS.search(hashed)
+        if params is None:
+            return True
+        memory_kib, time_cost, parallelism = map(int, params.groups())
+        return memory_kib < self.argon2_memory_kib or time_cost < self.argon2_time_cost
+
+    def calibrate(self, budget_ms: float = PASSWORD_HASH_BUDGET_MS) -> dict:
+        """
+        Measure this machine and raise or lower the cost of the default scheme
+        to the most that fits budget_ms. Blocks for a few hundred milliseconds;
+        run it off the event loop.
+
+        Returns:
+            dict: The scheme and the costs now in effect.
+        """
+        if self.scheme == "bcrypt":
+            sample = CryptContext(schemes=["bcrypt"], bcrypt__rounds=MIN_BCRYPT_ROUNDS)
+            started = time.perf_counter()
+            sample.hash("calibration")
+            self.bcrypt_rounds = bcrypt_rounds_for(budget_ms, time.perf_counter() - started)
+            settings = {"scheme": "bcrypt", "rounds": self.bcrypt_rounds}
+        else:
+            sample = CryptContext(schemes=["argon2"], argon2__rounds=1, argon2__memory_cost=self.argon2_memory_kib,
+                                  argon2__parallelism=self.argon2_parallelism)
+            started = time.perf_counter()
+            sample.hash("calibration")
+            self.argon2_time_cost = argon2_time_cost_for(budget_ms, time.perf_counter() - started)
+            settings = {"scheme": "argon2", "time_cost": self.argon2_time_cost,
+                        "memory_kib": self.argon2_memory_kib, "parallelism": self.argon2_parallelism}
+        self.context = self._build_context()
+        logger.info("Password hashing calibrated to %s for a %.0f ms budget", settings, budget_ms)
+        return settings
+
+
+password_policy = PasswordPolicy()
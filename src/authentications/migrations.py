@@ -0,0 +1,117 @@
+"""
+Backfill the canonical phone_e164 column on databases created before it existed.
+
+Usage:
+    python -m src.authentications.migrations
+
+Safe to re-run: it only touches rows that are still missing phone_e164, and it
+creates the unique indexes CONCURRENTLY so the tables stay writable meanwhile.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from src.database import async_engine
+from .phone import InvalidPhoneNumber, normalize_phone_number
+
+BACKFILL_BATCH_SIZE = 5000
+
+# Table -> column whose highest value survives when one number is stored under
+# several spellings, or None if such duplicates must be resolved by hand
+TABLES = {
+    "users": None,  # Duplicate users are real accounts and must be merged manually
+    "initusers": "id",  # Abandoned signups; any one of them will do
+    "otp": "created_date",
+}
+# Partitioned tables cannot carry a unique index on phone_e164 alone
+NON_UNIQUE = {"otp"}
+
+
+async def _add_column(table: str) -> None:
+    async with async_engine.begin() as conn:
+        await conn.execute(text(f"ALTER TABLE {table} ADD COLUMN IF NOT EXISTS phone_e164 VARCHAR"))
+
+
+async def _backfill(table: str) -> list:
+    """
+    Fill phone_e164 in batches. Returns the ids of rows whose number cannot be parsed.
+    """
+    invalid = []
+    update = text(f"UPDATE {table} SET phone_e164 = :phone_e164 WHERE id = :row_id")
+    while True:
+        async with async_engine.begin() as conn:
+            result = await conn.execute(
+                text(f"SELECT id, phone_number FROM {table} WHERE phone_e164 IS NULL "
+                     f"AND NOT (id = ANY(CAST(:invalid AS uuid[]))) ORDER BY id LIMIT :limit"),
+                {"invalid": invalid, "limit": BACKFILL_BATCH_SIZE},
+            )
+            rows = result.all()
+            if not rows:
+                return invalid
+            params = []
+            for row in rows:
+                try:
+                    params.append({"phone_e164": normalize_phone_number(row.phone_number), "row_id": row.id})
+                except InvalidPhoneNumber:
+                    invalid.append(row.id)
+            if params:
+                await conn.execute(update, params)
+
+
+async def _deduplicate(table: str, newest_first: str) -> int:
+    # Keep one row per canonical number; for OTPs the older ones are stale codes anyway
+    async with async_engine.begin() as conn:
+        result = await conn.execute(text(
+            f"DELETE FROM {table} t USING ("
+            f"  SELECT id, ROW_NUMBER() OVER (PARTITION BY phone_e164 ORDER BY {newest_first} DESC) AS position"
+            f"  FROM {table} WHERE phone_e164 IS NOT NULL"
+            f") ranked WHERE t.id = ranked.id AND ranked.position > 1"
+        ))
+        return result.rowcount
+
+
+async def _duplicates(table: str) -> list:
+    async with async_engine.connect() as conn:
+        result = await conn.execute(text(
+            f"SELECT phone_e164, array_agg(phone_number) AS spellings FROM {table} "
+            f"WHERE phone_e164 IS NOT NULL GROUP BY phone_e164 HAVING count(*) > 1"
+        ))
+        return result.all()
+
+
+async def _create_index(table: str, finish: bool) -> None:
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block, nor on a partitioned table
+    async with async_engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        if table in NON_UNIQUE:
+            await conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_phone_e164 ON {table} (phone_e164)"))
+        else:
+            await conn.execute(text(
+                f"CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS ix_{table}_phone_e164 ON {table} (phone_e164)"
+            ))
+        if finish:
+            await conn.execute(text(f"ALTER TABLE {table} ALTER COLUMN phone_e164 SET NOT NULL"))
+
+
+async def migrate() -> None:
+    for table, newest_first in TABLES.items():
+        await _add_column(table)
+        invalid = await _backfill(table)
+        if newest_first:
+            removed = await _deduplicate(table, newest_first)
+            print(f"{table}: removed {removed} duplicate rows")
+
+        duplicates = await _duplicates(table)
+        if duplicates:
+            print(f"{table}: {len(duplicates)} numbers are stored under several spellings; "
+                  f"merge them, then re-run. First few: {duplicates[:5]}")
+            continue
+        if invalid:
+            print(f"{table}: {len(invalid)} rows have unparseable numbers and were left without phone_e164")
+
+        await _create_index(table, finish=not invalid)
+        print(f"{table}: phone_e164 backfilled and indexed")
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
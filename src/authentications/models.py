@@ -1,6 +1,6 @@
 from datetime import datetime, timezone
 
-from sqlalchemy import Column
+from sqlalchemy import Column, Index, text
 from sqlalchemy.types import TIMESTAMP
 from sqlmodel import SQLModel, Field
 from typing import Optional
@@ -9,16 +9,28 @@ from uuid import UUID, uuid4
 
 class User(SQLModel, table=True):
     __tablename__ = "users"
+    __table_args__ = (
+        # Trigram indexes for partial and fuzzy search from support tooling (needs the pg_trgm extension).
+        # src.user.services.full_name must build exactly this expression for the planner to use the index.
+        Index("ix_users_full_name_trgm", text("lower(first_name || ' ' || last_name) gin_trgm_ops"),
+              postgresql_using="gin").ddl_if(dialect="postgresql"),
+        Index("ix_users_phone_e164_trgm", text("phone_e164 gin_trgm_ops"),
+              postgresql_using="gin").ddl_if(dialect="postgresql"),
+    )
 
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     first_name: str = Field(nullable=False, index=True)
     last_name: str = Field(nullable=False, index=True)
     phone_number: str = Field(nullable=False, unique=True)
+    # Canonical E.164 form of phone_number; every lookup goes through this key
+    phone_e164: str = Field(nullable=False, unique=True, index=True)
     login_pin: str = Field(nullable=False)
     device_id: Optional[str] = Field(default=None)
     google_id: Optional[str] = Field(default=None)
     profile_picture: Optional[str] = Field(default=None)
     refresh_token: Optional[str] = Field(default=None)
+    # Bumped on every change to a field served by /v1/users/me; the profile ETag is derived from it
+    version: int = Field(default=1, nullable=False, sa_column_kwargs={"server_default": "1"})
     created_date: datetime = Field(
         sa_column=Column(
             TIMESTAMP(timezone=True),
@@ -35,21 +47,28 @@ class InitUser(SQLModel, table=True):
     first_name: str = Field(nullable=False, index=True)
     last_name: str = Field(nullable=False, index=True)
     phone_number: str = Field(nullable=False, unique=True)
+    phone_e164: str = Field(nullable=False, unique=True, index=True)
     login_pin: str = Field(nullable=False)
     profile_picture: Optional[str] = Field(default=None)
 
 
 class OTP(SQLModel, table=True):
     __tablename__ = "otp"
+    # Daily partitions maintained by src.partitions; expired days are dropped whole
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_date)"}
 
     id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
     phone_number: str = Field(nullable=False, index=True)
+    # Not unique at the database level (partitioned tables need the partition key in
+    # every unique index); issuance is serialised per number with an advisory lock instead
+    phone_e164: str = Field(nullable=False, index=True)
     otp_code: str = Field(nullable=False, index=True)
     created_date: datetime = Field(
         sa_column=Column(
             TIMESTAMP(timezone=True),
+            primary_key=True,
             nullable=False,
-            default=datetime.now(timezone.utc)
+            default=lambda: datetime.now(timezone.utc)
         )
     )
     is_valid: bool = Field(default=True)
@@ -58,4 +77,42 @@ class OTP(SQLModel, table=True):
         sa_column=Column(
             TIMESTAMP(timezone=True),
             nullable=False,
-            default=datetime.now(timezone.utc)))
\ No newline at end of file
+            default=datetime.now(timezone.utc)))
+
+
+class OTPRequestLimit(SQLModel, table=True):
+    __tablename__ = "otp_request_limits"
+
+    # One row per number, kept outside the daily-partitioned otp table so that
+    # request limits and bans outlive its lookup window and retention
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    phone_e164: str = Field(nullable=False, unique=True, index=True)
+    request_count: int = Field(default=0, nullable=False)
+    # First request counted since the number last verified a code; the resend delay runs from here
+    window_start: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=lambda: datetime.now(timezone.utc)
+        )
+    )
+    banned_date: Optional[datetime] = Field(default=None, sa_column=Column(TIMESTAMP(timezone=True)))
+
+
+class TrustedDevice(SQLModel, table=True):
+    __tablename__ = "trusted_devices"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    user_id: UUID = Field(foreign_key="users.id", nullable=False, index=True)
+    device_id: str = Field(nullable=False)
+    google_id: Optional[str] = Field(default=None)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=lambda: datetime.now(timezone.utc)
+        )
+    )
+    last_used_date: Optional[datetime] = Field(default=None, sa_column=Column(TIMESTAMP(timezone=True)))
+    # Set when the user signs the device out or resets their PIN; the credential stops working
+    revoked_date: Optional[datetime] = Field(default=None, sa_column=Column(TIMESTAMP(timezone=True)))
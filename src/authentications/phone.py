@@ -0,0 +1,90 @@
+import os
+from functools import lru_cache
+
+import dotenv
+
+dotenv.load_dotenv()
+
+# Calling code -> (country, trunk prefix, valid national number lengths)
+COUNTRY_CODES = {
+    "234": ("NG", "0", (10,)),
+    "233": ("GH", "0", (9,)),
+    "229": ("BJ", "", (8, 10)),
+    "237": ("CM", "", (9,)),
+    "254": ("KE", "0", (9,)),
+    "27": ("ZA", "0", (9,)),
+    "44": ("GB", "0", (10,)),
+    "1": ("US", "", (10,)),
+}
+# Country assumed for numbers written without a country code, e.g. "0803..."
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "234")
+
+_SEPARATORS = str.maketrans("", "", " -().\t")
+
+
+def _build_prefix_table() -> dict:
+    # Every 3-digit prefix mapped to its longest matching calling code, so lookup is one dict hit
+    table = {}
+    for prefix in range(1000):
+        digits = f"{prefix:03d}"
+        for length in (3, 2, 1):
+            if digits[:length] in COUNTRY_CODES:
+                table[digits] = digits[:length]
+                break
+    return table
+
+
+PREFIX_TABLE = _build_prefix_table()
+
+
+class InvalidPhoneNumber(ValueError):
+    pass
+
+
+@lru_cache(maxsize=65536)
+def normalize_phone_number(raw: str) -> str:
+    """
+    Convert a phone number as typed by a user into canonical E.164 form.
+
+    "0803 123 4567", "+234 803 123 4567", "2348031234567" and "8031234567"
+    all become "+2348031234567". Results are memoised since the same numbers
+    come back on every OTP and login request.
+
+    Args:
+        raw (str): The phone number as received.
+
+    Returns:
+        str: The number in E.164 format.
+
+    Raises:
+        InvalidPhoneNumber: If the input cannot be a valid phone number.
+    """
+    value = raw.strip().translate(_SEPARATORS)
+    international = value.startswith("+") or value.startswith("00")
+    digits = value[1:] if value.startswith("+") else value[2:] if value.startswith("00") else value
+    if not (digits.isascii() and digits.isdigit()):
+        raise InvalidPhoneNumber(f"Invalid phone number: {raw!r}")
+
+    if not international:
+        _, trunk, lengths = COUNTRY_CODES[DEFAULT_COUNTRY_CODE]
+        if trunk and digits.startswith(trunk) and len(digits) - len(trunk) in lengths:
+            return f"+{DEFAULT_COUNTRY_CODE}{digits[len(trunk):]}"
+        if len(digits) in lengths:
+            return f"+{DEFAULT_COUNTRY_CODE}{digits}"
+        # Otherwise assume an international number typed without the "+"
+
+    code = PREFIX_TABLE.get(digits[:3])
+    if code is None:
+        # Country we have no rules for: only enforce the E.164 length bounds
+        if 8 <= len(digits) <= 15:
+            return f"+{digits}"
+        raise InvalidPhoneNumber(f"Invalid phone number: {raw!r}")
+
+    national = digits[len(code):]
+    _, trunk, lengths = COUNTRY_CODES[code]
+    # "+234 0803..." keeps the trunk zero by mistake surprisingly often
+    if trunk and national.startswith(trunk) and len(national) - len(trunk) in lengths:
+        national = national[len(trunk):]
+    if len(national) not in lengths:
+        raise InvalidPhoneNumber(f"Invalid phone number: {raw!r}")
+    return f"+{code}{national}"
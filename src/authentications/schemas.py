@@ -1,60 +1,78 @@
-from pydantic import BaseModel
+from datetime import datetime
+from typing import Annotated, Optional
+
+from pydantic import AfterValidator, BaseModel
+
+from .phone import normalize_phone_number
+
+# Accepts any common spelling of a number and hands views the canonical E.164 form
+PhoneNumber = Annotated[str, AfterValidator(normalize_phone_number)]
 
 
 class SignupRequest(BaseModel):
     first_name: str
     last_name: str
-    phone_number: str
+    phone_number: PhoneNumber
     login_pin: str
 
 
 class SigninRequest(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
 
 
 class OTPRequest(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
     identifier: str
 
 
 class VerifyOTPRequest(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
     otp: str
 
 
 class LoginRequest(BaseModel):
-    phone_number: str
-    pin: str
+    phone_number: PhoneNumber
+    # May be left out when a device_credential is sent; the server asks for it on risk signals
+    pin: Optional[str] = None
     device_id: str
     google_id: str
+    device_credential: Optional[str] = None
 
 
 class TokenResponse(BaseModel):
     access_token: str
     refresh_token: str
     token_type: str = "bearer"
+    # Issued after a PIN login; store it on the device and send it with later logins
+    device_credential: Optional[str] = None
+
+
+class TrustedDeviceResponse(BaseModel):
+    device_id: str
+    created_date: datetime
+    last_used_date: Optional[datetime] = None
 
 
 class VerifyOTPSignup(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
     otp: str
 
 
 class VerifyOTPSignin(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
     otp: str
     device_id: str
 
 
 class ForgotLoginPin(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
 
 
 class ResetLoginPin(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
     otp: str
     new_login_pin: str
 
 
 class ResendOTP(BaseModel):
-    phone_number: str
+    phone_number: PhoneNumber
@@ -3,27 +3,19 @@ import httpx
 import random
 from sqlalchemy.ext.asyncio import AsyncSession
 from fastapi import HTTPException
-import os
 
+from sqlalchemy import delete, text
 from sqlmodel import select
 
-from .models import OTP
+from .models import OTP, OTPRequestLimit
+from .singleflight import SingleFlight
+from src.database import shard_router
+from src.notifications.services import send_otp_message
+from src.settings.services import get_settings
 from PIL import Image, ImageDraw, ImageFont
-import cloudinary
-import cloudinary.uploader
-from io import BytesIO
 import dotenv
 
 dotenv.load_dotenv()
-TERMII_API_KEY = os.getenv("TERMII_API_KEY")
-SENDER_ID = os.getenv("SENDER_ID")
-BASE_URL = os.getenv("BASE_URL")
-
-cloudinary.config(
-    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),  # Replace with your Cloudinary cloud name
-    api_key=os.getenv("CLOUDINARY_API_KEY"),  # Replace with your Cloudinary API key
-    api_secret=os.getenv("CLOUDINARY_API_SECRET")  # Replace with your Cloudinary API secret
-)
 
 # async def send_otp_via_termii(phone_number: str, otp: str, message_template: str):
 #     """
@@ -167,91 +159,6 @@ cloudinary.config(
 #             # Handle non-200 HTTP responses (e.g., 4xx or 5xx errors)
 #             print(f"HTTP error occurred: {e}")
 #             return {"success": False, "message": f"HTTP error occurred: {e}"}
-async def send_otp_via_termii(phone_number: str, otp: str, message_template: str):
-    """
-    Send an OTP via both WhatsApp and SMS using Termii.
-
-    Args:
-        phone_number (str): The recipient's phone number in international format (e.g., +2341234567890).
-        otp (str): The OTP to send.
-        message_template (str): The message template, e.g., "Your OTP is {otp}."
-
-    Returns:
-        list: A list of responses from each channel (WhatsApp and SMS).
-    """
-    whatsapp_response = await send_otp(phone_number, otp, message_template, channel="whatsapp")
-    text_response = await send_otp(phone_number, otp, message_template, channel="generic")
-    return [whatsapp_response, text_response]
-
-async def send_otp(phone_number: str, otp: str, message_template: str, channel: str):
-    """
-    Send an OTP to a phone number using Termii via a specified channel.
-
-    Args:
-        phone_number (str): The recipient's phone number in international format (e.g., +2341234567890).
-        otp (str): The OTP to send.
-        message_template (str): The message template, e.g., "Your OTP is {otp}."
-        channel (str): The channel to use ('whatsapp' or 'generic').
-
-    Returns:
-        dict: Response indicating success or failure.
-    """
-    url = f"{BASE_URL}/api/sms/send"
-    message = message_template.format(otp=otp)
-
-    payload = {
-        "to": phone_number,
-        "from": SENDER_ID,
-        "sms": message,
-        "type": "plain",  # Use 'plain' for standard SMS.
-        "channel": channel,  # 'whatsapp' or 'generic'
-        "api_key": TERMII_API_KEY,
-    }
-
-    print(f"Sending OTP via {channel}: {otp} to {phone_number}")
-
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, json=payload)
-            response.raise_for_status()  # Raises an exception for HTTP 4xx/5xx errors
-            response_data = response.json()  # Parse the JSON response
-
-            # Extract relevant fields from Termii's response
-            message_id = response_data.get("message_id")
-            balance = response_data.get("balance")
-            user = response_data.get("user")
-            message_status = response_data.get("message", "").lower()
-
-            if "successfully sent" in message_status:
-                print(f"OTP sent successfully via {channel}.")
-                return {
-                    "success": True,
-                    "message": f"OTP sent successfully via {channel}.",
-                    "details": {
-                        "message_id": message_id,
-                        "balance": balance,
-                        "user": user,
-                    },
-                }
-            else:
-                print(f"Failed to send OTP via {channel}.")
-                return {
-                    "success": False,
-                    "message": response_data.get("message", f"Failed to send OTP via {channel}."),
-                }
-
-        except httpx.RequestError as e:
-            # Handle connection errors
-            print(f"Request error occurred: {e}")
-            return {"success": False, "message": f"Request error occurred: {e}"}
-
-        except httpx.HTTPStatusError as e:
-            # Handle HTTP response errors
-            print(f"HTTP error occurred: {e}")
-            return {"success": False, "message": f"HTTP error occurred: {e}"}
-
-
-
 async def generate_otp(length=4):
     """
     Generate a numeric OTP of the specified length.
@@ -260,9 +167,19 @@ async def generate_otp(length=4):
 
 
 MAX_REQUESTS_BEFORE_BAN = 10
-MAX_REQUESTS_LIMIT = 5
-OTP_VALIDITY_PERIOD = timedelta(minutes=5)
+# Pushed to a user's signed-in devices when a code for their number is requested or used
+OTP_STATUS = "otp_status"
 RESEND_DELAY_PERIOD = timedelta(minutes=30)
+# The request limit, validity, coalescing and lookup windows are in src.settings
+
+otp_single_flight = SingleFlight()
+
+
+def recent_otp_filter():
+    """
+    Condition on OTP.created_date that limits a query to the partitions a live code can be in.
+    """
+    return OTP.created_date >= datetime.now(timezone.utc) - timedelta(days=get_settings().otp_lookup_days)
 
 
 # async def send_user_otp(phone_number: str, db_session: AsyncSession):
@@ -347,98 +264,111 @@ RESEND_DELAY_PERIOD = timedelta(minutes=30)
 #     return {"success": True, "message": "OTP sent successfully.", "otp": new_otp}
 
 
-async def send_user_otp(phone_number: str, db_session: AsyncSession):
+async def send_user_otp(phone_number: str):
     """
     Handle OTP requests with limits and validity checks.
 
+    Concurrent requests for the same phone number in this worker share one
+    transaction and one SMS send, and every caller gets the same result. The
+    shared work runs in its own session on the number's shard, so it never
+    uses (or commits) a session belonging to one of the waiting requests.
+
     Args:
-        phone_number (str): The recipient's phone number.
-        db_session (AsyncSession): The database session.
+        phone_number (str): The recipient's phone number in canonical E.164 form.
 
     Returns:
         dict: Response indicating success or failure.
     """
+    return await otp_single_flight.do(phone_number, lambda: _issue_user_otp_in_own_session(phone_number))
+
+
+async def _issue_user_otp_in_own_session(phone_number: str):
+    async with shard_router.session_factory(phone_number)() as db_session:
+        return await _issue_user_otp(phone_number, db_session)
+
+
+async def _issue_user_otp(phone_number: str, db_session: AsyncSession):
+    # Serialise OTP issuance for this number across workers until the commit below
+    await db_session.execute(
+        text("SELECT pg_advisory_xact_lock(hashtext(:lock_key))"), {"lock_key": f"otp:{phone_number}"}
+    )
+
     # Query the database for the existing OTP record
-    statement = select(OTP).where(OTP.phone_number == phone_number)
+    statement = select(OTP).where(OTP.phone_e164 == phone_number, recent_otp_filter())
     result = await db_session.execute(statement)
     existing_otp = result.scalars().first()
 
+    # Request counts and bans outlive the otp partitions the query above is limited to
+    statement = select(OTPRequestLimit).where(OTPRequestLimit.phone_e164 == phone_number)
+    result = await db_session.execute(statement)
+    limit = result.scalars().first()
+
     # Current time with timezone
     time_now = datetime.now(timezone.utc)
-
-    if existing_otp:
-        # Ensure created_date is timezone-aware
-        created_date = existing_otp.created_date
-        if created_date.tzinfo is None:  # If created_date is naive, make it timezone-aware
-            created_date = created_date.replace(tzinfo=timezone.utc)
-
-        time_since_created = time_now - created_date
-        print(existing_otp.request_count)
-        # Case 3: Request count > 10
-        if existing_otp.request_count > MAX_REQUESTS_BEFORE_BAN:
-            return {"success": False, "message": "Your account has been banned due to excessive requests."}
-
-        # Case 1: Request count > 5 and time < 30 minutes
-        if existing_otp.request_count >= 5 and time_now - existing_otp.created_date < timedelta(minutes=30):
-            return {"success": False, "message": "Too many requests. Please try again after 30 minutes."}
-
-        # Case 2: Request count >= 5 and time >= 30 minutes
-        if existing_otp.request_count >= MAX_REQUESTS_LIMIT and time_now - existing_otp.created_date > timedelta(minutes=30):
-            print("case 1")
-            print(existing_otp.request_count >= MAX_REQUESTS_LIMIT)
-            print(time_now - existing_otp.created_date > timedelta(minutes=30))
-            print(f"{time_now}.....{existing_otp}")
-            print(time_now - existing_otp.created_date)
-
-            new_otp = await generate_otp()
-            existing_otp.otp_code = new_otp
-            existing_otp.is_valid = True
-            existing_otp.request_count += 1
-            existing_otp.expire_date = time_now
-            await db_session.commit()
-
-            # Send OTP to the user
-            message_template = f"Your OTP is {new_otp}. It is valid for 5 minutes."
-            response = await send_otp_via_termii(phone_number, new_otp, message_template)
-            return {"success": True, "message": "OTP sent successfully.", "otp": new_otp}
-
-        # Case 4: Request count <= 5
-        if existing_otp.request_count < MAX_REQUESTS_LIMIT:
-            print("case 4")
-            print(existing_otp.request_count < MAX_REQUESTS_LIMIT)
-
-            new_otp = await generate_otp()
-            existing_otp.otp_code = new_otp
-            existing_otp.is_valid = True
-            existing_otp.request_count += 1
-            existing_otp.expire_date = time_now
-            await db_session.commit()
-
-            # Send OTP to the user
-            message_template = f"Your OTP is {new_otp}. It is valid for 5 minutes."
-            response = await send_otp_via_termii(phone_number, new_otp, message_template)
-            return {"success": True, "message": "OTP sent successfully.", "otp": new_otp}
-
-    # If no OTP exists, create a new one
+    settings = get_settings()
+    message_template = f"Your OTP is {{otp}}. It is valid for {settings.otp_validity_minutes} minutes."
+
+    # Another worker issued a code moments ago for the same tap: return it instead of sending again
+    if (existing_otp and existing_otp.is_valid
+            and time_now - existing_otp.expire_date < timedelta(seconds=settings.otp_coalesce_seconds)):
+        await db_session.commit()
+        return {"success": True, "message": "OTP sent successfully.", "otp": existing_otp.otp_code}
+
+    if limit is None:
+        limit = OTPRequestLimit(phone_e164=phone_number, request_count=0, window_start=time_now)
+        db_session.add(limit)
+
+    # Ensure window_start is timezone-aware
+    window_start = limit.window_start
+    if window_start.tzinfo is None:  # If window_start is naive, make it timezone-aware
+        window_start = window_start.replace(tzinfo=timezone.utc)
+
+    # Case 3: Request count > 10; the ban stays until support lifts it
+    if limit.banned_date is not None or limit.request_count > MAX_REQUESTS_BEFORE_BAN:
+        limit.banned_date = limit.banned_date or time_now
+        await db_session.commit()  # Releases the advisory lock
+        return {"success": False, "message": "Your account has been banned due to excessive requests."}
+
+    # Case 1: Request count >= 5 and time < 30 minutes
+    if limit.request_count >= settings.otp_max_requests and time_now - window_start < RESEND_DELAY_PERIOD:
+        await db_session.commit()  # Releases the advisory lock
+        return {"success": False, "message": "Too many requests. Please try again after 30 minutes."}
+
+    # Case 2 (request count >= 5 and time >= 30 minutes) and case 4 (request count < 5): send a new code
+    limit.request_count += 1
     new_otp = await generate_otp()
-    new_otp_record = OTP(
-        phone_number=phone_number,
-        otp_code=new_otp,
-        is_valid=True,
-        created_date=time_now,
-        request_count=1,
-        expire_date=time_now,
-    )
-    db_session.add(new_otp_record)
+    if existing_otp:
+        existing_otp.otp_code = new_otp
+        existing_otp.is_valid = True
+        existing_otp.request_count = limit.request_count
+        existing_otp.expire_date = time_now
+    else:
+        db_session.add(OTP(
+            phone_number=phone_number,
+            phone_e164=phone_number,
+            otp_code=new_otp,
+            is_valid=True,
+            created_date=time_now,
+            request_count=limit.request_count,
+            expire_date=time_now,
+        ))
     await db_session.commit()
 
     # Send OTP to the user
-    message_template = f"Your OTP is {new_otp}. It is valid for 5 minutes."
-    response = await send_otp_via_termii(phone_number, new_otp, message_template)
-
+    response = await send_otp_message(phone_number, new_otp, message_template)
     return {"success": True, "message": "OTP sent successfully.", "otp": new_otp}
 
 
+async def clear_otp_requests(db_session: AsyncSession, phone_number: str) -> None:
+    """
+    Start the number's request count afresh once it verifies a code; a ban is kept.
+    Runs in the caller's transaction.
+    """
+    await db_session.execute(
+        delete(OTPRequestLimit).where(OTPRequestLimit.phone_e164 == phone_number, OTPRequestLimit.banned_date.is_(None))
+    )
+
+
 # async def send_user_otp(phone_number: str, db_session: AsyncSession):
 #     otp = await generate_otp()
 #     await store_otp(phone_number, otp, db_session)
@@ -500,26 +430,3 @@ async def generate_initial_image(first_name: str, last_name: str) -> Image:
                   letter, font=font, fill=random_color())
 
     return image
-
-
-async def upload_image_to_cloudinary(image):
-    """
-    Uploads the generated image to Cloudinary and returns the URL.
-    If the image is passed as a BytesIO object, it will be converted to PIL.Image first.
-    """
-
-    # Check if the image is already a PIL.Image
-    if isinstance(image, BytesIO):
-        # If it's a BytesIO object, load it as a PIL.Image
-        image = Image.open(image)
-
-    # Create a BytesIO buffer to store the image data
-    img_byte_arr = BytesIO()
-    image.save(img_byte_arr, format="PNG")  # Save the image in PNG format to the buffer
-    img_byte_arr.seek(0)  # Rewind the buffer to the beginning
-
-    # Upload image to Cloudinary
-    response = cloudinary.uploader.upload(img_byte_arr, resource_type="image")
-
-    # Return the URL of the uploaded image
-    return response['secure_url']
@@ -0,0 +1,33 @@
+import asyncio
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent calls that share a key into a single execution.
+
+    The first caller for a key starts the work; callers arriving while it runs
+    await the same task and receive the same result (or exception). The work is
+    shielded, so a caller that disconnects does not cancel it for the others.
+    """
+
+    def __init__(self):
+        self._calls = {}
+
+    async def do(self, key, fn):
+        """
+        Args:
+            key: Anything hashable identifying the work, e.g. a phone number.
+            fn: Zero-argument callable returning an awaitable.
+
+        Returns:
+            The result of fn(), shared by every concurrent caller with this key.
+        """
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        return await asyncio.shield(task)
+
+    def in_flight(self, key) -> bool:
+        return key in self._calls
@@ -1,39 +1,44 @@
+import asyncio
+import os
+
 from fastapi.security import OAuth2PasswordBearer
 from jose import jwt, JWTError
 from datetime import datetime, timedelta
 from fastapi import HTTPException, Depends
-from passlib.context import CryptContext
-from sqlalchemy import select
+from sqlalchemy import select, update
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from .hashing import password_policy
 from .models import User
-from src.database import get_db
+from .phone import InvalidPhoneNumber, normalize_phone_number
+from src.database import get_read_db, shard_router
+from src.settings.services import get_settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="token")
 
-# Secret keys
-ACCESS_SECRET_KEY = "your-access-secret-key"
-REFRESH_SECRET_KEY = "your-refresh-secret-key"
+# Secret keys and token lifetimes come from src.settings
 ALGORITHM = "HS256"
 
-# Token expiration times
-ACCESS_TOKEN_EXPIRE_MINUTES = 15
-REFRESH_TOKEN_EXPIRE_DAYS = 7
+# Comma-separated phone numbers of support and admin staff, allowed into internal tooling endpoints
+STAFF_PHONE_NUMBERS = {
+    normalize_phone_number(number) for number in os.getenv("STAFF_PHONE_NUMBERS", "").split(",") if number.strip()
+}
 
 
 def create_access_token(data: dict) -> str:
+    settings = get_settings()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+    expire = datetime.utcnow() + timedelta(minutes=settings.access_token_expire_minutes)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, ACCESS_SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, settings.access_secret_key, algorithm=ALGORITHM)
 
 
 def create_refresh_token(data: dict) -> str:
+    settings = get_settings()
     to_encode = data.copy()
-    expire = datetime.utcnow() + timedelta(days=REFRESH_TOKEN_EXPIRE_DAYS)
+    expire = datetime.utcnow() + timedelta(days=settings.refresh_token_expire_days)
     to_encode.update({"exp": expire})
-    return jwt.encode(to_encode, REFRESH_SECRET_KEY, algorithm=ALGORITHM)
+    return jwt.encode(to_encode, settings.refresh_secret_key, algorithm=ALGORITHM)
 
 
 def decode_token(token: str, secret_key: str) -> dict:
@@ -44,23 +49,64 @@ def decode_token(token: str, secret_key: str) -> dict:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
 
 
+def phone_key_from_token(subject: str) -> str:
+    # Tokens issued before phone normalisation carry the number as typed at signup
+    try:
+        return normalize_phone_number(subject)
+    except InvalidPhoneNumber:
+        raise HTTPException(status_code=401, detail="Invalid token")
+
+
+# Hashing is CPU-bound for a whole latency budget, so it runs in a thread instead of stalling the event loop
 async def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+    return await asyncio.to_thread(password_policy.hash, password)
 
 
 async def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+    return await asyncio.to_thread(password_policy.verify, plain_password, hashed_password)
+
+
+def pin_needs_rehash(hashed_password: str) -> bool:
+    return password_policy.needs_rehash(hashed_password)
+
+
+async def rehash_login_pin(phone_e164: str, pin: str, old_hash: str) -> None:
+    """
+    Replace a PIN hash made under an older policy, after the PIN was just verified.
+    Meant to run as a background task after the login response is sent; the
+    update only applies if the hash has not changed meanwhile (e.g. a PIN reset).
+    """
+    new_hash = await hash_password(pin)
+    async with shard_router.session_factory(phone_e164)() as session:
+        await session.execute(
+            update(User).where(User.phone_e164 == phone_e164, User.login_pin == old_hash).values(login_pin=new_hash)
+        )
+        await session.commit()
 
 
-async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_db)) -> User:
-    payload = decode_token(token, ACCESS_SECRET_KEY)
+async def get_current_phone(token: str = Depends(oauth2_scheme)) -> str:
+    """
+    Resolve the caller's E.164 phone number from the access token alone, without a database lookup.
+    """
+    phone_number = decode_token(token, get_settings().access_secret_key).get("sub")
+    if not phone_number:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    return phone_key_from_token(phone_number)
+
+
+async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession = Depends(get_read_db)) -> User:
+    return await get_user_from_token(token, db)
+
+
+async def get_user_from_token(token: str, db: AsyncSession) -> User:
+    payload = decode_token(token, get_settings().access_secret_key)
     phone_number = payload.get("sub")
 
     if not phone_number:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     # Query user by phone number
-    statement = select(User).where(User.phone_number == phone_number)
+    statement = select(User).where(User.phone_e164 == phone_key_from_token(phone_number))
     result = await db.execute(statement)
     user = result.scalars().first()
 
@@ -68,3 +114,9 @@ async def get_current_user(token: str = Depends(oauth2_scheme), db: AsyncSession
         raise HTTPException(status_code=401, detail="User not found")
 
     return user
+
+
+async def get_staff_user(current_user: User = Depends(get_current_user)) -> User:
+    if current_user.phone_e164 not in STAFF_PHONE_NUMBERS:
+        raise HTTPException(status_code=403, detail="Staff access required")
+    return current_user
@@ -1,17 +1,27 @@
 from datetime import datetime, timezone, timedelta
 
+from typing import List
+
+from .devices import issue_device_credential, list_devices, requires_pin, revoke_devices, verify_device_credential
 from .models import User, OTP, InitUser
 from .schemas import SigninRequest, SignupRequest, TokenResponse, LoginRequest, VerifyOTPSignup, VerifyOTPSignin, \
-    ForgotLoginPin, ResetLoginPin, ResendOTP
-from .services import send_user_otp, upload_image_to_cloudinary, generate_initial_image, generate_otp
-from fastapi import APIRouter, Depends, status, BackgroundTasks
+    ForgotLoginPin, ResetLoginPin, ResendOTP, TrustedDeviceResponse
+from .services import (OTP_STATUS, clear_otp_requests, send_user_otp, generate_initial_image, generate_otp,
+                       recent_otp_filter)
+from fastapi import APIRouter, Depends, status, BackgroundTasks, Request
 from fastapi.exceptions import HTTPException
-from src.database import get_db
+from src.audit.writer import audit_log
+from src.fraud.services import check_login, event_attributes, record_login_failure
+from src.media.services import store_avatar
+from src.notifications.push import publish_event
+from src.database import get_db, get_read_db, mark_recent_write
+from src.outbox.services import add_outbox_event
+from src.settings.services import get_settings
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 
-from .utilities import (verify_password, create_access_token, create_refresh_token, decode_token, REFRESH_SECRET_KEY,
-                        get_current_user, hash_password)
+from .utilities import (verify_password, create_access_token, create_refresh_token, decode_token,
+                        get_current_user, hash_password, phone_key_from_token, pin_needs_rehash, rehash_login_pin)
 
 router = APIRouter(prefix="/auth", tags=["auth"])
 
@@ -19,8 +29,8 @@ router = APIRouter(prefix="/auth", tags=["auth"])
 @router.post("/signup/")
 async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     # Step 1: Check if the user already exists in the InitUser table
-    statement = select(User).filter(User.phone_number == request.phone_number)
-    statement1 = select(InitUser).filter(InitUser.phone_number == request.phone_number)
+    statement = select(User).filter(User.phone_e164 == request.phone_number)
+    statement1 = select(InitUser).filter(InitUser.phone_e164 == request.phone_number)
     result = await db.execute(statement)
     result1 = await db.execute(statement1)
     existing_user = result.scalars().first()
@@ -38,6 +48,7 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
         first_name=request.first_name,
         last_name=request.last_name,
         phone_number=request.phone_number,
+        phone_e164=request.phone_number,
         login_pin=await hash_password(request.login_pin)
     )
     db.add(new_init_user)
@@ -46,39 +57,45 @@ async def signup(request: SignupRequest, db: AsyncSession = Depends(get_db)):
     # Step 3: Generate the image with initials
     image = await generate_initial_image(request.first_name, request.last_name)
 
-    # Step 4: Upload the image to Cloudinary
-    image_url = await upload_image_to_cloudinary(image)
+    # Step 4: Store the image and its thumbnail variants
+    image_url = await store_avatar(image)
 
     # Step 5: Update the profile picture URL in InitUser
     new_init_user.profile_picture = image_url
     await db.commit()
 
     # Step 6: Send OTP
-    response = await send_user_otp(request.phone_number, db)
+    response = await send_user_otp(request.phone_number)
 
     # Step 7: Return response
     return {"message": "Signup successful. OTP sent.", "response": response}
 
 
 @router.post("/signin/")
-async def signin(request: SigninRequest, db: AsyncSession = Depends(get_db)):
-    # Use select() for async query
-    statement = select(User).filter(User.phone_number == request.phone_number)
-    result = await db.execute(statement)  # Use db directly here
+async def signin(request: SigninRequest, db: AsyncSession = Depends(get_db),
+                 read_db: AsyncSession = Depends(get_read_db)):
+    # The existence check is read-only, so it may be served by a replica
+    statement = select(User).filter(User.phone_e164 == request.phone_number)
+    result = await read_db.execute(statement)
     user = result.scalars().first()
 
     if not user:
         raise HTTPException(status_code=404, detail="User not found.")
 
     # Send OTP
-    response = await send_user_otp(request.phone_number, db)
+    response = await send_user_otp(request.phone_number)
+
+    # Let the user's signed-in devices know a code was requested
+    await publish_event(db, user.id, OTP_STATUS,
+                        {"flow": "signin", "status": "sent" if response.get("success") else "refused"})
+    await db.commit()
     return {"message": "Signin successful. OTP sent.", "response": response}
 
 
 @router.post("/verify-otp_signup/")
-async def verify_otp_signup(request: VerifyOTPSignup, db: AsyncSession = Depends(get_db)):
+async def verify_otp_signup(request: VerifyOTPSignup, http_request: Request, db: AsyncSession = Depends(get_db)):
     # Step 1: Query the database for the OTP record based on the OTP code
-    statement = select(OTP).where(OTP.otp_code == request.otp, OTP.is_valid == True)
+    statement = select(OTP).where(OTP.otp_code == request.otp, OTP.is_valid == True, recent_otp_filter())
     result = await db.execute(statement)
     otp_record = result.scalars().first()
 
@@ -86,7 +103,7 @@ async def verify_otp_signup(request: VerifyOTPSignup, db: AsyncSession = Depends
         raise HTTPException(status_code=404, detail="Invalid or expired OTP.")
 
     # Step 2: Check if the phone number matches
-    if otp_record.phone_number != request.phone_number:
+    if otp_record.phone_e164 != request.phone_number:
         raise HTTPException(status_code=400, detail="The provided phone number does not match the OTP.")
 
     # Step 3: Ensure created_date is timezone-aware
@@ -95,14 +112,11 @@ async def verify_otp_signup(request: VerifyOTPSignup, db: AsyncSession = Depends
     # Step 4: Check if five minutes have elapsed since `created_date`
     current_time = datetime.now(timezone.utc)
     elapsed_time = current_time - created_date
-    print(f"the created date is {created_date}")
-    print(f"the current date is {current_time}")
-    print(f"the remaining date is {elapsed_time}")
-    if elapsed_time > timedelta(minutes=5):
+    if elapsed_time > timedelta(minutes=get_settings().otp_validity_minutes):
         raise HTTPException(status_code=400, detail="OTP has expired.")
 
     # Step 5: Retrieve the user data from the InitUser table
-    statement = select(InitUser).where(InitUser.phone_number == request.phone_number)
+    statement = select(InitUser).where(InitUser.phone_e164 == request.phone_number)
     result = await db.execute(statement)
     init_user_record = result.scalars().first()
 
@@ -114,10 +128,16 @@ async def verify_otp_signup(request: VerifyOTPSignup, db: AsyncSession = Depends
         first_name=init_user_record.first_name,
         last_name=init_user_record.last_name,
         phone_number=init_user_record.phone_number,
+        phone_e164=init_user_record.phone_e164,
         login_pin=init_user_record.login_pin,
         profile_picture=init_user_record.profile_picture
     )
     db.add(new_user)
+    add_outbox_event(db, "user.signed_up", new_user.id, {
+        "phone_number": new_user.phone_e164,
+        "first_name": new_user.first_name,
+        "last_name": new_user.last_name,
+    })
     await db.commit()
 
     # Step 7: Delete the InitUser record after successful verification and transfer
@@ -126,15 +146,22 @@ async def verify_otp_signup(request: VerifyOTPSignup, db: AsyncSession = Depends
 
     # Step 8: Delete the OTP record after successful verification
     await db.delete(otp_record)
+    await clear_otp_requests(db, request.phone_number)
     await db.commit()
 
+    # Replicas may not have the new account when the app logs straight in
+    mark_recent_write(new_user.phone_e164)
+
+    await audit_log.record_request(http_request, "otp_verified", actor=request.phone_number, user_id=new_user.id,
+                                   details={"flow": "signup"})
+
     return {"success": True, "message": "OTP verified successfully, user account created."}
 
 
 @router.post("/verify-otp_signin/")
-async def verify_otp_signin(request: VerifyOTPSignin, db: AsyncSession = Depends(get_db)):
+async def verify_otp_signin(request: VerifyOTPSignin, http_request: Request, db: AsyncSession = Depends(get_db)):
     # Query the database for the OTP record based on the OTP code
-    statement = select(OTP).where(OTP.otp_code == request.otp, OTP.is_valid == True)
+    statement = select(OTP).where(OTP.otp_code == request.otp, OTP.is_valid == True, recent_otp_filter())
     result = await db.execute(statement)
     otp_record = result.scalars().first()
 
@@ -142,7 +169,7 @@ async def verify_otp_signin(request: VerifyOTPSignin, db: AsyncSession = Depends
         raise HTTPException(status_code=404, detail="Invalid or expired OTP.")
 
     # Check if the phone number matches
-    if otp_record.phone_number != request.phone_number:
+    if otp_record.phone_e164 != request.phone_number:
         raise HTTPException(status_code=400, detail="The provided phone number does not match the OTP.")
 
     # Ensure created_date is timezone-aware
@@ -152,19 +179,17 @@ async def verify_otp_signin(request: VerifyOTPSignin, db: AsyncSession = Depends
     # Check if five minutes have elapsed since `created_date`
     current_time = datetime.now(timezone.utc)
     elapsed_time = current_time - created_date
-    print(f"the created date is {created_date}")
-    print(f"the current date is {current_time}")
-    print(f"the remaining date is {elapsed_time}")
 
-    if elapsed_time > timedelta(minutes=5):
+    if elapsed_time > timedelta(minutes=get_settings().otp_validity_minutes):
         raise HTTPException(status_code=400, detail="OTP has expired.")
 
     # Delete the OTP record after successful verification
     await db.delete(otp_record)
+    await clear_otp_requests(db, request.phone_number)
     await db.commit()
 
     # Query the User table using the phone number
-    user_query = select(User).where(User.phone_number == request.phone_number)
+    user_query = select(User).where(User.phone_e164 == request.phone_number)
     user_result = await db.execute(user_query)
     user_record = user_result.scalars().first()
 
@@ -173,8 +198,12 @@ async def verify_otp_signin(request: VerifyOTPSignin, db: AsyncSession = Depends
 
     user_record.device_id = request.device_id
     db.add(user_record)
+    await publish_event(db, user_record.id, OTP_STATUS, {"flow": "signin", "status": "verified"})
     await db.commit()
 
+    await audit_log.record_request(http_request, "otp_verified", actor=request.phone_number, user_id=user_record.id,
+                                   details={"flow": "signin", "device_id": request.device_id})
+
     # Return user information
     return {
         "success": True,
@@ -190,7 +219,7 @@ async def verify_otp_signin(request: VerifyOTPSignin, db: AsyncSession = Depends
 @router.post("/forgot-login-pin/")
 async def forgot_login_pin(request: ForgotLoginPin, db: AsyncSession = Depends(get_db)):
     # Step 1: Verify user exists
-    statement = select(User).where(User.phone_number == request.phone_number)
+    statement = select(User).where(User.phone_e164 == request.phone_number)
     result = await db.execute(statement)
     user = result.scalars().first()
 
@@ -200,7 +229,10 @@ async def forgot_login_pin(request: ForgotLoginPin, db: AsyncSession = Depends(g
     # Step 2: Generate OTP and store it in the OTP table
 
     # Step 3: Send OTP to user
-    response = await send_user_otp(request.phone_number, db)
+    response = await send_user_otp(request.phone_number)
+    await publish_event(db, user.id, OTP_STATUS,
+                        {"flow": "pin_reset", "status": "sent" if response.get("success") else "refused"})
+    await db.commit()
     if not response.get("success"):
         raise HTTPException(status_code=500, detail="Failed to send OTP.")
 
@@ -208,15 +240,11 @@ async def forgot_login_pin(request: ForgotLoginPin, db: AsyncSession = Depends(g
 
 
 @router.post("/reset-login-pin/")
-async def reset_login_pin(request: ResetLoginPin, db: AsyncSession = Depends(get_db)):
+async def reset_login_pin(request: ResetLoginPin, http_request: Request, db: AsyncSession = Depends(get_db)):
     # Step 1: Validate the OTP
-    statement = select(OTP).where(OTP.phone_number == request.phone_number, OTP.otp_code == request.otp)
+    statement = select(OTP).where(OTP.phone_e164 == request.phone_number, OTP.otp_code == request.otp, recent_otp_filter())
     result = await db.execute(statement)
     otp_record = result.scalars().first()
-    print(request)
-
-    print(request.phone_number)
-    print(otp_record)
 
     if not otp_record:
         raise HTTPException(status_code=400, detail="Invalid OTP.")
@@ -225,17 +253,15 @@ async def reset_login_pin(request: ResetLoginPin, db: AsyncSession = Depends(get
     created_date = otp_record.expire_date
 
     current_time = datetime.now(timezone.utc)
-    print(f"this is your {created_date}")
-    print(f"this your {current_time}")
-    print(current_time - created_date > timedelta(minutes=5))
-    if current_time - created_date > timedelta(minutes=5):
+    validity = timedelta(minutes=get_settings().otp_validity_minutes)
+    if current_time - created_date > validity:
         raise HTTPException(status_code=400, detail="OTP has expired.")
 
     # Step 2: Invalidate OTP
 
 
     # Step 3: Update the user's login pin
-    statement = select(User).where(User.phone_number == request.phone_number)
+    statement = select(User).where(User.phone_e164 == request.phone_number)
     result = await db.execute(statement)
     user = result.scalars().first()
 
@@ -245,8 +271,15 @@ async def reset_login_pin(request: ResetLoginPin, db: AsyncSession = Depends(get
     user.login_pin = await hash_password(request.new_login_pin)
     db.add(user)
     await db.delete(otp_record)
+    await clear_otp_requests(db, request.phone_number)
+    # Whoever knew the old PIN may have trusted a device with it
+    await revoke_devices(db, user.id)
+    add_outbox_event(db, "user.pin_reset", user.id, {"phone_number": user.phone_e164})
+    await publish_event(db, user.id, OTP_STATUS, {"flow": "pin_reset", "status": "verified"})
     await db.commit()
 
+    await audit_log.record_request(http_request, "pin_reset", actor=request.phone_number, user_id=user.id)
+
     return {"message": "Login PIN reset successfully."}
 
 
@@ -257,7 +290,7 @@ async def resend_otp(request: ResendOTP, db: AsyncSession = Depends(get_db)):
     """
     # Step 1: Verify user exists
 
-    statement = select(OTP).where(OTP.phone_number == request.phone_number)
+    statement = select(OTP).where(OTP.phone_e164 == request.phone_number, recent_otp_filter())
 
     result = await db.execute(statement)
     user = result.scalars().first()
@@ -265,7 +298,7 @@ async def resend_otp(request: ResendOTP, db: AsyncSession = Depends(get_db)):
     if not user:
         raise HTTPException(status_code=404, detail="Invalid request.")
 
-    response = await send_user_otp(request.phone_number, db)
+    response = await send_user_otp(request.phone_number)
     if not response.get("success"):
         raise HTTPException(status_code=500, detail="Failed to resend OTP.")
 
@@ -273,44 +306,89 @@ async def resend_otp(request: ResendOTP, db: AsyncSession = Depends(get_db)):
 
 
 @router.post("/login", response_model=TokenResponse)
-async def login(login_data: LoginRequest, db: AsyncSession = Depends(get_db)):
+async def login(login_data: LoginRequest, http_request: Request, background_tasks: BackgroundTasks,
+                db: AsyncSession = Depends(get_db)):
+    # Refuse phones, devices and addresses that are guessing PINs, before spending any bcrypt time
+    velocity = event_attributes(http_request, login_data.phone_number, login_data.device_id)
+    decision = check_login(velocity)
+    if not decision.allowed:
+        await audit_log.record_request(http_request, "login", actor=login_data.phone_number, success=False,
+                                       details={"reason": "velocity", "rules": decision.reasons,
+                                                "device_id": login_data.device_id})
+        raise HTTPException(status_code=429, detail="Too many login attempts. Please try again later.")
+
     # Query user by phone number
-    statement = select(User).where(User.phone_number == login_data.phone_number)
+    statement = select(User).where(User.phone_e164 == login_data.phone_number)
     result = await db.execute(statement)
     user = result.scalars().first()
 
     if not user:
+        record_login_failure(velocity)
+        await audit_log.record_request(http_request, "login", actor=login_data.phone_number, success=False,
+                                       details={"reason": "unknown_user", "device_id": login_data.device_id})
         raise HTTPException(status_code=404, detail="User not found")
 
-    if not await verify_password(login_data.pin, user.login_pin):
-        raise HTTPException(status_code=401, detail="Invalid PIN")
+    # A trusted device proves itself with an HMAC check, unless the attempt looks risky
+    settings = get_settings()
+    trusted_device = None
+    if login_data.device_credential and settings.enabled("trusted_device_login") and not requires_pin(decision):
+        trusted_device = await verify_device_credential(db, user, login_data.device_credential,
+                                                        login_data.device_id, login_data.google_id)
+
+    device_credential = None
+    if trusted_device is not None:
+        trusted_device.last_used_date = datetime.now(timezone.utc)
+        db.add(trusted_device)
+    else:
+        if not login_data.pin:
+            await audit_log.record_request(http_request, "login", actor=login_data.phone_number, success=False,
+                                           user_id=user.id,
+                                           details={"reason": "pin_required", "device_id": login_data.device_id})
+            raise HTTPException(status_code=401, detail="PIN required")
+
+        if not await verify_password(login_data.pin, user.login_pin):
+            record_login_failure(velocity)
+            await audit_log.record_request(http_request, "login", actor=login_data.phone_number, success=False,
+                                           user_id=user.id,
+                                           details={"reason": "invalid_pin", "device_id": login_data.device_id})
+            raise HTTPException(status_code=401, detail="Invalid PIN")
+
+        # Bring hashes made under an older scheme or cost up to the current policy, after responding
+        if settings.enabled("pin_rehash_on_login") and pin_needs_rehash(user.login_pin):
+            background_tasks.add_task(rehash_login_pin, user.phone_e164, login_data.pin, user.login_pin)
+
+        # Trust this device for later logins
+        device_credential = await issue_device_credential(db, user, login_data.device_id, login_data.google_id)
 
     # Generate tokens
-    access_token = create_access_token({"sub": user.phone_number})
-    refresh_token = create_refresh_token({"sub": user.phone_number})
-
-    print(f"{login_data.device_id}  deviceID")
-    print(f"{login_data.google_id}  googleID")
-
+    access_token = create_access_token({"sub": user.phone_e164})
+    refresh_token = create_refresh_token({"sub": user.phone_e164})
 
     # Save refresh token in the database
     user.refresh_token = refresh_token
     db.add(user)
     await db.commit()
+    # Requests made with the new token read the refresh token and device just written
+    mark_recent_write(user.phone_e164)
 
-    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
+    await audit_log.record_request(http_request, "login", actor=login_data.phone_number, user_id=user.id,
+                                   details={"device_id": login_data.device_id,
+                                            "method": "device" if trusted_device is not None else "pin"})
+
+    return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer",
+            "device_credential": device_credential}
 
 
 @router.post("/refresh-token", response_model=TokenResponse)
 async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
-    payload = decode_token(refresh_token, REFRESH_SECRET_KEY)
+    payload = decode_token(refresh_token, get_settings().refresh_secret_key)
     phone_number = payload.get("sub")
 
     if not phone_number:
         raise HTTPException(status_code=401, detail="Invalid token")
 
     # Query user by phone number and validate refresh token
-    statement = select(User).where(User.phone_number == phone_number)
+    statement = select(User).where(User.phone_e164 == phone_key_from_token(phone_number))
     result = await db.execute(statement)
     user = result.scalars().first()
 
@@ -318,7 +396,7 @@ async def refresh_token(refresh_token: str, db: AsyncSession = Depends(get_db)):
         raise HTTPException(status_code=401, detail="Invalid or expired refresh token")
 
     # Generate new access token
-    access_token = create_access_token({"sub": user.phone_number})
+    access_token = create_access_token({"sub": user.phone_e164})
 
     return {"access_token": access_token, "refresh_token": refresh_token, "token_type": "bearer"}
 
@@ -328,3 +406,22 @@ async def secure_data(current_user: User = Depends(get_current_user)):
     return {
         "message": f"Welcome {current_user.phone_number}, here is your secure data."
     }
+
+
+@router.get("/devices", response_model=List[TrustedDeviceResponse])
+async def trusted_devices(current_user: User = Depends(get_current_user), db: AsyncSession = Depends(get_read_db)):
+    return await list_devices(db, current_user.id)
+
+
+@router.delete("/devices/{device_id}")
+async def revoke_device(device_id: str, http_request: Request, current_user: User = Depends(get_current_user),
+                        db: AsyncSession = Depends(get_db)):
+    revoked = await revoke_devices(db, current_user.id, device_id)
+    if not revoked:
+        raise HTTPException(status_code=404, detail="Device not found.")
+    await db.commit()
+
+    await audit_log.record_request(http_request, "device_revoked", actor=current_user.phone_e164,
+                                   user_id=current_user.id, details={"device_id": device_id})
+
+    return {"message": "Device signed out."}
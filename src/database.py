@@ -1,16 +1,42 @@
+import asyncio
+import itertools
+import logging
 import os
+import time
 from dotenv import load_dotenv
-from sqlalchemy import event
+from fastapi import HTTPException, Request
+from sqlalchemy import event, text
 from sqlmodel import SQLModel, create_engine
 from sqlalchemy.ext.asyncio import create_async_engine
 from sqlalchemy.orm import sessionmaker
 from sqlmodel.ext.asyncio.session import AsyncSession
 
+from src.settings.services import get_settings
+from src.sharding import ShardMoving, ShardRouter, parse_shard_urls, shard_key
+
 load_dotenv()
 
-DB_URL = os.getenv("DB_URL")
+logger = logging.getLogger(__name__)
+
+DB_URL = get_settings().db_url
+# Comma-separated async URLs of streaming replicas; empty means every read goes to the primary
+REPLICA_DB_URLS = [url.strip() for url in os.getenv("REPLICA_DB_URLS", "").split(",") if url.strip()]
+# Replica lag and read-your-writes windows are reloadable, see src.settings
+REPLICA_CHECK_INTERVAL_SECONDS = 2
+# "name=url,..." of the databases users are spread over; the first must be the DB_URL database.
+# Empty means a single database.
+SHARD_DB_URLS = parse_shard_urls(os.getenv("SHARD_DB_URLS", ""))
+# Shards being added by `python -m src.shard_split`; they receive no traffic until removed from here
+SHARD_PENDING = [name.strip() for name in os.getenv("SHARD_PENDING", "").split(",") if name.strip()]
+# Answer 503 for users that the pending split moves, while their rows get their final sync
+SHARD_FREEZE_MOVING = os.getenv("SHARD_FREEZE_MOVING", "false").lower() == "true"
 
 async_engine = create_async_engine(DB_URL, echo=True)
+replica_engines = [create_async_engine(url) for url in REPLICA_DB_URLS]
+shard_urls = SHARD_DB_URLS or {"primary": DB_URL}
+shard_engines = {
+    name: async_engine if url == DB_URL else create_async_engine(url) for name, url in shard_urls.items()
+}
 
 
 
@@ -23,14 +49,147 @@ SessionLocal = sessionmaker(
     expire_on_commit=False
 )
 
+shard_router = ShardRouter(
+    {
+        name: SessionLocal if engine is async_engine else
+        sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        for name, engine in shard_engines.items()
+    },
+    home=next(iter(shard_urls)),
+    pending=SHARD_PENDING,
+    freeze_moving=SHARD_FREEZE_MOVING,
+)
+
+ReplicaSessionLocals = [
+    sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+    for engine in replica_engines
+]
+
+# Indexes into ReplicaSessionLocals that are reachable and within max_replica_lag_seconds;
+# replaced wholesale by monitor_replicas so readers never see a half-updated list
+healthy_replicas = list(range(len(replica_engines)))
+_replica_cursor = itertools.count()
+_recent_writers = {}
+
 
 # Initialize the database
 async def init_db() -> None:
-    async with async_engine.begin() as conn:
-        await conn.run_sync(SQLModel.metadata.create_all)
+    for engine in shard_engines.values():
+        async with engine.begin() as conn:
+            # Trigram operator classes used by the user search indexes; Postgres only
+            if conn.dialect.name == "postgresql":
+                await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            await conn.run_sync(SQLModel.metadata.create_all)
+
+
+def _client_key(request: Request, phone_e164: str = None) -> str:
+    # The user, so a refreshed token or a new device still sees its own writes; the address for anonymous callers
+    if phone_e164:
+        return phone_e164
+    return request.client.host if request.client else "anonymous"
+
+
+def mark_recent_write(phone_e164: str) -> None:
+    """
+    Send this user's reads to the primary for read_your_writes_seconds, e.g.
+    right after issuing tokens for an account a replica may not have yet.
+    """
+    _mark_write(phone_e164)
+
+
+def _mark_write(client_key: str) -> None:
+    now = time.monotonic()
+    _recent_writers[client_key] = now + get_settings().read_your_writes_seconds
+    # Keep the map bounded by dropping expired entries once it grows
+    if len(_recent_writers) > 10_000:
+        for key, deadline in list(_recent_writers.items()):
+            if deadline <= now:
+                del _recent_writers[key]
+
+
+def _wrote_recently(client_key: str) -> bool:
+    deadline = _recent_writers.get(client_key)
+    return deadline is not None and deadline > time.monotonic()
 
 
-# Dependency to get a database session
-async def get_db() -> AsyncSession:
-    async with SessionLocal() as session:
+def read_session_factory(client_key: str = None, phone_e164: str = None):
+    """
+    Pick the session factory for a read-only unit of work: round-robin over
+    healthy replicas, or the primary if there are none or the client wrote recently.
+    Users on a shard other than the home shard are read from that shard's primary.
+
+    Args:
+        client_key (str): Read-your-writes key; defaults to phone_e164.
+        phone_e164 (str): The user the reads are about.
+    """
+    client_key = client_key or phone_e164
+    if phone_e164 is not None and shard_router.sharded:
+        shard = shard_router.shard_for(phone_e164)
+        if shard != shard_router.home:
+            return shard_router.session_factories[shard]
+    replicas = healthy_replicas
+    if not replicas or (client_key is not None and _wrote_recently(client_key)):
+        return SessionLocal
+    return ReplicaSessionLocals[replicas[next(_replica_cursor) % len(replicas)]]
+
+
+# Dependency to get a database session on the shard of the user the request is about
+async def get_db(request: Request) -> AsyncSession:
+    phone_e164 = await shard_key(request)
+    try:
+        session_factory = shard_router.session_factory(phone_e164 if shard_router.sharded else None)
+    except ShardMoving:
+        raise HTTPException(status_code=503, detail="Account maintenance in progress, please retry shortly.",
+                            headers={"Retry-After": "5"})
+    async with session_factory() as session:
+        client_key = _client_key(request, phone_e164)
+        # Route this user's reads to the primary for a while after it commits
+        event.listen(session.sync_session, "after_commit", lambda _: _mark_write(client_key))
         yield session
+
+
+# Dependency for read-only paths; may be served by a replica
+async def get_read_db(request: Request) -> AsyncSession:
+    phone_e164 = await shard_key(request)
+    async with read_session_factory(_client_key(request, phone_e164), phone_e164)() as session:
+        yield session
+
+
+# Dependency for tables that are not sharded (campaigns and other global data)
+async def get_home_db() -> AsyncSession:
+    async with shard_router.session_factory()() as session:
+        yield session
+
+
+async def _replica_lag(engine) -> float:
+    async with engine.connect() as conn:
+        result = await conn.execute(text(
+            "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+            "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END"
+        ))
+        return float(result.scalar())
+
+
+async def monitor_replicas(stop_event: asyncio.Event) -> None:
+    """
+    Periodically measure replication lag and keep healthy_replicas up to date.
+    Replicas that lag too far or cannot be reached are skipped until they recover.
+    """
+    global healthy_replicas
+    while not stop_event.is_set():
+        healthy = []
+        for index, engine in enumerate(replica_engines):
+            try:
+                lag = await asyncio.wait_for(_replica_lag(engine), REPLICA_CHECK_INTERVAL_SECONDS)
+            except Exception:
+                logger.warning("Replica %d is unreachable; reads fall back to the primary", index)
+                continue
+            if lag <= get_settings().max_replica_lag_seconds:
+                healthy.append(index)
+            else:
+                logger.warning("Replica %d is %.1fs behind; skipping it", index, lag)
+        healthy_replicas = healthy
+        try:
+            await asyncio.wait_for(stop_event.wait(), REPLICA_CHECK_INTERVAL_SECONDS)
+        except asyncio.TimeoutError:
+            pass
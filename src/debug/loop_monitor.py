@@ -0,0 +1,100 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+from collections import deque
+
+import dotenv
+
+from .profiler import format_stack
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG_INTERVAL_SECONDS = float(os.getenv("LOOP_LAG_INTERVAL_MS", "100")) / 1000
+# A callback that holds the loop this long is logged with the stack it was blocked in
+LOOP_STALL_SECONDS = float(os.getenv("LOOP_STALL_MS", "250")) / 1000
+LAG_WINDOW = 600  # samples kept for percentiles; one minute at the default interval
+STALLS_KEPT = 20
+
+
+class EventLoopMonitor:
+    """
+    Continuously measures event loop lag, and catches what is blocking the loop.
+
+    A task on the loop wakes every interval and records how late it woke up.
+    A watchdog thread watches that task's heartbeat; when the loop has not
+    checked in for stall_seconds, it grabs the loop thread's current stack,
+    which is the blocking call (an inline bcrypt hash, a synchronous upload).
+    """
+
+    def __init__(self, interval_seconds: float = LOOP_LAG_INTERVAL_SECONDS,
+                 stall_seconds: float = LOOP_STALL_SECONDS):
+        self.interval_seconds = interval_seconds
+        self.stall_seconds = stall_seconds
+        self.lags = deque(maxlen=LAG_WINDOW)
+        self.max_lag = 0.0
+        self.stall_count = 0
+        self.stalls = deque(maxlen=STALLS_KEPT)
+        self._heartbeat = time.monotonic()
+        self._loop_thread = None
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        """Measure until stop_event is set. Started from lifespan."""
+        self._loop_thread = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        watchdog = threading.Thread(target=self._watch, args=(stop_event,), name="loop-watchdog", daemon=True)
+        watchdog.start()
+        while not stop_event.is_set():
+            expected = time.monotonic() + self.interval_seconds
+            try:
+                await asyncio.wait_for(stop_event.wait(), self.interval_seconds)
+            except asyncio.TimeoutError:
+                pass
+            now = time.monotonic()
+            self._heartbeat = now
+            lag = max(0.0, now - expected)
+            self.lags.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+        await asyncio.to_thread(watchdog.join)
+
+    def _watch(self, stop_event: asyncio.Event) -> None:
+        reported = None
+        while not stop_event.is_set():
+            time.sleep(self.interval_seconds / 2)
+            heartbeat = self._heartbeat
+            blocked = time.monotonic() - heartbeat - self.interval_seconds
+            # Report each stall once, at the moment it crosses the threshold
+            if blocked >= self.stall_seconds and reported != heartbeat:
+                reported = heartbeat
+                frame = sys._current_frames().get(self._loop_thread)
+                stack = format_stack(frame) if frame is not None else ""
+                self.stall_count += 1
+                self.stalls.append({"at": time.time(), "blocked_seconds": round(blocked, 3), "stack": stack})
+                logger.warning("Event loop blocked for %.0f ms in:\n%s", blocked * 1000, stack)
+
+    def percentile(self, fraction: float) -> float:
+        if not self.lags:
+            return 0.0
+        ordered = sorted(self.lags)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def snapshot(self) -> dict:
+        return {
+            "interval_ms": self.interval_seconds * 1000,
+            "lag_ms": {
+                "last": round(self.lags[-1] * 1000, 3) if self.lags else 0.0,
+                "p50": round(self.percentile(0.5) * 1000, 3),
+                "p99": round(self.percentile(0.99) * 1000, 3),
+                "max": round(self.max_lag * 1000, 3),
+            },
+            "stall_threshold_ms": self.stall_seconds * 1000,
+            "stalls": self.stall_count,
+            "recent_stalls": list(self.stalls),
+        }
+
+
+loop_monitor = EventLoopMonitor()
@@ -0,0 +1,58 @@
+import asyncio
+import os
+import time
+
+from fastapi import APIRouter, Depends, Query, Request
+from fastapi.exceptions import HTTPException
+from fastapi.responses import PlainTextResponse
+
+from src.audit.writer import audit_log
+from src.authentications.models import User
+from src.authentications.utilities import get_staff_user
+from src.database import shard_router
+from src.outbox.services import get_outbox_lag
+from .loop_monitor import loop_monitor
+from .profiler import SamplingProfiler
+
+router = APIRouter(prefix="/_debug", tags=["debug"], include_in_schema=False)
+
+# One profile at a time per worker; concurrent ones would only profile each other
+_profile_lock = asyncio.Lock()
+
+
+@router.get("/profile", response_class=PlainTextResponse)
+async def profile(http_request: Request, seconds: float = Query(10, gt=0, le=60),
+                  interval_ms: float = Query(5, ge=1, le=100), staff_user: User = Depends(get_staff_user)):
+    # Step 1: Refuse to stack a second profiler on a worker that is already being profiled
+    if _profile_lock.locked():
+        raise HTTPException(status_code=409, detail="A profile is already running on this worker.")
+
+    # Step 2: Sample every thread of this worker while it keeps serving traffic
+    async with _profile_lock:
+        await audit_log.record_request(http_request, "debug_profile", actor=staff_user.phone_e164,
+                                       user_id=staff_user.id, details={"seconds": seconds, "pid": os.getpid()})
+        profiler = SamplingProfiler(interval_ms / 1000)
+        await asyncio.to_thread(profiler.run, seconds)
+
+    # Step 3: Return collapsed stacks for flamegraph.pl, speedscope or inferno
+    filename = f"profile-{os.getpid()}-{int(time.time())}.folded"
+    return PlainTextResponse(profiler.collapsed(), headers={
+        "Content-Disposition": f'attachment; filename="{filename}"',
+        "X-Worker-Pid": str(os.getpid()),
+        "X-Profile-Samples": str(profiler.sample_count),
+    })
+
+
+@router.get("/loop")
+async def loop_lag(staff_user: User = Depends(get_staff_user)):
+    return {"pid": os.getpid(), **loop_monitor.snapshot()}
+
+
+@router.get("/outbox")
+async def outbox_lag(staff_user: User = Depends(get_staff_user)):
+    # Every shard has its own outbox and relay, so a stuck relay shows up as one shard's lag
+    lag = {}
+    for shard, session_factory in shard_router.session_factories.items():
+        async with session_factory() as db:
+            lag[shard] = await get_outbox_lag(db)
+    return lag
@@ -0,0 +1,349 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import UUID
+
+import dotenv
+from sqlalchemy import bindparam, func, insert, literal, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.authentications.models import User
+from src.database import shard_router
+from src.notifications.bulk import add_recipients, run_campaign
+from src.notifications.models import Campaign
+from src.notifications.push import publish_events
+from src.outbox.services import add_outbox_events
+from src.partitions import retained_since
+from src.sharding import ShardMoving
+from src.transactions.models import LedgerEntry, Wallet
+from .models import Estate, EstateUnit, LevyInvoice, LevyRun
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+LEVY_CHUNK_SIZE = int(os.getenv("LEVY_CHUNK_SIZE", "1000"))
+LEVY_BILLED = "estate_levy"
+
+runs = LevyRun.__table__
+invoices = LevyInvoice.__table__
+units = EstateUnit.__table__
+campaigns = Campaign.__table__
+wallets = Wallet.__table__
+users = User.__table__
+ledger = LedgerEntry.__table__
+
+# Levy runs this process is billing right now; a resubmitted levy does not start a second pass over it
+_levies_in_flight: set = set()
+
+
+def levy_in_flight(run_id: UUID) -> bool:
+    return run_id in _levies_in_flight
+
+
+def levy_expired(run: LevyRun) -> bool:
+    # Ledger references are checked on attached partitions only; postings of an older run may be archived
+    return run.created_date < retained_since("ledger_entries")
+
+
+def levy_reference(run_id: UUID, unit_id: UUID) -> str:
+    return f"estate-levy:{run_id}:{unit_id}"
+
+
+def levy_message(estate: Estate, name: str, period: str, amount: Decimal) -> str:
+    return (f"{estate.name}: your {name} for {period} of NGN {amount:,.2f} has been billed. "
+            f"It is paid from your wallet if the balance allows; otherwise pay it in the app.")
+
+
+async def create_levy_run(db_session: AsyncSession, estate: Estate, name: str, period: str,
+                          amount: Decimal) -> LevyRun:
+    """
+    Start billing a levy to every occupied unit of an estate: one invoice per
+    unit, generated with a single INSERT ... SELECT, plus an SMS campaign that
+    recipients are queued into as their invoices are billed.
+
+    The levy is identified by (estate, name, period). Submitting it again
+    returns the run already created for it, so a retried request never bills
+    twice; callers compare the amount to tell a retry from a conflicting levy.
+
+    Returns:
+        LevyRun: The new or existing run, with total_count filled in.
+    """
+    statement = select(LevyRun).where(LevyRun.estate_id == estate.id, LevyRun.name == name, LevyRun.period == period)
+    run = (await db_session.execute(statement)).scalars().first()
+    if run:
+        return run
+
+    # A draft until billing has queued its recipients, so resume_campaigns cannot send it half-built
+    campaign = Campaign(name=f"{estate.name} {name} {period}", message=levy_message(estate, name, period, amount),
+                        status="draft")
+    run = LevyRun(estate_id=estate.id, name=name, period=period, amount=amount, campaign_id=campaign.id)
+    db_session.add(campaign)
+    db_session.add(run)
+    try:
+        await db_session.flush()
+    except IntegrityError:
+        # Submitted twice at once; the other request created the run
+        await db_session.rollback()
+        return (await db_session.execute(statement)).scalars().one()
+
+    result = await db_session.execute(
+        insert(invoices).from_select(
+            ["run_id", "unit_id", "resident_phone_e164", "amount", "status"],
+            select(
+                literal(run.id, invoices.c.run_id.type),
+                units.c.id,
+                units.c.resident_phone_e164,
+                literal(amount, invoices.c.amount.type),
+                literal("pending"),
+            ).where(units.c.estate_id == estate.id, units.c.resident_phone_e164.is_not(None)),
+        )
+    )
+    run.total_count = result.rowcount
+    await db_session.commit()
+    return run
+
+
+async def _post_on_shard(session_factory, run: LevyRun, rows: list) -> dict:
+    """
+    Debit one shard's share of a chunk of invoices in a single transaction.
+
+    Invoices whose ledger entry already exists (posted by an earlier attempt
+    that died before marking them) count as paid without posting again; the
+    check runs under the wallet locks, so concurrent attempts cannot both post.
+
+    Returns:
+        dict: Outcome ('paid', 'unpaid', 'no_wallet') -> unit ids.
+    """
+    time_now = datetime.now(timezone.utc)
+    outcomes = defaultdict(list)
+    async with session_factory() as db_session:
+        # Step 1: Lock the residents' wallets in a fixed order so chunks cannot deadlock
+        statement = (
+            select(wallets.c.id, wallets.c.user_id, wallets.c.balance, users.c.phone_e164)
+            .join(users, users.c.id == wallets.c.user_id)
+            .where(users.c.phone_e164.in_(sorted({row.resident_phone_e164 for row in rows})))
+            .order_by(wallets.c.id)
+            .with_for_update(of=wallets)
+        )
+        wallet_rows = {row.phone_e164: row for row in (await db_session.execute(statement)).all()}
+        balances = {row.id: row.balance for row in wallet_rows.values()}
+
+        # Step 2: Skip invoices an earlier attempt already posted
+        references = [levy_reference(run.id, row.unit_id) for row in rows]
+        posted = set((await db_session.execute(
+            select(ledger.c.reference).where(ledger.c.reference.in_(references))
+        )).scalars())
+
+        # Step 3: Decide in memory which invoices the wallets can cover; a resident may own several units
+        paid = []
+        debits = defaultdict(Decimal)
+        for row, reference in zip(rows, references):
+            wallet = wallet_rows.get(row.resident_phone_e164)
+            if reference in posted:
+                outcomes["paid"].append(row.unit_id)
+            elif wallet is None:
+                outcomes["no_wallet"].append(row.unit_id)
+            elif balances[wallet.id] >= row.amount:
+                balances[wallet.id] -= row.amount
+                debits[wallet.id] += row.amount
+                paid.append((row, reference, wallet))
+                outcomes["paid"].append(row.unit_id)
+            else:
+                outcomes["unpaid"].append(row.unit_id)
+
+        # Step 4: Post all debits with one statement per table
+        if paid:
+            await db_session.execute(insert(ledger), [
+                {
+                    "wallet_id": wallet.id,
+                    "entry_type": "debit",
+                    "amount": row.amount,
+                    "reference": reference,
+                    "description": f"{run.name} {run.period}",
+                    "created_date": time_now,
+                }
+                for row, reference, wallet in paid
+            ])
+            await db_session.execute(
+                update(wallets)
+                .where(wallets.c.id == bindparam("b_wallet_id"))
+                .values(balance=wallets.c.balance - bindparam("b_amount")),
+                [{"b_wallet_id": wallet_id, "b_amount": amount} for wallet_id, amount in debits.items()],
+            )
+            await add_outbox_events(db_session, [
+                ("ledger.posted", wallet.id, {
+                    "reference": reference,
+                    "entry_type": "debit",
+                    "amount": row.amount,
+                    "user_id": wallet.user_id,
+                })
+                for row, reference, wallet in paid
+            ])
+
+        # Step 5: Tell connected residents, whether they were debited or owe the levy
+        unpaid = set(outcomes["unpaid"])
+        await publish_events(db_session, [
+            (wallet_rows[row.resident_phone_e164].user_id, LEVY_BILLED, {
+                "run_id": run.id, "unit_id": row.unit_id, "amount": row.amount,
+                "status": "unpaid" if row.unit_id in unpaid else "paid",
+            })
+            for row, reference in zip(rows, references)
+            if reference not in posted and row.resident_phone_e164 in wallet_rows
+        ])
+        await db_session.commit()
+    return outcomes
+
+
+async def bill_chunk(home_session: AsyncSession, run: LevyRun, rows: list, router=shard_router) -> dict:
+    """
+    Bill one chunk of pending invoices: post on every shard concurrently, then
+    record the outcomes, progress and SMS recipients on the home shard.
+
+    Invoices of residents whose shard is being split stay pending for a later run.
+
+    Returns:
+        dict: Invoices newly marked per outcome.
+    """
+    # Step 1: Group the invoices by the shard holding each resident's wallet
+    by_shard = defaultdict(list)
+    for row in rows:
+        try:
+            by_shard[router.session_factory(row.resident_phone_e164)].append(row)
+        except ShardMoving:
+            continue
+    results = await asyncio.gather(*(
+        _post_on_shard(session_factory, run, shard_rows) for session_factory, shard_rows in by_shard.items()
+    ))
+
+    # Step 2: One UPDATE per outcome; only pending rows change, so a concurrent attempt is not counted twice
+    time_now = datetime.now(timezone.utc)
+    counts = {"paid": 0, "unpaid": 0, "no_wallet": 0}
+    for status in counts:
+        unit_ids = [unit_id for outcomes in results for unit_id in outcomes.get(status, [])]
+        if unit_ids:
+            result = await home_session.execute(
+                update(invoices)
+                .where(invoices.c.run_id == run.id, invoices.c.unit_id.in_(unit_ids), invoices.c.status == "pending")
+                .values(status=status, updated_date=time_now)
+            )
+            counts[status] = result.rowcount
+    await home_session.execute(update(runs).where(runs.c.id == run.id).values(
+        paid_count=runs.c.paid_count + counts["paid"],
+        unpaid_count=runs.c.unpaid_count + counts["unpaid"],
+        no_wallet_count=runs.c.no_wallet_count + counts["no_wallet"],
+    ))
+
+    # Step 3: Queue the SMS for everyone billed; recipients already queued are skipped
+    if run.campaign_id:
+        billed = set()
+        for outcomes in results:
+            billed.update(outcomes.get("paid", []))
+            billed.update(outcomes.get("unpaid", []))
+        queued = await add_recipients(home_session, run.campaign_id,
+                                      sorted({row.resident_phone_e164 for row in rows if row.unit_id in billed}))
+        await home_session.execute(update(campaigns).where(campaigns.c.id == run.campaign_id).values(
+            total_count=campaigns.c.total_count + queued
+        ))
+    await home_session.commit()
+    return counts
+
+
+async def run_levy(run_id: UUID, router=shard_router, providers: list = None,
+                   chunk_size: int = LEVY_CHUNK_SIZE) -> dict:
+    """
+    Bill every pending invoice of a levy run, then send its SMS campaign.
+
+    Invoices are read in keyset order in chunks of chunk_size and each chunk is
+    committed before the next is read. Only pending invoices are read, so
+    running this again after a crash, or while another attempt is running,
+    picks up whatever is left without billing anyone twice. A run this process
+    is already billing is not started again.
+
+    Args:
+        run_id (UUID): The levy run to bill.
+        router (ShardRouter): Where the levy run lives (home shard) and where each resident's wallet lives.
+        providers (list): SMS providers in preference order; no SMS is sent when None.
+        chunk_size (int): Invoices per chunk.
+
+    Returns:
+        dict: Counts per outcome plus invoices per second.
+    """
+    if levy_in_flight(run_id):
+        return {"success": False, "message": "Levy run is already being billed."}
+    _levies_in_flight.add(run_id)
+    try:
+        return await _run_levy(run_id, router, providers, chunk_size)
+    finally:
+        _levies_in_flight.discard(run_id)
+
+
+async def _run_levy(run_id: UUID, router, providers: list, chunk_size: int) -> dict:
+    totals = {"paid": 0, "unpaid": 0, "no_wallet": 0}
+    started = time.perf_counter()
+    last_unit_id = None
+    home_factory = router.session_factory()
+
+    async with home_factory() as home_session:
+        run = await home_session.get(LevyRun, run_id)
+        if not run:
+            return {"success": False, "message": "Levy run not found."}
+        if levy_expired(run):
+            return {"success": False, "message": "Levy run is too old to bill."}
+
+        while True:
+            # Step 1: Next chunk of pending invoices
+            statement = select(invoices.c.unit_id, invoices.c.resident_phone_e164, invoices.c.amount).where(
+                invoices.c.run_id == run_id,
+                invoices.c.status == "pending",
+            )
+            if last_unit_id is not None:
+                statement = statement.where(invoices.c.unit_id > last_unit_id)
+            rows = (await home_session.execute(statement.order_by(invoices.c.unit_id).limit(chunk_size))).all()
+            if not rows:
+                break
+            last_unit_id = rows[-1].unit_id
+
+            # Step 2: Post it and record progress
+            counts = await bill_chunk(home_session, run, rows, router)
+            for key, value in counts.items():
+                totals[key] += value
+
+        # Step 3: Finished unless some residents were mid-move between shards
+        pending = (await home_session.execute(
+            select(func.count()).select_from(invoices).where(invoices.c.run_id == run_id,
+                                                             invoices.c.status == "pending")
+        )).scalar()
+        await home_session.execute(update(runs).where(runs.c.id == run_id).values(
+            status="incomplete" if pending else "completed",
+            completed_date=None if pending else datetime.now(timezone.utc),
+        ))
+        # Everyone billed so far is queued; from here a restart resumes the campaign
+        if run.campaign_id:
+            await home_session.execute(
+                update(campaigns).where(campaigns.c.id == run.campaign_id, campaigns.c.status == "draft")
+                .values(status="queued")
+            )
+        await home_session.commit()
+
+    elapsed = time.perf_counter() - started
+    billed = sum(totals.values())
+    rate = billed / elapsed if elapsed else 0.0
+    logger.info("Levy run %s: %d paid, %d unpaid, %d without wallet, %d left pending, %.1f invoices/s",
+                run_id, totals["paid"], totals["unpaid"], totals["no_wallet"], pending, rate)
+
+    if providers and run.campaign_id:
+        await run_campaign(home_factory, run.campaign_id, providers)
+
+    return {
+        "success": True,
+        **totals,
+        "pending": pending,
+        "elapsed_seconds": round(elapsed, 3),
+        "invoices_per_second": round(rate, 1),
+    }
@@ -0,0 +1,103 @@
+"""
+Geohash encoding: a point becomes a base32 string whose prefixes are ever
+smaller rectangular cells containing it, so "estates in this cell" is a
+prefix match a B-tree index can serve.
+"""
+import math
+
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+_DECODE = {char: index for index, char in enumerate(_BASE32)}
+
+EARTH_RADIUS_M = 6_371_000.0
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS_M / 180
+
+
+def encode(latitude: float, longitude: float, precision: int = 12) -> str:
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = bit_count = 0
+    even = True  # Bits alternate longitude, latitude, longitude, ...
+    while len(chars) < precision:
+        bounds, value = (lon_range, longitude) if even else (lat_range, latitude)
+        middle = (bounds[0] + bounds[1]) / 2
+        if value >= middle:
+            bits = bits * 2 + 1
+            bounds[0] = middle
+        else:
+            bits = bits * 2
+            bounds[1] = middle
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = bit_count = 0
+    return "".join(chars)
+
+
+def bounds(geohash: str) -> tuple:
+    """
+    Returns:
+        tuple: (min latitude, min longitude, max latitude, max longitude) of the cell.
+
+    Raises:
+        ValueError: If geohash contains a character outside the geohash alphabet.
+    """
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        if char not in _DECODE:
+            raise ValueError(f"Invalid geohash: {geohash!r}")
+        value = _DECODE[char]
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            middle = (interval[0] + interval[1]) / 2
+            if value >> shift & 1:
+                interval[0] = middle
+            else:
+                interval[1] = middle
+            even = not even
+    return lat_range[0], lon_range[0], lat_range[1], lon_range[1]
+
+
+def neighbours(geohash: str) -> list:
+    """
+    The up to eight cells of the same precision around geohash (fewer next to a pole).
+    """
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    height, width = max_lat - min_lat, max_lon - min_lon
+    center_lat, center_lon = (min_lat + max_lat) / 2, (min_lon + max_lon) / 2
+    cells = []
+    for d_lat in (-1, 0, 1):
+        latitude = center_lat + d_lat * height
+        if not -90 < latitude < 90:
+            continue
+        for d_lon in (-1, 0, 1):
+            if d_lat == d_lon == 0:
+                continue
+            longitude = (center_lon + d_lon * width + 180) % 360 - 180
+            cell = encode(latitude, longitude, len(geohash))
+            if cell not in cells:
+                cells.append(cell)
+    return cells
+
+
+def cell_span_m(geohash: str) -> float:
+    """
+    The shorter side of the cell in meters. Any point further than this from a
+    point in the cell lies outside the cell and its neighbours.
+    """
+    min_lat, min_lon, max_lat, max_lon = bounds(geohash)
+    widest_lat = max(abs(min_lat), abs(max_lat))
+    return min((max_lat - min_lat) * METERS_PER_DEGREE,
+               (max_lon - min_lon) * METERS_PER_DEGREE * math.cos(math.radians(widest_lat)))
+
+
+def distance_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    """Great-circle (haversine) distance in meters."""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(min(1.0, math.sqrt(a)))
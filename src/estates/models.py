@@ -0,0 +1,102 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import Column, Index, Numeric, UniqueConstraint
+from sqlalchemy.types import TIMESTAMP
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from uuid import UUID, uuid4
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Estate(SQLModel, table=True):
+    __tablename__ = "estates"
+    __table_args__ = (
+        # Proximity search scans geohash prefixes with LIKE 'cell%', which needs the pattern
+        # operator class under any collation other than "C"
+        Index("ix_estates_geohash", "geohash", postgresql_ops={"geohash": "text_pattern_ops"}),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    name: str = Field(nullable=False)
+    address: Optional[str] = Field(default=None)
+    latitude: float = Field(nullable=False)
+    longitude: float = Field(nullable=False)
+    # Full-precision geohash of (latitude, longitude), set by src.estates.services on every write
+    geohash: str = Field(nullable=False, max_length=12)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+    updated_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+
+
+class EstateUnit(SQLModel, table=True):
+    __tablename__ = "estate_units"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    estate_id: UUID = Field(foreign_key="estates.id", nullable=False, index=True)
+    label: str = Field(nullable=False)  # e.g. 'Block C, Flat 4'
+    # Users are sharded by phone number, so residents are referenced by it rather than by a foreign key
+    resident_phone_e164: Optional[str] = Field(default=None, index=True)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+
+
+class LevyRun(SQLModel, table=True):
+    __tablename__ = "levy_runs"
+    __table_args__ = (
+        # Submitting the same levy again returns, and resumes, the run already started for it
+        UniqueConstraint("estate_id", "name", "period", name="uq_levy_runs_estate_name_period"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    estate_id: UUID = Field(foreign_key="estates.id", nullable=False)
+    name: str = Field(nullable=False)  # e.g. 'Service charge'
+    period: str = Field(nullable=False)  # 'YYYY-MM'
+    amount: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False))
+    status: str = Field(default="billing", nullable=False)  # 'billing', 'completed', 'incomplete'
+    total_count: int = Field(default=0, nullable=False)
+    paid_count: int = Field(default=0, nullable=False)
+    unpaid_count: int = Field(default=0, nullable=False)
+    no_wallet_count: int = Field(default=0, nullable=False)
+    # SMS campaign telling residents about the levy; recipients are queued as invoices are billed
+    campaign_id: Optional[UUID] = Field(default=None, foreign_key="campaigns.id")
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+    completed_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+
+
+class LevyInvoice(SQLModel, table=True):
+    __tablename__ = "levy_invoices"
+
+    # One invoice per unit per run; the key also orders the billing job's keyset scan
+    run_id: UUID = Field(foreign_key="levy_runs.id", primary_key=True)
+    unit_id: UUID = Field(foreign_key="estate_units.id", primary_key=True)
+    resident_phone_e164: str = Field(nullable=False)
+    amount: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False))
+    # 'pending', 'paid' (debited from the wallet), 'unpaid' (balance too low), 'no_wallet'
+    status: str = Field(default="pending", nullable=False)
+    updated_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
@@ -0,0 +1,72 @@
+from datetime import datetime
+from decimal import Decimal
+from typing import List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+from src.authentications.schemas import PhoneNumber
+
+
+class EstateRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=200)
+    address: Optional[str] = Field(None, max_length=500)
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+
+class UpdateEstate(BaseModel):
+    name: Optional[str] = Field(None, min_length=1, max_length=200)
+    address: Optional[str] = Field(None, max_length=500)
+    latitude: Optional[float] = Field(None, ge=-90, le=90)
+    longitude: Optional[float] = Field(None, ge=-180, le=180)
+
+
+class EstateUnitRequest(BaseModel):
+    label: str = Field(..., min_length=1, max_length=100)
+    resident_phone_number: Optional[PhoneNumber] = None
+
+
+class EstateUnitResponse(BaseModel):
+    id: UUID
+    label: str
+    resident_phone_e164: Optional[str] = None
+
+
+class EstateResponse(BaseModel):
+    id: UUID
+    name: str
+    address: Optional[str] = None
+    latitude: float
+    longitude: float
+    created_date: datetime
+    units: List[EstateUnitResponse] = []
+
+
+class NearbyEstate(BaseModel):
+    id: UUID
+    name: str
+    latitude: float
+    longitude: float
+    distance_m: float
+
+
+class LevyRequest(BaseModel):
+    name: str = Field(..., min_length=1, max_length=100)
+    period: str = Field(..., pattern=r"^\d{4}-(0[1-9]|1[0-2])$")  # 'YYYY-MM'
+    amount: Decimal = Field(..., gt=0, max_digits=18, decimal_places=2)
+
+
+class LevyRunResponse(BaseModel):
+    id: UUID
+    estate_id: UUID
+    name: str
+    period: str
+    amount: Decimal
+    status: str
+    total_count: int
+    paid_count: int
+    unpaid_count: int
+    no_wallet_count: int
+    created_date: datetime
+    completed_date: Optional[datetime] = None
@@ -0,0 +1,176 @@
+import heapq
+import os
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+
+import dotenv
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.notifications.push import event_hooks, publish_event
+from . import geohash
+from .models import Estate
+
+dotenv.load_dotenv()
+
+# Cells are searched finest first, ~1.2 km, ~4.9 km then ~39 km wide; coarser cells would hold
+# too much of a city to cache
+SEARCH_PRECISIONS = (6, 5, 4)
+MAX_NEARBY = 50
+# Below the span of the coarsest cells up to ~65 degrees latitude, so the search never returns too few
+MAX_RADIUS_KM = 15
+# Bounds on how long a worker may serve a cell it never saw invalidated, and on its memory
+ESTATE_CACHE_SECONDS = float(os.getenv("ESTATE_CACHE_SECONDS", "600"))
+ESTATE_CACHE_MAX_ROWS = int(os.getenv("ESTATE_CACHE_MAX_ROWS", "500000"))
+ESTATE_CHANGED = "estate_changed"
+
+
+class RegionCache:
+    """
+    Per-process map of geohash cell -> the estates in it, as
+    (id, name, latitude, longitude) tuples.
+
+    Writes drop every cached cell containing the old or new location. A fill
+    that was already reading when a write landed is discarded rather than
+    cached, so it cannot put back what the write invalidated. Entries expire
+    after ttl_seconds and at most max_rows estates are held, least recently
+    used cells first out.
+    """
+
+    def __init__(self, ttl_seconds: float = ESTATE_CACHE_SECONDS, max_rows: int = ESTATE_CACHE_MAX_ROWS,
+                 clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_rows = max_rows
+        self.clock = clock
+        self.cells = OrderedDict()
+        self.rows = 0
+        self.generation = 0
+
+    def get(self, cell: str):
+        entry = self.cells.get(cell)
+        if entry is None:
+            return None
+        estates, expires = entry
+        if expires <= self.clock():
+            self._drop(cell)
+            return None
+        self.cells.move_to_end(cell)
+        return estates
+
+    def put(self, cell: str, estates: tuple, generation: int) -> None:
+        """Cache a cell read while the cache was at generation; ignored if a write landed since."""
+        if generation != self.generation:
+            return
+        self._drop(cell)
+        self.cells[cell] = (estates, self.clock() + self.ttl_seconds)
+        self.rows += len(estates)
+        while self.rows > self.max_rows and self.cells:
+            self._drop(next(iter(self.cells)))
+
+    def invalidate(self, *hashes: str) -> None:
+        self.generation += 1
+        for full_hash in hashes:
+            if full_hash:
+                for precision in SEARCH_PRECISIONS:
+                    self._drop(full_hash[:precision])
+
+    def _drop(self, cell: str) -> None:
+        entry = self.cells.pop(cell, None)
+        if entry is not None:
+            self.rows -= len(entry[0])
+
+    def __len__(self) -> int:
+        return len(self.cells)
+
+
+region_cache = RegionCache()
+
+
+def _on_estate_event(user_id: str, event: dict) -> None:
+    # Every worker hears the NOTIFY sent with an estate write and drops the cells it touched
+    if event.get("type") == ESTATE_CHANGED:
+        region_cache.invalidate(*event["data"]["geohashes"])
+
+
+event_hooks.append(_on_estate_event)
+
+
+async def _load_cells(session_factory, cells: list, cache: RegionCache) -> dict:
+    found = {cell: cache.get(cell) for cell in cells}
+    missing = [cell for cell, estates in found.items() if estates is None]
+    if not missing:
+        return found
+
+    generation = cache.generation
+    statement = (
+        select(Estate.id, Estate.name, Estate.latitude, Estate.longitude, Estate.geohash)
+        .where(or_(*(Estate.geohash.like(f"{cell}%") for cell in missing)))
+    )
+    async with session_factory() as db:
+        rows = (await db.execute(statement)).all()
+
+    by_cell = {cell: [] for cell in missing}
+    precision = len(missing[0])
+    for row in rows:
+        by_cell[row.geohash[:precision]].append((row.id, row.name, row.latitude, row.longitude))
+    for cell, estates in by_cell.items():
+        found[cell] = tuple(estates)
+        cache.put(cell, found[cell], generation)
+    return found
+
+
+async def nearby_estates(session_factory, latitude: float, longitude: float, k: int, radius_m: float,
+                         cache: RegionCache = region_cache) -> list:
+    """
+    Find the k estates nearest to a point, within radius_m.
+
+    Searches the point's geohash cell and its neighbours, finest cells first.
+    The answer is final once the k-th nearest estate is closer than the cells'
+    span (nothing outside the 3x3 block can be closer) or the block covers the
+    whole radius; otherwise the search widens to the next coarser cells.
+
+    Args:
+        session_factory: Opens a session on the database holding the estates; only used on cache misses.
+        latitude (float): Of the point, in degrees.
+        longitude (float): Of the point, in degrees.
+        k (int): How many estates to return at most.
+        radius_m (float): Ignore estates further away than this.
+
+    Returns:
+        list: (distance in meters, (id, name, latitude, longitude)) tuples, nearest first.
+    """
+    nearest = []
+    for precision in SEARCH_PRECISIONS:
+        center = geohash.encode(latitude, longitude, precision)
+        cells = await _load_cells(session_factory, [center, *geohash.neighbours(center)], cache)
+        candidates = (
+            (geohash.distance_m(latitude, longitude, estate[2], estate[3]), estate)
+            for estates in cells.values() for estate in estates
+        )
+        nearest = heapq.nsmallest(k, (candidate for candidate in candidates if candidate[0] <= radius_m),
+                                  key=lambda candidate: candidate[0])
+        span = geohash.cell_span_m(center)
+        if span >= radius_m or (len(nearest) == k and nearest[-1][0] <= span):
+            break
+    return nearest
+
+
+def _locate(estate: Estate) -> None:
+    estate.geohash = geohash.encode(estate.latitude, estate.longitude)
+
+
+async def save_estate(db: AsyncSession, estate: Estate, changed_by, previous_geohash: str = None) -> Estate:
+    """
+    Write an estate and tell every worker to drop the cached cells around its
+    old and new location. The NOTIFY goes out when the caller commits; the
+    caller should also invalidate region_cache itself after committing, so this
+    worker does not serve the old cells until its NOTIFY comes back.
+    """
+    _locate(estate)
+    if previous_geohash is not None:
+        estate.updated_date = datetime.now(timezone.utc)
+    db.add(estate)
+    await publish_event(db, changed_by, ESTATE_CHANGED,
+                        {"estate_id": str(estate.id), "geohashes": [estate.geohash, previous_geohash]})
+    return estate
@@ -0,0 +1,137 @@
+from uuid import UUID
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Query, Request
+from fastapi.exceptions import HTTPException
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.audit.writer import audit_log
+from src.authentications.models import User
+from src.authentications.utilities import get_current_phone, get_staff_user
+from src.database import get_home_db, shard_router
+from src.notifications.services import sms_registry
+from .billing import create_levy_run, levy_expired, levy_in_flight, run_levy
+from .models import Estate, EstateUnit, LevyRun
+from .schemas import (
+    EstateRequest,
+    EstateResponse,
+    EstateUnitRequest,
+    EstateUnitResponse,
+    LevyRequest,
+    LevyRunResponse,
+    NearbyEstate,
+    UpdateEstate,
+)
+from .services import MAX_NEARBY, MAX_RADIUS_KM, nearby_estates, region_cache, save_estate
+
+router = APIRouter(prefix="/estates", tags=["estates"])
+
+
+async def _get_estate(db: AsyncSession, estate_id: UUID, for_update: bool = False) -> Estate:
+    statement = select(Estate).where(Estate.id == estate_id)
+    if for_update:
+        statement = statement.with_for_update()
+    estate = (await db.execute(statement)).scalars().first()
+    if not estate:
+        raise HTTPException(status_code=404, detail="Estate not found.")
+    return estate
+
+
+async def _units(db: AsyncSession, estate_id: UUID) -> list:
+    statement = select(EstateUnit).where(EstateUnit.estate_id == estate_id).order_by(EstateUnit.label)
+    return (await db.execute(statement)).scalars().all()
+
+
+@router.get("/nearby", response_model=list[NearbyEstate])
+async def nearby(latitude: float = Query(..., ge=-90, le=90), longitude: float = Query(..., ge=-180, le=180),
+                 k: int = Query(10, ge=1, le=MAX_NEARBY), radius_km: float = Query(5, gt=0, le=MAX_RADIUS_KM),
+                 phone_e164: str = Depends(get_current_phone)):
+    # Estates live on the home shard; a session is only opened for cells this worker has not cached
+    nearest = await nearby_estates(shard_router.session_factory(), latitude, longitude, k, radius_km * 1000)
+    return [
+        {"id": estate_id, "name": name, "latitude": lat, "longitude": lon, "distance_m": round(distance, 1)}
+        for distance, (estate_id, name, lat, lon) in nearest
+    ]
+
+
+@router.post("/", response_model=EstateResponse, status_code=201)
+async def create_estate(request: EstateRequest, http_request: Request, db: AsyncSession = Depends(get_home_db),
+                        staff_user: User = Depends(get_staff_user)):
+    # Step 1: Save the estate and announce the cells it lands in
+    estate = await save_estate(db, Estate(**request.model_dump()), staff_user.id)
+    await db.commit()
+    region_cache.invalidate(estate.geohash)
+
+    # Step 2: Record who added it
+    await audit_log.record_request(http_request, "estate_created", actor=staff_user.phone_e164,
+                                   user_id=staff_user.id, details={"estate_id": str(estate.id)})
+    return estate
+
+
+@router.patch("/{estate_id}", response_model=EstateResponse)
+async def update_estate(estate_id: UUID, request: UpdateEstate, http_request: Request,
+                        db: AsyncSession = Depends(get_home_db), staff_user: User = Depends(get_staff_user)):
+    # Step 1: Apply the changes under a row lock
+    estate = await _get_estate(db, estate_id, for_update=True)
+    previous_geohash = estate.geohash
+    changes = request.model_dump(exclude_unset=True, exclude_none=True)
+    for field, value in changes.items():
+        setattr(estate, field, value)
+
+    # Step 2: Save, dropping cached cells around both the old and the new location
+    await save_estate(db, estate, staff_user.id, previous_geohash=previous_geohash)
+    await db.commit()
+    region_cache.invalidate(estate.geohash, previous_geohash)
+
+    await audit_log.record_request(http_request, "estate_updated", actor=staff_user.phone_e164,
+                                   user_id=staff_user.id, details={"estate_id": str(estate.id),
+                                                                   "fields": sorted(changes)})
+    return {**estate.model_dump(), "units": await _units(db, estate.id)}
+
+
+@router.get("/{estate_id}", response_model=EstateResponse)
+async def get_estate(estate_id: UUID, db: AsyncSession = Depends(get_home_db),
+                     phone_e164: str = Depends(get_current_phone)):
+    estate = await _get_estate(db, estate_id)
+    return {**estate.model_dump(), "units": await _units(db, estate.id)}
+
+
+@router.post("/{estate_id}/units", response_model=EstateUnitResponse, status_code=201)
+async def add_unit(estate_id: UUID, request: EstateUnitRequest, db: AsyncSession = Depends(get_home_db),
+                   staff_user: User = Depends(get_staff_user)):
+    estate = await _get_estate(db, estate_id)
+    unit = EstateUnit(estate_id=estate.id, label=request.label, resident_phone_e164=request.resident_phone_number)
+    db.add(unit)
+    await db.commit()
+    return unit
+
+
+@router.post("/{estate_id}/levies", response_model=LevyRunResponse, status_code=202)
+async def bill_levy(estate_id: UUID, request: LevyRequest, http_request: Request, background_tasks: BackgroundTasks,
+                    db: AsyncSession = Depends(get_home_db), staff_user: User = Depends(get_staff_user)):
+    # Step 1: Create the run and its invoices, or find the one already started for this levy
+    estate = await _get_estate(db, estate_id)
+    run = await create_levy_run(db, estate, request.name, request.period, request.amount)
+    if run.amount != request.amount:
+        raise HTTPException(status_code=409, detail="This levy was already billed with a different amount.")
+    if run.status != "completed" and levy_expired(run):
+        raise HTTPException(status_code=409, detail="This levy is too old to resume.")
+
+    # Step 2: Bill in the background; progress is readable from the run. Resubmitting resumes an unfinished run
+    # unless it is still being billed.
+    if run.status != "completed" and not levy_in_flight(run.id):
+        background_tasks.add_task(run_levy, run.id, providers=sms_registry.ranked())
+
+    await audit_log.record_request(http_request, "levy_billed", actor=staff_user.phone_e164, user_id=staff_user.id,
+                                   details={"estate_id": str(estate.id), "run_id": str(run.id),
+                                            "period": run.period, "amount": str(run.amount)})
+    return run
+
+
+@router.get("/{estate_id}/levies/{run_id}", response_model=LevyRunResponse)
+async def levy_status(estate_id: UUID, run_id: UUID, db: AsyncSession = Depends(get_home_db),
+                      staff_user: User = Depends(get_staff_user)):
+    run = await db.get(LevyRun, run_id)
+    if not run or run.estate_id != estate_id:
+        raise HTTPException(status_code=404, detail="Levy run not found.")
+    return run
@@ -0,0 +1,100 @@
+import asyncio
+import ipaddress
+import os
+from typing import Optional
+
+import dotenv
+
+from .sync import RedisVelocitySync
+from .velocity import VelocityDecision, VelocityEngine, VelocityRule
+
+dotenv.load_dotenv()
+
+FRAUD_MAX_KEYS = int(os.getenv("FRAUD_MAX_KEYS", "200000"))
+# Share counts between app nodes; without it each node enforces limits on its own traffic
+FRAUD_REDIS_URL = os.getenv("FRAUD_REDIS_URL")
+FRAUD_SYNC_SECONDS = float(os.getenv("FRAUD_SYNC_SECONDS", "1.0"))
+# Load balancers and proxies in front of the app (comma-separated addresses or CIDRs); only their
+# X-Forwarded-For is believed, and the per-IP rules never count a proxy's own address
+FRAUD_TRUSTED_PROXIES = [
+    ipaddress.ip_network(entry.strip(), strict=False)
+    for entry in os.getenv("FRAUD_TRUSTED_PROXIES", "").split(",") if entry.strip()
+]
+
+MINUTE = 60
+
+VELOCITY_RULES = [
+    VelocityRule("login_failures_per_phone", "login_failure", "phone", 15 * MINUTE, max_count=5),
+    VelocityRule("login_failures_per_device", "login_failure", "device", 15 * MINUTE, max_count=10),
+    VelocityRule("login_failures_per_ip", "login_failure", "ip", 15 * MINUTE, max_count=50),
+    VelocityRule("login_attempts_per_ip", "login", "ip", 5 * MINUTE, max_count=100),
+]
+
+velocity_engine = VelocityEngine(VELOCITY_RULES, max_keys=FRAUD_MAX_KEYS)
+
+
+def _is_trusted_proxy(address: str) -> bool:
+    try:
+        ip = ipaddress.ip_address(address)
+    except ValueError:
+        return False
+    return any(ip in network for network in FRAUD_TRUSTED_PROXIES)
+
+
+def client_ip(http_request) -> Optional[str]:
+    """
+    The caller's address for the per-IP rules.
+
+    X-Forwarded-For is read right to left and only through FRAUD_TRUSTED_PROXIES,
+    so a client cannot choose its own address. Returns None when the only address
+    known is a proxy's: the per-IP rules then do not apply, instead of treating
+    everyone behind the load balancer as one caller.
+    """
+    peer = http_request.client.host if http_request.client else None
+    if peer is None or not _is_trusted_proxy(peer):
+        return peer
+    forwarded = [address.strip() for header in http_request.headers.getlist("x-forwarded-for")
+                 for address in header.split(",") if address.strip()]
+    for address in reversed(forwarded):
+        if not _is_trusted_proxy(address):
+            return address
+    return None
+
+
+def event_attributes(http_request, phone_number: str, device_id: str = None) -> dict:
+    return {
+        "phone": phone_number,
+        "device": device_id,
+        "ip": client_ip(http_request),
+    }
+
+
+def _combine(*decisions) -> VelocityDecision:
+    reasons = [reason for decision in decisions for reason in decision.reasons]
+    return VelocityDecision(not reasons, max(decision.score for decision in decisions), reasons)
+
+
+def check_login(attributes: dict) -> VelocityDecision:
+    """
+    Decide whether a login attempt may proceed, and count it.
+
+    Blocks a phone, device or IP that has already failed too often, or an IP
+    making too many attempts of any outcome.
+    """
+    decision = _combine(
+        velocity_engine.check("login_failure", attributes),
+        velocity_engine.check("login", attributes),
+    )
+    velocity_engine.record("login", attributes)
+    return decision
+
+
+def record_login_failure(attributes: dict) -> None:
+    velocity_engine.record("login_failure", attributes)
+
+
+async def run_velocity_sync(stop_event: asyncio.Event) -> None:
+    """
+    Share counts through FRAUD_REDIS_URL until stop_event is set. Started from lifespan.
+    """
+    await RedisVelocitySync(velocity_engine, FRAUD_REDIS_URL, FRAUD_SYNC_SECONDS).run(stop_event)
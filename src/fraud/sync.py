@@ -0,0 +1,111 @@
+import asyncio
+import logging
+import os
+import socket
+
+import redis.asyncio as aioredis
+
+logger = logging.getLogger(__name__)
+
+
+class RedisVelocitySync:
+    """
+    Shares velocity counts between app nodes through Redis.
+
+    Each node adds its own per-bucket contributions to one hash per (rule, key)
+    and reads back the other nodes' contributions for the keys it has seen within
+    their window. Events on other nodes become visible within one sync interval;
+    scoring itself never waits on Redis.
+    """
+
+    def __init__(self, engine, url: str, interval: float = 1.0, node_id: str = None, prefix: str = "fraud"):
+        self.engine = engine
+        self.client = aioredis.from_url(url)
+        self.interval = interval
+        self.node_id = node_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.prefix = prefix
+        self.rules = {rule.name: rule for rule in engine.rules}
+        self.pending = {}  # (rule name, key, bucket) -> [count, amount]
+        self.watched = {}  # (rule name, key) -> last event time
+        engine.listeners.append(self._on_record)
+
+    def _on_record(self, rule, key: str, amount: float, now: float) -> None:
+        bucket = self.engine.counters[rule.name].bucket(now)
+        entry = self.pending.get((rule.name, key, bucket))
+        if entry is None:
+            entry = self.pending[(rule.name, key, bucket)] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += amount
+        self.watched[(rule.name, key)] = now
+
+    def _merge_pending(self, pending: dict) -> None:
+        for bucket_key, (count, amount) in pending.items():
+            entry = self.pending.setdefault(bucket_key, [0, 0.0])
+            entry[0] += count
+            entry[1] += amount
+
+    def _hash_name(self, rule_name: str, key: str) -> str:
+        return f"{self.prefix}:{rule_name}:{key}"
+
+    async def sync_once(self) -> None:
+        pending, self.pending = self.pending, {}
+        now = self.engine.clock()
+
+        # Stop following keys nobody here has touched within the rule's window
+        for watched_key, last_seen in list(self.watched.items()):
+            if now - last_seen > self.rules[watched_key[0]].window_seconds:
+                del self.watched[watched_key]
+                self.engine.remote[watched_key[0]].pop(watched_key[1], None)
+        watched = list(self.watched)
+
+        async with self.client.pipeline(transaction=False) as pipe:
+            for (rule_name, key, bucket), (count, amount) in pending.items():
+                name = self._hash_name(rule_name, key)
+                pipe.hincrby(name, f"{bucket}:{self.node_id}:c", count)
+                pipe.hincrbyfloat(name, f"{bucket}:{self.node_id}:a", amount)
+                pipe.expire(name, int(self.rules[rule_name].window_seconds * 2) + 1)
+            for rule_name, key in watched:
+                pipe.hgetall(self._hash_name(rule_name, key))
+            try:
+                results = await pipe.execute()
+            except Exception:
+                # Hand the counts back so the next sync sends them along with whatever arrived meanwhile
+                self._merge_pending(pending)
+                raise
+
+        stale = {}
+        for (rule_name, key), fields in zip(watched, results[len(pending) * 3:]):
+            counter = self.engine.counters[rule_name]
+            oldest = counter.bucket(now) - counter.buckets
+            count, amount = 0, 0.0
+            for field, value in fields.items():
+                bucket, node, kind = field.decode().split(":")
+                if int(bucket) <= oldest:
+                    stale.setdefault(self._hash_name(rule_name, key), []).append(field)
+                elif node != self.node_id:
+                    if kind == "c":
+                        count += int(value)
+                    else:
+                        amount += float(value)
+            self.engine.remote[rule_name][key] = (count, amount)
+
+        if stale:
+            async with self.client.pipeline(transaction=False) as pipe:
+                for name, fields in stale.items():
+                    pipe.hdel(name, *fields)
+                await pipe.execute()
+
+    async def run(self, stop_event: asyncio.Event) -> None:
+        try:
+            while not stop_event.is_set():
+                try:
+                    await self.sync_once()
+                except Exception:
+                    # Keep scoring on local counts while Redis is unavailable
+                    logger.exception("Velocity sync failed")
+                try:
+                    await asyncio.wait_for(stop_event.wait(), self.interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            await self.client.aclose()
@@ -0,0 +1,216 @@
+import time
+from array import array
+from collections import OrderedDict
+
+
+class _Window:
+    """
+    Ring buffer of per-bucket counts and amounts for one key, plus running totals.
+
+    Buckets are reset lazily as time moves forward, so recording and reading
+    are O(1) amortised regardless of how many buckets the window has. Most keys
+    are seen in a single bucket only, so the arrays are allocated on the first
+    event in a second bucket and the totals stand in for them until then.
+    """
+
+    __slots__ = ("last_bucket", "counts", "amounts", "total_count", "total_amount")
+
+    def __init__(self, bucket: int):
+        self.last_bucket = bucket
+        self.counts = None
+        self.amounts = None
+        self.total_count = 0
+        self.total_amount = 0.0
+
+    def advance(self, bucket: int, buckets: int) -> None:
+        elapsed = bucket - self.last_bucket
+        if elapsed <= 0:
+            return
+        if elapsed >= buckets:
+            self.counts = self.amounts = None
+            self.total_count = 0
+            self.total_amount = 0.0
+        elif self.counts is None:
+            if self.total_count:
+                self.counts = array("I", bytes(4 * buckets))
+                self.amounts = array("d", bytes(8 * buckets))
+                index = self.last_bucket % buckets
+                self.counts[index] = self.total_count
+                self.amounts[index] = self.total_amount
+        else:
+            counts, amounts = self.counts, self.amounts
+            for expired in range(self.last_bucket + 1, bucket + 1):
+                index = expired % buckets
+                self.total_count -= counts[index]
+                self.total_amount -= amounts[index]
+                counts[index] = 0
+                amounts[index] = 0.0
+        self.last_bucket = bucket
+
+    def add(self, bucket: int, buckets: int, amount: float) -> None:
+        self.advance(bucket, buckets)
+        if self.counts is not None:
+            index = bucket % buckets
+            self.counts[index] += 1
+            self.amounts[index] += amount
+        self.total_count += 1
+        self.total_amount += amount
+
+
+class SlidingWindowCounter:
+    """
+    Event counts and amount sums per key over a rolling window.
+
+    The window is split into fixed buckets (resolution = window / buckets), so
+    totals are exact to within one bucket. At most max_keys keys are tracked;
+    the least recently touched key is evicted first.
+    """
+
+    def __init__(self, window_seconds: float, buckets: int = 60, max_keys: int = 100_000, clock=time.time):
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.resolution = window_seconds / buckets
+        self.max_keys = max_keys
+        self.clock = clock
+        self.windows = OrderedDict()
+        self.evictions = 0
+
+    def bucket(self, now: float = None) -> int:
+        return int((self.clock() if now is None else now) // self.resolution)
+
+    def add(self, key: str, amount: float = 0.0, now: float = None) -> tuple:
+        """
+        Record one event for key.
+
+        Returns:
+            tuple: (count, amount) for key over the window, including this event.
+        """
+        bucket = self.bucket(now)
+        window = self.windows.get(key)
+        if window is None:
+            window = self.windows[key] = _Window(bucket)
+            if len(self.windows) > self.max_keys:
+                self.windows.popitem(last=False)
+                self.evictions += 1
+        else:
+            self.windows.move_to_end(key)
+        window.add(bucket, self.buckets, amount)
+        return window.total_count, window.total_amount
+
+    def get(self, key: str, now: float = None) -> tuple:
+        """
+        Returns:
+            tuple: (count, amount) for key over the window; (0, 0.0) if unknown.
+        """
+        window = self.windows.get(key)
+        if window is None:
+            return 0, 0.0
+        window.advance(self.bucket(now), self.buckets)
+        return window.total_count, window.total_amount
+
+    def __len__(self) -> int:
+        return len(self.windows)
+
+
+class VelocityRule:
+    def __init__(self, name: str, event_type: str, dimension: str, window_seconds: float,
+                 max_count: int = None, max_amount: float = None):
+        """
+        Args:
+            name (str): Shown in decisions and logs, e.g. 'login_failures_per_phone'.
+            event_type (str): Events the rule counts, e.g. 'login_failure' or 'transfer'.
+            dimension (str): Event attribute the rule is keyed on: 'phone', 'device' or 'ip'.
+            window_seconds (float): Length of the rolling window.
+            max_count (int): Events allowed per key within the window.
+            max_amount (float): Total amount allowed per key within the window.
+        """
+        self.name = name
+        self.event_type = event_type
+        self.dimension = dimension
+        self.window_seconds = window_seconds
+        self.max_count = max_count
+        self.max_amount = max_amount
+
+
+class VelocityDecision:
+    __slots__ = ("allowed", "score", "reasons")
+
+    def __init__(self, allowed: bool, score: float, reasons: list):
+        self.allowed = allowed
+        self.score = score
+        self.reasons = reasons
+
+
+class VelocityEngine:
+    """
+    Evaluates velocity rules against a stream of events.
+
+    check() scores an event against what has been seen so far without recording
+    it; record() adds it. Scores are the highest usage ratio across matching
+    rules, so 1.0 means some limit has been reached.
+    """
+
+    def __init__(self, rules: list, max_keys: int = 100_000, buckets: int = 60, clock=time.time):
+        self.rules = rules
+        self.clock = clock
+        self.counters = {
+            rule.name: SlidingWindowCounter(rule.window_seconds, buckets, max_keys, clock) for rule in rules
+        }
+        self._rules_by_event = {}
+        for rule in rules:
+            self._rules_by_event.setdefault(rule.event_type, []).append(rule)
+        # Filled by a sync backend with totals seen by other nodes: rule name -> {key: (count, amount)}
+        self.remote = {rule.name: {} for rule in rules}
+        self.listeners = []
+
+    def _totals(self, rule: VelocityRule, key: str, now: float) -> tuple:
+        count, amount = self.counters[rule.name].get(key, now)
+        remote_count, remote_amount = self.remote[rule.name].get(key, (0, 0.0))
+        return count + remote_count, amount + remote_amount
+
+    def check(self, event_type: str, attributes: dict, amount: float = 0.0, now: float = None) -> VelocityDecision:
+        """
+        Score an event as if it were recorded now, without recording it.
+
+        Args:
+            event_type (str): e.g. 'login', 'login_failure', 'transfer'.
+            attributes (dict): Dimension values, e.g. {'phone': ..., 'device': ..., 'ip': ...}.
+            amount (float): Monetary amount, for amount limits.
+            now (float): Event time in epoch seconds; defaults to the clock.
+
+        Returns:
+            VelocityDecision: Whether to allow it, its score and the rules it would break.
+        """
+        now = self.clock() if now is None else now
+        score = 0.0
+        reasons = []
+        for rule in self._rules_by_event.get(event_type, ()):
+            key = attributes.get(rule.dimension)
+            if key is None:
+                continue
+            count, total = self._totals(rule, key, now)
+            count, total = count + 1, total + amount
+            if rule.max_count:
+                score = max(score, count / rule.max_count)
+                if count > rule.max_count:
+                    reasons.append(rule.name)
+                    continue
+            if rule.max_amount:
+                score = max(score, total / rule.max_amount)
+                if total > rule.max_amount:
+                    reasons.append(rule.name)
+        return VelocityDecision(not reasons, score, reasons)
+
+    def record(self, event_type: str, attributes: dict, amount: float = 0.0, now: float = None) -> None:
+        now = self.clock() if now is None else now
+        for rule in self._rules_by_event.get(event_type, ()):
+            key = attributes.get(rule.dimension)
+            if key is None:
+                continue
+            self.counters[rule.name].add(key, amount, now)
+            for listener in self.listeners:
+                listener(rule, key, amount, now)
+
+    def count(self, rule_name: str, key: str, now: float = None) -> tuple:
+        rule = next(rule for rule in self.rules if rule.name == rule_name)
+        return self._totals(rule, key, self.clock() if now is None else now)
@@ -1,8 +1,28 @@
+import asyncio
+import os
+
 from fastapi import FastAPI
 from sqlalchemy import event
 
-from .database import init_db, async_engine
+from .database import (
+    init_db, async_engine, replica_engines, monitor_replicas, shard_engines, shard_router, shard_urls,
+)
 from .api import router
+from .audit.tables import ensure_audit_tables
+from .audit.writer import audit_log
+from .authentications.hashing import PASSWORD_HASH_CALIBRATE, password_policy
+from .debug.loop_monitor import loop_monitor
+from .fraud.services import FRAUD_REDIS_URL, run_velocity_sync
+from .http_client import close_http_client
+from .media.services import shutdown_image_pool
+from .notifications.bulk import resume_campaigns
+from .notifications.delivery import delivery_tracker
+from .notifications.push import listen_for_events
+from .outbox.relay import run_relay
+from .partitions import maintain_partitions, run_partition_maintenance
+from .notifications.services import sms_registry
+from .settings.services import get_settings, missing_required, settings_store
+from .transactions.scheduler import run_scheduler
 from sqlmodel import SQLModel
 from contextlib import asynccontextmanager
 from sqlalchemy.ext.asyncio import AsyncEngine
@@ -10,19 +30,88 @@ from sqlalchemy.ext.asyncio import AsyncEngine
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    # Refuse to serve with secrets left at nothing
+    missing = missing_required(get_settings())
+    if missing:
+        raise RuntimeError(f"Set {', '.join(missing)} in the environment before starting")
+
     # Run any startup tasks
     await init_db()
+    # Apply setting overrides from the table and file before serving anything
+    await settings_store.refresh(shard_router.session_factory())
+    # The audit log lives on the home database only; the other partitioned tables on every shard
+    async with async_engine.begin() as conn:
+        await ensure_audit_tables(conn)
+    for name, engine in shard_engines.items():
+        async with engine.begin() as conn:
+            await maintain_partitions(conn, home=name == shard_router.home)
+    audit_log.start()
+    delivery_tracker.start()
+    # Fit PIN hashing cost to this machine's speed
+    if PASSWORD_HASH_CALIBRATE:
+        await asyncio.to_thread(password_policy.calibrate)
+
+    stop_background = asyncio.Event()
+    background_tasks = []
+
+    # Pick up setting and feature flag changes without a restart
+    background_tasks.append(asyncio.create_task(settings_store.run(shard_router.session_factory(), stop_background)))
+
+    # Finish SMS campaigns a crash or restart left half sent
+    background_tasks.append(asyncio.create_task(
+        resume_campaigns(shard_router.session_factory(), sms_registry.ranked(), stop_background)
+    ))
+
+    # Measure event loop lag and log whatever blocks the loop
+    background_tasks.append(asyncio.create_task(loop_monitor.run(stop_background)))
+
+    # Collect due loan repayments in-process unless a dedicated worker does it
+    if os.getenv("REPAYMENT_SCHEDULER_ENABLED", "false").lower() == "true":
+        for session_factory in shard_router.session_factories.values():
+            background_tasks.append(asyncio.create_task(run_scheduler(session_factory, stop_background)))
+
+    # Keep track of which read replicas are usable
+    if replica_engines:
+        background_tasks.append(asyncio.create_task(monitor_replicas(stop_background)))
+
+    # Publish outbox events; workers elect a single active relay between them
+    if os.getenv("OUTBOX_RELAY_ENABLED", "false").lower() == "true":
+        for engine in shard_engines.values():
+            background_tasks.append(asyncio.create_task(run_relay(stop_background, engine=engine)))
+
+    # Share fraud velocity counts with the other app nodes
+    if FRAUD_REDIS_URL:
+        background_tasks.append(asyncio.create_task(run_velocity_sync(stop_background)))
+
+    for name, engine in shard_engines.items():
+        # Keep future partitions created and retire expired ones
+        background_tasks.append(asyncio.create_task(
+            run_partition_maintenance(stop_background, engine, home=name == shard_router.home)
+        ))
+        # Fan account events from every worker out to this worker's WebSocket clients
+        background_tasks.append(asyncio.create_task(listen_for_events(shard_urls[name], stop_background)))
+
     yield
+
     # Run any shutdown tasks if needed
+    stop_background.set()
+    await asyncio.gather(*background_tasks)
+    await audit_log.stop()
+    await delivery_tracker.stop()
+    await close_http_client()
+    shutdown_image_pool()
 
 
-@event.listens_for(async_engine.sync_engine, "connect")
 def set_timezone(dbapi_connection, connection_record):
     cursor = dbapi_connection.cursor()
     cursor.execute("SET TIME ZONE 'UTC';")
     cursor.close()
 
 
+for engine in [*shard_engines.values(), *replica_engines]:
+    event.listen(engine.sync_engine, "connect", set_timezone)
+
+
 # Initialize the FastAPI application
 app = FastAPI(
     title="Ckash Fintech App",
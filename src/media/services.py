@@ -0,0 +1,78 @@
+import asyncio
+import hashlib
+import os
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+
+import dotenv
+
+from .storage import image_store
+from .variants import VARIANT_FORMATS, VARIANT_SIZES, render_variants
+
+dotenv.load_dotenv()
+
+IMAGE_WORKERS = int(os.getenv("IMAGE_WORKERS", "2"))
+
+_pool = None
+
+
+def _image_pool() -> ProcessPoolExecutor:
+    # Created on first upload so workers that never handle one don't fork
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=IMAGE_WORKERS)
+    return _pool
+
+
+def shutdown_image_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(cancel_futures=True)
+        _pool = None
+
+
+async def store_image(kind: str, image) -> dict:
+    """
+    Render every size variant of an image off the event loop and store them.
+
+    Keys are derived from the content hash, so re-uploading the same picture
+    is idempotent and the stored files never change once written.
+
+    Args:
+        kind (str): Key prefix, e.g. "avatars".
+        image: PIL image or encoded image bytes.
+
+    Returns:
+        dict: Variant name such as "128.webp" or "original.png" -> URL.
+    """
+    if not isinstance(image, bytes):
+        buffer = BytesIO()
+        image.save(buffer, format="PNG")
+        image = buffer.getvalue()
+
+    digest = hashlib.sha256(image).hexdigest()[:32]
+    variants = await asyncio.get_running_loop().run_in_executor(_image_pool(), render_variants, image)
+    urls = await asyncio.gather(*(image_store.save(f"{kind}/{digest}/{name}", data) for name, data in variants.items()))
+    return dict(zip(variants, urls))
+
+
+async def store_avatar(image) -> str:
+    """
+    Returns:
+        str: URL of the full-size PNG; avatar_variants() derives the thumbnails from it.
+    """
+    return (await store_image("avatars", image))["original.png"]
+
+
+def avatar_variants(profile_picture: str):
+    """
+    Thumbnail URLs for an avatar stored by store_avatar.
+
+    Returns:
+        dict: e.g. {"64.webp": url, ..., "256.png": url}, or None for avatars
+        uploaded before variants existed.
+    """
+    if not profile_picture or not profile_picture.endswith("/original.png"):
+        return None
+    base = profile_picture[:-len("original.png")]
+    return {f"{size}.{extension}": f"{base}{size}.{extension}" for size in VARIANT_SIZES for extension in VARIANT_FORMATS}
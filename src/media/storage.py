@@ -0,0 +1,121 @@
+import asyncio
+import os
+import re
+from abc import ABC, abstractmethod
+from io import BytesIO
+
+import cloudinary
+import cloudinary.uploader
+import dotenv
+
+dotenv.load_dotenv()
+
+# "local", "s3" or "cloudinary"
+IMAGE_STORE = os.getenv("IMAGE_STORE", "cloudinary")
+IMAGE_STORE_PATH = os.getenv("IMAGE_STORE_PATH", "media")
+# Where clients fetch locally stored images; the app serves them under /v1/media unless a CDN or nginx fronts the directory
+MEDIA_BASE_URL = os.getenv("MEDIA_BASE_URL", "/v1/media")
+
+S3_BUCKET = os.getenv("S3_BUCKET")
+S3_ENDPOINT_URL = os.getenv("S3_ENDPOINT_URL")  # e.g. a MinIO or R2 endpoint
+S3_PUBLIC_URL = os.getenv("S3_PUBLIC_URL")
+
+cloudinary.config(
+    cloud_name=os.getenv("CLOUDINARY_CLOUD_NAME"),
+    api_key=os.getenv("CLOUDINARY_API_KEY"),
+    api_secret=os.getenv("CLOUDINARY_API_SECRET")
+)
+
+# Keys are content-addressed paths such as "avatars/3f9a.../128.webp"
+KEY_PATTERN = re.compile(r"^[a-z]+/[0-9a-f]{16,64}/[a-z0-9]+\.(png|webp)$")
+CONTENT_TYPES = {"png": "image/png", "webp": "image/webp"}
+
+
+def content_type_for(key: str) -> str:
+    return CONTENT_TYPES[key.rsplit(".", 1)[1]]
+
+
+class ImageStore(ABC):
+    """
+    Where image bytes live. Keys are immutable: the same key always holds the
+    same bytes, so anything served from a store can be cached indefinitely.
+    """
+
+    @abstractmethod
+    async def save(self, key: str, data: bytes) -> str:
+        """
+        Store data under key.
+
+        Returns:
+            str: URL clients fetch the image from.
+        """
+
+    def path(self, key: str):
+        """Local file holding key, for stores the app serves itself; None otherwise."""
+        return None
+
+
+class LocalImageStore(ImageStore):
+    def __init__(self, root: str = IMAGE_STORE_PATH, base_url: str = MEDIA_BASE_URL):
+        self.root = os.path.abspath(root)
+        self.base_url = base_url.rstrip("/")
+
+    def _write(self, key: str, data: bytes) -> None:
+        path = os.path.join(self.root, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a concurrent reader never sees a partial file
+        temporary = f"{path}.{os.getpid()}.tmp"
+        with open(temporary, "wb") as handle:
+            handle.write(data)
+        os.replace(temporary, path)
+
+    async def save(self, key: str, data: bytes) -> str:
+        await asyncio.to_thread(self._write, key, data)
+        return f"{self.base_url}/{key}"
+
+    def path(self, key: str):
+        if not KEY_PATTERN.match(key):
+            return None
+        path = os.path.join(self.root, key)
+        return path if os.path.isfile(path) else None
+
+
+class S3ImageStore(ImageStore):
+    """Any S3-compatible bucket; objects are written with a year-long immutable Cache-Control."""
+
+    def __init__(self, bucket: str = S3_BUCKET, endpoint_url: str = S3_ENDPOINT_URL, public_url: str = S3_PUBLIC_URL):
+        import boto3
+
+        self.bucket = bucket
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+        self.public_url = (public_url or f"{endpoint_url}/{bucket}").rstrip("/")
+
+    async def save(self, key: str, data: bytes) -> str:
+        await asyncio.to_thread(
+            self.client.put_object, Bucket=self.bucket, Key=key, Body=data,
+            ContentType=content_type_for(key), CacheControl="public, max-age=31536000, immutable",
+        )
+        return f"{self.public_url}/{key}"
+
+
+class CloudinaryImageStore(ImageStore):
+    async def save(self, key: str, data: bytes) -> str:
+        public_id, extension = key.rsplit(".", 1)
+        response = await asyncio.to_thread(
+            cloudinary.uploader.upload, BytesIO(data), resource_type="image", public_id=public_id,
+            format=extension, overwrite=False,
+        )
+        return response["secure_url"]
+
+
+def create_image_store(kind: str = IMAGE_STORE) -> ImageStore:
+    if kind == "local":
+        return LocalImageStore()
+    if kind == "s3":
+        return S3ImageStore()
+    if kind == "cloudinary":
+        return CloudinaryImageStore()
+    raise ValueError(f"Unknown IMAGE_STORE: {kind!r}")
+
+
+image_store = create_image_store()
@@ -0,0 +1,42 @@
+"""
+Resizing and encoding of uploaded images. Runs in worker processes, so
+everything here takes and returns plain bytes.
+"""
+from io import BytesIO
+
+from PIL import Image
+
+VARIANT_SIZES = (64, 128, 256)
+VARIANT_FORMATS = {"webp": {"format": "WEBP", "quality": 82, "method": 4}, "png": {"format": "PNG", "optimize": True}}
+
+
+def render_variants(data: bytes, sizes: tuple = VARIANT_SIZES) -> dict:
+    """
+    Produce square thumbnails of an image in every variant format, plus the original as PNG.
+
+    Args:
+        data (bytes): Encoded source image in any format Pillow reads.
+        sizes (tuple): Edge lengths in pixels.
+
+    Returns:
+        dict: Variant name such as "128.webp" or "original.png" -> encoded bytes.
+    """
+    source = Image.open(BytesIO(data))
+    source = source.convert("RGBA" if "A" in source.getbands() else "RGB")
+    # Centre-crop to a square so every variant has the same framing
+    edge = min(source.size)
+    left, top = (source.width - edge) // 2, (source.height - edge) // 2
+    square = source.crop((left, top, left + edge, top + edge))
+
+    variants = {"original.png": _encode(source, VARIANT_FORMATS["png"])}
+    for size in sizes:
+        resized = square.resize((size, size), Image.Resampling.LANCZOS) if size < edge else square
+        for extension, options in VARIANT_FORMATS.items():
+            variants[f"{size}.{extension}"] = _encode(resized, options)
+    return variants
+
+
+def _encode(image: Image.Image, options: dict) -> bytes:
+    buffer = BytesIO()
+    image.save(buffer, **options)
+    return buffer.getvalue()
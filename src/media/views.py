@@ -0,0 +1,27 @@
+from fastapi import APIRouter, Header, Response
+from fastapi.exceptions import HTTPException
+from fastapi.responses import FileResponse
+
+from .storage import content_type_for, image_store
+
+router = APIRouter(prefix="/media", tags=["media"])
+
+# Keys are content-addressed, so a response never goes stale
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+@router.get("/{key:path}")
+async def get_image(key: str, if_none_match: str = Header(None)):
+    # Step 1: Only keys the local store wrote are served; this also rules out path traversal
+    path = image_store.path(key)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Image not found.")
+
+    # Step 2: The content hash in the key is a strong validator for its bytes
+    etag = f'"{key.split("/")[1]}-{key.rsplit("/", 1)[1]}"'
+    headers = {"Cache-Control": IMMUTABLE_CACHE_CONTROL, "ETag": etag}
+    if if_none_match and etag in (candidate.strip() for candidate in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+
+    # Step 3: Stream the file from disk without reading it into memory first
+    return FileResponse(path, media_type=content_type_for(key), headers=headers)
@@ -0,0 +1,281 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from uuid import UUID
+
+import dotenv
+from sqlalchemy import bindparam, select, update
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import Campaign, CampaignRecipient
+from .providers import BULK_CHUNK_LIMIT
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+BULK_SMS_RATE_PER_SECOND = float(os.getenv("BULK_SMS_RATE_PER_SECOND", "1000"))
+BULK_SEND_CHUNK_SIZE = min(int(os.getenv("BULK_SEND_CHUNK_SIZE", "500")), BULK_CHUNK_LIMIT)
+RECIPIENT_INSERT_CHUNK_SIZE = 5000
+
+campaigns = Campaign.__table__
+recipients = CampaignRecipient.__table__
+
+
+class TokenBucket:
+    """
+    Async token bucket. acquire(n) waits until n tokens are available, so
+    every campaign sending from this process shares one messages-per-second budget.
+    """
+
+    def __init__(self, rate: float, capacity: float = None):
+        self.rate = rate
+        self.capacity = capacity or rate
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: float = 1) -> None:
+        if tokens > self.capacity:
+            raise ValueError("Cannot acquire more tokens than the bucket holds.")
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= tokens:
+                    self.tokens -= tokens
+                    return
+                await asyncio.sleep((tokens - self.tokens) / self.rate)
+
+
+# Shared by every campaign in this process; divide the provider's limit by the worker count
+send_budget = TokenBucket(BULK_SMS_RATE_PER_SECOND, max(BULK_SMS_RATE_PER_SECOND, BULK_SEND_CHUNK_SIZE))
+
+
+async def _iterate(phone_numbers):
+    if hasattr(phone_numbers, "__aiter__"):
+        async for phone_number in phone_numbers:
+            yield phone_number
+    else:
+        for phone_number in phone_numbers:
+            yield phone_number
+
+
+async def create_campaign(db_session: AsyncSession, name: str, message: str, phone_numbers) -> Campaign:
+    """
+    Create a campaign and queue its recipients in batched inserts.
+
+    Args:
+        db_session (AsyncSession): The database session.
+        name (str): Campaign name, for reporting.
+        message (str): The text every recipient receives.
+        phone_numbers: Iterable or async iterable of recipient phone numbers.
+
+    Returns:
+        Campaign: The new campaign, with total_count filled in.
+    """
+    campaign = Campaign(name=name, message=message)
+    db_session.add(campaign)
+    await db_session.flush()
+
+    total = await add_recipients(db_session, campaign.id, phone_numbers)
+    campaign.total_count = total
+    await db_session.commit()
+    return campaign
+
+
+async def add_recipients(db_session: AsyncSession, campaign_id: UUID, phone_numbers) -> int:
+    """
+    Queue recipients for a campaign. Numbers already queued are skipped, so a
+    partially loaded stream can simply be replayed.
+
+    Returns:
+        int: Number of recipients newly queued.
+    """
+    queued = 0
+    chunk = []
+
+    async def flush():
+        if not chunk:
+            return 0
+        statement = (
+            insert(recipients)
+            .values([{"campaign_id": campaign_id, "phone_number": phone_number} for phone_number in chunk])
+            .on_conflict_do_nothing(index_elements=["campaign_id", "phone_number"])
+        )
+        result = await db_session.execute(statement)
+        chunk.clear()
+        return result.rowcount
+
+    async for phone_number in _iterate(phone_numbers):
+        chunk.append(phone_number)
+        if len(chunk) >= RECIPIENT_INSERT_CHUNK_SIZE:
+            queued += await flush()
+    queued += await flush()
+    return queued
+
+
+async def _send_chunk(providers: list, phone_numbers: list, message: str) -> dict:
+    """
+    Send one chunk, passing whatever a provider could not send on to the next one.
+
+    Returns:
+        dict: (provider name, provider message id) per number sent; numbers missing from it failed.
+    """
+    sent = {}
+    failed = phone_numbers
+    for provider in providers:
+        response = await provider.send_bulk(failed, message)
+        still_failed = set(response.get("failed", []))
+        message_ids = response.get("message_ids") or {}
+        for phone_number in failed:
+            if phone_number not in still_failed:
+                message_id = message_ids.get(phone_number)
+                sent[phone_number] = (provider.name, str(message_id) if message_id else None)
+        failed = [phone_number for phone_number in failed if phone_number in still_failed]
+        if not failed:
+            break
+    return sent
+
+
+async def run_campaign(session_factory, campaign_id: UUID, providers: list,
+                       chunk_size: int = BULK_SEND_CHUNK_SIZE, budget: TokenBucket = send_budget,
+                       stop_event: asyncio.Event = None) -> dict:
+    """
+    Send a campaign to every queued recipient.
+
+    Recipients are read in keyset order, sent in provider bulk requests within the
+    shared rate budget, and their state is written back with one UPDATE per outcome
+    per chunk. Only 'queued' rows are read, so running this again after a crash
+    picks up where the last committed chunk left off (see resume_campaigns).
+
+    Each chunk is claimed with FOR UPDATE SKIP LOCKED until its state is committed,
+    so two runs of the same campaign never send to the same recipient.
+
+    Args:
+        session_factory: Callable returning a new AsyncSession.
+        campaign_id (UUID): The campaign to send.
+        providers (list): SMS providers in preference order.
+        chunk_size (int): Recipients per provider request.
+        budget (TokenBucket): Rate limiter shared across campaigns.
+        stop_event (asyncio.Event): Optional event that ends the run between chunks,
+            leaving the campaign 'sending' for a later resume.
+
+    Returns:
+        dict: Counts of sent and failed recipients plus messages per second.
+    """
+    sent_total, failed_total = 0, 0
+    started = time.perf_counter()
+    last_id = None
+
+    async with session_factory() as db_session:
+        campaign = await db_session.get(Campaign, campaign_id)
+        if not campaign:
+            return {"success": False, "message": "Campaign not found."}
+        message = campaign.message
+        campaign.status = "sending"
+        await db_session.commit()
+
+        while stop_event is None or not stop_event.is_set():
+            # Step 1: Claim the next chunk of queued recipients
+            statement = select(recipients.c.id, recipients.c.phone_number).where(
+                recipients.c.campaign_id == campaign_id,
+                recipients.c.status == "queued",
+            )
+            if last_id is not None:
+                statement = statement.where(recipients.c.id > last_id)
+            statement = statement.order_by(recipients.c.id).limit(chunk_size).with_for_update(skip_locked=True)
+            rows = (await db_session.execute(statement)).all()
+            if not rows:
+                break
+            last_id = rows[-1].id
+
+            # Step 2: Send it within the rate budget
+            await budget.acquire(len(rows))
+            sent = await _send_chunk(providers, [row.phone_number for row in rows], message)
+            sent_ids = [row.id for row in rows if row.phone_number in sent]
+            failed_ids = [row.id for row in rows if row.phone_number not in sent]
+
+            # Step 3: Record delivery state for the whole chunk at once, with the id delivery reports will quote
+            time_now = datetime.now(timezone.utc)
+            if sent_ids:
+                await db_session.execute(
+                    update(recipients).where(recipients.c.id == bindparam("b_id")).values(
+                        status="sent", provider=bindparam("b_provider"),
+                        provider_message_id=bindparam("b_message_id"), updated_date=time_now,
+                    ),
+                    [
+                        {"b_id": row.id, "b_provider": sent[row.phone_number][0],
+                         "b_message_id": sent[row.phone_number][1]}
+                        for row in rows if row.phone_number in sent
+                    ],
+                )
+            if failed_ids:
+                await db_session.execute(
+                    update(recipients).where(recipients.c.id.in_(failed_ids))
+                    .values(status="failed", updated_date=time_now)
+                )
+            await db_session.execute(
+                update(campaigns).where(campaigns.c.id == campaign_id).values(
+                    sent_count=campaigns.c.sent_count + len(sent_ids),
+                    failed_count=campaigns.c.failed_count + len(failed_ids),
+                )
+            )
+            await db_session.commit()
+            sent_total += len(sent_ids)
+            failed_total += len(failed_ids)
+
+        # Another run may still hold some recipients; whichever finishes the last chunk completes the campaign
+        unsent = select(recipients.c.id).where(
+            recipients.c.campaign_id == campaign_id, recipients.c.status == "queued"
+        ).exists()
+        await db_session.execute(
+            update(campaigns).where(campaigns.c.id == campaign_id, ~unsent).values(status="completed")
+        )
+        await db_session.commit()
+
+    elapsed = time.perf_counter() - started
+    rate = (sent_total + failed_total) / elapsed if elapsed else 0.0
+    logger.info("Campaign %s: %d sent, %d failed, %.1f messages/s", campaign_id, sent_total, failed_total, rate)
+    return {
+        "success": True,
+        "sent": sent_total,
+        "failed": failed_total,
+        "elapsed_seconds": round(elapsed, 3),
+        "messages_per_second": round(rate, 1),
+    }
+
+
+async def resume_campaigns(session_factory, providers: list, stop_event: asyncio.Event = None) -> int:
+    """
+    Finish the campaigns a crash or restart left unsent: every campaign still
+    'queued' or 'sending' is run again, oldest first. Recipients are claimed with
+    SKIP LOCKED, so a campaign another worker is still sending is not sent twice.
+    Started as a background task from the app lifespan.
+
+    Returns:
+        int: Number of campaigns resumed.
+    """
+    async with session_factory() as db_session:
+        statement = (
+            select(campaigns.c.id)
+            .where(campaigns.c.status.in_(["queued", "sending"]))
+            .order_by(campaigns.c.created_date)
+        )
+        campaign_ids = (await db_session.execute(statement)).scalars().all()
+
+    for campaign_id in campaign_ids:
+        if stop_event is not None and stop_event.is_set():
+            break
+        try:
+            await run_campaign(session_factory, campaign_id, providers, stop_event=stop_event)
+        except Exception:
+            # Its recipients stay queued for the next resume
+            logger.exception("Resuming campaign %s failed", campaign_id)
+    if campaign_ids:
+        logger.info("Resumed %d unfinished campaigns", len(campaign_ids))
+    return len(campaign_ids)
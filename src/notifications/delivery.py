@@ -0,0 +1,274 @@
+import asyncio
+import hashlib
+import hmac
+import logging
+import os
+import time
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import dotenv
+from sqlalchemy import text
+
+from src.database import async_engine
+from .services import sms_registry
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SMS_RECEIPT_BUFFER_SIZE = int(os.getenv("SMS_RECEIPT_BUFFER_SIZE", "100000"))
+SMS_RECEIPT_BATCH_SIZE = int(os.getenv("SMS_RECEIPT_BATCH_SIZE", "5000"))
+SMS_RECEIPT_FLUSH_SECONDS = float(os.getenv("SMS_RECEIPT_FLUSH_SECONDS", "1.0"))
+# Shared secret providers sign delivery-report webhooks with; every report is refused while it is unset
+SMS_WEBHOOK_SECRET = os.getenv("SMS_WEBHOOK_SECRET")
+SMS_FLUSH_ATTEMPTS = 3
+# Flushes a receipt is retried for when its message is not recorded yet (sent from another worker
+# whose own buffer has not flushed); after that it is dropped
+UNMATCHED_RECEIPT_FLUSHES = 5
+
+# Final outcomes in providers' delivery reports; anything else ('Message Sent', 'Accepted') is interim
+DELIVERED_STATUSES = {"delivered", "delivrd"}
+FAILED_STATUSES = {
+    "failed", "message failed", "rejected", "expired", "undelivered", "undeliv", "dnd active on phone number",
+}
+
+INSERT_SENT = """
+INSERT INTO sms_messages (id, provider, provider_message_id, phone_number, status, sent_date)
+SELECT s.id, s.provider, s.message_id, s.phone_number, 'sent', s.sent_date
+FROM unnest(CAST(:ids AS uuid[]), CAST(:providers AS text[]), CAST(:message_ids AS text[]),
+            CAST(:phone_numbers AS text[]), CAST(:sent_dates AS timestamptz[]))
+     AS s(id, provider, message_id, phone_number, sent_date)
+ON CONFLICT (provider, provider_message_id) DO NOTHING
+"""
+
+# One statement per batch however large it is: the receipts travel as four arrays and are joined as a table
+APPLY_RECEIPTS = """
+UPDATE sms_messages AS m
+SET status = r.status, delivered_date = r.delivered_date, updated_date = now()
+FROM unnest(CAST(:providers AS text[]), CAST(:message_ids AS text[]), CAST(:statuses AS text[]),
+            CAST(:delivered_dates AS timestamptz[])) AS r(provider, message_id, status, delivered_date)
+WHERE m.provider = r.provider AND m.provider_message_id = r.message_id AND m.status = 'sent'
+RETURNING m.provider, m.provider_message_id, m.status, m.sent_date, m.delivered_date
+"""
+
+KNOWN_MESSAGES = """
+SELECT m.provider, m.provider_message_id FROM sms_messages AS m
+JOIN unnest(CAST(:providers AS text[]), CAST(:message_ids AS text[])) AS r(provider, message_id)
+  ON m.provider = r.provider AND m.provider_message_id = r.message_id
+"""
+
+
+def verify_signature(body: bytes, signature: str, secret: str = SMS_WEBHOOK_SECRET) -> bool:
+    """
+    Check a webhook's HMAC-SHA512 signature (Termii's X-Termii-Signature scheme).
+    Fails closed: nothing verifies when no secret is configured.
+    """
+    if not secret:
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha512).hexdigest()
+    return bool(signature) and hmac.compare_digest(expected, signature)
+
+
+def _parse_time(value):
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except ValueError:
+        return None
+    return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+
+def parse_receipt(source: str, payload: dict, received_at: datetime = None):
+    """
+    Turn one delivery report into (provider, provider message id, status, delivered at).
+
+    Args:
+        source (str): Webhook the report came in on: 'termii', or the name of a
+            Termii-compatible provider such as SECONDARY_SMS_NAME.
+        payload (dict): The report as posted.
+        received_at (datetime): Used as the delivery time when the report carries none.
+
+    Returns:
+        tuple: With status 'delivered' or 'failed', or None for interim and malformed reports.
+    """
+    message_id = payload.get("message_id")
+    raw_status = str(payload.get("status", "")).strip().lower()
+    if not message_id:
+        return None
+    if raw_status in DELIVERED_STATUSES:
+        status = "delivered"
+    elif raw_status in FAILED_STATUSES:
+        status = "failed"
+    else:
+        return None
+    # Termii reports both channels to one webhook; routing tracks them as separate providers
+    provider = f"termii-{payload.get('channel') or 'generic'}" if source == "termii" else source
+    delivered_at = _parse_time(payload.get("delivered_at") or payload.get("done_date"))
+    return provider, str(message_id), status, delivered_at or received_at or datetime.now(timezone.utc)
+
+
+class DeliveryTracker:
+    """
+    Records which provider message ids were sent, and applies delivery reports
+    to them in bulk.
+
+    Sends and receipts are buffered in memory and written in batches of up to
+    batch_size, at most flush_seconds after the first one arrived. Each applied
+    receipt feeds the provider's delivery latency and success rate into the SMS
+    routing stats of this worker.
+    """
+
+    def __init__(self, engine=async_engine, registry=sms_registry, buffer_size: int = SMS_RECEIPT_BUFFER_SIZE,
+                 batch_size: int = SMS_RECEIPT_BATCH_SIZE, flush_seconds: float = SMS_RECEIPT_FLUSH_SECONDS):
+        self.engine = engine
+        self.registry = registry
+        self.batch_size = batch_size
+        self.flush_seconds = flush_seconds
+        self.queue = asyncio.Queue(maxsize=buffer_size)
+        # (provider, message id) -> (status, delivered at, flushes tried)
+        self.unmatched = {}
+        self.sends_recorded = 0
+        self.sends_dropped = 0
+        self.receipts_applied = 0
+        self.receipts_dropped = 0
+        self._task = None
+
+    def record_sent(self, provider: str, phone_number: str, response: dict) -> None:
+        """ProviderRegistry listener; never blocks a send, so a full buffer drops the record instead."""
+        message_id = (response.get("details") or {}).get("message_id")
+        if not message_id:
+            return
+        try:
+            self.queue.put_nowait(("sent", (provider, str(message_id), phone_number, datetime.now(timezone.utc))))
+        except asyncio.QueueFull:
+            self.sends_dropped += 1
+
+    async def record_receipt(self, receipt: tuple) -> None:
+        """Buffer one parsed receipt; waits if the buffer is full."""
+        await self.queue.put(("receipt", receipt))
+
+    def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self) -> None:
+        """Write everything still buffered, then stop. Called from lifespan on shutdown."""
+        if self._task is None:
+            return
+        await self.queue.put(None)
+        await self._task
+        self._task = None
+
+    async def _run(self) -> None:
+        while True:
+            if self.unmatched:
+                # Retry receipts still waiting for their send even when no new traffic arrives
+                try:
+                    item = await asyncio.wait_for(self.queue.get(), self.flush_seconds)
+                except asyncio.TimeoutError:
+                    await self._flush([])
+                    continue
+            else:
+                item = await self.queue.get()
+            if item is None:
+                await self._flush([])
+                return
+            items = [item]
+            deadline = time.monotonic() + self.flush_seconds
+            stopping = False
+            while len(items) < self.batch_size:
+                if self.queue.empty():
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = await asyncio.wait_for(self.queue.get(), remaining)
+                    except asyncio.TimeoutError:
+                        break
+                else:
+                    item = self.queue.get_nowait()
+                if item is None:
+                    stopping = True
+                    break
+                items.append(item)
+            await self._flush(items)
+            if stopping:
+                return
+
+    async def _flush(self, items: list) -> None:
+        sends = [payload for kind, payload in items if kind == "sent"]
+        receipts = dict(self.unmatched)
+        self.unmatched = {}
+        for kind, payload in items:
+            if kind == "receipt":
+                provider, message_id, status, delivered_at = payload
+                # A later final report for the same message replaces an earlier one in the same batch
+                receipts[(provider, message_id)] = (status, delivered_at, 0)
+        if not sends and not receipts:
+            return
+
+        for attempt in range(1, SMS_FLUSH_ATTEMPTS + 1):
+            try:
+                applied, known = await self._write(sends, receipts)
+                break
+            except Exception:
+                if attempt == SMS_FLUSH_ATTEMPTS:
+                    logger.exception("Dropping %d sends and %d delivery reports after %d failed flushes",
+                                     len(sends), len(receipts), attempt)
+                    self.sends_dropped += len(sends)
+                    self.receipts_dropped += len(receipts)
+                    return
+                await asyncio.sleep(0.5 * attempt)
+
+        self.sends_recorded += len(sends)
+        self.receipts_applied += len(applied)
+        for row in applied:
+            stats = self.registry.stats.get(row.provider)
+            if stats is None:
+                continue
+            latency = (row.delivered_date - row.sent_date).total_seconds() if row.status == "delivered" else None
+            stats.record_delivery(max(0.0, latency) if latency is not None else None, row.status == "delivered")
+
+        # Receipts for messages already final are duplicates; the rest may be waiting on another worker's flush
+        applied_keys = {(row.provider, row.provider_message_id) for row in applied}
+        for key, (status, delivered_at, attempts) in receipts.items():
+            if key in applied_keys or key in known:
+                continue
+            if attempts + 1 >= UNMATCHED_RECEIPT_FLUSHES:
+                self.receipts_dropped += 1
+            else:
+                self.unmatched[key] = (status, delivered_at, attempts + 1)
+
+    async def _write(self, sends: list, receipts: dict) -> tuple:
+        applied, known = [], set()
+        async with self.engine.begin() as conn:
+            if sends:
+                providers, message_ids, phone_numbers, sent_dates = map(list, zip(*sends))
+                await conn.execute(text(INSERT_SENT), {
+                    "ids": [uuid4() for _ in sends], "providers": providers, "message_ids": message_ids,
+                    "phone_numbers": phone_numbers, "sent_dates": sent_dates,
+                })
+            if receipts:
+                keys = list(receipts)
+                result = await conn.execute(text(APPLY_RECEIPTS), {
+                    "providers": [provider for provider, _ in keys],
+                    "message_ids": [message_id for _, message_id in keys],
+                    "statuses": [receipts[key][0] for key in keys],
+                    "delivered_dates": [receipts[key][1] for key in keys],
+                })
+                applied = result.all()
+                applied_keys = {(row.provider, row.provider_message_id) for row in applied}
+                missing = [key for key in keys if key not in applied_keys]
+                if missing:
+                    result = await conn.execute(text(KNOWN_MESSAGES), {
+                        "providers": [provider for provider, _ in missing],
+                        "message_ids": [message_id for _, message_id in missing],
+                    })
+                    known = {(row.provider, row.provider_message_id) for row in result}
+        return applied, known
+
+
+delivery_tracker = DeliveryTracker()
+sms_registry.listeners.append(delivery_tracker.record_sent)
@@ -0,0 +1,79 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import Column, Index, UniqueConstraint
+from sqlalchemy.types import TIMESTAMP
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from uuid import UUID, uuid4
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Campaign(SQLModel, table=True):
+    __tablename__ = "campaigns"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    name: str = Field(nullable=False)
+    message: str = Field(nullable=False)
+    # 'draft' while recipients are still being added (never resumed), then 'queued', 'sending', 'completed'
+    status: str = Field(default="queued", nullable=False)
+    total_count: int = Field(default=0, nullable=False)
+    sent_count: int = Field(default=0, nullable=False)
+    failed_count: int = Field(default=0, nullable=False)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+
+
+class CampaignRecipient(SQLModel, table=True):
+    __tablename__ = "campaign_recipients"
+    __table_args__ = (
+        # Re-submitting the same recipient list must not duplicate sends
+        UniqueConstraint("campaign_id", "phone_number", name="uq_campaign_recipients_campaign_phone"),
+        # Serves the sender's keyset scan over queued recipients
+        Index("ix_campaign_recipients_campaign_status_id", "campaign_id", "status", "id"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    campaign_id: UUID = Field(foreign_key="campaigns.id", nullable=False)
+    phone_number: str = Field(nullable=False)
+    status: str = Field(default="queued", nullable=False)  # 'queued', 'sent', 'failed'
+    provider: Optional[str] = Field(default=None)
+    provider_message_id: Optional[str] = Field(default=None)
+    updated_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+
+
+class SmsMessage(SQLModel, table=True):
+    __tablename__ = "sms_messages"
+    __table_args__ = (
+        # Delivery reports identify a message by the provider's id for it
+        UniqueConstraint("provider", "provider_message_id", name="uq_sms_messages_provider_message"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True)
+    provider: str = Field(nullable=False)
+    provider_message_id: str = Field(nullable=False)
+    phone_number: str = Field(nullable=False)
+    status: str = Field(default="sent", nullable=False)  # 'sent', 'delivered', 'failed'
+    sent_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+    # When the handset got it, as stated by the provider's delivery report
+    delivered_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+    updated_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
@@ -0,0 +1,164 @@
+import asyncio
+import os
+from abc import ABC, abstractmethod
+
+import dotenv
+import httpx
+
+from src.http_client import get_http_client
+from src.settings.services import get_settings
+
+dotenv.load_dotenv()
+
+# Optional second SMS gateway with a Termii-compatible JSON API
+SECONDARY_SMS_NAME = os.getenv("SECONDARY_SMS_NAME", "secondary")
+SECONDARY_SMS_URL = os.getenv("SECONDARY_SMS_URL")
+SECONDARY_SMS_API_KEY = os.getenv("SECONDARY_SMS_API_KEY")
+
+# Termii's documented cap on recipients per bulk request
+BULK_CHUNK_LIMIT = 10_000
+
+
+class SMSProvider(ABC):
+    """
+    Base class for anything that can deliver a single text message.
+    Subclasses implement send() and return the usual {"success": ..., "message": ...} dict.
+    """
+
+    name = "base"
+
+    @abstractmethod
+    async def send(self, phone_number: str, message: str) -> dict:
+        """Deliver one message."""
+
+    async def send_bulk(self, phone_numbers: list, message: str) -> dict:
+        """
+        Send the same message to many recipients. Providers without a bulk
+        endpoint fall back to concurrent single sends.
+        """
+        responses = await asyncio.gather(*(self.send(phone_number, message) for phone_number in phone_numbers))
+        failed = [phone_number for phone_number, response in zip(phone_numbers, responses)
+                  if not response.get("success")]
+        return {
+            "success": len(failed) < len(phone_numbers),
+            "message": f"{len(phone_numbers) - len(failed)} of {len(phone_numbers)} sent via {self.name}.",
+            "failed": failed,
+            # The provider's id for each message sent; delivery reports refer to it
+            "message_ids": {
+                phone_number: (response.get("details") or {}).get("message_id")
+                for phone_number, response in zip(phone_numbers, responses) if response.get("success")
+            },
+        }
+
+
+class TermiiProvider(SMSProvider):
+    """
+    Termii's SMS API on one channel ('generic' or 'whatsapp').
+    """
+
+    def __init__(self, base_url: str, api_key: str, sender_id: str, channel: str = "generic",
+                 name: str = None, client: httpx.AsyncClient = None):
+        self.base_url = (base_url or "").rstrip("/")
+        self.api_key = api_key
+        self.sender_id = sender_id
+        self.channel = channel
+        self.name = name or f"termii-{channel}"
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    def _payload(self, to, message: str) -> dict:
+        return {
+            "to": to,
+            "from": self.sender_id,
+            "sms": message,
+            "type": "plain",  # Use 'plain' for standard SMS.
+            "channel": self.channel,  # 'whatsapp' or 'generic'
+            "api_key": self.api_key,
+        }
+
+    async def _post(self, path: str, payload: dict) -> dict:
+        try:
+            response = await self.client.post(f"{self.base_url}{path}", json=payload)
+            response.raise_for_status()  # Raises an exception for HTTP 4xx/5xx errors
+            response_data = response.json()  # Parse the JSON response
+        except httpx.RequestError as e:
+            # Handle connection errors
+            return {"success": False, "message": f"Request error occurred: {e}"}
+        except httpx.HTTPStatusError as e:
+            # Handle HTTP response errors
+            return {"success": False, "message": f"HTTP error occurred: {e}"}
+        except ValueError as e:
+            # Handle a response body that is not JSON
+            return {"success": False, "message": f"Invalid response from {self.name}: {e}"}
+
+        # Extract relevant fields from Termii's response
+        message_status = response_data.get("message", "").lower()
+        if "successfully sent" not in message_status:
+            return {
+                "success": False,
+                "message": response_data.get("message", f"Failed to send via {self.name}."),
+            }
+
+        return {
+            "success": True,
+            "message": f"Message sent successfully via {self.name}.",
+            "details": {
+                "message_id": response_data.get("message_id"),
+                "balance": response_data.get("balance"),
+                "user": response_data.get("user"),
+            },
+        }
+
+    async def send(self, phone_number: str, message: str) -> dict:
+        """
+        Send a message to a phone number using Termii via this provider's channel.
+
+        Args:
+            phone_number (str): The recipient's phone number in international format (e.g., +2341234567890).
+            message (str): The text to deliver.
+
+        Returns:
+            dict: Response indicating success or failure.
+        """
+        return await self._post("/api/sms/send", self._payload(phone_number, message))
+
+    async def send_bulk(self, phone_numbers: list, message: str) -> dict:
+        """
+        Send one message to up to BULK_CHUNK_LIMIT recipients with a single request
+        to Termii's /api/sms/send/bulk endpoint.
+
+        Args:
+            phone_numbers (list): Recipients in international format.
+            message (str): The text to deliver.
+
+        Returns:
+            dict: Response indicating success or failure; a failure covers the whole chunk.
+        """
+        if len(phone_numbers) > BULK_CHUNK_LIMIT:
+            raise ValueError(f"Termii accepts at most {BULK_CHUNK_LIMIT} recipients per bulk request.")
+        response = await self._post("/api/sms/send/bulk", self._payload(phone_numbers, message))
+        response["failed"] = [] if response["success"] else list(phone_numbers)
+        # Termii answers a bulk request with one message id for every recipient in it
+        message_id = (response.get("details") or {}).get("message_id")
+        response["message_ids"] = {phone_number: message_id for phone_number in phone_numbers} \
+            if response["success"] else {}
+        return response
+
+
+def configured_providers() -> list:
+    """
+    Build the SMS providers available from the environment, in preference order.
+    """
+    settings = get_settings()
+    providers = [
+        TermiiProvider(settings.base_url, settings.termii_api_key, settings.sender_id, channel="generic"),
+        TermiiProvider(settings.base_url, settings.termii_api_key, settings.sender_id, channel="whatsapp"),
+    ]
+    if SECONDARY_SMS_URL:
+        providers.append(
+            TermiiProvider(SECONDARY_SMS_URL, SECONDARY_SMS_API_KEY, settings.sender_id, name=SECONDARY_SMS_NAME)
+        )
+    return providers
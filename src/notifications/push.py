@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+
+import asyncpg
+import dotenv
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+PUSH_CHANNEL = "account_events"
+# Events buffered per connection before the client is treated as too slow and dropped
+PUSH_QUEUE_SIZE = int(os.getenv("PUSH_QUEUE_SIZE", "64"))
+PUSH_SEND_TIMEOUT_SECONDS = float(os.getenv("PUSH_SEND_TIMEOUT_SECONDS", "10"))
+LISTENER_RETRY_SECONDS = 5
+
+
+class PushConnection:
+    __slots__ = ("websocket", "queue", "overflowed")
+
+    def __init__(self, websocket, queue_size: int):
+        self.websocket = websocket
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.overflowed = False
+
+
+class PushHub:
+    """
+    Per-process registry of open WebSocket connections, keyed by user id.
+
+    Every connection gets a bounded queue drained by its own sender loop, so one
+    slow client never blocks delivery to the others. A client whose queue fills
+    up is disconnected with 1013 (try again later) and is expected to reconnect
+    and re-fetch state.
+    """
+
+    def __init__(self, queue_size: int = PUSH_QUEUE_SIZE):
+        self.queue_size = queue_size
+        self.connections = defaultdict(set)
+
+    def connect(self, user_key: str, websocket) -> PushConnection:
+        connection = PushConnection(websocket, self.queue_size)
+        self.connections[user_key].add(connection)
+        return connection
+
+    def disconnect(self, user_key: str, connection: PushConnection) -> None:
+        user_connections = self.connections.get(user_key)
+        if user_connections is None:
+            return
+        user_connections.discard(connection)
+        if not user_connections:
+            del self.connections[user_key]
+
+    def deliver(self, user_key: str, message: str) -> int:
+        """
+        Queue a message for every connection of one user without waiting.
+
+        Returns:
+            int: Number of connections the message was queued for.
+        """
+        delivered = 0
+        for connection in list(self.connections.get(user_key, ())):
+            try:
+                connection.queue.put_nowait(message)
+                delivered += 1
+            except asyncio.QueueFull:
+                connection.overflowed = True
+                self.disconnect(user_key, connection)
+                # Wake the sender loop so it closes the socket
+                connection.queue.get_nowait()
+                connection.queue.put_nowait(None)
+        return delivered
+
+    async def serve(self, user_key: str, websocket) -> None:
+        """
+        Pump queued events to one accepted WebSocket until either side disconnects.
+        """
+        connection = self.connect(user_key, websocket)
+        receiver = asyncio.create_task(self._drain_incoming(connection))
+        try:
+            while True:
+                message = await connection.queue.get()
+                if message is None:
+                    break
+                await asyncio.wait_for(websocket.send_text(message), PUSH_SEND_TIMEOUT_SECONDS)
+        except Exception:
+            # Send timeouts and closed sockets both just end this connection
+            pass
+        finally:
+            receiver.cancel()
+            self.disconnect(user_key, connection)
+            if connection.overflowed:
+                try:
+                    await websocket.close(code=1013)
+                except Exception:
+                    pass
+
+    @staticmethod
+    async def _drain_incoming(connection: PushConnection) -> None:
+        # Clients only listen; reading keeps pings flowing and detects disconnects
+        try:
+            while True:
+                await connection.websocket.receive_text()
+        except Exception:
+            pass
+        # A full queue means the sender is busy and will hit the closed socket itself
+        if not connection.queue.full():
+            connection.queue.put_nowait(None)
+
+
+push_hub = PushHub()
+
+
+async def publish_events(db_session: AsyncSession, events: list) -> None:
+    """
+    Queue account events for delivery with Postgres NOTIFY on the caller's session.
+
+    NOTIFY is transactional: listeners on every worker receive the events only
+    when the caller commits, and never if it rolls back.
+
+    Args:
+        db_session (AsyncSession): The session whose transaction carries the business change.
+        events (list): (user_id, event_type, data) tuples; data must be JSON-serialisable.
+    """
+    if not events:
+        return
+    payloads = [
+        json.dumps({"user": str(user_id), "event": {"type": event_type, "data": data}}, default=str)
+        for user_id, event_type, data in events
+    ]
+    await db_session.execute(
+        text("SELECT pg_notify(:channel, payload) FROM unnest(CAST(:payloads AS text[])) AS payload"),
+        {"channel": PUSH_CHANNEL, "payloads": payloads},
+    )
+
+
+async def publish_event(db_session: AsyncSession, user_id, event_type: str, data: dict) -> None:
+    await publish_events(db_session, [(user_id, event_type, data)])
+
+
+# Called with (user id, event) for every event this worker hears, whether or not the user is connected
+event_hooks = []
+
+
+def _on_notify(connection, pid, channel, payload) -> None:
+    try:
+        message = json.loads(payload)
+        push_hub.deliver(message["user"], json.dumps(message["event"]))
+    except (ValueError, KeyError):
+        logger.warning("Ignoring malformed push payload on %s", channel)
+        return
+    for hook in event_hooks:
+        try:
+            hook(message["user"], message["event"])
+        except Exception:
+            logger.exception("Push event hook failed")
+
+
+async def listen_for_events(dsn: str, stop_event: asyncio.Event) -> None:
+    """
+    Hold a dedicated LISTEN connection and fan incoming events out to this
+    worker's sockets, reconnecting if the connection drops.
+
+    Args:
+        dsn (str): Database URL; a SQLAlchemy '+asyncpg' suffix is accepted.
+        stop_event (asyncio.Event): Set on shutdown.
+    """
+    dsn = dsn.replace("+asyncpg", "")
+    while not stop_event.is_set():
+        connection = None
+        try:
+            connection = await asyncpg.connect(dsn)
+            lost = asyncio.Event()
+            connection.add_termination_listener(lambda _: lost.set())
+            await connection.add_listener(PUSH_CHANNEL, _on_notify)
+            stop_waiter = asyncio.create_task(stop_event.wait())
+            lost_waiter = asyncio.create_task(lost.wait())
+            await asyncio.wait({stop_waiter, lost_waiter}, return_when=asyncio.FIRST_COMPLETED)
+            stop_waiter.cancel()
+            lost_waiter.cancel()
+        except Exception:
+            # Caches on this worker are invalidated through these events, so never give up on the listener
+            logger.exception("Push listener connection failed")
+        finally:
+            if connection is not None and not connection.is_closed():
+                try:
+                    await connection.close()
+                except Exception:
+                    connection.terminate()
+        if not stop_event.is_set():
+            try:
+                await asyncio.wait_for(stop_event.wait(), LISTENER_RETRY_SECONDS)
+            except asyncio.TimeoutError:
+                pass
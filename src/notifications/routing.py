@@ -0,0 +1,178 @@
+import asyncio
+import os
+import time
+from collections import deque
+
+import dotenv
+
+dotenv.load_dotenv()
+
+STATS_WINDOW = 200
+MIN_SAMPLES_FOR_HEALTH = 10
+MAX_ERROR_RATE = float(os.getenv("SMS_MAX_ERROR_RATE", "0.5"))
+# Share of handed-off messages a provider may fail to deliver, per its delivery reports
+MAX_UNDELIVERED_RATE = float(os.getenv("SMS_MAX_UNDELIVERED_RATE", "0.3"))
+DEFAULT_HEDGE_DELAY_SECONDS = float(os.getenv("SMS_DEFAULT_HEDGE_DELAY_SECONDS", "1.0"))
+MIN_HEDGE_DELAY_SECONDS = 0.2
+MAX_HEDGE_DELAY_SECONDS = 5.0
+
+
+class ProviderStats:
+    """
+    Rolling latency and error-rate window for one provider, both for its API
+    and for end-to-end delivery as reported by its delivery receipts.
+    Only the last STATS_WINDOW sends are kept, so a provider that recovers is trusted again quickly.
+    """
+
+    def __init__(self, window: int = STATS_WINDOW):
+        self.latencies = deque(maxlen=window)
+        self.outcomes = deque(maxlen=window)
+        self.delivery_latencies = deque(maxlen=window)
+        self.delivery_outcomes = deque(maxlen=window)
+
+    def record(self, latency_seconds: float, success: bool) -> None:
+        self.outcomes.append(success)
+        # Failed sends often fail fast; counting their latency would make a broken provider look quick
+        if success:
+            self.latencies.append(latency_seconds)
+
+    def record_delivery(self, latency_seconds, delivered: bool) -> None:
+        """
+        Args:
+            latency_seconds: From hand-off to the handset, or None if unknown.
+            delivered (bool): False for rejected, expired and otherwise undelivered messages.
+        """
+        self.delivery_outcomes.append(delivered)
+        if delivered and latency_seconds is not None:
+            self.delivery_latencies.append(latency_seconds)
+
+    def undelivered_rate(self) -> float:
+        if len(self.delivery_outcomes) < MIN_SAMPLES_FOR_HEALTH:
+            return 0.0
+        return self.delivery_outcomes.count(False) / len(self.delivery_outcomes)
+
+    def expected_latency(self) -> float:
+        """
+        Median API latency plus, once enough receipts are in, median delivery latency:
+        a provider that answers fast but delivers slowly should not win on API speed alone.
+        """
+        api = self.percentile(0.5) or 0.0
+        if len(self.delivery_latencies) < MIN_SAMPLES_FOR_HEALTH:
+            return api
+        ordered = sorted(self.delivery_latencies)
+        return api + ordered[len(ordered) // 2]
+
+    def error_rate(self) -> float:
+        if not self.outcomes:
+            return 0.0
+        return self.outcomes.count(False) / len(self.outcomes)
+
+    def percentile(self, fraction: float):
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+    def is_healthy(self) -> bool:
+        if self.undelivered_rate() > MAX_UNDELIVERED_RATE:
+            return False
+        return len(self.outcomes) < MIN_SAMPLES_FOR_HEALTH or self.error_rate() <= MAX_ERROR_RATE
+
+
+class ProviderRegistry:
+    """
+    Routes each message to the currently fastest healthy provider and hedges
+    to the next one when the first is slower than its own p95.
+    """
+
+    def __init__(self, providers: list = None):
+        self.providers = []
+        self.stats = {}
+        # Called with (provider name, phone number, response) for every message a provider accepted
+        self.listeners = []
+        for provider in providers or []:
+            self.register(provider)
+
+    def register(self, provider) -> None:
+        self.providers.append(provider)
+        self.stats[provider.name] = ProviderStats()
+
+    def ranked(self) -> list:
+        """
+        Providers ordered healthy-first, then by expected latency. Providers with no
+        samples yet sort first so new or recovered providers get traffic.
+        """
+        def sort_key(indexed):
+            index, provider = indexed
+            stats = self.stats[provider.name]
+            return (not stats.is_healthy(), stats.expected_latency(), index)
+
+        return [provider for _, provider in sorted(enumerate(self.providers), key=sort_key)]
+
+    def hedge_delay(self, provider) -> float:
+        p95 = self.stats[provider.name].percentile(0.95)
+        if p95 is None or len(self.stats[provider.name].latencies) < MIN_SAMPLES_FOR_HEALTH:
+            return DEFAULT_HEDGE_DELAY_SECONDS
+        return min(MAX_HEDGE_DELAY_SECONDS, max(MIN_HEDGE_DELAY_SECONDS, p95))
+
+    async def _timed_send(self, provider, phone_number: str, message: str) -> dict:
+        started = time.perf_counter()
+        try:
+            response = await provider.send(phone_number, message)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            response = {"success": False, "message": f"{provider.name} raised {e!r}"}
+        self.stats[provider.name].record(time.perf_counter() - started, response.get("success", False))
+        response["provider"] = provider.name
+        if response.get("success"):
+            # Hedged sends can both be accepted; each is tracked, since each may be delivered
+            for listener in self.listeners:
+                listener(provider.name, phone_number, response)
+        return response
+
+    async def send(self, phone_number: str, message: str) -> dict:
+        """
+        Send one message, hedging across providers.
+
+        The best-ranked provider is tried first. If it has not answered within its
+        p95 latency, or it fails, the next provider is started as well; the first
+        successful response wins. The backup carries the exact same text (and so the
+        same OTP code), so a user who receives both still has one code to verify.
+
+        Args:
+            phone_number (str): The recipient's phone number.
+            message (str): The text to deliver.
+
+        Returns:
+            dict: Response of the winning provider, or the last failure.
+        """
+        candidates = self.ranked()
+        if not candidates:
+            return {"success": False, "message": "No SMS provider is configured."}
+
+        in_flight = set()
+        last_response = {"success": False, "message": "Failed to send message."}
+        try:
+            for index, provider in enumerate(candidates):
+                in_flight.add(asyncio.ensure_future(self._timed_send(provider, phone_number, message)))
+                has_backup = index + 1 < len(candidates)
+                timeout = self.hedge_delay(provider) if has_backup else None
+
+                # Wait for a success or the hedge deadline, whichever comes first
+                while in_flight:
+                    done, in_flight = await asyncio.wait(
+                        in_flight, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if not done:
+                        break  # Deadline passed: start the backup alongside
+                    for task in done:
+                        last_response = task.result()
+                        if last_response.get("success"):
+                            return last_response
+                    if has_backup:
+                        break  # Something failed: move on to the backup immediately
+        finally:
+            for task in in_flight:
+                task.cancel()
+        return last_response
@@ -0,0 +1,9 @@
+from typing import List
+
+from pydantic import BaseModel
+
+
+class CampaignRequest(BaseModel):
+    name: str
+    message: str
+    phone_numbers: List[str]
@@ -0,0 +1,20 @@
+from .providers import configured_providers
+from .routing import ProviderRegistry
+
+sms_registry = ProviderRegistry(configured_providers())
+
+
+async def send_otp_message(phone_number: str, otp: str, message_template: str) -> dict:
+    """
+    Send an OTP through the fastest healthy SMS provider, hedged to a backup.
+
+    Args:
+        phone_number (str): The recipient's phone number in international format (e.g., +2341234567890).
+        otp (str): The OTP to send.
+        message_template (str): The message template, e.g., "Your OTP is {otp}."
+
+    Returns:
+        dict: Response indicating success or failure, including the provider used.
+    """
+    message = message_template.format(otp=otp)
+    return await sms_registry.send(phone_number, message)
@@ -0,0 +1,50 @@
+"""
+Local stand-in for Termii's SMS API, for development, tests and benchmarks.
+
+    STUB_LATENCY_MS=100 uvicorn src.notifications.stub_provider:app --port 9101
+"""
+import asyncio
+import os
+from typing import List, Union
+from uuid import uuid4
+
+from fastapi import FastAPI
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel
+
+
+class StubMessage(BaseModel):
+    to: Union[str, List[str]]
+    sms: str
+    channel: str = "generic"
+
+
+def create_stub_app(latency_seconds: float = 0.0, fail: bool = False) -> FastAPI:
+    """
+    Build a Termii-compatible stub that sleeps latency_seconds per request
+    (single or bulk) and, when fail is set, answers every call with HTTP 503.
+    """
+    stub = FastAPI(title="Stub SMS provider")
+    stub.state.requests = 0
+    stub.state.messages = 0
+
+    async def accept(request: StubMessage) -> dict:
+        stub.state.requests += 1
+        await asyncio.sleep(latency_seconds)
+        if fail:
+            raise HTTPException(status_code=503, detail="Provider unavailable")
+        stub.state.messages += len(request.to) if isinstance(request.to, list) else 1
+        return {"code": "ok", "message_id": str(uuid4()), "message": "Successfully Sent", "balance": 1000}
+
+    @stub.post("/api/sms/send")
+    async def send(request: StubMessage):
+        return await accept(request)
+
+    @stub.post("/api/sms/send/bulk")
+    async def send_bulk(request: StubMessage):
+        return await accept(request)
+
+    return stub
+
+
+app = create_stub_app(latency_seconds=int(os.getenv("STUB_LATENCY_MS", "0")) / 1000)
@@ -0,0 +1,103 @@
+from datetime import datetime, timezone
+from uuid import UUID
+
+from fastapi import APIRouter, BackgroundTasks, Depends, Request, WebSocket, status
+from fastapi.exceptions import HTTPException
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.authentications.models import User
+from src.audit.writer import audit_log
+from src.authentications.utilities import get_staff_user, get_user_from_token
+from src.database import get_home_db, read_session_factory, SessionLocal
+from src.sharding import phone_from_token
+from .bulk import create_campaign, run_campaign
+from .delivery import delivery_tracker, parse_receipt, verify_signature
+from .models import Campaign
+from .push import push_hub
+from .schemas import CampaignRequest
+from .services import sms_registry
+
+router = APIRouter(prefix="/notifications", tags=["notifications"])
+ws_router = APIRouter(tags=["realtime"])
+
+
+@router.post("/campaigns/")
+async def start_campaign(request: CampaignRequest, http_request: Request, background_tasks: BackgroundTasks,
+                         db: AsyncSession = Depends(get_home_db), staff_user: User = Depends(get_staff_user)):
+    # Step 1: Queue the recipients
+    campaign = await create_campaign(db, request.name, request.message, request.phone_numbers)
+
+    # Step 2: Send in the background; progress is readable from the campaign row
+    background_tasks.add_task(run_campaign, SessionLocal, campaign.id, sms_registry.ranked())
+
+    await audit_log.record_request(http_request, "campaign_started", actor=staff_user.phone_e164,
+                                   user_id=staff_user.id,
+                                   details={"campaign_id": str(campaign.id), "total_count": campaign.total_count})
+
+    return {"message": "Campaign queued.", "campaign_id": campaign.id, "total_count": campaign.total_count}
+
+
+@router.get("/campaigns/{campaign_id}")
+async def campaign_status(campaign_id: UUID, db: AsyncSession = Depends(get_home_db),
+                          staff_user: User = Depends(get_staff_user)):
+    campaign = await db.get(Campaign, campaign_id)
+    if not campaign:
+        raise HTTPException(status_code=404, detail="Campaign not found.")
+
+    return {
+        "campaign_id": campaign.id,
+        "status": campaign.status,
+        "total_count": campaign.total_count,
+        "sent_count": campaign.sent_count,
+        "failed_count": campaign.failed_count,
+    }
+
+
+@router.post("/delivery-reports/{source}", status_code=status.HTTP_202_ACCEPTED)
+async def delivery_reports(source: str, http_request: Request):
+    """
+    Webhook for SMS delivery reports. Acknowledges as soon as the reports are
+    buffered; they are applied to sms_messages in batches by the delivery tracker.
+    """
+    # Step 1: Only providers we send through report here
+    if source != "termii" and source not in sms_registry.stats:
+        raise HTTPException(status_code=404, detail="Unknown delivery report source.")
+
+    # Step 2: Check the signature over the raw body
+    body = await http_request.body()
+    if not verify_signature(body, http_request.headers.get("x-termii-signature")):
+        raise HTTPException(status_code=401, detail="Invalid signature.")
+
+    # Step 3: Buffer the final reports; interim ones ('Message Sent') are acknowledged and ignored
+    try:
+        payload = await http_request.json()
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Delivery report must be JSON.")
+    reports = payload if isinstance(payload, list) else [payload]
+    received_at = datetime.now(timezone.utc)
+    accepted = 0
+    for report in reports:
+        receipt = parse_receipt(source, report, received_at) if isinstance(report, dict) else None
+        if receipt is not None:
+            await delivery_tracker.record_receipt(receipt)
+            accepted += 1
+
+    return {"accepted": accepted}
+
+
+@ws_router.websocket("/ws")
+async def account_events(websocket: WebSocket, token: str = None):
+    # Browsers cannot set headers on WebSocket upgrades, so the token may come as ?token=
+    if not token:
+        token = websocket.headers.get("authorization", "").removeprefix("Bearer ").strip()
+
+    # Authenticate with a short-lived session so idle sockets do not pin DB connections
+    try:
+        async with read_session_factory(phone_e164=phone_from_token(token))() as db:
+            user = await get_user_from_token(token, db)
+    except HTTPException:
+        await websocket.close(code=status.WS_1008_POLICY_VIOLATION)
+        return
+
+    await websocket.accept()
+    await push_hub.serve(str(user.id), websocket)
@@ -0,0 +1,36 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column, Index, text
+from sqlalchemy.dialects.postgresql import JSONB
+from sqlalchemy.types import TIMESTAMP
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class OutboxEvent(SQLModel, table=True):
+    __tablename__ = "outbox"
+    __table_args__ = (
+        # Only unpublished rows are ever scanned, so keep the index that small
+        Index("ix_outbox_unpublished", "id", postgresql_where=text("published_date IS NULL")),
+    )
+
+    # Sequential id gives the relay its publish order; assigned at insert, so it matches commit
+    # order only for events written under the same row lock, i.e. per aggregate (see src.outbox.relay)
+    id: Optional[int] = Field(default=None, sa_column=Column(BigInteger, primary_key=True, autoincrement=True))
+    event_type: str = Field(nullable=False)  # e.g. 'user.signed_up', 'ledger.posted'
+    aggregate_id: str = Field(nullable=False)
+    payload: dict = Field(default_factory=dict, sa_column=Column(JSONB, nullable=False))
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+    published_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
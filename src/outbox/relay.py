@@ -0,0 +1,198 @@
+"""
+Outbox relay: drains committed outbox rows and publishes them to a sink.
+
+Usage:
+    OUTBOX_SINK=redis://localhost:6379/0 python -m src.outbox.relay
+    OUTBOX_SINK=file:/var/log/ckash/events.jsonl python -m src.outbox.relay
+    OUTBOX_SINK=http://localhost:9200/events python -m src.outbox.relay
+
+Delivery is at-least-once: a batch is marked published in the same transaction
+that read it, after the sink accepted it, so a crash in between re-sends the
+batch. Consumers should de-duplicate on the event id.
+
+Ordering is per aggregate only. Ids are assigned at insert, not at commit, so a
+slow transaction can commit a lower id after higher ones were published; it is
+published with the next batch, out of global id order. Events for one aggregate
+are written under that aggregate's row lock (e.g. the wallet's FOR UPDATE), so
+they commit, and are published, in id order.
+"""
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime, timezone
+
+import dotenv
+import redis.asyncio as aioredis
+from sqlalchemy import select, text, update
+
+from src.database import async_engine
+from src.http_client import get_http_client
+from .models import OutboxEvent
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+OUTBOX_SINK = os.getenv("OUTBOX_SINK", "file:outbox-events.jsonl")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", "500"))
+OUTBOX_IDLE_SECONDS = float(os.getenv("OUTBOX_IDLE_SECONDS", "0.5"))
+# Only one relay may publish at a time, otherwise ordering is lost
+OUTBOX_LOCK_KEY = 7_420_034
+
+outbox = OutboxEvent.__table__
+
+
+def _serialize(row) -> dict:
+    return {
+        "id": row.id,
+        "event_type": row.event_type,
+        "aggregate_id": row.aggregate_id,
+        "payload": row.payload,
+        "created_date": row.created_date.isoformat(),
+    }
+
+
+class FileSink:
+    """Appends events as JSON lines; handy locally and for replaying into analytics."""
+
+    def __init__(self, path: str):
+        self.path = path
+
+    async def publish(self, events: list) -> None:
+        lines = "".join(json.dumps(event) + "\n" for event in events)
+        await asyncio.to_thread(self._append, lines)
+
+    def _append(self, lines: str) -> None:
+        with open(self.path, "a", encoding="utf-8") as handle:
+            handle.write(lines)
+            handle.flush()
+            os.fsync(handle.fileno())
+
+    async def close(self) -> None:
+        pass
+
+
+class RedisStreamSink:
+    """XADDs each event to a Redis stream in one pipelined round trip per batch."""
+
+    def __init__(self, url: str, stream: str = "ckash:events"):
+        self.client = aioredis.from_url(url)
+        self.stream = stream
+
+    async def publish(self, events: list) -> None:
+        async with self.client.pipeline(transaction=False) as pipe:
+            for event in events:
+                pipe.xadd(self.stream, {"event": json.dumps(event)})
+            await pipe.execute()
+
+    async def close(self) -> None:
+        await self.client.aclose()
+
+
+class HTTPSink:
+    """POSTs each batch as a JSON array; any non-2xx answer fails the batch."""
+
+    def __init__(self, url: str):
+        self.url = url
+
+    async def publish(self, events: list) -> None:
+        response = await get_http_client().post(self.url, json=events)
+        response.raise_for_status()
+
+    async def close(self) -> None:
+        pass
+
+
+def build_sink(spec: str = OUTBOX_SINK):
+    if spec.startswith(("redis://", "rediss://")):
+        return RedisStreamSink(spec)
+    if spec.startswith(("http://", "https://")):
+        return HTTPSink(spec)
+    if spec.startswith("file:"):
+        return FileSink(spec[len("file:"):])
+    raise ValueError(f"Unsupported OUTBOX_SINK: {spec}")
+
+
+async def relay_batch(conn, sink, batch_size: int = OUTBOX_BATCH_SIZE) -> dict:
+    """
+    Publish one batch of the committed, unpublished events in id order.
+
+    Args:
+        conn: An AsyncConnection holding the relay lock.
+        sink: Object with an async publish(events) method.
+        batch_size (int): Maximum events per batch.
+
+    Returns:
+        dict: Number of events published and the age of the oldest one in seconds.
+    """
+    async with conn.begin():
+        statement = (
+            select(outbox.c.id, outbox.c.event_type, outbox.c.aggregate_id, outbox.c.payload, outbox.c.created_date)
+            .where(outbox.c.published_date.is_(None))
+            .order_by(outbox.c.id)
+            .limit(batch_size)
+        )
+        rows = (await conn.execute(statement)).all()
+        if not rows:
+            return {"published": 0, "lag_seconds": 0.0}
+
+        await sink.publish([_serialize(row) for row in rows])
+
+        time_now = datetime.now(timezone.utc)
+        await conn.execute(
+            update(outbox).where(outbox.c.id.in_([row.id for row in rows])).values(published_date=time_now)
+        )
+    return {"published": len(rows), "lag_seconds": round((time_now - rows[0].created_date).total_seconds(), 3)}
+
+
+async def run_relay(stop_event: asyncio.Event, sink=None, engine=async_engine) -> None:
+    """
+    Relay events until stop_event is set. Every instance competes for a Postgres
+    advisory lock and only the holder publishes, so it is safe to start one per worker.
+    With sharding, one relay runs per shard database.
+    """
+    sink = sink or build_sink()
+    reported = time.monotonic()
+    published = 0
+    try:
+        while not stop_event.is_set():
+            try:
+                async with engine.connect() as conn:
+                    is_leader = await conn.scalar(text("SELECT pg_try_advisory_lock(:key)"), {"key": OUTBOX_LOCK_KEY})
+                    await conn.commit()
+                    if is_leader:
+                        try:
+                            while not stop_event.is_set():
+                                result = await relay_batch(conn, sink)
+                                published += result["published"]
+                                if time.monotonic() - reported >= 60:
+                                    logger.info("Outbox relay: %d events in the last minute, lag %.3fs",
+                                                published, result["lag_seconds"])
+                                    reported, published = time.monotonic(), 0
+                                if result["published"] < OUTBOX_BATCH_SIZE:
+                                    await _sleep(stop_event, OUTBOX_IDLE_SECONDS)
+                        finally:
+                            # Session-level locks survive the return to the pool, so release explicitly
+                            await conn.rollback()
+                            await conn.execute(text("SELECT pg_advisory_unlock(:key)"), {"key": OUTBOX_LOCK_KEY})
+                            await conn.commit()
+            except Exception:
+                # Sink or database trouble: the batch stays unpublished and is retried
+                logger.exception("Outbox relay batch failed")
+            await _sleep(stop_event, OUTBOX_IDLE_SECONDS * 10)
+    finally:
+        await sink.close()
+
+
+async def _sleep(stop_event: asyncio.Event, seconds: float) -> None:
+    try:
+        await asyncio.wait_for(stop_event.wait(), seconds)
+    except asyncio.TimeoutError:
+        pass
+
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run_relay(asyncio.Event()))
@@ -0,0 +1,59 @@
+import json
+from datetime import datetime, timezone
+
+from sqlalchemy import func, insert, select
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from .models import OutboxEvent
+
+outbox = OutboxEvent.__table__
+
+
+def _jsonable(payload: dict) -> dict:
+    # UUIDs, Decimals and datetimes become strings so the row fits in JSONB
+    return json.loads(json.dumps(payload, default=str))
+
+
+def add_outbox_event(db_session: AsyncSession, event_type: str, aggregate_id, payload: dict) -> OutboxEvent:
+    """
+    Record an event in the caller's transaction; it is published only if that transaction commits.
+
+    Args:
+        db_session (AsyncSession): The session carrying the business change.
+        event_type (str): Dotted event name, e.g. 'user.signed_up'.
+        aggregate_id: Id of the entity the event is about.
+        payload (dict): Event body.
+
+    Returns:
+        OutboxEvent: The pending outbox row.
+    """
+    event = OutboxEvent(event_type=event_type, aggregate_id=str(aggregate_id), payload=_jsonable(payload))
+    db_session.add(event)
+    return event
+
+
+async def add_outbox_events(db_session: AsyncSession, events: list) -> None:
+    """
+    Batch form of add_outbox_event for set-based writers.
+
+    Args:
+        events (list): (event_type, aggregate_id, payload) tuples.
+    """
+    if not events:
+        return
+    time_now = datetime.now(timezone.utc)
+    await db_session.execute(insert(outbox), [
+        {"event_type": event_type, "aggregate_id": str(aggregate_id), "payload": _jsonable(payload),
+         "created_date": time_now}
+        for event_type, aggregate_id, payload in events
+    ])
+
+
+async def get_outbox_lag(db_session: AsyncSession) -> dict:
+    """
+    Backlog size and age of the oldest unpublished event.
+    """
+    statement = select(func.count(), func.min(outbox.c.created_date)).where(outbox.c.published_date.is_(None))
+    backlog, oldest = (await db_session.execute(statement)).one()
+    lag = (datetime.now(timezone.utc) - oldest).total_seconds() if oldest else 0.0
+    return {"backlog": backlog, "lag_seconds": round(lag, 3)}
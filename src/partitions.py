@@ -0,0 +1,253 @@
+"""
+Declarative range partitioning by creation time, and the job that maintains it.
+
+Usage:
+    python -m src.partitions                               # create upcoming, expire old partitions
+    python -m src.partitions --convert otp ledger_entries  # one-off: turn existing tables into partitioned ones
+
+Each table in PARTITION_POLICIES is partitioned on created_date. The maintenance
+job pre-creates partitions ahead of time and retires partitions that fall out of
+retention by dropping them or detaching them into the 'archive' schema, both of
+which are metadata-only operations regardless of row count.
+
+Both commands run on every shard. Tables marked home_only, such as audit_log,
+exist on the home database alone and are left out elsewhere.
+"""
+import argparse
+import asyncio
+import logging
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import text
+
+from src.database import async_engine, shard_engines, shard_router
+
+logger = logging.getLogger(__name__)
+
+PARTITION_MAINTENANCE_INTERVAL = timedelta(hours=6)
+PARTITION_LOCK_KEY = 7_420_036
+
+
+class PartitionPolicy:
+    def __init__(self, interval: str, premake: int, retain: int = None, expire: str = "drop",
+                 indexes: tuple = (), foreign_keys: tuple = (), home_only: bool = False):
+        """
+        Args:
+            interval (str): 'day' or 'month'.
+            premake (int): Future partitions to keep ready.
+            retain (int): Past partitions to keep; None keeps everything.
+            expire (str): 'drop' or 'detach' (moved to the archive schema).
+            indexes (tuple): Indexed columns, recreated when converting an existing table.
+            foreign_keys (tuple): (column, 'table(column)') pairs, likewise.
+            home_only (bool): The table lives on the home database only, not on every shard.
+        """
+        self.interval = interval
+        self.premake = premake
+        self.retain = retain
+        self.expire = expire
+        self.indexes = indexes
+        self.foreign_keys = foreign_keys
+        self.home_only = home_only
+
+
+PARTITION_POLICIES = {
+    # Codes live for minutes; a week is plenty for support and rate-limit history
+    "otp": PartitionPolicy("day", premake=3, retain=7, expire="drop",
+                           indexes=("phone_e164", "otp_code", "phone_number")),
+    # Written by one COPY writer per process to the home database (src.audit.writer)
+    "audit_log": PartitionPolicy("month", premake=2, retain=24, expire="detach", home_only=True),
+    # Ledger history is never deleted; old months are detached into the archive schema
+    "ledger_entries": PartitionPolicy("month", premake=2, retain=36, expire="detach",
+                                      indexes=("wallet_id", "reference"),
+                                      foreign_keys=(("wallet_id", "wallets(id)"),)),
+}
+
+
+def period_start(moment: datetime, interval: str, offset: int = 0) -> datetime:
+    if interval == "day":
+        day = datetime(moment.year, moment.month, moment.day, tzinfo=timezone.utc)
+        return day + timedelta(days=offset)
+    index = moment.year * 12 + moment.month - 1 + offset
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def retained_since(table: str, now: datetime = None) -> datetime:
+    """
+    Start of the oldest partition of `table` that retention keeps attached.
+    Rows created before it may already be dropped or detached into the archive.
+    """
+    policy = PARTITION_POLICIES[table]
+    if policy.retain is None:
+        return datetime.min.replace(tzinfo=timezone.utc)
+    return period_start(now or datetime.now(timezone.utc), policy.interval, -policy.retain)
+
+
+def partition_name(table: str, start: datetime, interval: str) -> str:
+    return f"{table}_{start:%Y_%m_%d}" if interval == "day" else f"{table}_{start:%Y_%m}"
+
+
+def partition_start(table: str, name: str, interval: str):
+    suffix = name[len(table) + 1:]
+    try:
+        return datetime.strptime(suffix, "%Y_%m_%d" if interval == "day" else "%Y_%m").replace(tzinfo=timezone.utc)
+    except ValueError:
+        return None
+
+
+async def _is_partitioned(conn, table: str) -> bool:
+    result = await conn.execute(text(
+        "SELECT 1 FROM pg_partitioned_table p JOIN pg_class c ON c.oid = p.partrelid "
+        "WHERE c.relname = :table AND c.relnamespace = 'public'::regnamespace"
+    ), {"table": table})
+    return result.scalar() is not None
+
+
+async def _partitions(conn, table: str) -> list:
+    result = await conn.execute(text(
+        "SELECT child.relname FROM pg_inherits i "
+        "JOIN pg_class parent ON parent.oid = i.inhparent "
+        "JOIN pg_class child ON child.oid = i.inhrelid "
+        "WHERE parent.relname = :table AND parent.relnamespace = 'public'::regnamespace"
+    ), {"table": table})
+    return list(result.scalars())
+
+
+async def create_partition(conn, table: str, start: datetime, interval: str) -> None:
+    end = period_start(start, interval, 1)
+    await conn.execute(text(
+        f"CREATE TABLE IF NOT EXISTS {partition_name(table, start, interval)} PARTITION OF {table} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+
+
+async def maintain_partitions(conn, now: datetime = None, home: bool = True) -> dict:
+    """
+    Create upcoming partitions and retire expired ones for every partitioned table.
+
+    Runs under a transaction-level advisory lock so concurrent workers do not race.
+
+    Args:
+        conn: An AsyncConnection inside a transaction.
+        now (datetime): Reference time, for tests.
+        home (bool): Whether conn is the home database; home_only tables are skipped otherwise.
+
+    Returns:
+        dict: Per table, the partitions created and retired.
+    """
+    now = now or datetime.now(timezone.utc)
+    await conn.execute(text("SELECT pg_advisory_xact_lock(:key)"), {"key": PARTITION_LOCK_KEY})
+    await conn.execute(text("CREATE SCHEMA IF NOT EXISTS archive"))
+
+    report = {}
+    for table, policy in PARTITION_POLICIES.items():
+        if (policy.home_only and not home) or not await _is_partitioned(conn, table):
+            continue
+        existing = set(await _partitions(conn, table))
+        created, retired = [], []
+
+        for offset in range(policy.premake + 1):
+            start = period_start(now, policy.interval, offset)
+            if partition_name(table, start, policy.interval) not in existing:
+                await create_partition(conn, table, start, policy.interval)
+                created.append(partition_name(table, start, policy.interval))
+
+        if policy.retain is not None:
+            cutoff = retained_since(table, now)
+            for name in sorted(existing):
+                start = partition_start(table, name, policy.interval)
+                if start is None or start >= cutoff:
+                    continue
+                if policy.expire == "drop":
+                    await conn.execute(text(f"DROP TABLE {name}"))
+                else:
+                    await conn.execute(text(f"ALTER TABLE {table} DETACH PARTITION {name}"))
+                    await conn.execute(text(f"ALTER TABLE {name} SET SCHEMA archive"))
+                retired.append(name)
+
+        report[table] = {"created": created, "retired": retired}
+        if created or retired:
+            logger.info("Partitions for %s: created %s, retired %s", table, created, retired)
+    return report
+
+
+async def convert_to_partitioned(conn, table: str) -> int:
+    """
+    Rebuild an existing plain table as a partitioned one and copy its rows over.
+
+    Takes an exclusive lock on the table for the duration, so run it in a
+    maintenance window. Unique constraints that do not include created_date
+    cannot exist on a partitioned table and become plain indexes.
+
+    Returns:
+        int: Number of rows copied.
+    """
+    policy = PARTITION_POLICIES[table]
+    if await _is_partitioned(conn, table):
+        return 0
+
+    legacy = f"{table}_legacy"
+    await conn.execute(text(f"ALTER TABLE {table} RENAME TO {legacy}"))
+    await conn.execute(text(
+        f"CREATE TABLE {table} (LIKE {legacy} INCLUDING DEFAULTS INCLUDING GENERATED) "
+        f"PARTITION BY RANGE (created_date)"
+    ))
+
+    # Partitions covering every existing row, up to the premake horizon
+    oldest = (await conn.execute(text(f"SELECT min(created_date) FROM {legacy}"))).scalar()
+    now = datetime.now(timezone.utc)
+    start = period_start(oldest or now, policy.interval)
+    horizon = period_start(now, policy.interval, policy.premake)
+    while start <= horizon:
+        await create_partition(conn, table, start, policy.interval)
+        start = period_start(start, policy.interval, 1)
+
+    result = await conn.execute(text(f"INSERT INTO {table} SELECT * FROM {legacy}"))
+    await conn.execute(text(f"DROP TABLE {legacy}"))
+
+    # Keys and indexes are built after the copy, under the names create_all would give them
+    await conn.execute(text(f"ALTER TABLE {table} ADD PRIMARY KEY (id, created_date)"))
+    for column, target in policy.foreign_keys:
+        await conn.execute(text(f"ALTER TABLE {table} ADD FOREIGN KEY ({column}) REFERENCES {target}"))
+    for column in policy.indexes:
+        await conn.execute(text(f"CREATE INDEX ix_{table}_{column} ON {table} ({column})"))
+    return result.rowcount
+
+
+async def run_partition_maintenance(stop_event: asyncio.Event, engine=async_engine, home: bool = True) -> None:
+    """
+    Re-run maintenance every PARTITION_MAINTENANCE_INTERVAL until stop_event is set.
+    Started from lifespan, once per shard, which also runs one pass before serving requests.
+    """
+    while True:
+        try:
+            await asyncio.wait_for(stop_event.wait(), PARTITION_MAINTENANCE_INTERVAL.total_seconds())
+            return
+        except asyncio.TimeoutError:
+            pass
+        try:
+            async with engine.begin() as conn:
+                await maintain_partitions(conn, home=home)
+        except Exception:
+            logger.exception("Partition maintenance failed")
+
+
+async def main(convert: list) -> None:
+    for name, engine in shard_engines.items():
+        home = name == shard_router.home
+        for table in convert:
+            if PARTITION_POLICIES[table].home_only and not home:
+                continue
+            async with engine.begin() as conn:
+                copied = await convert_to_partitioned(conn, table)
+            print(f"{name}: {table}: partitioned, {copied} rows copied")
+        async with engine.begin() as conn:
+            print(f"{name}: {await maintain_partitions(conn, home=home)}")
+    for engine in shard_engines.values():
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--convert", nargs="*", default=[], choices=sorted(PARTITION_POLICIES))
+    args = parser.parse_args()
+    asyncio.run(main(args.convert))
@@ -0,0 +1,93 @@
+"""
+Daily settlement reconciliation.
+
+Usage:
+    python -m src.reconciliation.job --provider utilities --file settlement-2026-10-18.csv --date 2026-10-18
+    python -m src.reconciliation.job --file settlement.csv --ledger-file ledger.csv   # both files already on disk
+
+Exports the day's ledger entries from every shard with COPY, matches them
+against the provider's settlement file and writes the exceptions next to the
+settlement file as <name>.exceptions.csv.
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+from datetime import date, datetime, time as day_time, timedelta, timezone
+
+from .pipeline import DEFAULT_PARTITIONS, reconcile
+
+# Provider -> (reference column, amount column) in its settlement file, and the
+# prefix our ledger references carry for that provider's transactions
+SETTLEMENT_FORMATS = {
+    "utilities": {"columns": ("transaction_reference", "amount"), "ledger_prefix": "bill:"},
+    "card": {"columns": ("merchant_reference", "settled_amount"), "ledger_prefix": "card:"},
+    "bank_transfer": {"columns": ("session_id", "amount"), "ledger_prefix": "transfer:"},
+}
+
+EXPORT_LEDGER = """
+SELECT reference, amount FROM ledger_entries
+WHERE created_date >= $1 AND created_date < $2 AND reference LIKE $3
+"""
+
+
+async def export_ledger(path: str, day: date, reference_prefix: str, engines) -> None:
+    """
+    COPY one day's ledger entries for a provider from every database holding
+    ledger_entries into one CSV file, with a single header row.
+    The date bounds let Postgres read only that month's ledger partition.
+
+    Args:
+        path (str): CSV file to write.
+        day (date): Settlement day (UTC).
+        reference_prefix (str): Ledger reference prefix of the provider's transactions.
+        engines: Engines of every shard; the caller owns and disposes them.
+    """
+    start = datetime.combine(day, day_time.min, tzinfo=timezone.utc)
+    with open(path, "wb") as handle:
+        for index, engine in enumerate(engines):
+            async with engine.connect() as conn:
+                raw_connection = await conn.get_raw_connection()
+                await raw_connection.driver_connection.copy_from_query(
+                    EXPORT_LEDGER, start, start + timedelta(days=1), reference_prefix.replace("%", r"\%") + "%",
+                    output=handle, format="csv", header=index == 0,
+                )
+
+
+async def _export_from_shards(path: str, day: date, reference_prefix: str) -> None:
+    from src.database import shard_engines
+
+    try:
+        await export_ledger(path, day, reference_prefix, list(shard_engines.values()))
+    finally:
+        for engine in shard_engines.values():
+            await engine.dispose()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reconcile a provider settlement file against the ledger.")
+    parser.add_argument("--file", required=True, help="Provider settlement CSV")
+    parser.add_argument("--provider", choices=sorted(SETTLEMENT_FORMATS), default="utilities")
+    parser.add_argument("--date", type=date.fromisoformat, help="Settlement day; defaults to yesterday (UTC)")
+    parser.add_argument("--ledger-file", help="Use an existing ledger export instead of querying the database")
+    parser.add_argument("--partitions", type=int, default=DEFAULT_PARTITIONS)
+    args = parser.parse_args()
+
+    settlement_format = SETTLEMENT_FORMATS[args.provider]
+    stem = os.path.splitext(args.file)[0]
+    ledger_path = args.ledger_file
+    if ledger_path is None:
+        day = args.date or (datetime.now(timezone.utc).date() - timedelta(days=1))
+        ledger_path = f"{stem}.ledger.csv"
+        asyncio.run(_export_from_shards(ledger_path, day, settlement_format["ledger_prefix"]))
+
+    started = time.perf_counter()
+    totals = reconcile(args.file, ledger_path, f"{stem}.exceptions.csv",
+                       provider_columns=settlement_format["columns"], partitions=args.partitions)
+    totals["seconds"] = round(time.perf_counter() - started, 2)
+    print(json.dumps(totals, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,208 @@
+"""
+Columnar reconciliation of a provider settlement file against a ledger export.
+
+Both inputs are CSV files streamed in blocks with pyarrow. Rows are spread over
+hash partitions on disk by reference, then each partition is joined on its own
+(a grace hash join), so memory is bounded by the largest partition rather than
+by the file size.
+"""
+import csv
+import os
+import tempfile
+from collections import Counter
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.ipc as pa_ipc
+
+READ_BLOCK_SIZE = 16 << 20  # bytes of CSV per streamed block
+DEFAULT_PARTITIONS = 64
+
+PARTITION_SCHEMA = pa.schema([("reference", pa.string()), ("amount", pa.int64()), ("row", pa.int64())])
+
+REPORT_COLUMNS = ["status", "reference", "provider_amount", "ledger_amount", "provider_row", "ledger_row"]
+
+
+def read_chunks(path: str, reference_column: str, amount_column: str, block_size: int = READ_BLOCK_SIZE):
+    """
+    Stream (references, amounts in kobo, row numbers) from a CSV file.
+
+    Args:
+        path (str): CSV file with a header row.
+        reference_column (str): Column holding the transaction reference.
+        amount_column (str): Column holding the amount in naira, e.g. "1500.50".
+        block_size (int): Bytes parsed per block.
+
+    Yields:
+        tuple: (object array of references, int64 array of kobo, int64 array of 1-based data rows).
+    """
+    reader = pa_csv.open_csv(
+        path,
+        read_options=pa_csv.ReadOptions(block_size=block_size),
+        convert_options=pa_csv.ConvertOptions(
+            include_columns=[reference_column, amount_column],
+            column_types={reference_column: pa.string(), amount_column: pa.float64()},
+        ),
+    )
+    first_row = 1
+    for batch in reader:
+        references = batch.column(0).to_numpy(zero_copy_only=False)
+        amounts = np.rint(batch.column(1).to_numpy(zero_copy_only=False) * 100).astype(np.int64)
+        rows = np.arange(first_row, first_row + batch.num_rows, dtype=np.int64)
+        first_row += batch.num_rows
+        yield references, amounts, rows
+
+
+class _Partitioner:
+    """Appends rows to one Arrow IPC file per hash partition."""
+
+    def __init__(self, directory: str, side: str, partitions: int):
+        self.partitions = partitions
+        self.paths = [os.path.join(directory, f"{side}-{index}.arrow") for index in range(partitions)]
+        self.writers = [None] * partitions
+
+    def write(self, references, amounts, rows) -> None:
+        # Python's str hash is fine here: both sides are partitioned in the same process
+        buckets = np.fromiter((hash(reference) for reference in references), np.int64, len(references))
+        buckets %= self.partitions
+        order = np.argsort(buckets, kind="stable")
+        bounds = np.searchsorted(buckets[order], np.arange(self.partitions + 1))
+        for index in range(self.partitions):
+            start, end = bounds[index], bounds[index + 1]
+            if start == end:
+                continue
+            selected = order[start:end]
+            batch = pa.record_batch([
+                pa.array(references[selected], pa.string()),
+                pa.array(amounts[selected]),
+                pa.array(rows[selected]),
+            ], schema=PARTITION_SCHEMA)
+            if self.writers[index] is None:
+                self.writers[index] = pa_ipc.new_stream(self.paths[index], PARTITION_SCHEMA)
+            self.writers[index].write_batch(batch)
+
+    def close(self) -> None:
+        for writer in self.writers:
+            if writer is not None:
+                writer.close()
+
+    def read(self, index: int):
+        if self.writers[index] is None:
+            return np.empty(0, object), np.empty(0, np.int64), np.empty(0, np.int64)
+        with pa_ipc.open_stream(self.paths[index]) as reader:
+            table = reader.read_all()
+        return (
+            table.column("reference").to_numpy(),
+            table.column("amount").to_numpy(),
+            table.column("row").to_numpy(),
+        )
+
+
+def _duplicates(references) -> set:
+    return {reference for reference, count in Counter(references.tolist()).items() if count > 1}
+
+
+def join_partition(provider: tuple, ledger: tuple, report) -> dict:
+    """
+    Hash-join one partition: build on the provider side, probe with the ledger side.
+
+    Args:
+        provider (tuple): (references, amounts, rows) from the settlement file.
+        ledger (tuple): (references, amounts, rows) from the ledger export.
+        report: csv.writer receiving one line per exception.
+
+    Returns:
+        dict: Counts and kobo totals per outcome.
+    """
+    provider_refs, provider_amounts, provider_rows = provider
+    ledger_refs, ledger_amounts, ledger_rows = ledger
+    totals = Counter()
+
+    # References must be unique on each side; anything repeated is reported and left out of the join
+    duplicates = _duplicates(provider_refs) | _duplicates(ledger_refs)
+    if duplicates:
+        for side, refs, amounts, rows in (("provider", provider_refs, provider_amounts, provider_rows),
+                                          ("ledger", ledger_refs, ledger_amounts, ledger_rows)):
+            repeated = np.fromiter((reference in duplicates for reference in refs), bool, len(refs))
+            for reference, amount, row in zip(refs[repeated], amounts[repeated], rows[repeated]):
+                if side == "provider":
+                    report.writerow(["duplicate_reference", reference, amount, "", row, ""])
+                else:
+                    report.writerow(["duplicate_reference", reference, "", amount, "", row])
+            totals["duplicate_reference"] += int(repeated.sum())
+        keep = np.fromiter((reference not in duplicates for reference in provider_refs), bool, len(provider_refs))
+        provider_refs, provider_amounts, provider_rows = provider_refs[keep], provider_amounts[keep], provider_rows[keep]
+        keep = np.fromiter((reference not in duplicates for reference in ledger_refs), bool, len(ledger_refs))
+        ledger_refs, ledger_amounts, ledger_rows = ledger_refs[keep], ledger_amounts[keep], ledger_rows[keep]
+
+    index = dict(zip(provider_refs.tolist(), range(len(provider_refs))))
+    positions = np.fromiter((index.get(reference, -1) for reference in ledger_refs), np.int64, len(ledger_refs))
+    matched = positions >= 0
+    matched_positions = positions[matched]
+
+    differs = provider_amounts[matched_positions] != ledger_amounts[matched]
+    agreed = ~differs
+    totals["matched"] += int(agreed.sum())
+    totals["matched_kobo"] += int(ledger_amounts[matched][agreed].sum())
+
+    for reference, provider_amount, ledger_amount, provider_row, ledger_row in zip(
+        ledger_refs[matched][differs], provider_amounts[matched_positions][differs], ledger_amounts[matched][differs],
+        provider_rows[matched_positions][differs], ledger_rows[matched][differs],
+    ):
+        report.writerow(["amount_mismatch", reference, provider_amount, ledger_amount, provider_row, ledger_row])
+    totals["amount_mismatch"] += int(differs.sum())
+
+    unmatched = ~matched
+    for reference, amount, row in zip(ledger_refs[unmatched], ledger_amounts[unmatched], ledger_rows[unmatched]):
+        report.writerow(["missing_from_provider", reference, "", amount, "", row])
+    totals["missing_from_provider"] += int(unmatched.sum())
+    totals["missing_from_provider_kobo"] += int(ledger_amounts[unmatched].sum())
+
+    hit = np.zeros(len(provider_refs), bool)
+    hit[matched_positions] = True
+    for reference, amount, row in zip(provider_refs[~hit], provider_amounts[~hit], provider_rows[~hit]):
+        report.writerow(["missing_from_ledger", reference, amount, "", row, ""])
+    totals["missing_from_ledger"] += int((~hit).sum())
+    totals["missing_from_ledger_kobo"] += int(provider_amounts[~hit].sum())
+    return totals
+
+
+def reconcile(provider_path: str, ledger_path: str, report_path: str,
+              provider_columns: tuple = ("reference", "amount"), ledger_columns: tuple = ("reference", "amount"),
+              partitions: int = DEFAULT_PARTITIONS, block_size: int = READ_BLOCK_SIZE) -> dict:
+    """
+    Match a settlement file against a ledger export on reference and amount.
+
+    Amounts are compared in kobo. Every row that is not an exact match is
+    written to report_path with its status and row numbers in both files.
+
+    Args:
+        provider_path (str): Provider settlement CSV.
+        ledger_path (str): Ledger export CSV.
+        report_path (str): Where to write the exceptions CSV.
+        provider_columns (tuple): (reference column, amount column) in the settlement file.
+        ledger_columns (tuple): (reference column, amount column) in the ledger export.
+        partitions (int): Hash partitions; raise it to lower peak memory.
+        block_size (int): Bytes of CSV parsed per block.
+
+    Returns:
+        dict: Row counts and kobo totals per outcome.
+    """
+    totals = Counter()
+    with tempfile.TemporaryDirectory(prefix="reconcile-") as directory:
+        sides = {}
+        for side, path, (reference_column, amount_column) in (("provider", provider_path, provider_columns),
+                                                              ("ledger", ledger_path, ledger_columns)):
+            partitioner = sides[side] = _Partitioner(directory, side, partitions)
+            for references, amounts, rows in read_chunks(path, reference_column, amount_column, block_size):
+                totals[f"{side}_rows"] += len(references)
+                partitioner.write(references, amounts, rows)
+            partitioner.close()
+
+        with open(report_path, "w", newline="", encoding="utf-8") as handle:
+            report = csv.writer(handle)
+            report.writerow(REPORT_COLUMNS)
+            for index in range(partitions):
+                totals.update(join_partition(sides["provider"].read(index), sides["ledger"].read(index), report))
+    return dict(totals)
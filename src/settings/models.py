@@ -0,0 +1,29 @@
+from datetime import datetime, timezone
+
+from sqlalchemy import BigInteger, Column
+from sqlalchemy.types import TIMESTAMP
+from sqlmodel import SQLModel, Field
+from typing import Optional
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class AppSetting(SQLModel, table=True):
+    __tablename__ = "app_settings"
+
+    # A Settings field name, or 'flag:<name>' to switch one feature flag
+    key: str = Field(primary_key=True)
+    # JSON-encoded; null removes the override, and the row stays so the version never goes backwards
+    value: Optional[str] = Field(default=None)
+    # Taken from one sequence across all rows; the highest is the version of the whole table
+    version: int = Field(sa_column=Column(BigInteger, nullable=False))
+    updated_by: Optional[str] = Field(default=None)
+    updated_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
@@ -0,0 +1,15 @@
+from typing import Any, Dict, List
+
+from pydantic import BaseModel
+
+
+class SettingsSnapshot(BaseModel):
+    version: int
+    # Everything but the secrets
+    settings: Dict[str, Any]
+    flags: List[str]
+
+
+class SettingUpdate(BaseModel):
+    # Any JSON value the setting accepts; null removes the override
+    value: Any = None
@@ -0,0 +1,225 @@
+import asyncio
+import json
+import logging
+import os
+from typing import Optional
+
+import dotenv
+from pydantic import BaseModel, ConfigDict, Field, ValidationError
+from sqlalchemy import select
+
+from .models import AppSetting
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+SETTINGS_REFRESH_SECONDS = float(os.getenv("SETTINGS_REFRESH_SECONDS", "30"))
+# Optional JSON file of overrides, {"version": 3, "settings": {...}}; the version must go up with every edit
+SETTINGS_FILE = os.getenv("SETTINGS_FILE")
+FLAG_PREFIX = "flag:"
+SETTINGS_CHANGED = "settings_changed"
+
+
+class Settings(BaseModel):
+    """
+    One immutable snapshot of the app's configuration.
+
+    Every field is read from the environment variable of the same name in
+    upper case, then overridden from SETTINGS_FILE and the app_settings table,
+    except the STARTUP_ONLY ones. Code reads the current snapshot through
+    get_settings(), which is an attribute load: no I/O and no locks.
+    """
+
+    model_config = ConfigDict(frozen=True, extra="forbid")
+
+    version: int = 0
+
+    # Bound when the process starts: secrets, and what engines and clients are built from
+    db_url: Optional[str] = None
+    access_secret_key: str = "your-access-secret-key"
+    refresh_secret_key: str = "your-refresh-secret-key"
+    termii_api_key: Optional[str] = None
+    sender_id: Optional[str] = None
+    base_url: Optional[str] = None
+    # Signs trusted-device credentials (src.authentications.devices); required, see REQUIRED
+    device_credential_secret: Optional[str] = None
+
+    # Tokens and OTPs
+    access_token_expire_minutes: int = Field(15, ge=1)
+    refresh_token_expire_days: int = Field(7, ge=1)
+    otp_max_requests: int = Field(5, ge=1)
+    otp_validity_minutes: int = Field(5, ge=1)
+    # Requests for the same number within this window are answered with the code just issued
+    otp_coalesce_seconds: int = Field(10, ge=0)
+    # OTP rows older than this are ignored, which lets lookups skip all but the latest daily partitions
+    otp_lookup_days: int = Field(1, ge=1)
+
+    # Read replicas
+    max_replica_lag_seconds: float = Field(2, ge=0)
+    # How long a client's reads stay on the primary after it commits a write
+    read_your_writes_seconds: float = Field(5, ge=0)
+
+    # Feature flags that are on; FEATURE_FLAGS in the environment is a comma-separated list
+    flags: frozenset[str] = frozenset({"trusted_device_login", "pin_rehash_on_login"})
+
+    def enabled(self, flag: str) -> bool:
+        return flag in self.flags
+
+
+STARTUP_ONLY = {"db_url", "access_secret_key", "refresh_secret_key", "termii_api_key", "sender_id", "base_url",
+                "device_credential_secret"}
+SECRETS = {"db_url", "access_secret_key", "refresh_secret_key", "termii_api_key", "device_credential_secret"}
+# The app refuses to start without these; a shared default would let anyone forge what they sign
+REQUIRED = {"device_credential_secret"}
+
+
+def missing_required(settings: Settings) -> list:
+    """
+    Returns:
+        list: Environment variable names of REQUIRED settings that are unset or empty.
+    """
+    return sorted(name.upper() for name in REQUIRED if not getattr(settings, name))
+
+
+def env_values(environ=os.environ) -> dict:
+    values = {name: environ[name.upper()] for name in Settings.model_fields if name.upper() in environ}
+    if "FEATURE_FLAGS" in environ:
+        values["flags"] = {flag.strip() for flag in environ["FEATURE_FLAGS"].split(",") if flag.strip()}
+    values.pop("version", None)
+    return values
+
+
+def apply_overrides(values: dict, overrides: dict) -> dict:
+    """
+    Layer file or table overrides onto values. Startup-only keys are ignored,
+    since changing them needs a restart; a None value removes an override.
+
+    Returns:
+        dict: New values; the arguments are left unchanged.
+    """
+    values = dict(values)
+    flags = set(values.get("flags", Settings.model_fields["flags"].default))
+    for key, value in overrides.items():
+        if value is None:
+            continue
+        if key.startswith(FLAG_PREFIX):
+            (flags.add if value else flags.discard)(key[len(FLAG_PREFIX):])
+        elif key in STARTUP_ONLY:
+            logger.warning("Ignoring override of %s; it is only read at startup", key)
+        elif key == "flags":
+            flags = set(value)
+        else:
+            values[key] = value
+    values["flags"] = flags
+    return values
+
+
+def build_settings(version: int, environment: dict, *layers: dict) -> Settings:
+    """
+    Args:
+        version (int): Version of the resulting snapshot.
+        environment (dict): Values from env_values(), startup-only ones included.
+        layers (dict): Overrides, applied in order.
+
+    Raises:
+        pydantic.ValidationError: If a value has the wrong type or a key is unknown.
+    """
+    values = environment
+    for layer in layers:
+        values = apply_overrides(values, layer)
+    return Settings(**values, version=version)
+
+
+def read_settings_file(path: str) -> tuple:
+    """
+    Returns:
+        tuple: (version, overrides) from a settings file, or (0, {}) if there is none.
+    """
+    if not path or not os.path.exists(path):
+        return 0, {}
+    with open(path) as file:
+        document = json.load(file)
+    return int(document.get("version", 0)), document.get("settings", {})
+
+
+async def read_settings_table(session_factory) -> tuple:
+    """
+    Returns:
+        tuple: (highest row version, overrides) from the app_settings table.
+    """
+    async with session_factory() as db_session:
+        rows = (await db_session.execute(select(AppSetting.key, AppSetting.value, AppSetting.version))).all()
+    overrides = {row.key: json.loads(row.value) if row.value is not None else None for row in rows}
+    return max((row.version for row in rows), default=0), overrides
+
+
+class SettingsStore:
+    """
+    Holds the current Settings and replaces it wholesale when a newer version
+    is loaded. Readers keep whatever snapshot they picked up, so one request
+    never sees half of a change.
+
+    The version is the settings file's plus the table's; both only go up, so
+    an older read (say from before a concurrent write) is never swapped in
+    over a newer one.
+    """
+
+    def __init__(self, environment: dict):
+        self.environment = environment
+        self.current = build_settings(0, environment)
+        # Set by other workers' change notifications to refresh before the next poll
+        self.wake = asyncio.Event()
+
+    def swap(self, candidate: Settings) -> bool:
+        if candidate.version <= self.current.version:
+            return False
+        self.current = candidate
+        logger.info("Settings version %d in effect", candidate.version)
+        return True
+
+    async def refresh(self, session_factory=None, path: str = SETTINGS_FILE) -> Settings:
+        """
+        Reload the file and the table and swap in the result if it is newer.
+        An invalid result is logged and the current snapshot stays in effect.
+
+        Returns:
+            Settings: The snapshot in effect afterwards.
+        """
+        file_version, file_overrides = await asyncio.to_thread(read_settings_file, path)
+        table_version, table_overrides = (0, {}) if session_factory is None else await read_settings_table(
+            session_factory
+        )
+        version = file_version + table_version
+        if version > self.current.version:
+            try:
+                self.swap(build_settings(version, self.environment, file_overrides, table_overrides))
+            except ValidationError:
+                logger.exception("Rejected settings version %d; keeping version %d", version, self.current.version)
+        return self.current
+
+    async def run(self, session_factory, stop_event: asyncio.Event,
+                  interval_seconds: float = SETTINGS_REFRESH_SECONDS) -> None:
+        """
+        Refresh every interval_seconds, or sooner when woken, until stop_event
+        is set. Started as a background task from the app lifespan.
+        """
+        while not stop_event.is_set():
+            try:
+                await self.refresh(session_factory)
+            except Exception:
+                # An unreachable database leaves the last good snapshot in effect
+                logger.exception("Settings refresh failed")
+            waiters = [asyncio.ensure_future(stop_event.wait()), asyncio.ensure_future(self.wake.wait())]
+            await asyncio.wait(waiters, timeout=interval_seconds, return_when=asyncio.FIRST_COMPLETED)
+            for waiter in waiters:
+                waiter.cancel()
+            self.wake.clear()
+
+
+settings_store = SettingsStore(env_values())
+
+
+def get_settings() -> Settings:
+    """The snapshot in effect. Read it once per unit of work and use that copy throughout."""
+    return settings_store.current
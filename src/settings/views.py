@@ -0,0 +1,82 @@
+import json
+from datetime import datetime, timezone
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.exceptions import HTTPException
+from pydantic import ValidationError
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.audit.writer import audit_log
+from src.authentications.models import User
+from src.authentications.utilities import get_staff_user
+from src.database import get_home_db, shard_router
+from src.notifications.push import event_hooks, publish_event
+from .models import AppSetting
+from .schemas import SettingsSnapshot, SettingUpdate
+from .services import (
+    FLAG_PREFIX,
+    SECRETS,
+    SETTINGS_CHANGED,
+    STARTUP_ONLY,
+    Settings,
+    build_settings,
+    get_settings,
+    settings_store,
+)
+
+router = APIRouter(prefix="/settings", tags=["settings"])
+
+
+def _on_settings_event(user_id: str, event: dict) -> None:
+    # Another worker changed the table; refresh now instead of at the next poll
+    if event.get("type") == SETTINGS_CHANGED:
+        settings_store.wake.set()
+
+
+event_hooks.append(_on_settings_event)
+
+
+def _snapshot(settings: Settings) -> dict:
+    values = settings.model_dump(exclude=SECRETS | {"version", "flags"})
+    return {"version": settings.version, "settings": values, "flags": sorted(settings.flags)}
+
+
+@router.get("/", response_model=SettingsSnapshot)
+async def current_settings(staff_user: User = Depends(get_staff_user)):
+    return _snapshot(get_settings())
+
+
+@router.put("/{key}", response_model=SettingsSnapshot)
+async def update_setting(key: str, request: SettingUpdate, http_request: Request,
+                         db: AsyncSession = Depends(get_home_db), staff_user: User = Depends(get_staff_user)):
+    # Step 1: Only reloadable settings and flags can be changed, and only to values they accept
+    if key in STARTUP_ONLY or (key not in Settings.model_fields and not key.startswith(FLAG_PREFIX)) \
+            or key == "version":
+        raise HTTPException(status_code=404, detail="No such reloadable setting.")
+    if key.startswith(FLAG_PREFIX) and not isinstance(request.value, (bool, type(None))):
+        raise HTTPException(status_code=422, detail="Feature flags are true, false or null.")
+    try:
+        build_settings(0, settings_store.environment, {key: request.value})
+    except ValidationError as error:
+        raise HTTPException(status_code=422, detail=error.errors(include_url=False, include_context=False))
+
+    # Step 2: Write it with the next version; the lock keeps concurrent writers from sharing one
+    await db.execute(text("SELECT pg_advisory_xact_lock(hashtext('app_settings'))"))
+    version = (await db.execute(select(func.coalesce(func.max(AppSetting.version), 0)))).scalar() + 1
+    setting = await db.get(AppSetting, key) or AppSetting(key=key, version=version)
+    setting.value = json.dumps(request.value) if request.value is not None else None
+    setting.version = version
+    setting.updated_by = staff_user.phone_e164
+    setting.updated_date = datetime.now(timezone.utc)
+    db.add(setting)
+
+    # Step 3: Other workers refresh when this commits; this one refreshes straight away
+    await publish_event(db, staff_user.id, SETTINGS_CHANGED, {"key": key, "version": version})
+    await db.commit()
+    settings = await settings_store.refresh(shard_router.session_factory())
+
+    await audit_log.record_request(http_request, "setting_changed", actor=staff_user.phone_e164,
+                                   user_id=staff_user.id, details={"key": key, "value": request.value,
+                                                                   "version": version})
+    return _snapshot(settings)
@@ -0,0 +1,245 @@
+"""
+Online shard split: move the users a new shard will own onto it.
+
+Usage:
+    1. Add the new database to SHARD_DB_URLS, list it in SHARD_PENDING and deploy.
+       It gets the schema at startup but no traffic.
+    2. python -m src.shard_split copy shard2      # bulk copy while serving; repeatable
+    3. Set SHARD_FREEZE_MOVING=true and deploy. Requests for the users being
+       moved (about 1/N of them) get 503 Retry-After; everyone else is unaffected.
+    4. python -m src.shard_split copy shard2      # final sync; nothing writes these rows now
+       python -m src.shard_split verify shard2
+    5. Remove shard2 from SHARD_PENDING, unset SHARD_FREEZE_MOVING and deploy.
+    6. python -m src.shard_split cleanup          # delete rows from shards that no longer own them
+
+Copies replace the target's rows for each batch of users, so re-running after
+a failure or after more writes on the source is always safe.
+"""
+import argparse
+import asyncio
+
+from sqlalchemy import delete, func, insert, select
+
+from src.authentications.models import InitUser, OTP, OTPRequestLimit, TrustedDevice, User
+from src.transactions.models import LedgerEntry, Loan, LoanInstallment, Wallet
+
+SPLIT_BATCH_SIZE = 500
+
+users = User.__table__
+devices = TrustedDevice.__table__
+wallets = Wallet.__table__
+loans = Loan.__table__
+installments = LoanInstallment.__table__
+ledger = LedgerEntry.__table__
+# Rows owned by a user, in foreign-key order
+USER_TABLES = {"users": users, "devices": devices, "wallets": wallets, "loans": loans, "installments": installments, "ledger": ledger}
+# Tables keyed directly by phone number that are not linked to a user row
+PHONE_TABLES = (InitUser.__table__, OTP.__table__, OTPRequestLimit.__table__)
+
+
+async def _scan(session_factory, table, batch_size: int):
+    """
+    Yield (id, phone_e164) batches from a phone-keyed table in id order.
+    """
+    last_id = None
+    while True:
+        statement = select(table.c.id, table.c.phone_e164).order_by(table.c.id).limit(batch_size)
+        if last_id is not None:
+            statement = statement.where(table.c.id > last_id)
+        async with session_factory() as session:
+            rows = (await session.execute(statement)).all()
+        if not rows:
+            return
+        last_id = rows[-1].id
+        yield rows
+
+
+async def _fetch(session, table, column, values) -> list:
+    if not values:
+        return []
+    result = await session.execute(select(table).where(column.in_(values)))
+    return [dict(row) for row in result.mappings().all()]
+
+
+async def _user_rows(session, user_ids: list) -> dict:
+    user_wallets = await _fetch(session, wallets, wallets.c.user_id, user_ids)
+    user_loans = await _fetch(session, loans, loans.c.user_id, user_ids)
+    wallet_ids = [row["id"] for row in user_wallets]
+    loan_ids = [row["id"] for row in user_loans]
+    return {
+        "users": await _fetch(session, users, users.c.id, user_ids),
+        "devices": await _fetch(session, devices, devices.c.user_id, user_ids),
+        "wallets": user_wallets,
+        "loans": user_loans,
+        "installments": await _fetch(session, installments, installments.c.loan_id, loan_ids),
+        "ledger": await _fetch(session, ledger, ledger.c.wallet_id, wallet_ids),
+        "wallet_ids": wallet_ids,
+        "loan_ids": loan_ids,
+    }
+
+
+async def _delete_user_rows(session, user_ids: list, wallet_ids: list, loan_ids: list) -> None:
+    # Children first so foreign keys hold throughout
+    await session.execute(delete(ledger).where(ledger.c.wallet_id.in_(wallet_ids)))
+    await session.execute(delete(installments).where(installments.c.loan_id.in_(loan_ids)))
+    await session.execute(delete(loans).where(loans.c.user_id.in_(user_ids)))
+    await session.execute(delete(wallets).where(wallets.c.user_id.in_(user_ids)))
+    await session.execute(delete(devices).where(devices.c.user_id.in_(user_ids)))
+    await session.execute(delete(users).where(users.c.id.in_(user_ids)))
+
+
+async def _replace_user_rows(target_factory, user_ids: list, rows: dict) -> None:
+    async with target_factory() as session:
+        existing_wallets = (await session.execute(
+            select(wallets.c.id).where(wallets.c.user_id.in_(user_ids))
+        )).scalars().all()
+        existing_loans = (await session.execute(
+            select(loans.c.id).where(loans.c.user_id.in_(user_ids))
+        )).scalars().all()
+        await _delete_user_rows(session, user_ids, existing_wallets, existing_loans)
+        for key, table in USER_TABLES.items():
+            if rows[key]:
+                await session.execute(insert(table), rows[key])
+        await session.commit()
+
+
+async def copy_to(router, target: str, batch_size: int = SPLIT_BATCH_SIZE) -> dict:
+    """
+    Copy every user the target shard will own from the shards that own them now.
+
+    Returns:
+        dict: Rows copied per table.
+    """
+    copied = {key: 0 for key in USER_TABLES}
+    copied.update({table.name: 0 for table in PHONE_TABLES})
+    target_factory = router.session_factories[target]
+    for source in router.ring.nodes:
+        if source == target:
+            continue
+        source_factory = router.session_factories[source]
+
+        async for batch in _scan(source_factory, users, batch_size):
+            user_ids = [row.id for row in batch if router.target_ring.node_for(row.phone_e164) == target]
+            if not user_ids:
+                continue
+            async with source_factory() as session:
+                rows = await _user_rows(session, user_ids)
+            await _replace_user_rows(target_factory, user_ids, rows)
+            for key in USER_TABLES:
+                copied[key] += len(rows[key])
+
+        for table in PHONE_TABLES:
+            async for batch in _scan(source_factory, table, batch_size):
+                phones = list({
+                    row.phone_e164 for row in batch if router.target_ring.node_for(row.phone_e164) == target
+                })
+                if not phones:
+                    continue
+                async with source_factory() as session:
+                    rows = await _fetch(session, table, table.c.phone_e164, phones)
+                async with target_factory() as session:
+                    await session.execute(delete(table).where(table.c.phone_e164.in_(phones)))
+                    if rows:
+                        await session.execute(insert(table), rows)
+                    await session.commit()
+                copied[table.name] += len(rows)
+    return copied
+
+
+async def _user_totals(session, user_ids: list) -> tuple:
+    user_count = (await session.execute(
+        select(func.count()).select_from(users).where(users.c.id.in_(user_ids))
+    )).scalar()
+    wallet_count, balance = (await session.execute(
+        select(func.count(wallets.c.id), func.coalesce(func.sum(wallets.c.balance), 0))
+        .where(wallets.c.user_id.in_(user_ids))
+    )).one()
+    return user_count, wallet_count, balance
+
+
+async def verify(router, target: str, batch_size: int = SPLIT_BATCH_SIZE) -> list:
+    """
+    Compare the moving users' rows and wallet balances between the sources and the target.
+
+    Returns:
+        list: Descriptions of mismatches; empty when the copy is complete.
+    """
+    mismatches = []
+    target_factory = router.session_factories[target]
+    for source in router.ring.nodes:
+        if source == target:
+            continue
+        source_factory = router.session_factories[source]
+        async for batch in _scan(source_factory, users, batch_size):
+            user_ids = [row.id for row in batch if router.target_ring.node_for(row.phone_e164) == target]
+            if not user_ids:
+                continue
+            totals = []
+            for session_factory in (source_factory, target_factory):
+                async with session_factory() as session:
+                    totals.append(await _user_totals(session, user_ids))
+            if totals[0] != totals[1]:
+                mismatches.append(f"{source}: users {user_ids[0]}..{user_ids[-1]} differ: "
+                                  f"(users, wallets, balance) {totals[0]} vs {totals[1]}")
+    return mismatches
+
+
+async def cleanup(router, batch_size: int = SPLIT_BATCH_SIZE) -> dict:
+    """
+    Delete rows from every shard that the current ring assigns to another shard.
+    Run only after the split is live, i.e. nothing is pending any more.
+
+    Returns:
+        dict: Users and phone-keyed rows deleted per shard.
+    """
+    if router.target_ring is not router.ring:
+        raise RuntimeError("A split is still pending; finish it before cleaning up")
+    deleted = {}
+    for shard, session_factory in router.session_factories.items():
+        deleted[shard] = 0
+        async for batch in _scan(session_factory, users, batch_size):
+            user_ids = [row.id for row in batch if router.shard_for(row.phone_e164) != shard]
+            if not user_ids:
+                continue
+            async with session_factory() as session:
+                rows = await _user_rows(session, user_ids)
+                await _delete_user_rows(session, user_ids, rows["wallet_ids"], rows["loan_ids"])
+                await session.commit()
+            deleted[shard] += len(user_ids)
+
+        for table in PHONE_TABLES:
+            async for batch in _scan(session_factory, table, batch_size):
+                phones = list({row.phone_e164 for row in batch if router.shard_for(row.phone_e164) != shard})
+                if not phones:
+                    continue
+                async with session_factory() as session:
+                    result = await session.execute(delete(table).where(table.c.phone_e164.in_(phones)))
+                    await session.commit()
+                deleted[shard] += result.rowcount
+    return deleted
+
+
+async def main(command: str, target: str) -> None:
+    from src.database import shard_engines, shard_router
+
+    try:
+        if command == "copy":
+            print(await copy_to(shard_router, target))
+        elif command == "verify":
+            mismatches = await verify(shard_router, target)
+            print("\n".join(mismatches) if mismatches else "All moving users match")
+        else:
+            print(await cleanup(shard_router))
+    finally:
+        for engine in shard_engines.values():
+            await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("command", choices=["copy", "verify", "cleanup"])
+    parser.add_argument("target", nargs="?", help="Shard being added (copy and verify)")
+    args = parser.parse_args()
+    if args.command != "cleanup" and not args.target:
+        parser.error("copy and verify need the target shard")
+    asyncio.run(main(args.command, args.target))
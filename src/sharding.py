@@ -0,0 +1,139 @@
+"""
+Route each user's data to one of several Postgres databases by phone number.
+
+A user's rows (users, initusers, otp, wallets, loans, installments, ledger)
+live on the shard that owns their canonical phone number on a consistent-hash
+ring, so adding a shard moves only about 1/N of the users. Tables that are not
+owned by a user (campaigns, audit log, outbox consumers) stay on the home shard,
+which is the database at DB_URL.
+"""
+import bisect
+import hashlib
+from typing import Optional
+
+from jose import JWTError, jwt
+
+from src.authentications.phone import InvalidPhoneNumber, normalize_phone_number
+
+# Points per shard on the ring; more points give a more even spread
+VNODES = 256
+
+
+def _hash(value: str) -> int:
+    # Stable across processes and Python versions, unlike hash()
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), "big")
+
+
+class HashRing:
+    def __init__(self, nodes, vnodes: int = VNODES):
+        points = sorted((_hash(f"{node}#{index}"), node) for node in nodes for index in range(vnodes))
+        self.nodes = sorted(set(nodes))
+        self._hashes = [point for point, _ in points]
+        self._owners = [node for _, node in points]
+
+    def node_for(self, key: str) -> str:
+        index = bisect.bisect(self._hashes, _hash(key)) % len(self._hashes)
+        return self._owners[index]
+
+
+class ShardMoving(Exception):
+    """The key is being copied to a new shard and is briefly unavailable."""
+
+
+class ShardRouter:
+    def __init__(self, session_factories: dict, home: str, pending=(), freeze_moving: bool = False,
+                 vnodes: int = VNODES):
+        """
+        Args:
+            session_factories (dict): Shard name -> session factory for its primary.
+            home (str): Shard holding the tables that are not sharded.
+            pending (iterable): Shards being added by a split; they own no keys yet.
+            freeze_moving (bool): Refuse keys that the split is about to move, for the final sync.
+            vnodes (int): Ring points per shard.
+        """
+        pending = set(pending)
+        self.session_factories = session_factories
+        self.home = home
+        self.freeze_moving = freeze_moving
+        self.ring = HashRing([name for name in session_factories if name not in pending], vnodes)
+        # The ring after the split completes; identical to ring when nothing is pending
+        self.target_ring = HashRing(list(session_factories), vnodes) if pending else self.ring
+
+    @property
+    def sharded(self) -> bool:
+        return len(self.session_factories) > 1
+
+    def shard_for(self, phone_e164: str) -> str:
+        return self.ring.node_for(phone_e164)
+
+    def is_moving(self, phone_e164: str) -> bool:
+        return self.target_ring.node_for(phone_e164) != self.ring.node_for(phone_e164)
+
+    def session_factory(self, phone_e164: Optional[str] = None):
+        """
+        Session factory for the shard owning phone_e164, or the home shard if no key is given.
+
+        Raises:
+            ShardMoving: If the key is frozen for an in-progress split.
+        """
+        if phone_e164 is None:
+            return self.session_factories[self.home]
+        if self.freeze_moving and self.is_moving(phone_e164):
+            raise ShardMoving(phone_e164)
+        return self.session_factories[self.shard_for(phone_e164)]
+
+
+def parse_shard_urls(value: str) -> dict:
+    """
+    Parse "name=url,name=url" into an ordered dict. The first shard is the home shard.
+    """
+    shards = {}
+    for item in value.split(","):
+        if item.strip():
+            name, _, url = item.partition("=")
+            shards[name.strip()] = url.strip()
+    return shards
+
+
+def phone_from_token(token: str) -> Optional[str]:
+    """
+    Canonical phone number in a JWT's subject, without verifying the signature.
+
+    Only used to pick a shard; the token is still verified by whoever reads the
+    user, so a forged subject just sends the request to a shard where it fails.
+    """
+    try:
+        subject = jwt.get_unverified_claims(token).get("sub")
+        return normalize_phone_number(subject) if subject else None
+    except (JWTError, InvalidPhoneNumber, AttributeError):
+        return None
+
+
+async def shard_key(request) -> Optional[str]:
+    """
+    Find the phone number a request is about: the bearer token's subject, a
+    token passed as a query parameter, or phone_number in a JSON body.
+    """
+    authorization = request.headers.get("authorization", "")
+    if authorization.lower().startswith("bearer "):
+        phone = phone_from_token(authorization[7:].strip())
+        if phone:
+            return phone
+
+    for parameter in ("token", "refresh_token"):
+        if parameter in request.query_params:
+            phone = phone_from_token(request.query_params[parameter])
+            if phone:
+                return phone
+
+    if request.headers.get("content-type", "").startswith("application/json"):
+        try:
+            body = await request.json()
+        except ValueError:
+            return None
+        if isinstance(body, dict) and isinstance(body.get("phone_number"), str):
+            try:
+                return normalize_phone_number(body["phone_number"])
+            except InvalidPhoneNumber:
+                return None
+    return None
@@ -0,0 +1,96 @@
+from datetime import datetime, timezone
+from decimal import Decimal
+
+from sqlalchemy import Column, Index, Numeric
+from sqlalchemy.types import TIMESTAMP
+from sqlmodel import SQLModel, Field
+from typing import Optional
+from uuid import UUID, uuid4
+
+
+def utc_now() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class Wallet(SQLModel, table=True):
+    __tablename__ = "wallets"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    user_id: UUID = Field(foreign_key="users.id", nullable=False, unique=True)
+    balance: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False, default=0))
+    currency: str = Field(default="NGN", nullable=False)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+
+
+class LedgerEntry(SQLModel, table=True):
+    __tablename__ = "ledger_entries"
+    # Monthly partitions maintained by src.partitions; the partition key has to be part of the primary key
+    __table_args__ = {"postgresql_partition_by": "RANGE (created_date)"}
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    wallet_id: UUID = Field(foreign_key="wallets.id", nullable=False, index=True)
+    entry_type: str = Field(nullable=False)  # 'debit' or 'credit'
+    amount: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False))
+    # One per business event. Postgres cannot enforce uniqueness across partitions on this
+    # column alone; the scheduler guarantees it by posting under the installment row lock.
+    # Lookups only see attached partitions, so postings must not be retried once their
+    # partition may be archived (see src.partitions.retained_since).
+    reference: str = Field(nullable=False, index=True)
+    description: Optional[str] = Field(default=None)
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            primary_key=True,
+            nullable=False,
+            default=utc_now
+        )
+    )
+
+
+class Loan(SQLModel, table=True):
+    __tablename__ = "loans"
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    user_id: UUID = Field(foreign_key="users.id", nullable=False, index=True)
+    wallet_id: UUID = Field(foreign_key="wallets.id", nullable=False)
+    principal: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False))
+    status: str = Field(default="active", nullable=False)  # 'active', 'repaid', 'defaulted'
+    created_date: datetime = Field(
+        sa_column=Column(
+            TIMESTAMP(timezone=True),
+            nullable=False,
+            default=utc_now
+        )
+    )
+
+
+class LoanInstallment(SQLModel, table=True):
+    __tablename__ = "loan_installments"
+    __table_args__ = (
+        # Serves the scheduler's "pending and due" claim query
+        Index("ix_loan_installments_status_due_date", "status", "due_date"),
+    )
+
+    id: UUID = Field(default_factory=uuid4, primary_key=True, index=True)
+    loan_id: UUID = Field(foreign_key="loans.id", nullable=False, index=True)
+    wallet_id: UUID = Field(foreign_key="wallets.id", nullable=False)
+    amount: Decimal = Field(sa_column=Column(Numeric(18, 2), nullable=False))
+    status: str = Field(default="pending", nullable=False)  # 'pending', 'paid', 'failed'
+    attempts: int = Field(default=0, nullable=False)
+    due_date: datetime = Field(sa_column=Column(TIMESTAMP(timezone=True), nullable=False))
+    next_attempt_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+    paid_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
+    # Set once the owner has been reminded that this installment is coming due
+    reminded_date: Optional[datetime] = Field(
+        default=None, sa_column=Column(TIMESTAMP(timezone=True), nullable=True)
+    )
@@ -0,0 +1,291 @@
+import asyncio
+import logging
+import os
+import time
+from collections import defaultdict
+from datetime import datetime, timezone, timedelta
+from decimal import Decimal
+
+import dotenv
+from sqlalchemy import bindparam, case, insert, or_, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.notifications.push import publish_events
+from src.outbox.services import add_outbox_events
+from .models import LedgerEntry, Loan, LoanInstallment, Wallet
+
+dotenv.load_dotenv()
+
+logger = logging.getLogger(__name__)
+
+REPAYMENT_BATCH_SIZE = int(os.getenv("REPAYMENT_BATCH_SIZE", "500"))
+REPAYMENT_POLL_INTERVAL = timedelta(minutes=int(os.getenv("REPAYMENT_POLL_MINUTES", "60")))
+REPAYMENT_RETRY_DELAY = timedelta(hours=6)
+MAX_REPAYMENT_ATTEMPTS = 3
+# How long before its due date the owner of an installment is reminded
+LOAN_REMINDER_LEAD = timedelta(hours=int(os.getenv("LOAN_REMINDER_HOURS", "24")))
+LOAN_REMINDER = "loan_reminder"
+
+loans = Loan.__table__
+installments = LoanInstallment.__table__
+wallets = Wallet.__table__
+
+
+async def collect_due_batch(db_session: AsyncSession, batch_size: int = REPAYMENT_BATCH_SIZE) -> dict:
+    """
+    Claim one chunk of due installments and settle it in a single transaction.
+
+    Rows are claimed with FOR UPDATE SKIP LOCKED so any number of workers can run
+    this concurrently without blocking on, or double-charging, each other. If the
+    process dies mid-batch the transaction rolls back and the rows are picked up
+    again on the next run.
+
+    Args:
+        db_session (AsyncSession): The database session.
+        batch_size (int): Maximum number of installments to claim.
+
+    Returns:
+        dict: Counts of claimed, paid and failed installments.
+    """
+    time_now = datetime.now(timezone.utc)
+
+    # Step 1: Claim due installments nobody else is working on
+    statement = (
+        select(installments.c.id, installments.c.loan_id, installments.c.wallet_id, installments.c.amount,
+               installments.c.attempts)
+        .where(
+            installments.c.status == "pending",
+            installments.c.due_date <= time_now,
+            or_(installments.c.next_attempt_date.is_(None), installments.c.next_attempt_date <= time_now),
+        )
+        .order_by(installments.c.due_date)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)
+    )
+    claimed = (await db_session.execute(statement)).all()
+    if not claimed:
+        await db_session.rollback()
+        return {"claimed": 0, "paid": 0, "failed": 0}
+
+    # Step 2: Lock the affected wallets in a fixed order so workers cannot deadlock
+    wallet_ids = sorted({row.wallet_id for row in claimed})
+    statement = (
+        select(wallets.c.id, wallets.c.user_id, wallets.c.balance)
+        .where(wallets.c.id.in_(wallet_ids))
+        .order_by(wallets.c.id)
+        .with_for_update()
+    )
+    wallet_rows = (await db_session.execute(statement)).all()
+    balances = {row.id: row.balance for row in wallet_rows}
+    owners = {row.id: row.user_id for row in wallet_rows}
+
+    # Step 3: Decide in memory which installments the wallets can cover
+    paid, failed = [], []
+    debits = defaultdict(Decimal)
+    for row in claimed:
+        balance = balances.get(row.wallet_id, Decimal("0"))
+        if balance >= row.amount:
+            balances[row.wallet_id] = balance - row.amount
+            debits[row.wallet_id] += row.amount
+            paid.append(row)
+        else:
+            failed.append(row)
+
+    # Step 4: Post all debits with one statement per table
+    if paid:
+        await db_session.execute(
+            insert(LedgerEntry.__table__),
+            [
+                {
+                    "wallet_id": row.wallet_id,
+                    "entry_type": "debit",
+                    "amount": row.amount,
+                    "reference": f"loan-installment:{row.id}",
+                    "description": "Loan repayment",
+                    "created_date": time_now,
+                }
+                for row in paid
+            ],
+        )
+        await db_session.execute(
+            update(wallets)
+            .where(wallets.c.id == bindparam("b_wallet_id"))
+            .values(balance=wallets.c.balance - bindparam("b_amount")),
+            [{"b_wallet_id": wallet_id, "b_amount": amount} for wallet_id, amount in debits.items()],
+        )
+        await db_session.execute(
+            update(installments)
+            .where(installments.c.id.in_([row.id for row in paid]))
+            .values(status="paid", paid_date=time_now, attempts=installments.c.attempts + 1)
+        )
+        # A loan is repaid once none of its installments is left unpaid
+        outstanding = select(installments.c.id).where(
+            installments.c.loan_id == loans.c.id, installments.c.status != "paid"
+        ).exists()
+        await db_session.execute(
+            update(loans)
+            .where(loans.c.id.in_(sorted({row.loan_id for row in paid})), loans.c.status == "active", ~outstanding)
+            .values(status="repaid")
+        )
+        await add_outbox_events(db_session, [
+            ("ledger.posted", row.wallet_id, {
+                "reference": f"loan-installment:{row.id}",
+                "entry_type": "debit",
+                "amount": row.amount,
+                "user_id": owners[row.wallet_id],
+            })
+            for row in paid
+        ])
+        # Delivered to connected clients only if this transaction commits
+        await publish_events(db_session, [
+            (owners[row.wallet_id], "loan_repayment", {"installment_id": row.id, "amount": row.amount})
+            for row in paid
+        ])
+
+    # Step 5: Push back the ones that bounced, giving up after MAX_REPAYMENT_ATTEMPTS
+    if failed:
+        await db_session.execute(
+            update(installments)
+            .where(installments.c.id.in_([row.id for row in failed]))
+            .values(
+                attempts=installments.c.attempts + 1,
+                next_attempt_date=time_now + REPAYMENT_RETRY_DELAY,
+                status=case(
+                    (installments.c.attempts + 1 >= MAX_REPAYMENT_ATTEMPTS, "failed"),
+                    else_="pending",
+                ),
+            )
+        )
+
+    await db_session.commit()
+    return {"claimed": len(claimed), "paid": len(paid), "failed": len(failed)}
+
+
+async def send_due_reminders(db_session: AsyncSession, batch_size: int = REPAYMENT_BATCH_SIZE,
+                             lead: timedelta = LOAN_REMINDER_LEAD) -> int:
+    """
+    Push a reminder for one chunk of installments falling due within `lead`.
+
+    Each installment is reminded once: it is marked in the same transaction that
+    carries the push, and rows are claimed with FOR UPDATE SKIP LOCKED so
+    concurrent schedulers do not remind twice.
+
+    Args:
+        db_session (AsyncSession): The database session.
+        batch_size (int): Maximum number of installments to claim.
+        lead (timedelta): How far ahead of the due date to remind.
+
+    Returns:
+        int: Number of reminders sent.
+    """
+    time_now = datetime.now(timezone.utc)
+
+    # Step 1: Claim upcoming installments nobody has been reminded of
+    statement = (
+        select(installments.c.id, installments.c.loan_id, installments.c.amount, installments.c.due_date,
+               loans.c.user_id)
+        .join(loans, loans.c.id == installments.c.loan_id)
+        .where(
+            installments.c.status == "pending",
+            installments.c.due_date > time_now,
+            installments.c.due_date <= time_now + lead,
+            installments.c.reminded_date.is_(None),
+        )
+        .order_by(installments.c.due_date)
+        .limit(batch_size)
+        .with_for_update(of=installments, skip_locked=True)
+    )
+    claimed = (await db_session.execute(statement)).all()
+    if not claimed:
+        await db_session.rollback()
+        return 0
+
+    # Step 2: Mark them and push the reminders; both take effect on commit
+    await db_session.execute(
+        update(installments).where(installments.c.id.in_([row.id for row in claimed])).values(reminded_date=time_now)
+    )
+    await publish_events(db_session, [
+        (row.user_id, LOAN_REMINDER, {
+            "installment_id": row.id, "loan_id": row.loan_id, "amount": row.amount, "due_date": row.due_date,
+        })
+        for row in claimed
+    ])
+    await db_session.commit()
+    return len(claimed)
+
+
+async def run_reminders(session_factory, batch_size: int = REPAYMENT_BATCH_SIZE,
+                        stop_event: asyncio.Event = None) -> int:
+    """
+    Send every reminder that is currently due, one batch at a time.
+
+    Returns:
+        int: Number of reminders sent.
+    """
+    sent = 0
+    while stop_event is None or not stop_event.is_set():
+        async with session_factory() as db_session:
+            count = await send_due_reminders(db_session, batch_size)
+        if not count:
+            break
+        sent += count
+    if sent:
+        logger.info("Loan reminders: %d sent", sent)
+    return sent
+
+
+async def run_collection(session_factory, batch_size: int = REPAYMENT_BATCH_SIZE, stop_event: asyncio.Event = None) -> dict:
+    """
+    Drain every installment that is currently due, one batch at a time.
+
+    Args:
+        session_factory: Callable returning a new AsyncSession.
+        batch_size (int): Installments claimed per transaction.
+        stop_event (asyncio.Event): Optional event that ends the run between batches.
+
+    Returns:
+        dict: Totals plus elapsed seconds and installments per second.
+    """
+    totals = {"claimed": 0, "paid": 0, "failed": 0}
+    started = time.perf_counter()
+
+    while stop_event is None or not stop_event.is_set():
+        async with session_factory() as db_session:
+            counts = await collect_due_batch(db_session, batch_size)
+        if not counts["claimed"]:
+            break
+        for key, value in counts.items():
+            totals[key] += value
+
+    elapsed = time.perf_counter() - started
+    totals["elapsed_seconds"] = round(elapsed, 3)
+    totals["installments_per_second"] = round(totals["claimed"] / elapsed, 1) if elapsed else 0.0
+    if totals["claimed"]:
+        logger.info(
+            "Repayment collection: %(claimed)d claimed, %(paid)d paid, %(failed)d failed "
+            "in %(elapsed_seconds)ss (%(installments_per_second)s installments/s)",
+            totals,
+        )
+    return totals
+
+
+async def run_scheduler(session_factory, stop_event: asyncio.Event) -> None:
+    """
+    Run repayment collection, and reminders for upcoming installments, every
+    REPAYMENT_POLL_INTERVAL until stop_event is set. Started as a background
+    task from the app lifespan.
+    """
+    while not stop_event.is_set():
+        try:
+            await run_collection(session_factory, stop_event=stop_event)
+        except Exception:
+            # A bad batch must not kill the scheduler; its rows stay pending
+            logger.exception("Repayment collection run failed")
+        try:
+            await run_reminders(session_factory, stop_event=stop_event)
+        except Exception:
+            logger.exception("Loan reminder run failed")
+        try:
+            await asyncio.wait_for(stop_event.wait(), timeout=REPAYMENT_POLL_INTERVAL.total_seconds())
+        except asyncio.TimeoutError:
+            pass
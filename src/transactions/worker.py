@@ -0,0 +1,59 @@
+"""
+Standalone repayment collection worker.
+
+Usage:
+    python -m src.transactions.worker --processes 4 --batch-size 500 [--shard shard1]
+
+Each process opens its own engine and drains due installments with
+FOR UPDATE SKIP LOCKED, so the processes share the work without coordination.
+"""
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import time
+
+from .scheduler import REPAYMENT_BATCH_SIZE, run_collection
+
+
+def _collect_in_process(batch_size: int, shard: str = None) -> dict:
+    # Imported here so every spawned process builds its own engine and pool
+    from src.database import shard_engines, shard_router
+
+    async def collect():
+        try:
+            return await run_collection(shard_router.session_factories[shard or shard_router.home], batch_size)
+        finally:
+            for engine in shard_engines.values():
+                await engine.dispose()
+
+    return asyncio.run(collect())
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Collect due loan repayments.")
+    parser.add_argument("--processes", type=int, default=multiprocessing.cpu_count())
+    parser.add_argument("--batch-size", type=int, default=REPAYMENT_BATCH_SIZE)
+    parser.add_argument("--shard", default=None, help="Shard name from SHARD_DB_URLS; defaults to the home shard")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    started = time.perf_counter()
+
+    context = multiprocessing.get_context("spawn")
+    with context.Pool(args.processes) as pool:
+        results = pool.starmap(_collect_in_process, [(args.batch_size, args.shard)] * args.processes)
+
+    elapsed = time.perf_counter() - started
+    claimed = sum(result["claimed"] for result in results)
+    paid = sum(result["paid"] for result in results)
+    failed = sum(result["failed"] for result in results)
+    rate = claimed / elapsed if elapsed else 0.0
+    print(
+        f"{claimed} installments ({paid} paid, {failed} failed) across {args.processes} processes "
+        f"in {elapsed:.2f}s: {rate:.1f} installments/s"
+    )
+
+
+if __name__ == "__main__":
+    main()
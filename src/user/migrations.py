@@ -0,0 +1,42 @@
+"""
+Bring users tables created before profile versions and search up to date.
+
+Usage:
+    python -m src.user.migrations
+
+Runs on every shard. Adds the profile version column, then builds the trigram
+search indexes CONCURRENTLY so signups and logins carry on meanwhile.
+Re-running skips whatever already exists.
+"""
+import asyncio
+
+from sqlalchemy import text
+
+from src.database import shard_engines
+
+# A constant default makes this a catalog-only change, with no table rewrite
+ADD_VERSION = "ALTER TABLE users ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1"
+
+SEARCH_INDEXES = [
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_full_name_trgm "
+    "ON users USING gin (lower(first_name || ' ' || last_name) gin_trgm_ops)",
+    "CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_phone_e164_trgm ON users USING gin (phone_e164 gin_trgm_ops)",
+]
+
+
+async def migrate() -> None:
+    for name, engine in shard_engines.items():
+        # CREATE INDEX CONCURRENTLY cannot run inside a transaction block
+        async with engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(ADD_VERSION))
+            await conn.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+            for statement in SEARCH_INDEXES:
+                await conn.execute(text(statement))
+        print(f"{name}: users table up to date")
+    for engine in shard_engines.values():
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    asyncio.run(migrate())
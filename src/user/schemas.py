@@ -0,0 +1,38 @@
+from datetime import datetime
+from typing import Dict, List, Optional
+from uuid import UUID
+
+from pydantic import BaseModel, Field
+
+
+class UserSearchResult(BaseModel):
+    id: UUID
+    first_name: str
+    last_name: str
+    phone_e164: str
+    created_date: datetime
+    score: float
+
+
+class UserSearchPage(BaseModel):
+    results: List[UserSearchResult]
+    next_cursor: Optional[str] = None
+    # True when a shard ran out of time budget and its matches are missing from this page
+    partial: bool = False
+
+
+class UserProfile(BaseModel):
+    id: UUID
+    first_name: str
+    last_name: str
+    phone_number: str
+    phone_e164: str
+    profile_picture: Optional[str] = None
+    # Thumbnail URLs keyed like "128.webp"; absent for pictures uploaded before variants existed
+    profile_picture_variants: Optional[Dict[str, str]] = None
+    created_date: datetime
+
+
+class UpdateProfile(BaseModel):
+    first_name: Optional[str] = Field(None, min_length=1, max_length=100)
+    last_name: Optional[str] = Field(None, min_length=1, max_length=100)
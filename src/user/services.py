@@ -0,0 +1,207 @@
+import base64
+import json
+import os
+import re
+import time
+from collections import OrderedDict
+from uuid import UUID
+
+import dotenv
+from sqlalchemy import and_, func, literal_column, or_, select, text
+
+from src.authentications.models import User
+from src.authentications.phone import COUNTRY_CODES, DEFAULT_COUNTRY_CODE
+from src.notifications.push import event_hooks
+
+dotenv.load_dotenv()
+
+SEARCH_TIME_BUDGET_MS = int(os.getenv("USER_SEARCH_TIME_BUDGET_MS", "500"))
+SEARCH_SIMILARITY_THRESHOLD = float(os.getenv("USER_SEARCH_SIMILARITY_THRESHOLD", "0.3"))
+MIN_QUERY_LENGTH = 3  # Trigram indexes cannot serve shorter patterns
+
+# Upper bound on how long a worker may answer 304 from a version it never saw invalidated,
+# e.g. while its LISTEN connection was down
+PROFILE_CACHE_SECONDS = float(os.getenv("PROFILE_CACHE_SECONDS", "300"))
+PROFILE_CACHE_MAX_KEYS = int(os.getenv("PROFILE_CACHE_MAX_KEYS", "100000"))
+PROFILE_UPDATED = "profile_updated"
+
+# Must match ix_users_full_name_trgm in src/authentications/models.py; the space is a
+# literal rather than a bound parameter so the planner recognises the indexed expression
+full_name = func.lower(User.first_name.concat(literal_column("' '")).concat(User.last_name))
+
+_PHONE_QUERY = re.compile(r"^\+?[\d\s-]+$")
+
+
+def encode_cursor(score: float, user_id: UUID) -> str:
+    return base64.urlsafe_b64encode(json.dumps([score, str(user_id)]).encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """
+    Raises:
+        ValueError: If the cursor was not produced by encode_cursor.
+    """
+    try:
+        score, user_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return float(score), UUID(user_id)
+    except (TypeError, ValueError, json.JSONDecodeError) as error:
+        raise ValueError("Invalid cursor") from error
+
+
+def build_search(query: str, limit: int, after: tuple = None):
+    """
+    Build the search statement for one shard.
+
+    Phone-like queries match anywhere in the E.164 number; anything else is matched
+    against "first last" both as a substring and by trigram similarity. Results are
+    ordered by score, then id, which is also the keyset the cursor continues from.
+
+    Args:
+        query (str): What the support agent typed.
+        limit (int): Page size.
+        after (tuple): (score, id) of the last row of the previous page.
+    """
+    if _PHONE_QUERY.match(query):
+        digits = re.sub(r"\D", "", query)
+        trunk = COUNTRY_CODES[DEFAULT_COUNTRY_CODE][1]
+        if not query.lstrip().startswith("+") and trunk and digits.startswith(trunk):
+            # "0803 123" is stored as "+234803123..."
+            digits = DEFAULT_COUNTRY_CODE + digits[len(trunk):]
+        score = func.similarity(User.phone_e164, digits)
+        condition = User.phone_e164.like(f"%{digits}%")
+    else:
+        needle = query.strip().lower()
+        escaped = needle.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+        score = func.similarity(full_name, needle)
+        condition = or_(full_name.op("%")(needle), full_name.like(f"%{escaped}%"))
+
+    score = score.label("score")
+    statement = (
+        select(User.id, User.first_name, User.last_name, User.phone_e164, User.created_date, score)
+        .where(condition)
+        .order_by(score.desc(), User.id)
+        .limit(limit)
+    )
+    if after is not None:
+        after_score, after_id = after
+        statement = statement.where(or_(
+            score.element < after_score,
+            and_(score.element == after_score, User.id > after_id),
+        ))
+    return statement
+
+
+async def search_users(session, query: str, limit: int, after: tuple = None,
+                       time_budget_ms: int = SEARCH_TIME_BUDGET_MS) -> list:
+    """
+    Run one page of a user search on one shard within a statement timeout.
+
+    Returns:
+        list: Row mappings ordered by score, best first.
+
+    Raises:
+        sqlalchemy.exc.DBAPIError: If the query is cancelled by the time budget.
+    """
+    async with session.begin():
+        await session.execute(text(f"SET LOCAL statement_timeout = {int(time_budget_ms)}"))
+        await session.execute(text(f"SET LOCAL pg_trgm.similarity_threshold = {float(SEARCH_SIMILARITY_THRESHOLD)}"))
+        result = await session.execute(build_search(query, limit, after))
+        return [dict(row) for row in result.mappings().all()]
+
+
+def merge_pages(pages: list, limit: int, more: bool = False) -> tuple:
+    """
+    Merge per-shard pages into one page in keyset order.
+
+    Args:
+        pages (list): Row lists, one per shard.
+        limit (int): Page size.
+        more (bool): Some shard has rows past its page even if fewer were kept, e.g. after dropping stale copies.
+
+    Returns:
+        tuple: (rows, next cursor or None).
+    """
+    rows = sorted((row for page in pages for row in page), key=lambda row: (-row["score"], row["id"]))
+    has_more = more or len(rows) > limit or any(len(page) == limit for page in pages)
+    rows = rows[:limit]
+    next_cursor = encode_cursor(rows[-1]["score"], rows[-1]["id"]) if rows and has_more else None
+    return rows, next_cursor
+
+
+class ProfileVersionCache:
+    """
+    Per-process map of phone_e164 -> (user id, profile version), so conditional
+    GETs of /v1/users/me can be answered without a database round trip.
+
+    Versions only move forward: a lagging replica read cannot overwrite a newer
+    version learned from a write. Entries expire after ttl_seconds and at most
+    max_keys numbers are kept, least recently used first out.
+    """
+
+    def __init__(self, ttl_seconds: float = PROFILE_CACHE_SECONDS, max_keys: int = PROFILE_CACHE_MAX_KEYS,
+                 clock=time.monotonic):
+        self.ttl_seconds = ttl_seconds
+        self.max_keys = max_keys
+        self.clock = clock
+        self.entries = OrderedDict()
+
+    def get(self, phone_e164: str):
+        """
+        Returns:
+            tuple: (user id, version), or None if unknown or expired.
+        """
+        entry = self.entries.get(phone_e164)
+        if entry is None:
+            return None
+        user_id, version, expires = entry
+        if expires <= self.clock():
+            del self.entries[phone_e164]
+            return None
+        self.entries.move_to_end(phone_e164)
+        return user_id, version
+
+    def update(self, phone_e164: str, user_id: UUID, version: int) -> None:
+        current = self.get(phone_e164)
+        if current is not None and current[1] > version:
+            return
+        self.entries[phone_e164] = (user_id, version, self.clock() + self.ttl_seconds)
+        self.entries.move_to_end(phone_e164)
+        if len(self.entries) > self.max_keys:
+            self.entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self.entries)
+
+
+profile_versions = ProfileVersionCache()
+
+
+def _on_profile_event(user_id: str, event: dict) -> None:
+    # Every worker hears the NOTIFY sent with a profile write and moves its cache forward
+    if event.get("type") == PROFILE_UPDATED:
+        data = event["data"]
+        profile_versions.update(data["phone_e164"], UUID(user_id), data["version"])
+
+
+event_hooks.append(_on_profile_event)
+
+
+def profile_etag(user_id: UUID, version: int) -> str:
+    return f'"{user_id.hex}.{version}"'
+
+
+def etag_matches(header: str, etag: str, weak: bool = True) -> bool:
+    """
+    Check an If-None-Match (weak comparison) or If-Match (strong comparison) header against an ETag.
+    """
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    for candidate in header.split(","):
+        candidate = candidate.strip()
+        if weak and candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == etag:
+            return True
+    return False
@@ -0,0 +1,157 @@
+import asyncio
+
+from fastapi import APIRouter, Depends, Header, Query, Request, Response
+from fastapi.exceptions import HTTPException
+from sqlalchemy import select
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from src.audit.writer import audit_log
+from src.authentications.models import User
+from src.authentications.utilities import get_current_phone, get_staff_user
+from src.database import get_db, read_session_factory, shard_router
+from src.media.services import avatar_variants
+from src.notifications.push import publish_event
+from src.sharding import ShardMoving
+from .schemas import UpdateProfile, UserProfile, UserSearchPage
+from .services import (
+    MIN_QUERY_LENGTH,
+    PROFILE_UPDATED,
+    decode_cursor,
+    etag_matches,
+    merge_pages,
+    profile_etag,
+    profile_versions,
+    search_users,
+)
+
+router = APIRouter(prefix="/users", tags=["users"])
+
+QUERY_CANCELED = "57014"
+# Clients may keep the profile but must revalidate it with If-None-Match before use
+PROFILE_CACHE_CONTROL = "private, no-cache"
+
+
+def _profile(user: User) -> dict:
+    return {**user.model_dump(), "profile_picture_variants": avatar_variants(user.profile_picture)}
+
+
+def _profile_headers(user_id, version: int) -> dict:
+    return {"ETag": profile_etag(user_id, version), "Cache-Control": PROFILE_CACHE_CONTROL}
+
+
+async def _load_user(db: AsyncSession, phone_e164: str, for_update: bool = False) -> User:
+    statement = select(User).where(User.phone_e164 == phone_e164)
+    if for_update:
+        statement = statement.with_for_update()
+    user = (await db.execute(statement)).scalars().first()
+    if not user:
+        raise HTTPException(status_code=401, detail="User not found")
+    return user
+
+
+async def _read_profile(phone_e164: str, known_version: int = None) -> User:
+    async with read_session_factory(phone_e164=phone_e164)() as db:
+        user = await _load_user(db, phone_e164)
+    if known_version is None or user.version >= known_version:
+        return user
+    # The replica has not caught up with a write this worker already heard about
+    try:
+        async with shard_router.session_factory(phone_e164)() as db:
+            return await _load_user(db, phone_e164)
+    except ShardMoving:
+        raise HTTPException(status_code=503, detail="Account maintenance in progress, please retry shortly.",
+                            headers={"Retry-After": "5"})
+
+
+@router.get("/me", response_model=UserProfile)
+async def get_me(response: Response, phone_e164: str = Depends(get_current_phone), if_none_match: str = Header(None)):
+    # Step 1: Answer from the version cache when the client already has the current profile
+    cached = profile_versions.get(phone_e164)
+    if cached is not None and etag_matches(if_none_match, profile_etag(*cached)):
+        return Response(status_code=304, headers=_profile_headers(*cached))
+
+    # Step 2: Load the profile and remember its version
+    user = await _read_profile(phone_e164, cached[1] if cached is not None else None)
+    profile_versions.update(phone_e164, user.id, user.version)
+
+    # Step 3: The client's copy may still be current even though this worker had not cached it
+    headers = _profile_headers(user.id, user.version)
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return _profile(user)
+
+
+@router.patch("/me", response_model=UserProfile)
+async def update_me(request: UpdateProfile, http_request: Request, response: Response,
+                    phone_e164: str = Depends(get_current_phone), if_match: str = Header(None),
+                    db: AsyncSession = Depends(get_db)):
+    # Step 1: Lock the row so concurrent edits get distinct versions
+    user = await _load_user(db, phone_e164, for_update=True)
+
+    # Step 2: Reject edits made against a stale copy of the profile
+    if if_match and not etag_matches(if_match, profile_etag(user.id, user.version), weak=False):
+        raise HTTPException(status_code=412, detail="Profile has changed; fetch it again before editing.",
+                            headers=_profile_headers(user.id, user.version))
+
+    # Step 3: Apply the changes and tell every worker about the new version on commit
+    changes = request.model_dump(exclude_unset=True, exclude_none=True)
+    changed = {field: value for field, value in changes.items() if getattr(user, field) != value}
+    if changed:
+        for field, value in changed.items():
+            setattr(user, field, value)
+        user.version += 1
+        db.add(user)
+        await publish_event(db, user.id, PROFILE_UPDATED, {"phone_e164": phone_e164, "version": user.version})
+        await db.commit()
+        await audit_log.record_request(http_request, "profile_updated", actor=phone_e164, user_id=user.id,
+                                       details={"fields": sorted(changed)})
+    profile_versions.update(phone_e164, user.id, user.version)
+
+    response.headers.update(_profile_headers(user.id, user.version))
+    return _profile(user)
+
+
+async def _search_shard(shard: str, query: str, limit: int, after: tuple):
+    """
+    Returns:
+        tuple: (rows of users this shard owns, whether the shard had a full page), or None if it timed out.
+    """
+    # The home shard can be served by a replica; the others are read from their primary
+    session_factory = read_session_factory() if shard == shard_router.home else shard_router.session_factories[shard]
+    async with session_factory() as session:
+        try:
+            rows = await search_users(session, query, limit, after)
+        except DBAPIError as error:
+            if getattr(error.orig, "sqlstate", None) == QUERY_CANCELED:
+                return None
+            raise
+    # Users copied away by a split stay on the old shard until cleanup; only the owner's copy counts
+    return [row for row in rows if shard_router.shard_for(row["phone_e164"]) == shard], len(rows) == limit
+
+
+@router.get("/search", response_model=UserSearchPage)
+async def search(http_request: Request, q: str = Query(..., max_length=100), limit: int = Query(20, ge=1, le=100),
+                 cursor: str = None, staff_user: User = Depends(get_staff_user)):
+    # Step 1: Validate the query and cursor
+    query = q.strip()
+    if len(query) < MIN_QUERY_LENGTH:
+        raise HTTPException(status_code=422, detail=f"Search needs at least {MIN_QUERY_LENGTH} characters.")
+    try:
+        after = decode_cursor(cursor) if cursor else None
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor.")
+
+    # Step 2: Search every shard that owns users concurrently, each within the time budget
+    pages = await asyncio.gather(*(_search_shard(shard, query, limit, after) for shard in shard_router.ring.nodes))
+    finished = [page for page in pages if page is not None]
+    if not finished:
+        raise HTTPException(status_code=503, detail="Search took too long; try a more specific query.")
+
+    # Step 3: Merge into one page and record who looked whom up
+    rows, next_cursor = merge_pages([page for page, _ in finished], limit, more=any(full for _, full in finished))
+    await audit_log.record_request(http_request, "user_search", actor=staff_user.phone_e164, user_id=staff_user.id,
+                                   details={"query": query, "results": len(rows)})
+
+    return {"results": rows, "next_cursor": next_cursor, "partial": len(finished) < len(pages)}
@@ -0,0 +1,44 @@
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """
+    Small in-process cache with per-entry expiry and LRU eviction.
+
+    Meant for data that changes rarely but is read on every request, such as
+    biller catalogs and customer-name lookups. Not thread-safe; it is used from
+    the event loop only.
+    """
+
+    def __init__(self, ttl_seconds: float, max_size: int = 10_000):
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= time.monotonic():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key, value, ttl_seconds: float = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        self._entries[key] = (time.monotonic() + ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def invalidate(self, key) -> None:
+        self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        self._entries.clear()
+
+    def __len__(self) -> int:
+        return len(self._entries)
@@ -0,0 +1,129 @@
+import asyncio
+import os
+
+import dotenv
+import httpx
+
+from src.http_client import get_http_client
+
+dotenv.load_dotenv()
+
+PRIMARY_BILLS_URL = os.getenv("PRIMARY_BILLS_URL")
+PRIMARY_BILLS_API_KEY = os.getenv("PRIMARY_BILLS_API_KEY")
+SECONDARY_BILLS_URL = os.getenv("SECONDARY_BILLS_URL")
+SECONDARY_BILLS_API_KEY = os.getenv("SECONDARY_BILLS_API_KEY")
+
+# How long the primary gets before the same call is also sent to the secondary
+BILLS_HEDGE_DELAY_SECONDS = float(os.getenv("BILLS_HEDGE_DELAY_SECONDS", "0.5"))
+
+
+class ProviderError(Exception):
+    pass
+
+
+class BillProvider:
+    """
+    Client for a bill-payment aggregator (airtime, data, electricity, cable).
+
+    All providers are expected to expose the same small JSON API:
+        GET  /billers?category=...                         -> {"billers": [...]}
+        GET  /customers/validate?biller_code=&customer_id= -> {"valid": bool, "customer_name": str}
+        POST /payments                                     -> {"status": "success", ...}
+    Providers that differ should subclass and override the request methods.
+    """
+
+    def __init__(self, name: str, base_url: str, api_key: str = None, client: httpx.AsyncClient = None):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.api_key = api_key
+        self._client = client
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        return self._client or get_http_client()
+
+    async def _request(self, method: str, path: str, **kwargs) -> dict:
+        headers = {"Authorization": f"Bearer {self.api_key}"} if self.api_key else {}
+        try:
+            response = await self.client.request(method, f"{self.base_url}{path}", headers=headers, **kwargs)
+            response.raise_for_status()
+            return response.json()
+        except (httpx.RequestError, httpx.HTTPStatusError) as e:
+            raise ProviderError(f"{self.name}: {e}") from e
+        except ValueError as e:
+            # A 2xx body that is not JSON, e.g. a gateway's HTML error page
+            raise ProviderError(f"{self.name}: invalid JSON response: {e}") from e
+
+    async def get_billers(self, category: str) -> list:
+        response_data = await self._request("GET", "/billers", params={"category": category})
+        return response_data.get("billers", [])
+
+    async def validate_customer(self, biller_code: str, customer_id: str) -> dict:
+        return await self._request(
+            "GET", "/customers/validate", params={"biller_code": biller_code, "customer_id": customer_id}
+        )
+
+    async def pay(self, biller_code: str, customer_id: str, amount: str, reference: str) -> dict:
+        payload = {
+            "biller_code": biller_code,
+            "customer_id": customer_id,
+            "amount": amount,
+            "reference": reference,
+        }
+        return await self._request("POST", "/payments", json=payload)
+
+
+async def hedged_call(primary_call, secondary_call=None, hedge_delay: float = BILLS_HEDGE_DELAY_SECONDS):
+    """
+    Run primary_call and, if it has not answered within hedge_delay (or fails),
+    also run secondary_call. The first successful result wins and the loser is cancelled.
+
+    Only use this for idempotent reads; payments must never be hedged.
+
+    Args:
+        primary_call: Zero-argument callable returning an awaitable.
+        secondary_call: Optional zero-argument callable returning an awaitable.
+        hedge_delay (float): Seconds to wait on the primary before hedging.
+
+    Returns:
+        The result of whichever call succeeded first.
+    """
+    primary = asyncio.ensure_future(primary_call())
+    if secondary_call is None:
+        return await primary
+
+    await asyncio.wait({primary}, timeout=hedge_delay)
+    if primary.done() and primary.exception() is None:
+        return primary.result()
+
+    secondary = asyncio.ensure_future(secondary_call())
+    pending = {secondary} if primary.done() else {primary, secondary}
+    errors = [primary.exception()] if primary.done() else []
+    try:
+        while pending:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                if task.exception() is None:
+                    return task.result()
+                errors.append(task.exception())
+    finally:
+        for task in pending:
+            task.cancel()
+    raise errors[-1]
+
+
+_providers = None
+
+
+def get_providers() -> list:
+    """
+    Return the configured providers, primary first.
+    """
+    global _providers
+    if _providers is None:
+        _providers = []
+        if PRIMARY_BILLS_URL:
+            _providers.append(BillProvider("primary", PRIMARY_BILLS_URL, PRIMARY_BILLS_API_KEY))
+        if SECONDARY_BILLS_URL:
+            _providers.append(BillProvider("secondary", SECONDARY_BILLS_URL, SECONDARY_BILLS_API_KEY))
+    return _providers
@@ -0,0 +1,21 @@
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+
+class CustomerValidationItem(BaseModel):
+    category: str  # 'airtime', 'data', 'electricity', 'cable'
+    biller_code: str
+    customer_id: str  # Phone number for airtime/data, meter or smartcard number otherwise
+
+
+class ValidateCustomersRequest(BaseModel):
+    items: List[CustomerValidationItem]
+
+
+class CustomerValidationResult(BaseModel):
+    customer_id: str
+    biller_code: str
+    valid: bool
+    customer_name: Optional[str] = None
+    message: Optional[str] = None
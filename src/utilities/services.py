@@ -0,0 +1,102 @@
+import asyncio
+import re
+
+from .cache import TTLCache
+from .providers import ProviderError, get_providers, hedged_call
+
+# Nigerian mobile numbers: 0803..., 234803... or +234803...
+PHONE_NUMBER_PATTERN = re.compile(r"^(?:\+?234|0)[789][01]\d{8}$")
+PHONE_CATEGORIES = {"airtime", "data"}
+
+MAX_CONCURRENT_VALIDATIONS = 20
+
+biller_catalog_cache = TTLCache(ttl_seconds=60 * 60, max_size=64)
+customer_name_cache = TTLCache(ttl_seconds=24 * 60 * 60, max_size=100_000)
+
+
+async def get_billers(category: str, providers: list = None) -> list:
+    """
+    Return the biller catalog for a category, served from cache when possible.
+
+    Args:
+        category (str): The bill category, e.g. 'electricity'.
+        providers (list): Providers to query, primary first. Defaults to the configured ones.
+
+    Returns:
+        list: Billers as returned by the provider.
+    """
+    billers = biller_catalog_cache.get(category)
+    if billers is not None:
+        return billers
+
+    providers = get_providers() if providers is None else providers
+    if not providers:
+        raise ProviderError("No bill-payment provider is configured.")
+
+    secondary_call = (lambda: providers[1].get_billers(category)) if len(providers) > 1 else None
+    billers = await hedged_call(lambda: providers[0].get_billers(category), secondary_call)
+    biller_catalog_cache.set(category, billers)
+    return billers
+
+
+async def validate_customer(category: str, biller_code: str, customer_id: str, providers: list = None) -> dict:
+    """
+    Validate a phone, meter or smartcard number and look up the customer name.
+
+    Phone numbers for airtime and data are checked locally; everything else is
+    checked against the provider, hedged to the secondary if the primary is slow.
+
+    Returns:
+        dict: Validation result matching CustomerValidationResult.
+    """
+    result = {"customer_id": customer_id, "biller_code": biller_code}
+
+    if category in PHONE_CATEGORIES:
+        valid = bool(PHONE_NUMBER_PATTERN.match(customer_id))
+        return {**result, "valid": valid, "message": None if valid else "Invalid phone number."}
+
+    cache_key = (biller_code, customer_id)
+    customer_name = customer_name_cache.get(cache_key)
+    if customer_name is not None:
+        return {**result, "valid": True, "customer_name": customer_name}
+
+    providers = get_providers() if providers is None else providers
+    if not providers:
+        return {**result, "valid": False, "message": "No bill-payment provider is configured."}
+
+    secondary_call = (
+        (lambda: providers[1].validate_customer(biller_code, customer_id)) if len(providers) > 1 else None
+    )
+    try:
+        response_data = await hedged_call(
+            lambda: providers[0].validate_customer(biller_code, customer_id), secondary_call
+        )
+    except ProviderError as e:
+        return {**result, "valid": False, "message": str(e)}
+
+    if not response_data.get("valid"):
+        return {**result, "valid": False, "message": response_data.get("message", "Customer not found.")}
+
+    customer_name = response_data.get("customer_name")
+    if customer_name:
+        customer_name_cache.set(cache_key, customer_name)
+    return {**result, "valid": True, "customer_name": customer_name}
+
+
+async def validate_customers(items: list, providers: list = None) -> list:
+    """
+    Validate many customer numbers concurrently, at most MAX_CONCURRENT_VALIDATIONS in flight.
+
+    Args:
+        items (list): CustomerValidationItem objects.
+
+    Returns:
+        list: One result dict per item, in the same order.
+    """
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_VALIDATIONS)
+
+    async def validate(item):
+        async with semaphore:
+            return await validate_customer(item.category, item.biller_code, item.customer_id, providers)
+
+    return await asyncio.gather(*(validate(item) for item in items))
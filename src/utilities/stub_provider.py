@@ -0,0 +1,66 @@
+"""
+Local stand-in for a bill-payment provider, for development and tests.
+
+Run two of them with different latencies to exercise hedging:
+    STUB_LATENCY_MS=800 uvicorn src.utilities.stub_provider:app --port 9001
+    STUB_LATENCY_MS=50  uvicorn src.utilities.stub_provider:app --port 9002
+then point PRIMARY_BILLS_URL / SECONDARY_BILLS_URL at them.
+"""
+import asyncio
+import os
+
+from fastapi import FastAPI
+from fastapi.exceptions import HTTPException
+from pydantic import BaseModel
+
+BILLERS = {
+    "airtime": [{"code": "MTN-VTU", "name": "MTN Airtime"}, {"code": "GLO-VTU", "name": "Glo Airtime"}],
+    "data": [{"code": "MTN-DATA", "name": "MTN Data"}, {"code": "AIRTEL-DATA", "name": "Airtel Data"}],
+    "electricity": [{"code": "IKEDC-PREPAID", "name": "Ikeja Electric Prepaid"},
+                    {"code": "AEDC-PREPAID", "name": "Abuja Electric Prepaid"}],
+}
+
+
+class StubPayment(BaseModel):
+    biller_code: str
+    customer_id: str
+    amount: str
+    reference: str
+
+
+def create_stub_app(latency_seconds: float = 0.0, fail: bool = False) -> FastAPI:
+    """
+    Build a stub provider that sleeps latency_seconds before every answer
+    and, when fail is set, answers every call with HTTP 503.
+    """
+    stub = FastAPI(title="Stub bill-payment provider")
+    stub.state.calls = 0
+
+    async def simulate():
+        stub.state.calls += 1
+        await asyncio.sleep(latency_seconds)
+        if fail:
+            raise HTTPException(status_code=503, detail="Provider unavailable")
+
+    @stub.get("/billers")
+    async def billers(category: str):
+        await simulate()
+        return {"billers": BILLERS.get(category, [])}
+
+    @stub.get("/customers/validate")
+    async def validate_customer(biller_code: str, customer_id: str):
+        await simulate()
+        # Meter and smartcard numbers are 11 digits; anything else is rejected
+        if not (customer_id.isdigit() and len(customer_id) == 11):
+            return {"valid": False, "message": "Customer not found."}
+        return {"valid": True, "customer_name": f"Customer {customer_id[-4:]}"}
+
+    @stub.post("/payments")
+    async def payments(request: StubPayment):
+        await simulate()
+        return {"status": "success", "reference": request.reference, "token": request.reference[-12:]}
+
+    return stub
+
+
+app = create_stub_app(latency_seconds=int(os.getenv("STUB_LATENCY_MS", "0")) / 1000)
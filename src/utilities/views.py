@@ -0,0 +1,27 @@
+from typing import List
+
+from fastapi import APIRouter, Depends
+from fastapi.exceptions import HTTPException
+
+from src.authentications.models import User
+from src.authentications.utilities import get_current_user
+from .providers import ProviderError
+from .schemas import ValidateCustomersRequest, CustomerValidationResult
+from .services import get_billers, validate_customers
+
+router = APIRouter(prefix="/utilities", tags=["utilities"])
+
+
+@router.get("/billers/{category}")
+async def list_billers(category: str, current_user: User = Depends(get_current_user)):
+    try:
+        billers = await get_billers(category)
+    except ProviderError:
+        raise HTTPException(status_code=502, detail="Bill-payment provider is unavailable.")
+
+    return {"category": category, "billers": billers}
+
+
+@router.post("/validate/", response_model=List[CustomerValidationResult])
+async def validate(request: ValidateCustomersRequest, current_user: User = Depends(get_current_user)):
+    return await validate_customers(request.items)
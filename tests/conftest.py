@@ -0,0 +1,31 @@
+from contextlib import asynccontextmanager
+
+import pytest
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import sessionmaker
+from sqlmodel.ext.asyncio.session import AsyncSession
+
+
+@pytest.fixture
+def sqlite_db(tmp_path):
+    """
+    Opens a SQLite database under tmp_path holding only the given tables:
+
+        async with sqlite_db([User.__table__], name="home") as (engine, session_factory):
+            ...
+
+    Each name is its own file, so several can stand in for shards. The engine is disposed on exit.
+    """
+    pytest.importorskip("aiosqlite")
+
+    @asynccontextmanager
+    async def open_db(tables, name: str = "test"):
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / name}.db")
+        try:
+            async with engine.begin() as conn:
+                await conn.run_sync(lambda sync_conn: tables[0].metadata.create_all(sync_conn, tables=tables))
+            yield engine, sessionmaker(bind=engine, class_=AsyncSession, expire_on_commit=False)
+        finally:
+            await engine.dispose()
+
+    return open_db
@@ -0,0 +1,110 @@
+import asyncio
+import json
+
+import pytest
+
+from src.audit import writer
+from src.audit.writer import AuditLogWriter
+
+
+class FakeCopyWriter(AuditLogWriter):
+    """Collects batches instead of COPYing them; the first `failures` attempts raise."""
+
+    def __init__(self, failures: int = 0, **kwargs):
+        super().__init__(engine=None, **kwargs)
+        self.failures = failures
+        self.batches = []
+
+    async def _copy(self, rows: list) -> None:
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("database unavailable")
+        self.batches.append([row[2] for row in rows])
+
+
+@pytest.fixture(autouse=True)
+def fast_retries(monkeypatch):
+    monkeypatch.setattr(writer, "AUDIT_RETRY_SECONDS", 0.01)
+
+
+def test_full_batches_flush_without_waiting_and_stop_flushes_the_rest(tmp_path):
+    async def scenario():
+        audit = FakeCopyWriter(batch_size=3, flush_seconds=10, spill_path=str(tmp_path / "spill.jsonl"))
+        audit.start()
+        for index in range(7):
+            await audit.record(f"event-{index}")
+        await asyncio.sleep(0.05)
+        assert audit.batches == [["event-0", "event-1", "event-2"], ["event-3", "event-4", "event-5"]]
+
+        await audit.stop()
+        assert audit.batches[-1] == ["event-6"]
+        assert audit.rows_written == 7
+
+    asyncio.run(scenario())
+
+
+def test_a_partial_batch_is_flushed_when_the_timer_expires(tmp_path):
+    async def scenario():
+        audit = FakeCopyWriter(batch_size=100, flush_seconds=0.05, spill_path=str(tmp_path / "spill.jsonl"))
+        audit.start()
+        await audit.record("login")
+        await audit.record("pin_reset")
+        await asyncio.sleep(0.02)
+        assert audit.batches == []
+        await asyncio.sleep(0.1)
+        assert audit.batches == [["login", "pin_reset"]]
+        await audit.stop()
+
+    asyncio.run(scenario())
+
+
+def test_a_failing_database_holds_callers_back_and_no_row_is_lost(tmp_path):
+    async def scenario():
+        audit = FakeCopyWriter(failures=4, buffer_size=2, batch_size=2, flush_seconds=0.01,
+                               spill_path=str(tmp_path / "spill.jsonl"))
+        audit.start()
+        for index in range(4):
+            await audit.record(f"event-{index}")
+        # One batch is being retried and the buffer is full again: the next caller has to wait
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(audit.record("event-4"), 0.05)
+
+        for _ in range(100):
+            if audit.rows_written == 4:
+                break
+            await asyncio.sleep(0.02)
+        await audit.stop()
+        assert [event for batch in audit.batches for event in batch] == [f"event-{index}" for index in range(4)]
+        assert audit.rows_spilled == 0
+
+    asyncio.run(scenario())
+
+
+def test_rows_the_database_refuses_at_shutdown_are_spilled_to_disk(tmp_path):
+    spill = tmp_path / "spill.jsonl"
+
+    async def scenario():
+        audit = FakeCopyWriter(failures=1_000, batch_size=10, flush_seconds=10, spill_path=str(spill))
+        audit.start()
+        await audit.record("login", actor="+2348030000001", details={"device_id": "abc"})
+        await audit.record("transfer", success=False)
+        await asyncio.wait_for(audit.stop(), 1)
+        assert (audit.rows_written, audit.rows_spilled) == (0, 2)
+
+    asyncio.run(scenario())
+    rows = [json.loads(line) for line in spill.read_text(encoding="utf-8").splitlines()]
+    assert [(row["event_type"], row["actor"], row["success"]) for row in rows] == [
+        ("login", "+2348030000001", True), ("transfer", None, False),
+    ]
+    assert json.loads(rows[0]["details"]) == {"device_id": "abc"}
+
+
+def test_record_refuses_instead_of_hanging_when_the_writer_never_started(tmp_path):
+    async def scenario():
+        audit = FakeCopyWriter(buffer_size=2, spill_path=str(tmp_path / "spill.jsonl"))
+        await audit.record("login")
+        await audit.record("login")
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(audit.record("login"), 1)
+
+    asyncio.run(scenario())
@@ -0,0 +1,179 @@
+import asyncio
+import time
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import select
+
+from src.authentications.models import User
+from src.authentications.utilities import get_current_user
+from src.database import get_home_db
+from src.notifications import bulk
+from src.notifications.models import Campaign, CampaignRecipient
+from src.notifications.providers import SMSProvider
+from src.notifications.views import router
+
+
+class FakeBulkProvider(SMSProvider):
+    def __init__(self, name: str, failing: set = frozenset()):
+        self.name = name
+        self.failing = failing
+        self.batches = []
+
+    async def send(self, phone_number: str, message: str) -> dict:
+        return {"success": phone_number not in self.failing}
+
+    async def send_bulk(self, phone_numbers: list, message: str) -> dict:
+        self.batches.append(list(phone_numbers))
+        failed = [phone_number for phone_number in phone_numbers if phone_number in self.failing]
+        message_ids = {phone_number: f"{self.name}-{phone_number}"
+                       for phone_number in phone_numbers if phone_number not in failed}
+        return {"success": len(failed) < len(phone_numbers), "failed": failed, "message_ids": message_ids}
+
+
+class RecordingBudget:
+    def __init__(self):
+        self.acquired = []
+
+    async def acquire(self, tokens: float = 1) -> None:
+        self.acquired.append(tokens)
+
+
+def _run(scenario, sqlite_db):
+    async def wrapper():
+        async with sqlite_db([Campaign.__table__, CampaignRecipient.__table__], name="campaigns") as (
+                engine, session_factory):
+            await scenario(session_factory)
+
+    asyncio.run(wrapper())
+
+
+async def _campaign(session_factory, phone_numbers: list, status: str = "queued", sent: int = 0) -> Campaign:
+    async with session_factory() as session:
+        campaign = Campaign(name="Promo", message="hello", status=status, total_count=len(phone_numbers))
+        session.add(campaign)
+        session.add_all([
+            CampaignRecipient(campaign_id=campaign.id, phone_number=phone_number,
+                              status="sent" if index < sent else "queued")
+            for index, phone_number in enumerate(phone_numbers)
+        ])
+        await session.commit()
+    return campaign
+
+
+async def _recipients(session_factory, campaign_id) -> dict:
+    async with session_factory() as session:
+        rows = (await session.execute(
+            select(CampaignRecipient.phone_number, CampaignRecipient.status, CampaignRecipient.provider,
+                   CampaignRecipient.provider_message_id)
+            .where(CampaignRecipient.campaign_id == campaign_id)
+        )).all()
+    return {row.phone_number: (row.status, row.provider, row.provider_message_id) for row in rows}
+
+
+def test_campaign_is_sent_in_chunks_within_the_budget_and_records_each_recipient(sqlite_db):
+    async def scenario(session_factory):
+        phone_numbers = [f"+23480300000{index:02d}" for index in range(7)]
+        campaign = await _campaign(session_factory, phone_numbers)
+        provider = FakeBulkProvider("termii-generic", failing={phone_numbers[4]})
+        budget = RecordingBudget()
+
+        result = await bulk.run_campaign(session_factory, campaign.id, [provider], chunk_size=3, budget=budget)
+        assert (result["sent"], result["failed"]) == (6, 1)
+        assert [len(batch) for batch in provider.batches] == [3, 3, 1]
+        assert budget.acquired == [3, 3, 1]
+
+        states = await _recipients(session_factory, campaign.id)
+        assert states.pop(phone_numbers[4]) == ("failed", None, None)
+        assert states == {phone_number: ("sent", "termii-generic", f"termii-generic-{phone_number}")
+                          for phone_number in states}
+        async with session_factory() as session:
+            campaign = await session.get(Campaign, campaign.id)
+        assert (campaign.status, campaign.sent_count, campaign.failed_count) == ("completed", 6, 1)
+
+        # Running it again sends nothing: no recipient is left queued
+        await bulk.run_campaign(session_factory, campaign.id, [provider], chunk_size=3, budget=budget)
+        assert len(provider.batches) == 3
+
+    _run(scenario, sqlite_db)
+
+
+def test_each_recipient_records_the_provider_that_sent_it(sqlite_db):
+    async def scenario(session_factory):
+        phone_numbers = ["+2348030000001", "+2348030000002"]
+        campaign = await _campaign(session_factory, phone_numbers)
+        primary = FakeBulkProvider("termii-generic", failing={phone_numbers[1]})
+        secondary = FakeBulkProvider("secondary")
+
+        await bulk.run_campaign(session_factory, campaign.id, [primary, secondary], budget=RecordingBudget())
+        assert secondary.batches == [[phone_numbers[1]]]
+        assert await _recipients(session_factory, campaign.id) == {
+            phone_numbers[0]: ("sent", "termii-generic", f"termii-generic-{phone_numbers[0]}"),
+            phone_numbers[1]: ("sent", "secondary", f"secondary-{phone_numbers[1]}"),
+        }
+
+    _run(scenario, sqlite_db)
+
+
+def test_unfinished_campaigns_are_resumed_from_the_first_unsent_recipient(sqlite_db):
+    async def scenario(session_factory):
+        phone_numbers = [f"+23480300000{index:02d}" for index in range(5)]
+        interrupted = await _campaign(session_factory, phone_numbers, status="sending", sent=2)
+        never_started = await _campaign(session_factory, ["+2348039999999"])
+        done = await _campaign(session_factory, ["+2348038888888"], status="completed")
+        provider = FakeBulkProvider("termii-generic")
+
+        stopped = asyncio.Event()
+        stopped.set()
+        await bulk.resume_campaigns(session_factory, [provider], stop_event=stopped)
+        assert provider.batches == []
+
+        assert await bulk.resume_campaigns(session_factory, [provider]) == 2
+        assert sorted(number for batch in provider.batches for number in batch) == sorted(
+            phone_numbers[2:] + ["+2348039999999"]
+        )
+        async with session_factory() as session:
+            statuses = {campaign_id: (await session.get(Campaign, campaign_id)).status
+                        for campaign_id in (interrupted.id, never_started.id, done.id)}
+        assert set(statuses.values()) == {"completed"}
+
+    _run(scenario, sqlite_db)
+
+
+def test_token_bucket_spends_its_burst_then_waits_for_refill():
+    async def scenario():
+        budget = bulk.TokenBucket(rate=100, capacity=10)
+        started = time.monotonic()
+        await budget.acquire(10)
+        assert time.monotonic() - started < 0.05
+        await budget.acquire(10)
+        assert time.monotonic() - started >= 0.09
+        with pytest.raises(ValueError):
+            await budget.acquire(11)
+
+    asyncio.run(scenario())
+
+
+def test_campaign_endpoints_are_staff_only():
+    app = FastAPI()
+    app.include_router(router)
+    customer = User(first_name="Ada", last_name="Obi", phone_number="+2348030000001", phone_e164="+2348030000001",
+                    login_pin="x")
+
+    async def no_db():
+        yield None
+
+    app.dependency_overrides[get_current_user] = lambda: customer
+    app.dependency_overrides[get_home_db] = no_db
+
+    async def scenario():
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            response = await client.post("/notifications/campaigns/", json={
+                "name": "Promo", "message": "hello", "phone_numbers": ["+2348030000002"],
+            })
+            assert response.status_code == 403
+            response = await client.get(f"/notifications/campaigns/{customer.id}")
+            assert response.status_code == 403
+
+    asyncio.run(scenario())
@@ -0,0 +1,53 @@
+import asyncio
+import threading
+import time
+
+from src.debug.loop_monitor import EventLoopMonitor
+from src.debug.profiler import SamplingProfiler
+
+
+def _spin(stop: threading.Event) -> None:
+    while not stop.is_set():
+        sum(range(1000))
+
+
+def test_profiler_collects_collapsed_stacks_of_busy_threads():
+    stop = threading.Event()
+    worker = threading.Thread(target=_spin, args=(stop,), name="busy-worker")
+    worker.start()
+    try:
+        profiler = SamplingProfiler(interval_seconds=0.001)
+        profiler.run(0.2)
+    finally:
+        stop.set()
+        worker.join()
+
+    lines = profiler.collapsed().splitlines()
+    assert profiler.sample_count > 10
+    busy = [line for line in lines if line.startswith("busy-worker;")]
+    assert busy and all(":_spin:" in line for line in busy)
+    stack, count = busy[0].rsplit(" ", 1)
+    assert int(count) > 0
+
+
+def _block_the_loop():
+    time.sleep(0.3)
+
+
+def test_loop_monitor_reports_the_blocking_call():
+    monitor = EventLoopMonitor(interval_seconds=0.02, stall_seconds=0.1)
+
+    async def scenario():
+        stop = asyncio.Event()
+        task = asyncio.create_task(monitor.run(stop))
+        await asyncio.sleep(0.1)
+        _block_the_loop()
+        await asyncio.sleep(0.1)
+        stop.set()
+        await task
+
+    asyncio.run(scenario())
+    snapshot = monitor.snapshot()
+    assert snapshot["stalls"] >= 1
+    assert snapshot["lag_ms"]["max"] >= 200
+    assert "_block_the_loop" in snapshot["recent_stalls"][0]["stack"]
@@ -0,0 +1,137 @@
+import functools
+import hashlib
+import hmac
+import json
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi.testclient import TestClient
+
+from src.main import app
+from src.notifications import views
+from src.notifications.delivery import DeliveryTracker, parse_receipt, verify_signature
+from src.notifications.routing import ProviderRegistry, ProviderStats
+
+SENT = datetime(2024, 5, 1, 12, 0, tzinfo=timezone.utc)
+
+
+class FakeProvider:
+    def __init__(self, name: str, message_id: str = None):
+        self.name = name
+        self.message_id = message_id
+
+    async def send(self, phone_number: str, message: str) -> dict:
+        return {"success": True, "message": "sent", "details": {"message_id": self.message_id}}
+
+
+def test_parse_receipt_maps_statuses_and_channels():
+    assert parse_receipt("termii", {"message_id": "m1", "status": "Delivered", "channel": "whatsapp"},
+                         SENT) == ("termii-whatsapp", "m1", "delivered", SENT)
+    assert parse_receipt("termii", {"message_id": "m2", "status": "DND Active on Phone Number"},
+                         SENT)[1:3] == ("m2", "failed")
+    assert parse_receipt("secondary", {"message_id": "m3", "status": "Rejected"}, SENT)[0] == "secondary"
+    assert parse_receipt("termii", {"message_id": "m4", "status": "Message Sent"}, SENT) is None
+    assert parse_receipt("termii", {"status": "Delivered"}, SENT) is None
+
+
+def test_parse_receipt_reads_delivery_time():
+    receipt = parse_receipt("termii", {"message_id": "m1", "status": "Delivered",
+                                       "delivered_at": "2024-05-01T12:00:07Z"}, SENT)
+    assert receipt[3] == SENT + timedelta(seconds=7)
+
+
+def test_verify_signature():
+    body = b'{"message_id": "m1"}'
+    signature = hmac.new(b"secret", body, hashlib.sha512).hexdigest()
+    assert verify_signature(body, signature, "secret")
+    assert not verify_signature(body, signature, "other")
+    assert not verify_signature(body, None, "secret")
+    # Without a configured secret nothing is accepted, signed or not
+    assert not verify_signature(body, None, None)
+    assert not verify_signature(body, signature, "")
+
+
+def test_slow_delivery_outranks_fast_api():
+    registry = ProviderRegistry([FakeProvider("quick-api"), FakeProvider("quick-handset")])
+    for _ in range(10):
+        registry.stats["quick-api"].record(0.05, True)
+        registry.stats["quick-api"].record_delivery(30.0, True)
+        registry.stats["quick-handset"].record(0.2, True)
+        registry.stats["quick-handset"].record_delivery(3.0, True)
+    assert [provider.name for provider in registry.ranked()] == ["quick-handset", "quick-api"]
+
+
+def test_undelivered_messages_make_provider_unhealthy():
+    stats = ProviderStats()
+    for delivered in [True] * 6 + [False] * 4:
+        stats.record_delivery(2.0 if delivered else None, delivered)
+    assert stats.undelivered_rate() == 0.4
+    assert not stats.is_healthy()
+
+
+@pytest.mark.asyncio
+async def test_accepted_sends_are_recorded():
+    registry = ProviderRegistry([FakeProvider("termii-generic", message_id="m1")])
+    tracker = DeliveryTracker(registry=registry)
+    registry.listeners.append(tracker.record_sent)
+
+    await registry.send("+2348031234567", "hello")
+
+    kind, (provider, message_id, phone_number, _) = tracker.queue.get_nowait()
+    assert (kind, provider, message_id, phone_number) == ("sent", "termii-generic", "m1", "+2348031234567")
+
+
+@pytest.mark.asyncio
+async def test_flush_feeds_delivery_stats_and_retries_unmatched(monkeypatch):
+    registry = ProviderRegistry([FakeProvider("termii-generic")])
+    tracker = DeliveryTracker(registry=registry)
+
+    async def write(sends, receipts):
+        applied = [SimpleNamespace(provider=provider, provider_message_id=message_id, status=status,
+                                   sent_date=SENT, delivered_date=delivered_at)
+                   for (provider, message_id), (status, delivered_at, _) in receipts.items() if message_id == "m1"]
+        return applied, {("termii-generic", "m2")}
+
+    monkeypatch.setattr(tracker, "_write", write)
+    await tracker._flush([
+        ("receipt", ("termii-generic", "m1", "delivered", SENT + timedelta(seconds=4))),
+        ("receipt", ("termii-generic", "m2", "delivered", SENT)),  # already final: a duplicate
+        ("receipt", ("termii-generic", "m3", "failed", SENT)),  # not recorded yet
+    ])
+
+    assert tracker.receipts_applied == 1
+    assert list(registry.stats["termii-generic"].delivery_latencies) == [4.0]
+    assert list(tracker.unmatched) == [("termii-generic", "m3")]
+
+
+def test_webhook_acknowledges_and_buffers(monkeypatch):
+    tracker = DeliveryTracker()
+    monkeypatch.setattr(views, "delivery_tracker", tracker)
+    reports = [
+        {"message_id": "m1", "status": "Delivered", "channel": "generic"},
+        {"message_id": "m2", "status": "Message Sent", "channel": "generic"},
+    ]
+
+    monkeypatch.setattr(views, "verify_signature", functools.partial(verify_signature, secret="secret"))
+    body = json.dumps(reports).encode()
+    signature = hmac.new(b"secret", body, hashlib.sha512).hexdigest()
+
+    response = TestClient(app).post("/v1/notifications/delivery-reports/termii", content=body,
+                                    headers={"X-Termii-Signature": signature})
+
+    assert response.status_code == 202
+    assert response.json() == {"accepted": 1}
+    assert tracker.queue.qsize() == 1
+
+
+def test_webhook_rejects_unknown_source_and_bad_signature(monkeypatch):
+    client = TestClient(app)
+    assert client.post("/v1/notifications/delivery-reports/nobody", json={}).status_code == 404
+
+    # No SMS_WEBHOOK_SECRET in the test environment: even a well-formed report is refused
+    assert client.post("/v1/notifications/delivery-reports/termii", json={}).status_code == 401
+
+    monkeypatch.setattr(views, "verify_signature", functools.partial(verify_signature, secret="secret"))
+    assert client.post("/v1/notifications/delivery-reports/termii", json={},
+                       headers={"X-Termii-Signature": "forged"}).status_code == 401
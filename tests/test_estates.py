@@ -0,0 +1,86 @@
+import random
+
+import pytest
+
+from src.estates import geohash
+from src.estates.models import Estate
+from src.estates.services import RegionCache, _on_estate_event, nearby_estates, region_cache
+
+LAGOS = (6.5244, 3.3792)
+
+
+def test_geohash_round_trips_into_its_cell():
+    cell = geohash.encode(*LAGOS, precision=7)
+    min_lat, min_lon, max_lat, max_lon = geohash.bounds(cell)
+    assert min_lat <= LAGOS[0] <= max_lat and min_lon <= LAGOS[1] <= max_lon
+    assert geohash.encode(*LAGOS).startswith(cell)
+
+
+def test_neighbours_surround_the_cell():
+    cell = geohash.encode(*LAGOS, precision=6)
+    around = geohash.neighbours(cell)
+    assert len(around) == 8 and cell not in around
+    span = geohash.cell_span_m(cell)
+    for neighbour in around:
+        min_lat, min_lon, max_lat, max_lon = geohash.bounds(neighbour)
+        center = ((min_lat + max_lat) / 2, (min_lon + max_lon) / 2)
+        assert geohash.distance_m(*LAGOS, *center) < 3 * span
+
+
+def test_neighbours_wrap_the_antimeridian():
+    cell = geohash.encode(0.0, 179.999, precision=4)
+    assert any(geohash.bounds(neighbour)[1] == -180.0 for neighbour in geohash.neighbours(cell))
+
+
+def test_stale_fill_is_not_cached_after_a_write():
+    cache = RegionCache(ttl_seconds=60, max_rows=100)
+    cell = geohash.encode(*LAGOS, precision=6)
+    generation = cache.generation
+    cache.invalidate(geohash.encode(*LAGOS))  # a write lands while the fill is reading
+    cache.put(cell, (("id", "Old", *LAGOS),), generation)
+    assert cache.get(cell) is None
+
+
+def test_cache_is_bounded_by_rows():
+    cache = RegionCache(ttl_seconds=60, max_rows=3)
+    cache.put("s0000", (1, 2), cache.generation)
+    cache.put("s0001", (3, 4), cache.generation)
+    assert cache.get("s0000") is None and cache.rows == 2
+
+
+def test_estate_event_drops_cached_cells():
+    full = geohash.encode(*LAGOS)
+    region_cache.put(full[:5], (), region_cache.generation)
+    _on_estate_event("staff", {"type": "estate_changed", "data": {"geohashes": [full, None]}})
+    assert region_cache.get(full[:5]) is None
+
+
+@pytest.mark.asyncio
+async def test_nearby_matches_brute_force(sqlite_db):
+    async with sqlite_db([Estate.__table__], name="estates") as (engine, session_factory):
+        rng = random.Random(7)
+        estates = []
+        for index in range(2000):
+            # Dense around Lagos with a sparse spread over the region
+            spread = 0.05 if index % 2 else 0.6
+            latitude, longitude = LAGOS[0] + rng.uniform(-spread, spread), LAGOS[1] + rng.uniform(-spread, spread)
+            estates.append(Estate(name=f"Estate {index}", latitude=latitude, longitude=longitude,
+                                  geohash=geohash.encode(latitude, longitude)))
+        async with session_factory() as db:
+            db.add_all(estates)
+            await db.commit()
+
+        cache = RegionCache()
+        for point, k, radius_m in [(LAGOS, 10, 5000), ((6.9, 3.9), 5, 15000), ((6.9, 3.9), 50, 1000)]:
+            expected = sorted(
+                (geohash.distance_m(*point, estate.latitude, estate.longitude), estate.id) for estate in estates
+            )
+            expected = [estate_id for distance, estate_id in expected if distance <= radius_m][:k]
+            found = await nearby_estates(session_factory, *point, k, radius_m, cache=cache)
+            assert [estate[0] for _, estate in found] == expected
+
+    def unavailable():
+        raise AssertionError("cache miss")
+
+    # Asking again is answered from the cache without a session
+    assert len(await nearby_estates(unavailable, *LAGOS, 10, 5000, cache=cache)) == 10
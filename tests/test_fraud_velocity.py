@@ -0,0 +1,120 @@
+import asyncio
+import ipaddress
+
+import pytest
+from starlette.requests import Request
+
+from src.fraud import services
+from src.fraud.sync import RedisVelocitySync
+from src.fraud.velocity import SlidingWindowCounter, VelocityEngine, VelocityRule
+
+
+class FakeClock:
+    def __init__(self, now: float = 1_000_000.0):
+        self.now = now
+
+    def __call__(self) -> float:
+        return self.now
+
+
+def test_counter_expires_events_after_the_window():
+    clock = FakeClock()
+    counter = SlidingWindowCounter(60, buckets=60, clock=clock)
+    for _ in range(3):
+        counter.add("+2348031234567", 100.0)
+    clock.now += 30
+    counter.add("+2348031234567", 50.0)
+    assert counter.get("+2348031234567") == (4, 350.0)
+
+    clock.now += 31
+    assert counter.get("+2348031234567") == (1, 50.0)
+    clock.now += 3600
+    assert counter.get("+2348031234567") == (0, 0.0)
+
+
+def test_counter_evicts_least_recently_used_keys():
+    counter = SlidingWindowCounter(60, max_keys=2, clock=FakeClock())
+    counter.add("a")
+    counter.add("b")
+    counter.add("a")
+    counter.add("c")
+    assert len(counter) == 2
+    assert counter.get("b") == (0, 0.0)
+    assert counter.get("a") == (2, 0.0)
+    assert counter.evictions == 1
+
+
+def test_engine_blocks_once_a_limit_would_be_exceeded():
+    clock = FakeClock()
+    engine = VelocityEngine([
+        VelocityRule("failures_per_phone", "login_failure", "phone", 900, max_count=3),
+        VelocityRule("amount_per_device", "transfer", "device", 86400, max_amount=1000),
+    ], clock=clock)
+    attributes = {"phone": "+2348031234567", "device": "d1", "ip": "10.0.0.1"}
+
+    for _ in range(3):
+        assert engine.check("login_failure", attributes).allowed
+        engine.record("login_failure", attributes)
+    decision = engine.check("login_failure", attributes)
+    assert not decision.allowed
+    assert decision.reasons == ["failures_per_phone"]
+    assert engine.check("login_failure", {**attributes, "phone": "+2348030000000"}).allowed
+
+    clock.now += 901
+    assert engine.check("login_failure", attributes).allowed
+
+    engine.record("transfer", attributes, 600)
+    assert engine.check("transfer", attributes, 400).allowed
+    assert not engine.check("transfer", attributes, 401).allowed
+
+
+def test_engine_adds_counts_from_other_nodes():
+    engine = VelocityEngine([VelocityRule("failures", "login_failure", "phone", 900, max_count=3)],
+                            clock=FakeClock())
+    engine.remote["failures"]["+2348031234567"] = (3, 0.0)
+    assert not engine.check("login_failure", {"phone": "+2348031234567"}).allowed
+
+
+def _request(peer: str, forwarded: str = None) -> Request:
+    headers = [(b"x-forwarded-for", forwarded.encode())] if forwarded else []
+    return Request({"type": "http", "method": "POST", "path": "/", "query_string": b"",
+                    "client": (peer, 1234), "headers": headers})
+
+
+def test_client_ip_only_believes_forwarded_for_from_trusted_proxies(monkeypatch):
+    monkeypatch.setattr(services, "FRAUD_TRUSTED_PROXIES", [ipaddress.ip_network("10.0.0.0/8")])
+
+    # Behind the load balancer: the rightmost address it did not add itself
+    assert services.client_ip(_request("10.0.0.5", "6.6.6.6, 41.58.1.2, 10.0.0.9")) == "41.58.1.2"
+    # The load balancer's own address is never a caller
+    assert services.client_ip(_request("10.0.0.5")) is None
+    # A direct client cannot choose its address
+    assert services.client_ip(_request("41.58.1.2", "1.2.3.4")) == "41.58.1.2"
+
+
+class FailingPipeline:
+    def __getattr__(self, name):
+        return lambda *args, **kwargs: None
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def execute(self):
+        raise ConnectionError("redis unavailable")
+
+
+def test_counts_survive_a_failed_redis_sync():
+    pytest.importorskip("redis")
+    clock = FakeClock()
+    engine = VelocityEngine([VelocityRule("failures", "login_failure", "phone", 900, max_count=3)], clock=clock)
+    sync = RedisVelocitySync(engine, "redis://localhost:6379/0")
+    sync.client.pipeline = lambda transaction=False: FailingPipeline()
+
+    engine.record("login_failure", {"phone": "+2348031234567"})
+    with pytest.raises(ConnectionError):
+        asyncio.run(sync.sync_once())
+    engine.record("login_failure", {"phone": "+2348031234567"})
+    assert [entry[0] for entry in sync.pending.values()] == [2]
@@ -0,0 +1,40 @@
+import pytest
+
+from src.authentications.hashing import PasswordPolicy, argon2_time_cost_for, bcrypt_rounds_for
+
+
+def test_bcrypt_rounds_fit_the_budget():
+    # 40 ms at cost 10 -> 80 at 11, 160 at 12, 320 at 13
+    assert bcrypt_rounds_for(250, 0.040) == 12
+    assert bcrypt_rounds_for(1000, 0.040) == 14
+    # Slow machines keep the floor rather than dropping below it
+    assert bcrypt_rounds_for(10, 0.040) == 10
+    assert bcrypt_rounds_for(10_000_000, 0.001) == 16
+
+
+def test_argon2_time_cost_fits_the_budget():
+    assert argon2_time_cost_for(250, 0.050) == 5
+    assert argon2_time_cost_for(50, 0.050) == 2
+    assert argon2_time_cost_for(5000, 0.050) == 10
+
+
+def test_weaker_hashes_are_upgraded_but_stronger_ones_are_kept():
+    weak = PasswordPolicy("bcrypt", bcrypt_rounds=4).hash("1234")
+    strong = PasswordPolicy("bcrypt", bcrypt_rounds=6).hash("1234")
+    policy = PasswordPolicy("bcrypt", bcrypt_rounds=5)
+    assert policy.verify("1234", weak) and policy.verify("1234", strong)
+    assert policy.needs_rehash(weak)
+    assert not policy.needs_rehash(strong)
+    assert not policy.needs_rehash(policy.hash("1234"))
+
+
+def test_argon2_policy_upgrades_bcrypt_and_cheaper_argon2_hashes():
+    policy = PasswordPolicy("argon2", argon2_time_cost=3, argon2_memory_kib=65536)
+    assert policy.needs_rehash(PasswordPolicy("bcrypt", bcrypt_rounds=4).hash("1234"))
+    assert policy.needs_rehash("$argon2id$v=19$m=19456,t=2,p=1$c29tZXNhbHQ$aGFzaA")
+    assert not policy.needs_rehash("$argon2id$v=19$m=65536,t=3,p=1$c29tZXNhbHQ$aGFzaA")
+
+
+def test_unknown_scheme_is_rejected():
+    with pytest.raises(ValueError):
+        PasswordPolicy("md5")
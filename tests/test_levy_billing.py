@@ -0,0 +1,220 @@
+import asyncio
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy import event, select, update
+
+from src.authentications.models import User
+from src.authentications.utilities import get_staff_user
+from src.database import get_home_db
+from src.estates import billing, views
+from src.estates.models import Estate, EstateUnit, LevyInvoice, LevyRun
+from src.notifications.models import Campaign
+from src.sharding import ShardRouter
+from src.transactions.models import LedgerEntry, Wallet
+
+HOME_TABLES = [model.__table__ for model in (Campaign, Estate, EstateUnit, LevyRun, LevyInvoice)]
+SHARD_TABLES = [model.__table__ for model in (User, Wallet, LedgerEntry)]
+
+
+def _utc(target, context) -> None:
+    # SQLite hands back naive datetimes where Postgres keeps the offset
+    value = target.__dict__.get("created_date")
+    if isinstance(value, datetime) and value.tzinfo is None:
+        target.__dict__["created_date"] = value.replace(tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def aware_datetimes():
+    event.listen(LevyRun, "load", _utc)
+    yield
+    event.remove(LevyRun, "load", _utc)
+
+
+def _run(scenario, sqlite_db, monkeypatch):
+    # Postgres-only side channels: NOTIFY, the JSONB outbox and ON CONFLICT recipient inserts
+    events, recipients = [], []
+
+    async def publish(db_session, batch):
+        events.extend(batch)
+
+    async def no_outbox(db_session, batch):
+        return None
+
+    async def queue(db_session, campaign_id, phone_numbers):
+        # Like ON CONFLICT DO NOTHING: a resident whose units fall in different chunks is queued once
+        added = [phone for phone in phone_numbers if phone not in recipients]
+        recipients.extend(added)
+        return len(added)
+
+    monkeypatch.setattr(billing, "publish_events", publish)
+    monkeypatch.setattr(billing, "add_outbox_events", no_outbox)
+    monkeypatch.setattr(billing, "add_recipients", queue)
+
+    async def wrapper():
+        async with AsyncExitStack() as stack:
+            factories = {}
+            for name in ("home", "shard1"):
+                tables = SHARD_TABLES + (HOME_TABLES if name == "home" else [])
+                _, factories[name] = await stack.enter_async_context(sqlite_db(tables, name=name))
+            await scenario(ShardRouter(factories, home="home"), events, recipients)
+
+    asyncio.run(wrapper())
+
+
+async def _resident(router, phone: str, balance: str) -> Wallet:
+    async with router.session_factory(phone)() as session:
+        user = User(first_name="Ada", last_name="Obi", phone_number=phone, phone_e164=phone, login_pin="x",
+                    created_date=datetime.now(timezone.utc))
+        wallet = Wallet(user_id=user.id, balance=Decimal(balance))
+        session.add_all([user, wallet])
+        await session.commit()
+    return wallet
+
+
+async def _balance(router, phone: str, wallet_id) -> Decimal:
+    async with router.session_factory(phone)() as session:
+        return (await session.get(Wallet, wallet_id)).balance
+
+
+def test_levy_bills_across_shards_once(sqlite_db, monkeypatch):
+    async def scenario(router, events, recipients):
+        phones = [f"+234803{index:07d}" for index in range(40)]
+        rich = next(phone for phone in phones if router.shard_for(phone) == "shard1")
+        poor = next(phone for phone in phones if router.shard_for(phone) == "home")
+        rich_wallet = await _resident(router, rich, "100000.00")
+        poor_wallet = await _resident(router, poor, "10.00")
+
+        async with router.session_factory()() as db:
+            estate = Estate(name="Palm Grove", latitude=6.5, longitude=3.4, geohash="s14")
+            db.add(estate)
+            await db.flush()
+            db.add_all([
+                EstateUnit(estate_id=estate.id, label="A1", resident_phone_e164=rich),
+                EstateUnit(estate_id=estate.id, label="A2", resident_phone_e164=rich),
+                EstateUnit(estate_id=estate.id, label="B1", resident_phone_e164=poor),
+                EstateUnit(estate_id=estate.id, label="C1", resident_phone_e164="+2348099999999"),  # not signed up
+                EstateUnit(estate_id=estate.id, label="D1"),  # vacant
+            ])
+            await db.commit()
+            run = await billing.create_levy_run(db, estate, "Service charge", "2026-10", Decimal("25000.00"))
+            assert run.total_count == 4
+            # Submitting the same levy again returns the same run without new invoices
+            again = await billing.create_levy_run(db, estate, "Service charge", "2026-10", Decimal("25000.00"))
+            assert again.id == run.id
+            # Not resumable until its recipients are queued
+            assert (await db.get(Campaign, run.campaign_id)).status == "draft"
+
+        result = await billing.run_levy(run.id, router=router, chunk_size=2)
+        assert (result["paid"], result["unpaid"], result["no_wallet"], result["pending"]) == (2, 1, 1, 0)
+        assert await _balance(router, rich, rich_wallet.id) == Decimal("50000.00")
+        assert await _balance(router, poor, poor_wallet.id) == Decimal("10.00")
+        assert sorted(recipients) == sorted([rich, poor])
+        assert sorted(event["status"] for _, _, event in events) == ["paid", "paid", "unpaid"]
+        async with router.session_factory()() as db:
+            assert (await db.get(Campaign, run.campaign_id)).status == "queued"
+
+        # A crash after the shard committed but before the home shard recorded it: the invoice is pending again
+        async with router.session_factory()() as db:
+            await db.execute(update(LevyInvoice).where(LevyInvoice.status == "paid").values(status="pending"))
+            await db.execute(update(LevyRun).values(paid_count=0, status="billing"))
+            await db.commit()
+        result = await billing.run_levy(run.id, router=router)
+        assert result["paid"] == 2
+        assert await _balance(router, rich, rich_wallet.id) == Decimal("50000.00")
+        async with router.session_factory(rich)() as session:
+            entries = (await session.execute(select(LedgerEntry.reference))).scalars().all()
+        assert len(entries) == 2
+
+        async with router.session_factory()() as db:
+            run = await db.get(LevyRun, run.id)
+        assert (run.status, run.paid_count, run.unpaid_count, run.no_wallet_count) == ("completed", 2, 1, 1)
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_runs_older_than_the_ledger_retention_are_never_billed(sqlite_db, monkeypatch):
+    async def scenario(router, events, recipients):
+        phone = "+2348030000001"
+        wallet = await _resident(router, phone, "100000.00")
+        async with router.session_factory()() as db:
+            estate = Estate(name="Palm Grove", latitude=6.5, longitude=3.4, geohash="s14")
+            db.add(estate)
+            await db.flush()
+            db.add(EstateUnit(estate_id=estate.id, label="A1", resident_phone_e164=phone))
+            await db.commit()
+            run = await billing.create_levy_run(db, estate, "Service charge", "2020-01", Decimal("25000.00"))
+            # Its ledger partitions may be in the archive, where a replayed reference would not be found
+            await db.execute(update(LevyRun).values(created_date=datetime(2020, 1, 1, tzinfo=timezone.utc)))
+            await db.commit()
+
+        result = await billing.run_levy(run.id, router=router)
+        assert not result["success"] and "too old" in result["message"]
+        assert await _balance(router, phone, wallet.id) == Decimal("100000.00")
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_resubmitting_a_levy_never_starts_a_second_billing_pass(monkeypatch):
+    run = LevyRun(id=uuid4(), estate_id=uuid4(), name="Service charge", period="2026-10",
+                  amount=Decimal("25000.00"), created_date=datetime.now(timezone.utc))
+    scheduled = []
+
+    async def get_estate(db, estate_id, for_update=False):
+        return Estate(id=run.estate_id, name="Palm Grove", latitude=6.5, longitude=3.4, geohash="s14")
+
+    async def create_levy_run(db, estate, name, period, amount):
+        return run
+
+    async def run_levy(run_id, providers=None):
+        scheduled.append(run_id)
+
+    async def record_request(*args, **kwargs):
+        return None
+
+    async def no_db():
+        yield None
+
+    monkeypatch.setattr(views, "_get_estate", get_estate)
+    monkeypatch.setattr(views, "create_levy_run", create_levy_run)
+    monkeypatch.setattr(views, "run_levy", run_levy)
+    monkeypatch.setattr(views.audit_log, "record_request", record_request)
+    app = FastAPI()
+    app.include_router(views.router)
+    app.dependency_overrides[get_home_db] = no_db
+    app.dependency_overrides[get_staff_user] = lambda: User(first_name="Staff", last_name="User", login_pin="x",
+                                                            phone_number="+2348030000001",
+                                                            phone_e164="+2348030000001")
+
+    async def submit(amount: str):
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            return await client.post(f"/estates/{run.estate_id}/levies",
+                                     json={"name": run.name, "period": run.period, "amount": amount})
+
+    # A retry of the same levy resumes it
+    assert asyncio.run(submit("25000")).status_code == 202
+    assert scheduled == [run.id]
+
+    # The same levy with another amount is a different charge, not a retry
+    response = asyncio.run(submit("30000.00"))
+    assert response.status_code == 409
+    assert scheduled == [run.id]
+
+    # While the run is being billed a retry reports progress without starting another pass
+    monkeypatch.setattr(billing, "_levies_in_flight", {run.id})
+    assert asyncio.run(submit("25000.00")).status_code == 202
+    assert scheduled == [run.id]
+
+
+def test_run_levy_skips_a_run_this_process_is_already_billing(monkeypatch):
+    run_id = uuid4()
+    monkeypatch.setattr(billing, "_levies_in_flight", {run_id})
+
+    result = asyncio.run(billing.run_levy(run_id, router=None))
+    assert not result["success"] and "already" in result["message"]
+    assert billing.levy_in_flight(run_id)
@@ -0,0 +1,60 @@
+import asyncio
+from io import BytesIO
+
+import pytest
+from fastapi.testclient import TestClient
+from PIL import Image
+
+from src.main import app
+from src.media import services, views
+from src.media.storage import ImageStore, LocalImageStore
+from src.media.variants import render_variants
+
+
+def _png(width: int, height: int) -> bytes:
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), color="teal").save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def test_variants_are_square_in_every_size_and_format():
+    variants = render_variants(_png(300, 200))
+    assert set(variants) == {"original.png", "64.png", "64.webp", "128.png", "128.webp", "256.png", "256.webp"}
+    assert Image.open(BytesIO(variants["128.webp"])).size == (128, 128)
+    assert Image.open(BytesIO(variants["original.png"])).size == (300, 200)
+    # Never upscaled past the source
+    assert Image.open(BytesIO(variants["256.png"])).size == (200, 200)
+
+
+def test_stored_avatar_is_served_with_immutable_caching(tmp_path, monkeypatch):
+    store = LocalImageStore(str(tmp_path), "/v1/media")
+    monkeypatch.setattr(services, "image_store", store)
+    monkeypatch.setattr(views, "image_store", store)
+
+    url = asyncio.run(services.store_avatar(_png(200, 200)))
+    thumbnail = services.avatar_variants(url)["64.webp"]
+    try:
+        client = TestClient(app)
+        response = client.get(thumbnail)
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "image/webp"
+        assert "immutable" in response.headers["cache-control"]
+        assert client.get(thumbnail, headers={"If-None-Match": response.headers["etag"]}).status_code == 304
+    finally:
+        services.shutdown_image_pool()
+
+
+def test_keys_outside_the_store_layout_are_not_served(tmp_path, monkeypatch):
+    (tmp_path / "secret.png").write_bytes(b"x")
+    monkeypatch.setattr(views, "image_store", LocalImageStore(str(tmp_path)))
+    client = TestClient(app)
+    assert client.get("/v1/media/secret.png").status_code == 404
+    assert client.get("/v1/media/avatars/../../secret.png").status_code == 404
+
+
+def test_image_stores_must_implement_save():
+    class Incomplete(ImageStore):
+        pass
+
+    with pytest.raises(TypeError):
+        Incomplete()
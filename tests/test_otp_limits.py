@@ -0,0 +1,115 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy import event, select
+
+from src.authentications import services
+from src.authentications.models import OTP, OTPRequestLimit
+from src.settings.services import get_settings
+
+PHONE = "+2348030000001"
+
+
+def _utc(target, context) -> None:
+    # SQLite hands back naive datetimes where Postgres keeps the offset
+    for column in ("created_date", "expire_date", "window_start", "banned_date"):
+        value = target.__dict__.get(column)
+        if isinstance(value, datetime) and value.tzinfo is None:
+            target.__dict__[column] = value.replace(tzinfo=timezone.utc)
+
+
+@pytest.fixture(autouse=True)
+def aware_datetimes():
+    for model in (OTP, OTPRequestLimit):
+        event.listen(model, "load", _utc)
+    yield
+    for model in (OTP, OTPRequestLimit):
+        event.remove(model, "load", _utc)
+
+
+def _run(scenario, sqlite_db, monkeypatch):
+    sent = []
+
+    async def send_otp_message(phone_number, otp, message_template):
+        sent.append(otp)
+        return {"success": True}
+
+    monkeypatch.setattr(services, "send_otp_message", send_otp_message)
+    # Every request in these tests is a separate tap, not a double submit
+    monkeypatch.setattr(services, "get_settings", lambda: get_settings().model_copy(update={"otp_coalesce_seconds": 0}))
+
+    async def wrapper():
+        async def request_otp() -> dict:
+            async with session_factory() as session:
+                execute = session.execute
+
+                async def without_advisory_lock(statement, *args, **kwargs):
+                    # pg_advisory_xact_lock is Postgres-only; these tests issue one request at a time
+                    if "pg_advisory_xact_lock" in str(statement):
+                        return None
+                    return await execute(statement, *args, **kwargs)
+
+                session.execute = without_advisory_lock
+                return await services._issue_user_otp(PHONE, session)
+
+        async def age(days: float) -> None:
+            # Move every timestamp for the number into the past
+            delta = timedelta(days=days)
+            async with session_factory() as session:
+                for model, columns in ((OTP, ("created_date", "expire_date")), (OTPRequestLimit, ("window_start",))):
+                    for row in (await session.execute(select(model))).scalars():
+                        for column in columns:
+                            setattr(row, column, getattr(row, column) - delta)
+                await session.commit()
+
+        async with sqlite_db([OTP.__table__, OTPRequestLimit.__table__], name="otp") as (engine, session_factory):
+            await scenario(session_factory, request_otp, age)
+
+    asyncio.run(wrapper())
+    return sent
+
+
+def test_limit_and_ban_survive_the_otp_lookup_window(sqlite_db, monkeypatch):
+    lookup_days = get_settings().otp_lookup_days
+    max_requests = get_settings().otp_max_requests
+
+    async def scenario(session_factory, request_otp, age):
+        for _ in range(max_requests):
+            assert (await request_otp())["success"]
+        refused = await request_otp()
+        assert not refused["success"] and "30 minutes" in refused["message"]
+
+        # The otp row drops out of the lookup window, but the limit does not reset with it
+        await age(days=lookup_days + 1)
+        for _ in range(max_requests, services.MAX_REQUESTS_BEFORE_BAN + 1):
+            assert (await request_otp())["success"]
+        banned = await request_otp()
+        assert not banned["success"] and "banned" in banned["message"]
+
+        await age(days=lookup_days + 7)
+        assert "banned" in (await request_otp())["message"]
+        async with session_factory() as session:
+            # Verifying a code (if one were still around) does not lift a ban
+            await services.clear_otp_requests(session, PHONE)
+            await session.commit()
+        assert "banned" in (await request_otp())["message"]
+
+    sent = _run(scenario, sqlite_db, monkeypatch)
+    assert len(sent) == services.MAX_REQUESTS_BEFORE_BAN + 1
+
+
+def test_verifying_a_code_starts_the_count_afresh(sqlite_db, monkeypatch):
+    max_requests = get_settings().otp_max_requests
+
+    async def scenario(session_factory, request_otp, age):
+        for _ in range(max_requests):
+            assert (await request_otp())["success"]
+        assert not (await request_otp())["success"]
+
+        async with session_factory() as session:
+            await services.clear_otp_requests(session, PHONE)
+            await session.commit()
+        assert (await request_otp())["success"]
+
+    _run(scenario, sqlite_db, monkeypatch)
@@ -0,0 +1,142 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import JSON, Column, DateTime, Integer, MetaData, String, Table, select
+from sqlalchemy.types import TypeDecorator
+
+from src.outbox import relay, services
+from src.outbox.relay import FileSink, relay_batch
+
+
+class UTCDateTime(TypeDecorator):
+    # SQLite drops the offset that Postgres keeps
+    impl = DateTime
+    cache_ok = True
+
+    def process_result_value(self, value, dialect):
+        return value.replace(tzinfo=timezone.utc) if value is not None else None
+
+
+def _outbox_table() -> Table:
+    # The outbox model uses JSONB, which SQLite cannot create; same columns with portable types
+    return Table(
+        "outbox", MetaData(),
+        Column("id", Integer, primary_key=True, autoincrement=True),
+        Column("event_type", String, nullable=False),
+        Column("aggregate_id", String, nullable=False),
+        Column("payload", JSON, nullable=False),
+        Column("created_date", UTCDateTime, nullable=False),
+        Column("published_date", UTCDateTime, nullable=True),
+    )
+
+
+class RecordingSink:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.batches = []
+
+    async def publish(self, events: list) -> None:
+        if self.fail:
+            raise ConnectionError("sink unavailable")
+        self.batches.append([event["id"] for event in events])
+
+
+def _run(scenario, sqlite_db, monkeypatch):
+    outbox = _outbox_table()
+    monkeypatch.setattr(relay, "outbox", outbox)
+    monkeypatch.setattr(services, "outbox", outbox)
+
+    async def wrapper():
+        async with sqlite_db([outbox], name="outbox") as (engine, session_factory):
+            async with session_factory() as session:
+                await services.add_outbox_events(session, [
+                    ("ledger.posted", f"wallet-{index}", {"amount": index}) for index in range(5)
+                ])
+                await session.commit()
+            await scenario(engine, session_factory, outbox)
+
+    asyncio.run(wrapper())
+
+
+def test_file_sink_appends_one_json_line_per_event(tmp_path):
+    path = tmp_path / "events.jsonl"
+    sink = FileSink(str(path))
+
+    async def scenario():
+        await sink.publish([{"id": 1}, {"id": 2}])
+        await sink.publish([{"id": 3, "payload": {"note": "naïve"}}])
+        await sink.close()
+
+    asyncio.run(scenario())
+    assert [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()] == [
+        {"id": 1}, {"id": 2}, {"id": 3, "payload": {"note": "naïve"}},
+    ]
+
+
+def test_relay_publishes_in_id_order_and_marks_batches_sent(sqlite_db, monkeypatch):
+    async def scenario(engine, session_factory, outbox):
+        sink = RecordingSink()
+        async with engine.connect() as conn:
+            first = await relay_batch(conn, sink, batch_size=3)
+            second = await relay_batch(conn, sink, batch_size=3)
+            idle = await relay_batch(conn, sink, batch_size=3)
+
+        assert sink.batches == [[1, 2, 3], [4, 5]]
+        assert (first["published"], second["published"], idle) == (3, 2, {"published": 0, "lag_seconds": 0.0})
+        assert first["lag_seconds"] >= 0
+        async with session_factory() as session:
+            unpublished = (await session.execute(select(outbox.c.id).where(outbox.c.published_date.is_(None)))).all()
+            assert unpublished == []
+            assert await services.get_outbox_lag(session) == {"backlog": 0, "lag_seconds": 0.0}
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_a_failed_publish_leaves_the_batch_for_the_next_attempt(sqlite_db, monkeypatch):
+    async def scenario(engine, session_factory, outbox):
+        async with engine.connect() as conn:
+            with pytest.raises(ConnectionError):
+                await relay_batch(conn, RecordingSink(fail=True), batch_size=2)
+
+        async with session_factory() as session:
+            assert (await services.get_outbox_lag(session))["backlog"] == 5
+
+        sink = RecordingSink()
+        async with engine.connect() as conn:
+            assert (await relay_batch(conn, sink, batch_size=2))["published"] == 2
+        assert sink.batches == [[1, 2]]
+        async with session_factory() as session:
+            assert (await services.get_outbox_lag(session))["backlog"] == 3
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_a_lower_id_committed_late_is_still_published_and_each_aggregate_stays_in_order(sqlite_db, monkeypatch):
+    async def commit_event(session_factory, outbox, event_id: int, aggregate_id: str) -> None:
+        async with session_factory() as session:
+            await session.execute(outbox.insert().values(
+                id=event_id, event_type="ledger.posted", aggregate_id=aggregate_id, payload={},
+                created_date=datetime.now(timezone.utc),
+            ))
+            await session.commit()
+
+    async def scenario(engine, session_factory, outbox):
+        sink = RecordingSink()
+        async with engine.connect() as conn:
+            await relay_batch(conn, sink, batch_size=10)
+            # Id 6 was taken by a slow transaction on wallet-b; wallet-a's 7 and 8 commit and are published first
+            await commit_event(session_factory, outbox, 7, "wallet-a")
+            await commit_event(session_factory, outbox, 8, "wallet-a")
+            await relay_batch(conn, sink, batch_size=10)
+            await commit_event(session_factory, outbox, 6, "wallet-b")
+            await commit_event(session_factory, outbox, 9, "wallet-b")
+            await relay_batch(conn, sink, batch_size=10)
+
+        # Not in global id order, but nothing is skipped and every aggregate's events are in order
+        assert sink.batches == [[1, 2, 3, 4, 5], [7, 8], [6, 9]]
+        async with session_factory() as session:
+            assert (await services.get_outbox_lag(session))["backlog"] == 0
+
+    _run(scenario, sqlite_db, monkeypatch)
@@ -0,0 +1,59 @@
+import asyncio
+from datetime import datetime, timezone
+
+from src.partitions import maintain_partitions, partition_name, partition_start, period_start, retained_since
+
+
+def test_period_start_months_roll_over_years():
+    moment = datetime(2026, 11, 17, 13, 5, tzinfo=timezone.utc)
+    assert period_start(moment, "month") == datetime(2026, 11, 1, tzinfo=timezone.utc)
+    assert period_start(moment, "month", 2) == datetime(2027, 1, 1, tzinfo=timezone.utc)
+    assert period_start(moment, "month", -11) == datetime(2025, 12, 1, tzinfo=timezone.utc)
+
+
+def test_period_start_days():
+    moment = datetime(2026, 2, 28, 23, 59, tzinfo=timezone.utc)
+    assert period_start(moment, "day") == datetime(2026, 2, 28, tzinfo=timezone.utc)
+    assert period_start(moment, "day", 1) == datetime(2026, 3, 1, tzinfo=timezone.utc)
+
+
+def test_partition_names_round_trip():
+    start = datetime(2026, 3, 9, tzinfo=timezone.utc)
+    assert partition_name("otp", start, "day") == "otp_2026_03_09"
+    assert partition_start("otp", "otp_2026_03_09", "day") == start
+    assert partition_name("ledger_entries", start, "month") == "ledger_entries_2026_03"
+    assert partition_start("ledger_entries", "ledger_entries_2026_03", "month") == datetime(2026, 3, 1, tzinfo=timezone.utc)
+    assert partition_start("otp", "otp_default", "day") is None
+
+
+class FakeConnection:
+    """Every table is partitioned and has no partitions yet; records the SQL it is sent."""
+
+    def __init__(self):
+        self.statements = []
+
+    async def execute(self, statement, parameters=None):
+        self.statements.append(str(statement))
+        return self
+
+    def scalar(self):
+        return 1
+
+    def scalars(self):
+        return []
+
+
+def test_home_only_tables_are_maintained_on_the_home_database_alone():
+    now = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    home, shard = FakeConnection(), FakeConnection()
+
+    assert "audit_log" in asyncio.run(maintain_partitions(home, now))
+    report = asyncio.run(maintain_partitions(shard, now, home=False))
+    assert set(report) == {"otp", "ledger_entries"}
+    assert not any("audit_log" in statement for statement in shard.statements)
+
+
+def test_retained_since_is_the_oldest_partition_kept_attached():
+    now = datetime(2026, 10, 19, tzinfo=timezone.utc)
+    assert retained_since("ledger_entries", now) == datetime(2023, 10, 1, tzinfo=timezone.utc)
+    assert retained_since("otp", now) == datetime(2026, 10, 12, tzinfo=timezone.utc)
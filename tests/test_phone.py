@@ -0,0 +1,32 @@
+import pytest
+
+from src.authentications.phone import InvalidPhoneNumber, normalize_phone_number
+
+
+@pytest.mark.parametrize("raw", [
+    "08031234567",
+    "0803 123 4567",
+    "8031234567",
+    "2348031234567",
+    "+2348031234567",
+    "+234 (0) 803-123-4567",
+    "002348031234567",
+])
+def test_nigerian_spellings_share_one_key(raw):
+    assert normalize_phone_number(raw) == "+2348031234567"
+
+
+def test_other_countries_keep_their_calling_code():
+    assert normalize_phone_number("+44 7911 123456") == "+447911123456"
+    assert normalize_phone_number("+233 024 123 4567") == "+233241234567"
+    assert normalize_phone_number("+12025550123") == "+12025550123"
+
+
+def test_unknown_country_only_checks_length():
+    assert normalize_phone_number("+8613800138000") == "+8613800138000"
+
+
+@pytest.mark.parametrize("raw", ["", "abc", "+234803", "080312345678901234", "+234 803 123 456７"])
+def test_invalid_numbers_are_rejected(raw):
+    with pytest.raises(InvalidPhoneNumber):
+        normalize_phone_number(raw)
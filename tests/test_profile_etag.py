@@ -0,0 +1,65 @@
+from uuid import uuid4
+
+from fastapi.testclient import TestClient
+
+from src.authentications.utilities import create_access_token
+from src.main import app
+from src.user import views
+from src.user.services import ProfileVersionCache, _on_profile_event, etag_matches, profile_etag, profile_versions
+
+
+class Clock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_versions_never_move_backwards():
+    cache = ProfileVersionCache(ttl_seconds=60, max_keys=10)
+    user_id = uuid4()
+    cache.update("+2348030000001", user_id, 3)
+    cache.update("+2348030000001", user_id, 2)  # e.g. read from a lagging replica
+    assert cache.get("+2348030000001") == (user_id, 3)
+
+
+def test_entries_expire_and_are_bounded():
+    clock = Clock()
+    cache = ProfileVersionCache(ttl_seconds=60, max_keys=2, clock=clock)
+    for index in range(3):
+        cache.update(f"+23480300000{index:02d}", uuid4(), 1)
+    assert len(cache) == 2 and cache.get("+2348030000000") is None
+    clock.now = 61
+    assert cache.get("+2348030000001") is None
+
+
+def test_etag_comparison():
+    etag = profile_etag(uuid4(), 4)
+    assert etag_matches(f'"other", W/{etag}', etag)
+    assert not etag_matches(f"W/{etag}", etag, weak=False)
+    assert etag_matches("*", etag)
+    assert not etag_matches(None, etag)
+
+
+def test_profile_event_moves_cache_forward():
+    user_id = uuid4()
+    _on_profile_event(str(user_id), {"type": "profile_updated", "data": {"phone_e164": "+2348030000099", "version": 7}})
+    assert profile_versions.get("+2348030000099") == (user_id, 7)
+
+
+def test_conditional_get_is_answered_without_the_database(monkeypatch):
+    phone, user_id = "+2348030000042", uuid4()
+    profile_versions.update(phone, user_id, 5)
+
+    def no_database(*args, **kwargs):
+        raise AssertionError("conditional GET reached the database")
+
+    monkeypatch.setattr(views, "read_session_factory", no_database)
+    response = TestClient(app).get("/v1/users/me", headers={
+        "Authorization": f"Bearer {create_access_token({'sub': phone})}",
+        "If-None-Match": profile_etag(user_id, 5),
+    })
+    assert response.status_code == 304
+    assert response.headers["etag"] == profile_etag(user_id, 5)
+    assert response.content == b""
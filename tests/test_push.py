@@ -0,0 +1,132 @@
+import asyncio
+import json
+
+from src.notifications import push
+from src.notifications.push import PushHub
+
+
+class FakeWebSocket:
+    def __init__(self, stalled: bool = False):
+        self.stalled = stalled
+        self.sent = []
+        self.closed_with = None
+        self.gone = asyncio.Event()
+
+    async def send_text(self, message: str) -> None:
+        if self.stalled:
+            # A client that stopped reading: the send never completes
+            await asyncio.Event().wait()
+        self.sent.append(message)
+
+    async def receive_text(self) -> str:
+        await self.gone.wait()
+        raise ConnectionError("client went away")
+
+    async def close(self, code: int = 1000) -> None:
+        self.closed_with = code
+
+
+def test_events_fan_out_to_every_connection_of_the_user_only():
+    async def scenario():
+        hub = PushHub(queue_size=4)
+        first, second, other = FakeWebSocket(), FakeWebSocket(), FakeWebSocket()
+        tasks = [asyncio.create_task(hub.serve(user, websocket))
+                 for user, websocket in (("a", first), ("a", second), ("b", other))]
+        await asyncio.sleep(0)
+
+        assert hub.deliver("a", "credited") == 2
+        assert hub.deliver("nobody", "ignored") == 0
+        await asyncio.sleep(0.01)
+        assert first.sent == second.sent == ["credited"]
+        assert other.sent == []
+
+        # A closed socket is dropped; the user's other connection keeps receiving
+        first.gone.set()
+        await tasks[0]
+        assert hub.deliver("a", "otp_status") == 1
+        await asyncio.sleep(0.01)
+        assert second.sent == ["credited", "otp_status"]
+
+        second.gone.set()
+        other.gone.set()
+        await asyncio.gather(*tasks)
+        assert not hub.connections
+
+    asyncio.run(scenario())
+
+
+def test_slow_socket_is_disconnected_without_holding_up_the_others(monkeypatch):
+    monkeypatch.setattr(push, "PUSH_SEND_TIMEOUT_SECONDS", 0.2)
+
+    async def scenario():
+        hub = PushHub(queue_size=2)
+        slow, fast = FakeWebSocket(stalled=True), FakeWebSocket()
+        slow_task = asyncio.create_task(hub.serve("a", slow))
+        fast_task = asyncio.create_task(hub.serve("a", fast))
+        await asyncio.sleep(0)
+
+        # The slow sender holds one message in flight and two queued; the fourth overflows its queue
+        delivered = []
+        for index in range(4):
+            delivered.append(hub.deliver("a", f"event-{index}"))
+            await asyncio.sleep(0.01)
+        assert delivered == [2, 2, 2, 1]
+
+        await asyncio.wait_for(slow_task, 1)
+        assert slow.closed_with == 1013
+        assert fast.sent == [f"event-{index}" for index in range(4)]
+        assert len(hub.connections["a"]) == 1
+
+        fast.gone.set()
+        await fast_task
+
+    asyncio.run(scenario())
+
+
+def test_notifications_reach_sockets_and_hooks(monkeypatch):
+    hub = PushHub()
+    monkeypatch.setattr(push, "push_hub", hub)
+    heard = []
+
+    def failing_hook(user_id, event):
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(push, "event_hooks", [failing_hook, lambda user_id, event: heard.append((user_id, event))])
+
+    async def scenario():
+        websocket = FakeWebSocket()
+        task = asyncio.create_task(hub.serve("user-1", websocket))
+        await asyncio.sleep(0)
+        event = {"type": "wallet_credited", "data": {"amount": "500.00"}}
+        push._on_notify(None, 1, push.PUSH_CHANNEL, json.dumps({"user": "user-1", "event": event}))
+        push._on_notify(None, 1, push.PUSH_CHANNEL, "not json")
+        await asyncio.sleep(0.01)
+        websocket.gone.set()
+        await task
+        return websocket.sent, event
+
+    sent, event = asyncio.run(scenario())
+    assert [json.loads(message) for message in sent] == [event]
+    assert heard == [("user-1", event)]
+
+
+def test_listener_keeps_retrying_after_any_failure(monkeypatch):
+    monkeypatch.setattr(push, "LISTENER_RETRY_SECONDS", 0.01)
+    attempts = []
+
+    async def scenario():
+        stop_event = asyncio.Event()
+
+        async def connect(dsn):
+            attempts.append(dsn)
+            if len(attempts) == 3:
+                stop_event.set()
+            raise RuntimeError("unexpected driver failure")
+
+        monkeypatch.setattr(push.asyncpg, "connect", connect)
+        await asyncio.wait_for(
+            push.listen_for_events("postgresql+asyncpg://app@db/app", stop_event), 1
+        )
+
+    asyncio.run(scenario())
+    assert attempts == ["postgresql://app@db/app"] * 3
@@ -0,0 +1,84 @@
+import asyncio
+
+import pytest
+from starlette.requests import Request
+
+from src import database
+from src.authentications.utilities import create_access_token
+from src.sharding import ShardRouter
+
+PHONE = "+2348030000001"
+
+
+@pytest.fixture
+def replicas(monkeypatch):
+    primary, first, second = object(), object(), object()
+    monkeypatch.setattr(database, "SessionLocal", primary)
+    monkeypatch.setattr(database, "ReplicaSessionLocals", [first, second])
+    monkeypatch.setattr(database, "healthy_replicas", [0, 1])
+    monkeypatch.setattr(database, "shard_router", ShardRouter({"primary": primary}, home="primary"))
+    monkeypatch.setattr(database, "_recent_writers", {})
+    return primary, first, second
+
+
+def _request(headers: dict = None) -> Request:
+    return Request({
+        "type": "http", "method": "GET", "path": "/", "query_string": b"", "client": ("10.0.0.1", 1234),
+        "headers": [(name.lower().encode(), value.encode()) for name, value in (headers or {}).items()],
+    })
+
+
+def test_reads_round_robin_over_healthy_replicas(replicas):
+    primary, first, second = replicas
+    picked = [database.read_session_factory() for _ in range(4)]
+    assert set(picked) == {first, second} and picked[0] is not picked[1]
+
+    database.healthy_replicas = [1]
+    assert {database.read_session_factory() for _ in range(3)} == {second}
+
+
+def test_lagging_or_unreachable_replicas_fall_back_to_the_primary(replicas, monkeypatch):
+    primary, first, second = replicas
+    monkeypatch.setattr(database, "replica_engines", ["slow", "down"])
+    lags = {"slow": 60.0}
+
+    async def replica_lag(engine):
+        if engine not in lags:
+            raise OSError("connection refused")
+        return lags[engine]
+
+    monkeypatch.setattr(database, "_replica_lag", replica_lag)
+
+    async def check():
+        # One pass of the monitor, then shut it down
+        stop_event = asyncio.Event()
+        task = asyncio.create_task(database.monitor_replicas(stop_event))
+        await asyncio.sleep(0.01)
+        stop_event.set()
+        await task
+
+    asyncio.run(check())
+    assert database.healthy_replicas == []
+    assert database.read_session_factory() is primary
+
+    lags["slow"] = 0.5
+    asyncio.run(check())
+    assert database.healthy_replicas == [0]
+    assert database.read_session_factory() is first
+
+
+def test_writes_keep_that_users_reads_on_the_primary_whatever_token_they_use(replicas):
+    primary, first, second = replicas
+    database.mark_recent_write(PHONE)
+
+    assert database.read_session_factory(phone_e164=PHONE) is primary
+    assert database.read_session_factory(phone_e164="+2348030000002") is not primary
+
+    # A token issued after the write, from another address, is still the same user
+    request = _request({"Authorization": f"Bearer {create_access_token({'sub': PHONE})}"})
+    phone_e164 = asyncio.run(database.shard_key(request))
+    assert database._client_key(request, phone_e164) == PHONE
+    assert database.read_session_factory(database._client_key(request, phone_e164), phone_e164) is primary
+
+    # Anonymous callers are keyed on their address
+    assert database._client_key(_request()) == "10.0.0.1"
@@ -0,0 +1,93 @@
+import asyncio
+import csv
+from datetime import date
+
+import pytest
+
+pytest.importorskip("pyarrow")
+
+from src.reconciliation.job import export_ledger
+from src.reconciliation.pipeline import reconcile
+
+
+def _write(path, header, rows):
+    with open(path, "w", newline="") as handle:
+        writer = csv.writer(handle)
+        writer.writerow(header)
+        writer.writerows(rows)
+
+
+def test_reconcile_reports_every_kind_of_exception(tmp_path):
+    provider = tmp_path / "provider.csv"
+    ledger = tmp_path / "ledger.csv"
+    _write(provider, ["transaction_reference", "customer", "amount"], [
+        ["bill:1", "a", "1500.00"],
+        ["bill:2", "b", "200.10"],
+        ["bill:3", "c", "99.99"],   # ledger says 100.00
+        ["bill:4", "d", "10.00"],   # not in the ledger
+        ["bill:5", "e", "5.00"],
+        ["bill:5", "e", "5.00"],    # settled twice
+    ])
+    _write(ledger, ["reference", "amount"], [
+        ["bill:2", "200.1"],
+        ["bill:1", "1500"],
+        ["bill:3", "100.00"],
+        ["bill:6", "42.50"],        # never settled
+    ])
+    report = tmp_path / "exceptions.csv"
+
+    totals = reconcile(str(provider), str(ledger), str(report),
+                       provider_columns=("transaction_reference", "amount"), partitions=4, block_size=64)
+
+    assert totals["provider_rows"] == 6 and totals["ledger_rows"] == 4
+    assert totals["matched"] == 2 and totals["matched_kobo"] == 170010
+    assert totals["amount_mismatch"] == 1
+    assert totals["missing_from_ledger"] == 1 and totals["missing_from_ledger_kobo"] == 1000
+    assert totals["missing_from_provider"] == 1 and totals["missing_from_provider_kobo"] == 4250
+    assert totals["duplicate_reference"] == 2
+
+    with open(report, newline="") as handle:
+        rows = {(row["status"], row["reference"]): row for row in csv.DictReader(handle)}
+    assert rows[("amount_mismatch", "bill:3")]["provider_amount"] == "9999"
+    assert rows[("amount_mismatch", "bill:3")]["ledger_amount"] == "10000"
+    assert rows[("missing_from_ledger", "bill:4")]["provider_row"] == "4"
+    assert rows[("missing_from_provider", "bill:6")]["ledger_row"] == "4"
+    assert ("duplicate_reference", "bill:5") in rows
+
+
+class FakeShardEngine:
+    """Stands in for a shard's engine; its COPY writes the shard's ledger rows as asyncpg would."""
+
+    def __init__(self, rows: list):
+        self.rows = rows
+        self.driver_connection = self
+
+    def connect(self):
+        return self
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        return False
+
+    async def get_raw_connection(self):
+        return self
+
+    async def copy_from_query(self, query, *args, output, format, header):
+        lines = (["reference,amount"] if header else []) + [f"{reference},{amount}" for reference, amount in self.rows]
+        output.write("".join(line + "\n" for line in lines).encode())
+
+
+def test_ledger_export_covers_every_shard(tmp_path):
+    provider = tmp_path / "provider.csv"
+    ledger = tmp_path / "ledger.csv"
+    _write(provider, ["transaction_reference", "amount"], [["bill:1", "10.00"], ["bill:2", "20.00"]])
+    shards = [FakeShardEngine([("bill:1", "10.00")]), FakeShardEngine([("bill:2", "20.00")])]
+
+    asyncio.run(export_ledger(str(ledger), date(2026, 10, 18), "bill:", shards))
+    totals = reconcile(str(provider), str(ledger), str(tmp_path / "exceptions.csv"),
+                       provider_columns=("transaction_reference", "amount"), partitions=2)
+
+    assert ledger.read_text().count("reference,amount") == 1
+    assert totals["matched"] == 2 and totals["missing_from_ledger"] == 0
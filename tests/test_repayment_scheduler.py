@@ -0,0 +1,159 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
+
+from sqlalchemy import select
+from sqlalchemy.dialects import postgresql
+
+from src.authentications.models import User
+from src.transactions import scheduler
+from src.transactions.models import LedgerEntry, Loan, LoanInstallment, Wallet
+
+TABLES = [model.__table__ for model in (User, Wallet, LedgerEntry, Loan, LoanInstallment)]
+
+
+def _run(scenario, sqlite_db, monkeypatch):
+    events = []
+
+    async def publish(db_session, batch):
+        events.extend(batch)
+
+    async def no_outbox(db_session, batch):
+        return None
+
+    # Postgres-only side channels: NOTIFY and the JSONB outbox
+    monkeypatch.setattr(scheduler, "publish_events", publish)
+    monkeypatch.setattr(scheduler, "add_outbox_events", no_outbox)
+
+    async def wrapper():
+        async with sqlite_db(TABLES, name="loans") as (engine, session_factory):
+            await scenario(session_factory, events)
+
+    asyncio.run(wrapper())
+
+
+async def _loan(session_factory, phone: str, balance: str, amounts: list, due_days_ago: int = 1):
+    now = datetime.now(timezone.utc)
+    async with session_factory() as session:
+        user = User(first_name="Ada", last_name="Obi", phone_number=phone, phone_e164=phone, login_pin="x",
+                    created_date=now)
+        wallet = Wallet(user_id=user.id, balance=Decimal(balance))
+        loan = Loan(user_id=user.id, wallet_id=wallet.id, principal=sum(Decimal(amount) for amount in amounts))
+        installments = [
+            LoanInstallment(loan_id=loan.id, wallet_id=wallet.id, amount=Decimal(amount),
+                            due_date=now - timedelta(days=due_days_ago) + timedelta(minutes=index))
+            for index, amount in enumerate(amounts)
+        ]
+        session.add_all([user, wallet, loan, *installments])
+        await session.commit()
+    return wallet, loan, installments
+
+
+async def _get(session_factory, model, key):
+    async with session_factory() as session:
+        return await session.get(model, key)
+
+
+def test_pays_what_the_wallet_covers_and_marks_the_loan_repaid(sqlite_db, monkeypatch):
+    async def scenario(session_factory, events):
+        wallet, loan, installments = await _loan(session_factory, "+2348030000001", "250.00", ["100.00", "100.00"])
+        short_wallet, short_loan, short = await _loan(session_factory, "+2348030000002", "150.00",
+                                                      ["100.00", "100.00"])
+
+        async with session_factory() as session:
+            counts = await scheduler.collect_due_batch(session)
+        assert counts == {"claimed": 4, "paid": 3, "failed": 1}
+
+        assert (await _get(session_factory, Wallet, wallet.id)).balance == Decimal("50.00")
+        assert (await _get(session_factory, Loan, loan.id)).status == "repaid"
+        # The older installment is paid first; the other bounces and the loan stays open
+        assert (await _get(session_factory, Wallet, short_wallet.id)).balance == Decimal("50.00")
+        assert (await _get(session_factory, LoanInstallment, short[0].id)).status == "paid"
+        bounced = await _get(session_factory, LoanInstallment, short[1].id)
+        assert (bounced.status, bounced.attempts) == ("pending", 1)
+        assert bounced.next_attempt_date is not None
+        assert (await _get(session_factory, Loan, short_loan.id)).status == "active"
+
+        async with session_factory() as session:
+            references = (await session.execute(select(LedgerEntry.reference))).scalars().all()
+        assert sorted(references) == sorted(f"loan-installment:{row.id}"
+                                            for row in installments + short[:1])
+        assert [event_type for _, event_type, _ in events] == ["loan_repayment"] * 3
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_bounced_installments_wait_for_retry_and_fail_after_the_last_attempt(sqlite_db, monkeypatch):
+    async def scenario(session_factory, events):
+        _, loan, (installment,) = await _loan(session_factory, "+2348030000001", "10.00", ["100.00"])
+
+        async with session_factory() as session:
+            assert (await scheduler.collect_due_batch(session))["failed"] == 1
+        # Not due again until the retry delay has passed
+        async with session_factory() as session:
+            assert (await scheduler.collect_due_batch(session))["claimed"] == 0
+
+        for attempt in range(2, scheduler.MAX_REPAYMENT_ATTEMPTS + 1):
+            async with session_factory() as session:
+                row = await session.get(LoanInstallment, installment.id)
+                row.next_attempt_date = datetime.now(timezone.utc) - timedelta(minutes=1)
+                await session.commit()
+            async with session_factory() as session:
+                assert (await scheduler.collect_due_batch(session))["failed"] == 1
+
+        row = await _get(session_factory, LoanInstallment, installment.id)
+        assert (row.status, row.attempts) == ("failed", scheduler.MAX_REPAYMENT_ATTEMPTS)
+        assert (await _get(session_factory, Loan, loan.id)).status == "active"
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_only_due_installments_are_claimed_and_runs_drain_in_batches(sqlite_db, monkeypatch):
+    async def scenario(session_factory, events):
+        await _loan(session_factory, "+2348030000001", "1000.00", ["100.00", "100.00", "100.00"])
+        _, _, (future,) = await _loan(session_factory, "+2348030000002", "1000.00", ["100.00"], due_days_ago=-1)
+
+        totals = await scheduler.run_collection(session_factory, batch_size=2)
+        assert (totals["claimed"], totals["paid"], totals["failed"]) == (3, 3, 0)
+        assert (await _get(session_factory, LoanInstallment, future.id)).status == "pending"
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_claims_skip_locked_rows_and_lock_wallets_in_id_order(sqlite_db, monkeypatch):
+    async def scenario(session_factory, events):
+        for index in range(3):
+            await _loan(session_factory, f"+234803000000{index}", "1000.00", ["100.00"])
+
+        statements = []
+        async with session_factory() as session:
+            execute = session.execute
+
+            async def recording_execute(statement, *args, **kwargs):
+                statements.append(statement)
+                return await execute(statement, *args, **kwargs)
+
+            session.execute = recording_execute
+            await scheduler.collect_due_batch(session)
+
+        claim, lock = (str(statement.compile(dialect=postgresql.dialect())) for statement in statements[:2])
+        assert "FOR UPDATE SKIP LOCKED" in claim
+        assert "ORDER BY wallets.id" in lock and lock.rstrip().endswith("FOR UPDATE")
+
+    _run(scenario, sqlite_db, monkeypatch)
+
+
+def test_owners_are_reminded_once_of_installments_coming_due(sqlite_db, monkeypatch):
+    async def scenario(session_factory, events):
+        _, loan, (upcoming,) = await _loan(session_factory, "+2348030000001", "0.00", ["100.00"], due_days_ago=-0.5)
+        await _loan(session_factory, "+2348030000002", "0.00", ["100.00"], due_days_ago=-3)  # not yet
+        await _loan(session_factory, "+2348030000003", "0.00", ["100.00"])  # overdue: collected, not reminded
+
+        assert await scheduler.run_reminders(session_factory, batch_size=1) == 1
+        assert await scheduler.run_reminders(session_factory) == 0
+        assert [(user_id, event_type, data["installment_id"]) for user_id, event_type, data in events] == [
+            (loan.user_id, scheduler.LOAN_REMINDER, upcoming.id),
+        ]
+        assert (await _get(session_factory, LoanInstallment, upcoming.id)).reminded_date is not None
+
+    _run(scenario, sqlite_db, monkeypatch)
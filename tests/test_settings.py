@@ -0,0 +1,87 @@
+import asyncio
+import json
+
+import pytest
+from pydantic import ValidationError
+
+from src.settings.models import AppSetting
+from src.settings.services import SettingsStore, apply_overrides, build_settings, env_values, missing_required
+
+
+def _write(path, version: int, settings: dict) -> None:
+    path.write_text(json.dumps({"version": version, "settings": settings}))
+
+
+def test_environment_is_typed_and_flags_are_a_list():
+    environment = env_values({"OTP_MAX_REQUESTS": "8", "ACCESS_SECRET_KEY": "k", "FEATURE_FLAGS": "a, b,"})
+    settings = build_settings(0, environment)
+    assert settings.otp_max_requests == 8 and settings.access_secret_key == "k"
+    assert settings.flags == {"a", "b"} and settings.enabled("a") and not settings.enabled("c")
+
+
+def test_overrides_toggle_flags_and_skip_startup_only_keys():
+    values = apply_overrides({"access_secret_key": "k", "flags": {"a"}}, {
+        "access_secret_key": "changed", "flag:a": False, "flag:b": True, "otp_lookup_days": None,
+    })
+    assert values == {"access_secret_key": "k", "flags": {"b"}}
+
+
+def test_startup_refuses_to_run_without_the_device_credential_secret(monkeypatch):
+    from src import main
+
+    assert missing_required(build_settings(0, {})) == ["DEVICE_CREDENTIAL_SECRET"]
+    assert missing_required(build_settings(0, env_values({"DEVICE_CREDENTIAL_SECRET": "s3cret"}))) == []
+    # A table or file override cannot supply or replace it
+    assert "device_credential_secret" not in apply_overrides({}, {"device_credential_secret": "other"})
+
+    monkeypatch.setattr(main, "get_settings", lambda: build_settings(0, {}))
+
+    async def start():
+        async with main.lifespan(main.app):
+            pass
+
+    with pytest.raises(RuntimeError, match="DEVICE_CREDENTIAL_SECRET"):
+        asyncio.run(start())
+
+
+def test_snapshot_is_immutable():
+    settings = build_settings(0, {})
+    with pytest.raises(ValidationError):
+        settings.otp_max_requests = 50
+
+
+def test_only_newer_valid_versions_are_swapped_in(tmp_path):
+    path = tmp_path / "settings.json"
+    store = SettingsStore({"access_secret_key": "k"})
+    before = store.current
+
+    _write(path, 2, {"otp_max_requests": 9, "flag:trusted_device_login": False})
+    current = asyncio.run(store.refresh(path=str(path)))
+    assert (current.version, current.otp_max_requests, current.access_secret_key) == (2, 9, "k")
+    assert not current.enabled("trusted_device_login")
+    assert before.otp_max_requests == 5  # readers holding the old snapshot are unaffected
+
+    _write(path, 1, {"otp_max_requests": 3})  # an older copy of the file
+    assert asyncio.run(store.refresh(path=str(path))).otp_max_requests == 9
+
+    _write(path, 3, {"otp_max_requests": "many"})
+    assert asyncio.run(store.refresh(path=str(path))).version == 2
+
+
+def test_table_overrides_apply_over_the_file(tmp_path, sqlite_db):
+    path = tmp_path / "settings.json"
+    _write(path, 1, {"otp_max_requests": 9, "read_your_writes_seconds": 1.5})
+
+    async def scenario():
+        async with sqlite_db([AppSetting.__table__], name="home") as (engine, session_factory):
+            async with session_factory() as session:
+                session.add_all([
+                    AppSetting(key="otp_max_requests", value="3", version=1),
+                    AppSetting(key="otp_lookup_days", value=None, version=2),  # override removed
+                ])
+                await session.commit()
+            return await SettingsStore({}).refresh(session_factory, path=str(path))
+
+    settings = asyncio.run(scenario())
+    assert (settings.version, settings.otp_max_requests, settings.read_your_writes_seconds) == (3, 3, 1.5)
+    assert settings.otp_lookup_days == 1
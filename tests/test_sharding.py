@@ -0,0 +1,113 @@
+import asyncio
+from collections import Counter
+from contextlib import AsyncExitStack
+from datetime import datetime, timezone
+from decimal import Decimal
+from uuid import uuid4
+
+import pytest
+
+from src.authentications.models import InitUser, OTP, OTPRequestLimit, TrustedDevice, User
+from src.sharding import HashRing, ShardMoving, ShardRouter, parse_shard_urls
+from src.transactions.models import LedgerEntry, Loan, LoanInstallment, Wallet
+
+PHONES = [f"+234803{index:07d}" for index in range(20000)]
+
+
+def test_ring_spreads_keys_evenly():
+    ring = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    counts = Counter(ring.node_for(phone) for phone in PHONES)
+    assert set(counts) == {"shard0", "shard1", "shard2", "shard3"}
+    assert min(counts.values()) > len(PHONES) / 4 * 0.8
+
+
+def test_adding_a_shard_only_moves_keys_onto_it():
+    before = HashRing(["shard0", "shard1", "shard2"])
+    after = HashRing(["shard0", "shard1", "shard2", "shard3"])
+    moved = [phone for phone in PHONES if before.node_for(phone) != after.node_for(phone)]
+    assert all(after.node_for(phone) == "shard3" for phone in moved)
+    assert 0.15 < len(moved) / len(PHONES) < 0.35
+
+
+def test_pending_shard_owns_nothing_until_split_finishes():
+    factories = {"shard0": object(), "shard1": object(), "shard2": object()}
+    router = ShardRouter(factories, home="shard0", pending=["shard2"])
+    assert {router.shard_for(phone) for phone in PHONES} == {"shard0", "shard1"}
+    moving = [phone for phone in PHONES if router.is_moving(phone)]
+    assert moving and all(router.target_ring.node_for(phone) == "shard2" for phone in moving)
+    assert router.session_factory() is factories["shard0"]
+
+    frozen = ShardRouter(factories, home="shard0", pending=["shard2"], freeze_moving=True)
+    with pytest.raises(ShardMoving):
+        frozen.session_factory(moving[0])
+
+
+def test_parse_shard_urls_keeps_order():
+    shards = parse_shard_urls("home=postgresql+asyncpg://a/db, shard1=postgresql+asyncpg://b/db,")
+    assert list(shards) == ["home", "shard1"]
+    assert shards["shard1"] == "postgresql+asyncpg://b/db"
+
+
+TABLES = [model.__table__ for model in (User, TrustedDevice, InitUser, OTP, OTPRequestLimit, Wallet, Loan,
+                                        LoanInstallment, LedgerEntry)]
+
+
+def _run(scenario, sqlite_db, names):
+    async def wrapper():
+        async with AsyncExitStack() as stack:
+            factories = {}
+            for name in names:
+                _, factories[name] = await stack.enter_async_context(sqlite_db(TABLES, name=name))
+            await scenario(factories)
+
+    asyncio.run(wrapper())
+
+
+async def _add_user(session, phone: str, balance: str) -> None:
+    user = User(first_name="Ada", last_name="Obi", phone_number=phone, phone_e164=phone, login_pin="x",
+                created_date=datetime.now(timezone.utc))
+    wallet = Wallet(user_id=user.id, balance=Decimal(balance))
+    session.add(user)
+    session.add(wallet)
+    session.add(LedgerEntry(wallet_id=wallet.id, entry_type="credit", amount=Decimal(balance),
+                            reference=f"seed:{uuid4()}"))
+    session.add(OTP(phone_number=phone, phone_e164=phone, otp_code="123456",
+                    expire_date=datetime.now(timezone.utc)))
+
+
+def test_split_copies_verifies_and_cleans_up(sqlite_db):
+    from src.shard_split import cleanup, copy_to, verify
+
+    async def scenario(factories):
+        splitting = ShardRouter(factories, home="shard0", pending=["shard2"])
+        phones = PHONES[:300]
+        for source in ("shard0", "shard1"):
+            async with factories[source]() as session:
+                for phone in phones:
+                    if splitting.shard_for(phone) == source:
+                        await _add_user(session, phone, "250.00")
+                await session.commit()
+
+        moving = [phone for phone in phones if splitting.is_moving(phone)]
+        copied = await copy_to(splitting, "shard2", batch_size=50)
+        assert copied["users"] == len(moving) == copied["wallets"] == copied["ledger"] == copied["otp"]
+        # Re-running is idempotent
+        assert (await copy_to(splitting, "shard2", batch_size=50))["users"] == len(moving)
+        assert await verify(splitting, "shard2", batch_size=50) == []
+
+        with pytest.raises(RuntimeError):
+            await cleanup(splitting)
+        finished = ShardRouter(factories, home="shard0")
+        deleted = await cleanup(finished, batch_size=50)
+        assert deleted["shard2"] == 0
+        assert deleted["shard0"] + deleted["shard1"] == len(moving) * 2  # users plus their OTP rows
+
+        users = User.__table__
+        for phone in phones:
+            owner = finished.shard_for(phone)
+            for name, session_factory in factories.items():
+                async with session_factory() as session:
+                    found = (await session.execute(users.select().where(users.c.phone_e164 == phone))).first()
+                assert (found is not None) == (name == owner)
+
+    _run(scenario, sqlite_db, ["shard0", "shard1", "shard2"])
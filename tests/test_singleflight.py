@@ -0,0 +1,109 @@
+import asyncio
+
+import pytest
+
+from src.authentications import services
+from src.authentications.singleflight import SingleFlight
+
+
+def test_concurrent_calls_with_one_key_share_a_single_execution():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+        calls = []
+
+        async def work(key):
+            calls.append(key)
+            await release.wait()
+            return f"result-{key}"
+
+        waiters = [asyncio.create_task(flight.do("a", lambda: work("a"))) for _ in range(5)]
+        other = asyncio.create_task(flight.do("b", lambda: work("b")))
+        await asyncio.sleep(0)
+        assert flight.in_flight("a") and flight.in_flight("b")
+        release.set()
+        assert await asyncio.gather(*waiters) == ["result-a"] * 5
+        assert await other == "result-b"
+        assert sorted(calls) == ["a", "b"]
+
+    asyncio.run(scenario())
+
+
+def test_failure_reaches_every_waiter_and_the_key_is_freed():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def failing():
+            await release.wait()
+            raise RuntimeError("provider down")
+
+        waiters = [asyncio.create_task(flight.do("a", failing)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*waiters, return_exceptions=True)
+        assert all(isinstance(result, RuntimeError) for result in results)
+        await asyncio.sleep(0)
+        assert not flight.in_flight("a")
+
+        async def succeeding():
+            return "ok"
+
+        # The next call for the key runs afresh rather than reusing the failure
+        assert await flight.do("a", succeeding) == "ok"
+        await asyncio.sleep(0)
+        assert not flight.in_flight("a")
+
+    asyncio.run(scenario())
+
+
+def test_a_cancelled_caller_does_not_cancel_the_shared_work():
+    async def scenario():
+        flight = SingleFlight()
+        release = asyncio.Event()
+
+        async def work():
+            await release.wait()
+            return "done"
+
+        first = asyncio.create_task(flight.do("a", work))
+        second = asyncio.create_task(flight.do("a", work))
+        await asyncio.sleep(0)
+        first.cancel()
+        release.set()
+        assert await second == "done"
+        with pytest.raises(asyncio.CancelledError):
+            await first
+
+    asyncio.run(scenario())
+
+
+def test_otp_leader_opens_its_own_session_on_the_numbers_shard(monkeypatch):
+    sessions = []
+
+    class FakeSession:
+        async def __aenter__(self):
+            sessions.append(self)
+            return self
+
+        async def __aexit__(self, *exc_info):
+            self.closed = True
+
+    class FakeRouter:
+        def session_factory(self, phone_e164):
+            assert phone_e164 == "+2348030000001"
+            return FakeSession
+
+    async def issue(phone_number, db_session):
+        await asyncio.sleep(0.01)
+        return {"success": True, "session": db_session}
+
+    monkeypatch.setattr(services, "shard_router", FakeRouter())
+    monkeypatch.setattr(services, "_issue_user_otp", issue)
+
+    async def scenario():
+        return await asyncio.gather(*(services.send_user_otp("+2348030000001") for _ in range(3)))
+
+    results = asyncio.run(scenario())
+    assert len(sessions) == 1 and sessions[0].closed
+    assert all(result["session"] is sessions[0] for result in results)
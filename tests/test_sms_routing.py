@@ -0,0 +1,93 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from src.notifications.providers import SMSProvider, TermiiProvider
+from src.notifications.routing import ProviderRegistry
+
+
+class FakeProvider(SMSProvider):
+    def __init__(self, name: str, latency: float = 0.0, success: bool = True):
+        self.name = name
+        self.latency = latency
+        self.success = success
+        self.sent = []
+
+    async def send(self, phone_number: str, message: str) -> dict:
+        await asyncio.sleep(self.latency)
+        self.sent.append((phone_number, message))
+        return {"success": self.success, "message": "sent" if self.success else "failed"}
+
+
+@pytest.mark.asyncio
+async def test_routes_to_fastest_provider():
+    slow = FakeProvider("slow", latency=0.02)
+    fast = FakeProvider("fast", latency=0.0)
+    registry = ProviderRegistry([slow, fast])
+    registry.stats["slow"].record(0.5, True)
+    registry.stats["fast"].record(0.05, True)
+
+    response = await registry.send("+2348031234567", "Your OTP is 1234.")
+
+    assert response["provider"] == "fast"
+    assert slow.sent == []
+
+
+@pytest.mark.asyncio
+async def test_slow_provider_is_hedged_after_p95():
+    stuck = FakeProvider("stuck", latency=2.0)
+    backup = FakeProvider("backup", latency=0.0)
+    registry = ProviderRegistry([stuck, backup])
+    for _ in range(20):
+        registry.stats["stuck"].record(0.001, True)
+        registry.stats["backup"].record(0.01, True)
+
+    started = time.perf_counter()
+    response = await registry.send("+2348031234567", "Your OTP is 1234.")
+
+    assert response["provider"] == "backup"
+    assert time.perf_counter() - started < 1.0
+    assert backup.sent == [("+2348031234567", "Your OTP is 1234.")]
+
+
+@pytest.mark.asyncio
+async def test_failed_send_fails_over_and_demotes_provider():
+    broken = FakeProvider("broken", success=False)
+    healthy = FakeProvider("healthy", latency=0.001)
+    registry = ProviderRegistry([broken, healthy])
+
+    for _ in range(10):
+        response = await registry.send("+2348031234567", "hello")
+        assert response["success"]
+
+    assert not registry.stats["broken"].is_healthy()
+    assert registry.ranked()[0] is healthy
+
+
+@pytest.mark.asyncio
+async def test_all_providers_failing_returns_last_failure():
+    registry = ProviderRegistry([FakeProvider("a", success=False), FakeProvider("b", success=False)])
+
+    response = await registry.send("+2348031234567", "hello")
+
+    assert not response["success"]
+
+
+def test_providers_must_implement_send():
+    class Incomplete(SMSProvider):
+        name = "incomplete"
+
+    with pytest.raises(TypeError):
+        Incomplete()
+
+
+@pytest.mark.asyncio
+async def test_a_non_json_response_is_a_failed_send():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text="<html>Bad gateway</html>"))
+    provider = TermiiProvider("http://termii", "key", "Sender", client=httpx.AsyncClient(transport=transport))
+
+    response = await provider.send("+2348031234567", "hello")
+
+    assert not response["success"]
@@ -0,0 +1,84 @@
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from src.authentications import devices
+from src.authentications.devices import (
+    DEVICE_TRUST_DAYS,
+    issue_device_credential,
+    requires_pin,
+    revoke_devices,
+    verify_device_credential,
+)
+from src.authentications.models import TrustedDevice, User
+from src.fraud.velocity import VelocityDecision
+from src.settings.services import get_settings
+
+
+@pytest.fixture(autouse=True)
+def device_secret(monkeypatch):
+    settings = get_settings().model_copy(update={"device_credential_secret": "test-device-secret"})
+    monkeypatch.setattr(devices, "get_settings", lambda: settings)
+
+
+def _run(scenario, sqlite_db):
+    async def wrapper():
+        async with sqlite_db([User.__table__, TrustedDevice.__table__], name="devices") as (engine, session_factory):
+            async with session_factory() as session:
+                user = User(first_name="Ada", last_name="Obi", phone_number="+2348030000001",
+                            phone_e164="+2348030000001", login_pin="x", created_date=datetime.now(timezone.utc))
+                session.add(user)
+                await session.commit()
+                await scenario(session, user)
+
+    asyncio.run(wrapper())
+
+
+def test_credential_works_only_for_its_device_and_account(sqlite_db):
+    async def scenario(session, user):
+        credential = await issue_device_credential(session, user, "device-a", "google-1")
+        await session.commit()
+        assert await verify_device_credential(session, user, credential, "device-a", "google-1") is not None
+        assert await verify_device_credential(session, user, credential, "device-b", "google-1") is None
+        assert await verify_device_credential(session, user, credential, "device-a", "google-2") is None
+        forged = credential[:-4] + ("AAAA" if not credential.endswith("AAAA") else "BBBB")
+        assert await verify_device_credential(session, user, forged, "device-a", "google-1") is None
+        assert await verify_device_credential(session, user, "garbage", "device-a", "google-1") is None
+
+    _run(scenario, sqlite_db)
+
+
+def test_reissue_and_revocation_invalidate_old_credentials(sqlite_db):
+    async def scenario(session, user):
+        first = await issue_device_credential(session, user, "device-a")
+        await session.commit()
+        second = await issue_device_credential(session, user, "device-a")
+        await session.commit()
+        assert await verify_device_credential(session, user, first, "device-a") is None
+        assert await verify_device_credential(session, user, second, "device-a") is not None
+
+        assert await revoke_devices(session, user.id) == 1
+        await session.commit()
+        assert await verify_device_credential(session, user, second, "device-a") is None
+
+    _run(scenario, sqlite_db)
+
+
+def test_trust_expires(sqlite_db):
+    async def scenario(session, user):
+        credential = await issue_device_credential(session, user, "device-a")
+        await session.commit()
+        device = (await session.execute(TrustedDevice.__table__.select())).first()
+        stale = await session.get(TrustedDevice, device.id)
+        stale.created_date = datetime.now(timezone.utc) - timedelta(days=DEVICE_TRUST_DAYS + 1)
+        await session.commit()
+        assert await verify_device_credential(session, user, credential, "device-a") is None
+
+    _run(scenario, sqlite_db)
+
+
+def test_risky_attempts_need_the_pin():
+    assert not requires_pin(VelocityDecision(True, 0.1, []))
+    assert requires_pin(VelocityDecision(True, 0.8, []))
+    assert requires_pin(VelocityDecision(False, 1.2, ["login_failures_per_ip"]))
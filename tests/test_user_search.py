@@ -0,0 +1,95 @@
+import asyncio
+from datetime import datetime, timezone
+from uuid import uuid4
+
+import pytest
+from fastapi import FastAPI
+from httpx import ASGITransport, AsyncClient
+from sqlalchemy.dialects import postgresql
+
+from src.authentications.models import User
+from src.authentications.utilities import get_staff_user
+from src.sharding import ShardRouter
+from src.user import views
+from src.user.services import build_search, decode_cursor, encode_cursor, merge_pages
+
+
+def compiled(statement) -> str:
+    return str(statement.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+
+def test_cursor_round_trips():
+    user_id = uuid4()
+    assert decode_cursor(encode_cursor(0.42, user_id)) == (0.42, user_id)
+
+
+def test_garbage_cursor_is_rejected():
+    with pytest.raises(ValueError):
+        decode_cursor("not-a-cursor")
+
+
+def test_local_phone_query_matches_e164_digits():
+    sql = compiled(build_search("0803 123", 20))
+    assert "phone_e164 LIKE '%%234803123%%'" in sql
+
+
+def test_name_query_uses_indexed_expression_and_escapes_wildcards():
+    sql = compiled(build_search("Ada_O", 20))
+    assert "lower(users.first_name || ' ' || users.last_name)" in sql
+    assert "LIKE '%%ada\\\\_o%%'" in sql
+
+
+def test_merge_pages_orders_across_shards_and_continues_from_last_row():
+    ids = sorted(uuid4() for _ in range(4))
+    shard_a = [{"id": ids[0], "score": 0.9}, {"id": ids[2], "score": 0.5}]
+    shard_b = [{"id": ids[1], "score": 0.7}, {"id": ids[3], "score": 0.5}]
+    rows, cursor = merge_pages([shard_a, shard_b], limit=3)
+    assert [row["id"] for row in rows] == [ids[0], ids[1], ids[2]]
+    assert decode_cursor(cursor) == (0.5, ids[2])
+
+
+def test_merge_pages_has_no_cursor_on_last_page():
+    rows, cursor = merge_pages([[{"id": uuid4(), "score": 0.4}], []], limit=20)
+    assert len(rows) == 1 and cursor is None
+
+
+def test_search_skips_pending_shards_and_stale_copies(monkeypatch):
+    class Session:
+        def __init__(self, shard):
+            self.shard = shard
+
+        async def __aenter__(self):
+            return self
+
+        async def __aexit__(self, *exc_info):
+            return None
+
+    factories = {name: (lambda name=name: Session(name)) for name in ("shard0", "shard1", "shard2")}
+    # shard2 is still being filled by a split; shard1 keeps copies of users it no longer owns until cleanup
+    router = ShardRouter(factories, home="shard0", pending=["shard2"])
+    phones = [f"+234803{index:07d}" for index in range(40)]
+    searched = []
+
+    async def search_users(session, query, limit, after):
+        searched.append(session.shard)
+        return [{"id": uuid4(), "first_name": "Ada", "last_name": "Obi", "phone_e164": phone,
+                 "created_date": datetime.now(timezone.utc), "score": 0.5}
+                for phone in phones if session.shard == "shard1" or router.shard_for(phone) == session.shard][:limit]
+
+    monkeypatch.setattr(views, "shard_router", router)
+    monkeypatch.setattr(views, "read_session_factory", lambda: factories["shard0"])
+    monkeypatch.setattr(views, "search_users", search_users)
+
+    app = FastAPI()
+    app.include_router(views.router)
+    app.dependency_overrides[get_staff_user] = lambda: User(first_name="Staff", last_name="User", login_pin="x",
+                                                            phone_number="+2348030000001",
+                                                            phone_e164="+2348030000001")
+
+    async def scenario():
+        async with AsyncClient(transport=ASGITransport(app=app), base_url="http://test") as client:
+            return (await client.get("/users/search", params={"q": "0803", "limit": 100})).json()
+
+    page = asyncio.run(scenario())
+    assert sorted(searched) == ["shard0", "shard1"]
+    assert sorted(row["phone_e164"] for row in page["results"]) == phones
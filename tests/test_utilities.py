@@ -0,0 +1,99 @@
+import time
+
+import httpx
+import pytest
+from httpx import ASGITransport, AsyncClient
+
+from src.utilities import services
+from src.utilities.providers import BillProvider, ProviderError, hedged_call
+from src.utilities.schemas import CustomerValidationItem
+from src.utilities.stub_provider import create_stub_app
+
+
+def make_provider(name: str, stub) -> BillProvider:
+    client = AsyncClient(transport=ASGITransport(app=stub))
+    return BillProvider(name, "http://stub", client=client)
+
+
+@pytest.fixture(autouse=True)
+def clear_caches():
+    services.biller_catalog_cache.clear()
+    services.customer_name_cache.clear()
+
+
+@pytest.mark.asyncio
+async def test_slow_primary_is_hedged_to_secondary():
+    slow_stub = create_stub_app(latency_seconds=1.0)
+    fast_stub = create_stub_app(latency_seconds=0.0)
+    providers = [make_provider("primary", slow_stub), make_provider("secondary", fast_stub)]
+
+    started = time.perf_counter()
+    result = await services.validate_customer("electricity", "IKEDC-PREPAID", "45012345678", providers)
+
+    assert result["valid"]
+    assert result["customer_name"] == "Customer 5678"
+    assert time.perf_counter() - started < 0.9
+    assert fast_stub.state.calls == 1
+
+
+@pytest.mark.asyncio
+async def test_failing_primary_falls_back_to_secondary():
+    providers = [
+        make_provider("primary", create_stub_app(fail=True)),
+        make_provider("secondary", create_stub_app()),
+    ]
+
+    billers = await services.get_billers("airtime", providers)
+
+    assert [biller["code"] for biller in billers] == ["MTN-VTU", "GLO-VTU"]
+
+
+@pytest.mark.asyncio
+async def test_catalog_and_customer_names_are_cached():
+    stub = create_stub_app()
+    providers = [make_provider("primary", stub)]
+
+    await services.get_billers("electricity", providers)
+    await services.get_billers("electricity", providers)
+    await services.validate_customer("electricity", "IKEDC-PREPAID", "45012345678", providers)
+    await services.validate_customer("electricity", "IKEDC-PREPAID", "45012345678", providers)
+
+    assert stub.state.calls == 2
+
+
+@pytest.mark.asyncio
+async def test_validate_customers_runs_concurrently():
+    stub = create_stub_app(latency_seconds=0.2)
+    providers = [make_provider("primary", stub)]
+    items = [
+        CustomerValidationItem(category="electricity", biller_code="IKEDC-PREPAID", customer_id=f"450123456{i:02d}")
+        for i in range(10)
+    ] + [
+        CustomerValidationItem(category="airtime", biller_code="MTN-VTU", customer_id="08031234567"),
+        CustomerValidationItem(category="airtime", biller_code="MTN-VTU", customer_id="12345"),
+    ]
+
+    started = time.perf_counter()
+    results = await services.validate_customers(items, providers)
+
+    assert time.perf_counter() - started < 1.0
+    assert all(result["valid"] for result in results[:11])
+    assert not results[11]["valid"]
+
+
+@pytest.mark.asyncio
+async def test_hedged_call_raises_when_both_fail():
+    async def fail():
+        raise ValueError("down")
+
+    with pytest.raises(ValueError):
+        await hedged_call(fail, fail, hedge_delay=0.01)
+
+
+@pytest.mark.asyncio
+async def test_a_non_json_response_is_a_provider_error():
+    transport = httpx.MockTransport(lambda request: httpx.Response(200, text="<html>Bad gateway</html>"))
+    provider = BillProvider("primary", "http://stub", client=AsyncClient(transport=transport))
+
+    with pytest.raises(ProviderError):
+        await provider.get_billers("electricity")